@@ -8,12 +8,20 @@ from flask import Flask
 from flask_login import LoginManager
 from flask_socketio import SocketIO
 from dotenv import load_dotenv
+from utils.async_support import get_async_mode
+from utils.structured_log import configure_logging
 
 # Załaduj zmienne środowiskowe
 load_dotenv()
 
+# Jedyny serwer Socket.IO aplikacji (konfigurowany w create_app)
+socketio = SocketIO()
+
 def create_app():
     """Tworzy i konfiguruje aplikację Flask"""
+    # Logi trafiają do kolejki, zapis na stdout/do pliku robi osobny wątek
+    configure_logging()
+    
     # Ustaw jawną ścieżkę do templates i static
     template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'templates'))
     static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static'))
@@ -46,7 +54,13 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix='/admin')
     
     # Inicjalizacja SocketIO
-    socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
+    # Kolejka wiadomości (np. redis://) jest potrzebna tylko przy wielu procesach
+    socketio.init_app(
+        app,
+        cors_allowed_origins="*",
+        async_mode=get_async_mode(),
+        message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE') or None
+    )
     register_socketio_handlers(socketio)
     
     return app
@@ -11,9 +11,10 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 
 from flask_login import login_required, login_user, logout_user, current_user
 from app.models import User, ChatSession, UploadIndex, UserSession
-from app.session_analytics import SessionAnalytics
-from utils.learning_reports import LearningReportsSystem
+from app.session_analytics import SessionAnalytics, get_analytics
+from utils.learning_reports import get_learning_reports_system
 from utils.reports_scheduler import get_report_scheduler
+from utils.topic_tagger import message_topics, primary_topic
 
 class UserData:
     """Klasa wrapper dla danych użytkownika"""
@@ -21,20 +22,11 @@ class UserData:
         for key, value in data.items():
             setattr(self, key, value)
 
-# Inicjalizuj instancję analytics
-analytics = SessionAnalytics()
-
-# Inicjalizuj system raportów uczenia się
-learning_reports_system = LearningReportsSystem()
-
 # Dodaj logger
 logger = logging.getLogger(__name__)
 
 admin_bp = Blueprint('admin', __name__)
 
-# Inicjalizuj analitykę sesji
-analytics = SessionAnalytics()
-
 @admin_bp.route('/login', methods=['GET', 'POST'])
 def login():
     """Logowanie administratora"""
@@ -62,6 +54,7 @@ def logout():
 @login_required
 def dashboard():
     """Panel główny administratora z rozszerzonymi statystykami"""
+    analytics = get_analytics()
     # Odśwież dane analityczne
     analytics.load_all_data()
     
@@ -90,6 +83,7 @@ def users():
         flash('Brak uprawnień administratora', 'error')
         return redirect(url_for('admin.dashboard'))
     
+    analytics = get_analytics()
     # Odśwież dane analityczne
     analytics.load_all_data()
     
@@ -345,6 +339,7 @@ def session_details(session_id):
         flash('Brak uprawnień administratora', 'error')
         return redirect(url_for('admin.dashboard'))
     
+    analytics = get_analytics()
     # Odśwież dane analityczne
     analytics.load_all_data()
     
@@ -379,6 +374,7 @@ def analytics_dashboard():
         'response_quality': analytics.get_response_quality_percentage(),
         'positive_feedback': analytics.get_positive_feedback_percentage(),
         'top_topics': analytics.get_top_topics_with_stats(),
+        'most_asked_questions': analytics.get_most_asked_questions(10),
         'top_users': analytics.get_top_users_detailed(),
         'avg_response_time': analytics.get_average_response_time(),
         'system_uptime': analytics.get_system_uptime(),
@@ -393,7 +389,8 @@ def analytics_dashboard():
         'feedback_response_rate': analytics.get_feedback_response_rate(),
         'recent_sessions': analytics.get_recent_sessions(20),
         'activity_labels': analytics.get_activity_labels(),
-        'activity_data': analytics.get_activity_data()
+        'activity_data': analytics.get_activity_data(),
+        'token_usage': analytics.get_token_usage(30)
     }
     
     return render_template('admin/analytics.html', stats=stats)
@@ -413,6 +410,7 @@ def user_details(user_id):
         flash('Użytkownik nie został znaleziony', 'error')
         return redirect(url_for('admin.users'))
     
+    analytics = get_analytics()
     # Odśwież dane analityczne
     analytics.load_all_data()
     
@@ -444,6 +442,7 @@ def user_sessions(user_id):
         flash('Użytkownik nie został znaleziony', 'error')
         return redirect(url_for('admin.users'))
     
+    analytics = get_analytics()
     # Odśwież dane analityczne
     analytics.load_all_data()
     
@@ -505,6 +504,7 @@ def export_user_report(user_id):
         flash('Użytkownik nie został znaleziony', 'error')
         return redirect(url_for('admin.users'))
     
+    analytics = get_analytics()
     # Odśwież dane analityczne
     analytics.load_all_data()
     
@@ -612,6 +612,139 @@ def api_quick_stats():
             'system_status': 'Error'
         })
 
+@admin_bp.route('/api/most-asked-questions')
+@login_required
+def api_most_asked_questions():
+    """API najczęściej zadawanych pytań (podobne pytania zgrupowane)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Brak uprawnień'}), 403
+    
+    try:
+        from utils.question_index import get_question_index
+        
+        limit = request.args.get('limit', 20, type=int)
+        index = get_question_index()
+        return jsonify({
+            'questions': index.most_asked(limit),
+            'stats': index.stats()
+        })
+    except Exception as e:
+        logger.error(f"Błąd w api_most_asked_questions: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/api/streaming-stats')
+@login_required
+def api_streaming_stats():
+    """API statystyk strumieniowania odpowiedzi (ramki, cache, współdzielone generowania, pula)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Brak uprawnień'}), 403
+    
+    try:
+        from utils.chunk_coalescer import get_stream_stats
+        from utils.single_flight import get_single_flight
+        from utils.answer_cache import get_answer_cache
+        from app.generation_pool import get_generation_pool
+        from utils.markdown_render import get_render_cache
+        
+        pool = get_generation_pool()
+        return jsonify({
+            'frames': get_stream_stats(),
+            'single_flight': get_single_flight().stats(),
+            'answer_cache': get_answer_cache().stats(),
+            'generation_pool': pool.stats() if pool else None,
+            'render_cache': get_render_cache().stats()
+        })
+    except Exception as e:
+        logger.error(f"Błąd w api_streaming_stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/api/token-usage')
+@login_required
+def api_token_usage():
+    """API zużycia tokenów i kosztu OpenAI (per dzień, użytkownik, funkcja i model)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Brak uprawnień'}), 403
+    
+    try:
+        days = max(1, min(request.args.get('days', 30, type=int), 400))
+        return jsonify(get_analytics().get_token_usage(days, request.args.get('user_id')))
+    except Exception as e:
+        logger.error(f"Błąd w api_token_usage: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# =============================================
+# DEBUG / PROFILING ROUTES
+# =============================================
+
+@admin_bp.route('/api/debug/profile', methods=['POST'])
+@login_required
+def api_debug_profile():
+    """Profil próbkujący wszystkich wątków (format collapsed dla flamegraph lub podsumowanie JSON)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Brak uprawnień'}), 403
+
+    try:
+        from utils.profiler import profile_threads, ProfilerBusy
+        from utils.async_support import run_blocking
+
+        seconds = request.args.get('seconds', 10, type=float)
+        interval = request.args.get('interval_ms', 10, type=float) / 1000.0
+        output = request.args.get('format', 'collapsed')
+        include_idle = request.args.get('idle', '1') not in ('0', 'false', 'no')
+        if output not in ('collapsed', 'json'):
+            return jsonify({'error': 'format musi być collapsed lub json'}), 400
+
+        try:
+            # W trybie eventlet/gevent profiler musi działać w prawdziwym wątku systemowym
+            profiler = run_blocking(profile_threads, seconds, interval, include_idle)
+        except ProfilerBusy as e:
+            return jsonify({'error': str(e)}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        logger.info(f"Profil wykonany przez {current_user.username}: {profiler.samples} próbek, {profiler.duration:.1f}s")
+        if output == 'json':
+            return jsonify(profiler.summary(request.args.get('top', 30, type=int)))
+
+        response = make_response(profiler.collapsed())
+        response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+        response.headers['Content-Disposition'] = (
+            f'attachment; filename=profile_{datetime.now().strftime("%Y%m%d_%H%M%S")}.folded'
+        )
+        return response
+    except Exception as e:
+        logger.error(f"Błąd w api_debug_profile: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/api/debug/tracemalloc', methods=['POST'])
+@login_required
+def api_debug_tracemalloc():
+    """Największe przyrosty alokacji pamięci w zadanym oknie czasu (tracemalloc)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Brak uprawnień'}), 403
+
+    try:
+        from utils.profiler import tracemalloc_report, ProfilerBusy
+        from utils.metrics import process_rss_bytes
+
+        try:
+            report = tracemalloc_report(
+                seconds=request.args.get('seconds', 10, type=float),
+                top=request.args.get('top', 25, type=int),
+                group_by=request.args.get('group_by', 'lineno'),
+                frames=request.args.get('frames', 1, type=int)
+            )
+        except ProfilerBusy as e:
+            return jsonify({'error': str(e)}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        report['process_rss_bytes'] = process_rss_bytes()
+        return jsonify(report)
+    except Exception as e:
+        logger.error(f"Błąd w api_debug_tracemalloc: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # =============================================
 # LEARNING REPORTS ROUTES
 # =============================================
@@ -626,6 +759,7 @@ def learning_reports():
     
     try:
         # Pobierz listę dostępnych raportów
+        learning_reports_system = get_learning_reports_system()
         available_reports = learning_reports_system.get_available_reports()
         
         # Pobierz scheduler info
@@ -661,6 +795,7 @@ def generate_learning_report():
             date = datetime.now()
         
         # Generuj raport
+        learning_reports_system = get_learning_reports_system()
         report = learning_reports_system.generate_daily_report(date)
         
         return jsonify({
@@ -682,6 +817,7 @@ def view_learning_report(report_id):
         return redirect(url_for('admin.dashboard'))
     
     try:
+        learning_reports_system = get_learning_reports_system()
         report = learning_reports_system.get_report(report_id)
         
         if not report:
@@ -703,6 +839,7 @@ def download_learning_report(report_id):
         return jsonify({'error': 'Brak uprawnień'}), 403
     
     try:
+        learning_reports_system = get_learning_reports_system()
         report = learning_reports_system.get_report(report_id)
         
         if not report:
@@ -728,6 +865,7 @@ def api_learning_summary():
     
     try:
         # Pobierz ostatnie raporty
+        learning_reports_system = get_learning_reports_system()
         recent_reports = learning_reports_system.get_available_reports()[:7]  # Ostatnie 7 dni
         
         if not recent_reports:
@@ -812,6 +950,7 @@ def api_learning_reports():
         return jsonify({'error': 'Brak uprawnień'}), 403
     
     try:
+        learning_reports_system = get_learning_reports_system()
         reports = learning_reports_system.get_available_reports()
         return jsonify({
             'success': True,
@@ -829,6 +968,7 @@ def api_learning_report_detail(report_id):
         return jsonify({'error': 'Brak uprawnień'}), 403
     
     try:
+        learning_reports_system = get_learning_reports_system()
         report = learning_reports_system.get_report(report_id)
         if not report:
             return jsonify({'error': 'Raport nie znaleziony'}), 404
@@ -1120,7 +1260,7 @@ def api_user_activity(user_id):
                                         'content': content[:200] + "..." if len(content) > 200 else content,
                                         'timestamp': msg_time.isoformat() if msg_time else message.get('timestamp', ''),
                                         'session_id': filename.replace('.json', ''),
-                                        'topic': reports_system._detect_topic(content)
+                                        'topic': primary_topic(message_topics(message))
                                     }
                                     session_questions.append(question_data)
                         
@@ -1241,7 +1381,7 @@ def api_analyze_program():
         from utils.atpl_handbook_generator import get_handbook_generator
         
         generator = get_handbook_generator()
-        structure = generator.analyze_program_structure()
+        structure = generator.analyze_program_structure(current_user.id)
         
         return jsonify({
             'success': True,
@@ -1295,7 +1435,7 @@ def api_generate_content():
         from utils.atpl_handbook_generator import get_handbook_generator
         
         generator = get_handbook_generator()
-        content = generator.generate_chapter_content(module_id, chapter_id, topic_id, ai_type)
+        content = generator.generate_chapter_content(module_id, chapter_id, topic_id, ai_type, current_user.id)
         
         return jsonify({
             'success': True,
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Zadania wsadowe - odpowiedzi na całe banki pytań
+
+Bank pytań (JSONL lub CSV) jest zapisywany jako zadanie w katalogu
+data/batch_jobs/<job_id>/. Pytania są przetwarzane równolegle (limit
+współbieżności) z ogranicznikiem częstotliwości żądań. Pytania o ten sam
+zestaw dokumentów korzystają z jednego vector store. Każdy wynik jest od
+razu dopisywany do results.jsonl, więc przerwane zadanie można wznowić
+od pominiętych pytań.
+
+Każde pytanie musi mieć dokumenty: własne (kolumna documents) albo
+wspólne dla zadania - nie są dobierane automatycznie.
+"""
+import os
+import io
+import csv
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from utils.rate_limiter import TokenBucket
+from utils.token_usage import get_usage_ledger
+
+logger = logging.getLogger(__name__)
+
+QUESTION_FIELDS = ('question', 'pytanie', 'prompt', 'text')
+
+
+def _split_documents(value) -> Optional[List[str]]:
+    """Zwraca listę dokumentów z pola wiersza (lista lub tekst rozdzielony ';' lub ',')"""
+    if not value:
+        return None
+    if isinstance(value, list):
+        documents = [str(v).strip() for v in value]
+    else:
+        separator = ';' if ';' in str(value) else ','
+        documents = [v.strip() for v in str(value).split(separator)]
+    return [d for d in documents if d] or None
+
+
+def _question_row(row: Dict, index: int) -> Optional[Dict]:
+    """Normalizuje wiersz banku pytań"""
+    lowered = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+    question = next((lowered[f] for f in QUESTION_FIELDS if lowered.get(f)), None)
+    if not question or not str(question).strip():
+        return None
+    return {
+        'index': index,
+        'id': str(lowered.get('id') or lowered.get('question_id') or index + 1),
+        'question': str(question).strip(),
+        'documents': _split_documents(lowered.get('documents') or lowered.get('dokumenty'))
+    }
+
+
+def parse_question_bank(content: str, fmt: str) -> List[Dict]:
+    """Parsuje bank pytań w formacie JSONL lub CSV"""
+    rows = []
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(content.splitlines(), 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                raise ValueError(f'Niepoprawny JSON w linii {line_no}')
+            rows.append(item if isinstance(item, dict) else {'question': item})
+    elif fmt == 'csv':
+        sample = content[:4096]
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(io.StringIO(content), dialect)
+        lines = [r for r in reader if any(cell.strip() for cell in r)]
+        if not lines:
+            return []
+        header = [h.strip().lower() for h in lines[0]]
+        if any(f in header for f in QUESTION_FIELDS):
+            rows = [dict(zip(header, r)) for r in lines[1:]]
+        else:
+            # Bez nagłówka - pytanie w pierwszej kolumnie
+            rows = [{'question': r[0]} for r in lines]
+    else:
+        raise ValueError('Obsługiwane formaty: jsonl, csv')
+
+    questions = []
+    for row in rows:
+        question = _question_row(row, len(questions))
+        if question:
+            questions.append(question)
+    return questions
+
+
+class BatchJobManager:
+    """Rejestr zadań wsadowych i ich wykonawców"""
+
+    def __init__(self, jobs_dir: str = 'data/batch_jobs', max_concurrency: int = None,
+                 max_rate_per_minute: float = None, max_questions: int = None):
+        self.jobs_dir = jobs_dir
+        self.max_concurrency = max_concurrency or int(os.getenv('BATCH_MAX_CONCURRENCY', 4))
+        self.max_rate_per_minute = max_rate_per_minute or float(os.getenv('BATCH_MAX_RATE_PER_MINUTE', 60))
+        self.max_questions = max_questions or int(os.getenv('BATCH_MAX_QUESTIONS', 2000))
+        self._lock = threading.Lock()
+        self._runners = {}
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._mark_interrupted()
+
+    # ------------------------------------------------------------------
+    # Pliki zadania
+    # ------------------------------------------------------------------
+
+    def _path(self, job_id: str, name: str = '') -> str:
+        return os.path.join(self.jobs_dir, job_id, name)
+
+    def _save_job(self, job: Dict):
+        job['updated_at'] = datetime.now().isoformat()
+        tmp_path = self._path(job['job_id'], 'job.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._path(job['job_id'], 'job.json'))
+
+    def _load_questions(self, job_id: str) -> List[Dict]:
+        with open(self._path(job_id, 'questions.jsonl'), 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _load_results(self, job_id: str) -> Dict[int, Dict]:
+        """Wczytuje wyniki (ostatni wynik dla pytania wygrywa)"""
+        results = {}
+        path = self._path(job_id, 'results.jsonl')
+        if not os.path.exists(path):
+            return results
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # Niepełna linia po przerwaniu zapisu
+                    continue
+                results[result['index']] = result
+        return results
+
+    def _mark_interrupted(self):
+        """Zadania przerwane restartem serwera oznacza jako wstrzymane (do wznowienia)"""
+        for job_id in os.listdir(self.jobs_dir):
+            job = self.get(job_id)
+            if job and job['status'] in ('queued', 'running'):
+                job['status'] = 'interrupted'
+                self._save_job(job)
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def create_job(self, owner_id: str, questions: List[Dict], name: str = None,
+                   documents: List[str] = None, concurrency: int = None,
+                   rate_per_minute: float = None) -> Dict:
+        """Zapisuje nowe zadanie i uruchamia je"""
+        if not questions:
+            raise ValueError('Bank pytań jest pusty')
+        if len(questions) > self.max_questions:
+            raise ValueError(f'Za dużo pytań ({len(questions)}), limit to {self.max_questions}')
+        missing = [q['id'] for q in questions if not q.get('documents')]
+        if missing and not documents:
+            raise ValueError(f'Brak dokumentów dla pytań: {", ".join(missing[:5])} - podaj dokumenty '
+                             'zadania (documents) lub kolumnę documents dla każdego pytania')
+
+        job_id = uuid.uuid4().hex[:12]
+        os.makedirs(self._path(job_id), exist_ok=True)
+        with open(self._path(job_id, 'questions.jsonl'), 'w', encoding='utf-8') as f:
+            for question in questions:
+                f.write(json.dumps(question, ensure_ascii=False) + '\n')
+
+        job = {
+            'job_id': job_id,
+            'owner_id': owner_id,
+            'name': name or f'Bank pytań {datetime.now().strftime("%d.%m %H:%M")}',
+            'status': 'queued',
+            'documents': documents or None,
+            'concurrency': max(1, min(int(concurrency or self.max_concurrency), self.max_concurrency)),
+            'rate_per_minute': max(1.0, min(float(rate_per_minute or self.max_rate_per_minute), self.max_rate_per_minute)),
+            'total': len(questions),
+            'completed': 0,
+            'failed': 0,
+            'cached': 0,
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None
+        }
+        self._save_job(job)
+        logger.info("Utworzono zadanie wsadowe %s: %d pytań", job_id, len(questions))
+        self.start(job_id)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        if not job_id or not job_id.isalnum():
+            return None
+        path = self._path(job_id, 'job.json')
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def list_jobs(self, owner_id: str = None) -> List[Dict]:
+        jobs = [self.get(job_id) for job_id in os.listdir(self.jobs_dir)]
+        jobs = [j for j in jobs if j and (owner_id is None or j['owner_id'] == owner_id)]
+        return sorted(jobs, key=lambda j: j['created_at'], reverse=True)
+
+    def is_running(self, job_id: str) -> bool:
+        with self._lock:
+            runner = self._runners.get(job_id)
+            return bool(runner and runner['thread'].is_alive())
+
+    def start(self, job_id: str) -> bool:
+        """Uruchamia (lub wznawia) zadanie; pomija pytania z zapisaną odpowiedzią"""
+        job = self.get(job_id)
+        if not job or job['status'] == 'completed':
+            return False
+        with self._lock:
+            runner = self._runners.get(job_id)
+            if runner and runner['thread'].is_alive():
+                return False
+            cancel_event = threading.Event()
+            thread = threading.Thread(target=self._run, args=(job_id, cancel_event), daemon=True)
+            self._runners[job_id] = {'thread': thread, 'cancel': cancel_event}
+        thread.start()
+        return True
+
+    def cancel(self, job_id: str) -> bool:
+        """Zatrzymuje zadanie (zapisane wyniki zostają, zadanie można wznowić)"""
+        with self._lock:
+            runner = self._runners.get(job_id)
+        if not runner or not runner['thread'].is_alive():
+            return False
+        runner['cancel'].set()
+        return True
+
+    def iter_results(self, job_id: str) -> Iterator[str]:
+        """Zwraca wyniki jako linie JSONL w kolejności pytań"""
+        results = self._load_results(job_id)
+        for index in sorted(results):
+            yield json.dumps(results[index], ensure_ascii=False) + '\n'
+
+    # ------------------------------------------------------------------
+    # Wykonanie
+    # ------------------------------------------------------------------
+
+    def _run(self, job_id: str, cancel_event: threading.Event):
+        """Przetwarza pytania zadania z limitem współbieżności i częstotliwości"""
+        from utils.openai_rag import OpenAIRAG
+
+        job = self.get(job_id)
+        job_lock = threading.Lock()
+        results = self._load_results(job_id)
+        pending = [q for q in self._load_questions(job_id)
+                   if results.get(q['index'], {}).get('status') != 'ok']
+
+        job.update({
+            'status': 'running',
+            'started_at': job['started_at'] or datetime.now().isoformat(),
+            'error': None,
+            'completed': sum(1 for r in results.values() if r['status'] == 'ok'),
+            'failed': 0
+        })
+        self._save_job(job)
+        logger.info("Zadanie wsadowe %s: %d pytań do przetworzenia", job_id, len(pending))
+
+        bucket = TokenBucket(job['rate_per_minute'], capacity=job['concurrency'])
+        local = threading.local()
+        stores = {}
+        stores_lock = threading.Lock()
+
+        def get_rag():
+            if not hasattr(local, 'rag'):
+                local.rag = OpenAIRAG()
+            return local.rag
+
+        def store_for(documents):
+            """Zwraca vector store zestawu dokumentów (tworzony raz na zadanie, (None, []) przy błędzie)"""
+            key = tuple(sorted(documents))
+            with stores_lock:
+                entry = stores.setdefault(key, {'lock': threading.Lock(), 'store': None})
+            with entry['lock']:
+                if entry['store'] is None and documents:
+                    entry['rag'] = get_rag()
+                    vector_store_id, file_ids = entry['rag'].create_shared_vector_store(documents)
+                    if vector_store_id:
+                        entry['store'] = (vector_store_id, file_ids)
+                # Nieudane utworzenie nie jest zapamiętywane - kolejne pytanie spróbuje ponownie
+                return entry['store'] or (None, [])
+
+        def answer(question):
+            if cancel_event.is_set() or not bucket.acquire(is_cancelled=cancel_event.is_set):
+                return
+            rag = get_rag()
+            documents = question.get('documents') or job['documents'] or []
+            started = time.time()
+            if not documents:
+                # Zadania sprzed wymogu dokumentów - pytanie bez dokumentów nie jest wysyłane
+                text, cached, error, usage = '', False, 'Brak dokumentów dla pytania', None
+            else:
+                try:
+                    vector_store = store_for(documents)
+                    if vector_store[0]:
+                        text, cached = rag.answer_question(question['question'], documents,
+                                                           vector_store, cancel_event.is_set)
+                        error = rag.last_error
+                        usage = rag.last_usage
+                    else:
+                        # Bez vector store asystent odpowiedziałby bez dokumentów
+                        text, cached, error, usage = '', False, 'Nie utworzono vector store dla dokumentów', None
+                except Exception as e:
+                    text, cached, error, usage = '', False, str(e), None
+            try:
+                get_usage_ledger().record(usage, job['owner_id'], 'batch', cached=cached)
+            except Exception as e:
+                logger.warning("Błąd zapisu zużycia tokenów: %s", e)
+            if cancel_event.is_set() and error:
+                return
+
+            result = {
+                'index': question['index'],
+                'id': question['id'],
+                'question': question['question'],
+                'answer': text if not error else None,
+                'status': 'ok' if not error else 'error',
+                'error': error,
+                'cached': cached,
+                'usage': usage,
+                'documents': documents,
+                'duration': round(time.time() - started, 2),
+                'completed_at': datetime.now().isoformat()
+            }
+            with job_lock:
+                with open(self._path(job_id, 'results.jsonl'), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(result, ensure_ascii=False) + '\n')
+                job['completed' if not error else 'failed'] += 1
+                if cached:
+                    job['cached'] += 1
+                self._save_job(job)
+
+        try:
+            with ThreadPoolExecutor(max_workers=job['concurrency']) as executor:
+                for future in [executor.submit(answer, q) for q in pending]:
+                    future.result()
+
+            if cancel_event.is_set():
+                job['status'] = 'cancelled'
+            else:
+                # Pytania z błędem zostaną ponowione przy wznowieniu
+                job['status'] = 'completed' if not job['failed'] else 'partial'
+        except Exception as e:
+            logger.exception("Błąd zadania wsadowego %s: %s", job_id, e)
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        finally:
+            for entry in stores.values():
+                if entry['store'] and entry['store'][0]:
+                    try:
+                        entry['rag'].release_shared_vector_store(*entry['store'])
+                    except Exception as e:
+                        logger.warning("Nie udało się usunąć vector store zadania: %s", e)
+            job['finished_at'] = datetime.now().isoformat()
+            self._save_job(job)
+            logger.info("Zadanie wsadowe %s: %s (%d/%d, błędy: %d)", job_id, job['status'],
+                        job['completed'], job['total'], job['failed'])
+
+
+_batch_jobs = None
+_batch_jobs_lock = threading.Lock()
+
+
+def get_batch_jobs() -> BatchJobManager:
+    """Zwraca globalny rejestr zadań wsadowych"""
+    global _batch_jobs
+    if _batch_jobs is None:
+        with _batch_jobs_lock:
+            if _batch_jobs is None:
+                _batch_jobs = BatchJobManager()
+    return _batch_jobs
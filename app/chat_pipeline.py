@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Wspólny potok obsługi wiadomości czatu
+
+Używany przez Socket.IO (send_message) i strumień HTTP (/api/chat/stream).
+Transport dostarcza dwie funkcje: send(event, payload, final) dla zdarzeń
+i send_chunk(frame) dla fragmentów odpowiedzi - zapis wiadomości, kontekst
+rozmowy, generowanie, cache i raport PDF są wspólne.
+"""
+import time
+import logging
+from typing import Callable, Dict, List, Optional
+
+from app.models import ChatSession, UserSession
+from utils.answer_cache import get_answer_cache
+from utils.chunk_coalescer import ChunkCoalescer
+from utils.markdown_render import markdown_to_html, get_render_cache
+from utils.async_support import run_blocking
+from utils.metrics import GENERATION_SECONDS, GENERATIONS_TOTAL, ERRORS_TOTAL
+from utils.token_usage import get_usage_ledger
+
+logger = logging.getLogger(__name__)
+
+
+def accept_user_message(session_id: str, user_id: str, message: str,
+                        admit: Optional[Callable[[], Dict]] = None) -> Dict:
+    """Zapisuje wiadomość użytkownika i przekazuje generowanie do puli
+
+    admit() zgłasza zadanie do puli generowania i zwraca jej odpowiedź. Wiadomość
+    jest zapisywana przed zgłoszeniem (zadanie może ruszyć od razu i czyta historię),
+    a gdy pula odrzuci zadanie (BUSY), jest usuwana - pytanie bez odpowiedzi nie
+    zostaje w historii, a ponowienie przez klienta nie tworzy duplikatu. W indeksie
+    podobnych pytań liczone jest dopiero pytanie przyjęte przez pulę, więc ponowienia
+    nie zawyżają "najczęstszych pytań". Tytuł sesji ustawiany jest przy pierwszej
+    przyjętej wiadomości.
+    """
+    from app.generation_pool import GenerationPool
+
+    chat_session = ChatSession(session_id, user_id)
+
+    # Sprawdź czy to pierwsza wiadomość w sesji
+    history = chat_session.load_history()
+    is_first_message = len([msg for msg in history if msg['role'] == 'user' and msg.get('user_id') == user_id]) == 0
+
+    # Zapisz wiadomość użytkownika
+    saved = chat_session.save_message(message, 'user', count_question=admit is None)
+
+    admission = admit() if admit else None
+    if admission and admission['status'] == GenerationPool.BUSY:
+        chat_session.remove_message(saved)
+        logger.debug("Wiadomość odrzucona przez pulę - usunięta z historii sesji %s", session_id)
+        return {'timestamp': saved['timestamp'], 'title': None, 'admission': admission}
+    if admit:
+        chat_session.count_question(saved)
+
+    title = None
+    if is_first_message:
+        # Skróć wiadomość do maksymalnie 50 znaków dla tytułu
+        title = message[:50] + "..." if len(message) > 50 else message
+        logger.debug("Tytuł sesji %s: %s", session_id, title)
+        UserSession.update_session_title(user_id, session_id, title)
+
+    return {
+        'timestamp': saved['timestamp'],
+        'title': title,
+        'admission': admission
+    }
+
+
+def build_context(history: List[Dict], user_id: str) -> List[Dict]:
+    """Buduje kontekst rozmowy z historii sesji (tylko niepuste wiadomości tego użytkownika)"""
+    context = []
+    for msg in history:
+        if msg.get('user_id') == user_id:  # Tylko wiadomości tego użytkownika
+            # Sprawdź czy wiadomość ma niepustą treść
+            if msg.get('content') and msg.get('content').strip():
+                context.append({
+                    'role': msg['role'],
+                    'content': msg['content']
+                })
+            else:
+                logger.debug("Pomijam pustą wiadomość z historii: %s", msg.get('id') or msg.get('timestamp'))
+    return context
+
+
+def evict_cached_answer(data):
+    """Usuwa odpowiedź z cache po negatywnym feedbacku do wiadomości"""
+    feedback = data.get('feedback_type') or data.get('feedback') or data.get('type')
+    message_id = data.get('message_id')
+    if feedback == 'negative' and message_id:
+        try:
+            get_answer_cache().evict_for_message(message_id)
+        except Exception as e:
+            logger.warning("Błąd usuwania odpowiedzi z cache: %s", e)
+
+
+def usage_fields(rag) -> Dict:
+    """Pola zapisywane przy odpowiedzi asystenta: zużycie tokenów, trafienie w cache, współdzielenie
+
+    Tokeny wspólnego generowania (single-flight) ma tylko odpowiedź zapytania, które
+    je uruchomiło - pozostałe dostają shared=True bez usage.
+    """
+    fields = {}
+    if rag.last_usage:
+        fields['usage'] = rag.last_usage
+    if rag.last_cache_hit:
+        fields['cached'] = True
+    if rag.last_shared:
+        fields['shared'] = True
+    return fields
+
+
+def record_usage(rag, user_id: str, feature: str = 'chat'):
+    """Dolicza zużycie odpowiedzi do liczników dziennych (błąd nie przerywa obsługi)"""
+    try:
+        get_usage_ledger().record(rag.last_usage, user_id, feature, cached=rag.last_cache_hit,
+                                  shared=rag.last_shared)
+    except Exception as e:
+        logger.warning("Błąd zapisu zużycia tokenów: %s", e)
+
+
+def run_generation(send: Callable, send_chunk: Callable[[str], None], user_id: str, session_id: str,
+                   message: str, message_id: str, cancel_event, slim_complete: bool = False):
+    """Generuje odpowiedź i przekazuje zdarzenia do transportu
+
+    Zdarzenia końcowe (documents_used, response_complete, generation_cancelled,
+    error) są wysyłane z final=True. Czasy etapów trafiają do histogramu
+    aerochat_generation_stage_seconds.
+    """
+    started = time.perf_counter()
+    try:
+        chat_session = ChatSession(session_id, user_id)
+
+        # Rozpocznij generowanie odpowiedzi
+        send('generating_start', {'message': 'Generuję odpowiedź...', 'message_id': message_id})
+
+        # Inicjalizuj OpenAI RAG (klient openai/httpx ładowany przy pierwszej wiadomości)
+        from utils.openai_rag import OpenAIRAG
+        rag = OpenAIRAG()
+
+        # Przygotuj kontekst - PEŁNA HISTORIA ROZMOWY TYLKO DLA TEJ SESJI I TEGO UŻYTKOWNIKA
+        history = chat_session.load_history()
+        context = build_context(history, user_id)
+        logger.debug("Kontekst sesji %s: %d z %d wiadomości historii", session_id, len(context), len(history))
+
+        # Zapisz kontekst do pliku dla debugowania
+        rag.save_conversation_context(session_id, context, message)
+
+        # Ostateczna walidacja przed generowaniem odpowiedzi
+        if not message or not message.strip():
+            logger.warning("Pusta wiadomość przed generowaniem odpowiedzi %s", message_id)
+            send('error', {'message': 'Wiadomość nie może być pusta'}, final=True)
+            return
+
+        # Generuj odpowiedź ze strumieniem - ASYSTENT OTRZYMUJE PEŁNY KONTEKST
+        response_text = ""
+        documents_used = 0
+
+        # Fragmenty od dostawcy łączone są w większe ramki
+        coalescer = ChunkCoalescer(send_chunk)
+
+        stream_started = time.perf_counter()
+        GENERATION_SECONDS.observe(stream_started - started, stage='prepare')
+        first_chunk_at = None
+        stream = rag.generate_response_stream(message, context, session_id, user_id, cancel_event.is_set)
+        try:
+            for chunk in stream:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                    GENERATION_SECONDS.observe(first_chunk_at - stream_started, stage='first_chunk')
+                response_text += chunk
+                # Wyślij surowy chunk (markdown)
+                coalescer.add(chunk)
+
+                # Sprawdź czy użyto dokumentów (można to zrobić w rag.py)
+                if hasattr(rag, 'last_documents_used'):
+                    documents_used = rag.last_documents_used
+
+                if cancel_event.is_set():
+                    break
+        finally:
+            # Zamknięcie strumienia odłącza odbiorcę i zatrzymuje run u dostawcy,
+            # a koalescer wysyła resztę bufora także po błędzie (przed zdarzeniem error)
+            try:
+                stream.close()
+            finally:
+                coalescer.close()
+        GENERATION_SECONDS.observe(time.perf_counter() - stream_started, stage='stream')
+        logger.debug("Wysłano %d ramek z %d fragmentów", coalescer.frames, coalescer.deltas)
+
+        if cancel_event.is_set():
+            # Zachowaj to, co zdążyło się wygenerować
+            if response_text.strip():
+                chat_session.save_message(response_text, 'assistant', usage_fields(rag))
+            record_usage(rag, user_id)
+            send('generation_cancelled', {
+                'message_id': message_id,
+                'partial_response': bool(response_text.strip())
+            }, final=True)
+            logger.info("Generowanie %s anulowane po %d znakach", message_id, len(response_text))
+            GENERATIONS_TOTAL.inc(outcome='cancelled')
+            return
+
+        # Zapamiętaj powiązanie wiadomości z wpisem cache (dla negatywnego feedbacku)
+        get_answer_cache().mark_served(message_id, rag.last_cache_key)
+
+        # Wyślij informacje o użytych dokumentach
+        send('documents_used', {'count': documents_used}, final=True)
+
+        # Zapisz pełną odpowiedź razem ze zużyciem tokenów
+        chat_session.save_message(response_text, 'assistant', usage_fields(rag))
+        record_usage(rag, user_id)
+
+        # Wygeneruj raport PDF
+        with GENERATION_SECONDS.time(stage='pdf_report'):
+            pdf_path = run_blocking(rag.generate_pdf_report, response_text, session_id)
+
+        # Zakończ generowanie
+        complete = {
+            'message': 'Odpowiedź wygenerowana',
+            'message_id': message_id,
+            'documents_used': rag.last_documents_used,
+            'pdf_path': pdf_path,
+            'cached': rag.last_cache_hit,
+            'shared': rag.last_shared
+        }
+        if rag.last_error:
+            # Błąd po stronie dostawcy (także we współdzielonym generowaniu) - treść zawiera komunikat
+            complete['error'] = rag.last_error
+        if slim_complete:
+            # Klient ma już pełny Markdown - wyślij tylko skrót (HTML dostępny na żądanie)
+            complete['content_hash'] = get_render_cache().remember(response_text, user_id)
+            complete['content_length'] = len(response_text)
+        else:
+            complete['full_response'] = markdown_to_html(response_text)  # Konwertuj markdown do HTML
+        send('response_complete', complete, final=True)
+        total = time.perf_counter() - started
+        GENERATION_SECONDS.observe(total, stage='total')
+        if rag.last_error:
+            GENERATIONS_TOTAL.inc(outcome='upstream_error')
+            ERRORS_TOTAL.inc(source='upstream')
+            logger.warning("Odpowiedź %s z błędem dostawcy: %s", message_id, rag.last_error)
+        else:
+            GENERATIONS_TOTAL.inc(outcome='ok')
+        logger.info("Odpowiedź wygenerowana", extra={
+            'message_id': message_id, 'session_id': session_id, 'chars': len(response_text),
+            'cached': rag.last_cache_hit, 'shared': rag.last_shared, 'seconds': round(total, 3),
+            'tokens': (rag.last_usage or {}).get('total_tokens'), 'cost_usd': (rag.last_usage or {}).get('cost_usd')
+        })
+
+    except Exception as e:
+        GENERATIONS_TOTAL.inc(outcome='error')
+        ERRORS_TOTAL.inc(source='generation')
+        logger.exception("Błąd podczas generowania odpowiedzi %s", message_id)
+        send('error', {'message': f'Wystąpił błąd: {str(e)}', 'message_id': message_id}, final=True)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pula wykonawcza generowania odpowiedzi
+
+Generowanie nie blokuje wątku obsługi zdarzenia Socket.IO - zadanie
+trafia do puli, która uruchamia je przez socketio.start_background_task.
+Pula ogranicza liczbę równoczesnych generowań (globalnie i na użytkownika)
+oraz długość kolejki. Zadania czekające dostają zdarzenia z pozycją
+w kolejce, a przy pełnej kolejce klient od razu dostaje odpowiedź "busy".
+"""
+import os
+import time
+import logging
+import threading
+import itertools
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from utils.metrics import GENERATION_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationJob:
+    """Pojedyncze zadanie generowania odpowiedzi"""
+
+    def __init__(self, job_id: int, user_id: str, message_id: str, run: Callable[[], None],
+                 on_position: Optional[Callable[[int], None]] = None):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.message_id = message_id
+        self.run = run
+        self.on_position = on_position
+        self.submitted_at = time.time()
+        self.started_at = None
+
+
+class GenerationPool:
+    """Ograniczona pula generowania z kolejką i kontrolą przyjęć"""
+
+    STARTED = 'started'
+    QUEUED = 'queued'
+    BUSY = 'busy'
+
+    def __init__(self, socketio, max_workers: int = None, max_per_user: int = None,
+                 max_queue: int = None, max_queued_per_user: int = None):
+        self.socketio = socketio
+        self.max_workers = max_workers or int(os.getenv('GENERATION_MAX_WORKERS', 8))
+        self.max_per_user = max_per_user or int(os.getenv('GENERATION_MAX_PER_USER', 1))
+        self.max_queue = max_queue or int(os.getenv('GENERATION_MAX_QUEUE', 32))
+        self.max_queued_per_user = max_queued_per_user or int(os.getenv('GENERATION_MAX_QUEUED_PER_USER', 2))
+
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._active = {}
+        self._active_per_user = {}
+        self._ids = itertools.count(1)
+
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+    # ------------------------------------------------------------------
+    # Przyjmowanie zadań
+    # ------------------------------------------------------------------
+
+    def _can_start(self, user_id: str) -> bool:
+        return (len(self._active) < self.max_workers
+                and self._active_per_user.get(user_id, 0) < self.max_per_user)
+
+    def submit(self, user_id: str, message_id: str, run: Callable[[], None],
+               on_position: Optional[Callable[[int], None]] = None) -> Dict:
+        """Przyjmuje zadanie: uruchamia je, dodaje do kolejki albo odrzuca"""
+        with self._lock:
+            job = GenerationJob(next(self._ids), user_id, message_id, run, on_position)
+
+            # Wolne miejsce przy niepustej kolejce oznacza, że czekające zadania
+            # blokuje limit ich użytkowników - inny użytkownik może ruszyć od razu
+            queued_for_user = sum(1 for queued in self._queue if queued.user_id == user_id)
+            if not queued_for_user and self._can_start(user_id):
+                self._mark_started(job)
+                status = {'status': self.STARTED, 'position': 0}
+            else:
+                if len(self._queue) >= self.max_queue or queued_for_user >= self.max_queued_per_user:
+                    self.rejected += 1
+                    return {'status': self.BUSY, 'position': None}
+                self._queue.append(job)
+                status = {'status': self.QUEUED, 'position': len(self._queue)}
+
+        if status['status'] == self.STARTED:
+            self.socketio.start_background_task(self._run, job)
+        else:
+            logger.info("Zadanie %s w kolejce (pozycja %d)", job.job_id, status['position'])
+        return status
+
+    def _mark_started(self, job: GenerationJob):
+        job.started_at = time.time()
+        self.total_wait += job.started_at - job.submitted_at
+        GENERATION_SECONDS.observe(job.started_at - job.submitted_at, stage='queue_wait')
+        self._active[job.job_id] = job
+        self._active_per_user[job.user_id] = self._active_per_user.get(job.user_id, 0) + 1
+
+    # ------------------------------------------------------------------
+    # Wykonanie
+    # ------------------------------------------------------------------
+
+    def _run(self, job: GenerationJob):
+        try:
+            job.run()
+        except Exception as e:
+            logger.exception("Błąd zadania generowania %s: %s", job.job_id, e)
+        finally:
+            self._release(job)
+
+    def _release(self, job: GenerationJob):
+        """Zwalnia miejsce, uruchamia kolejne zadania i aktualizuje pozycje w kolejce"""
+        to_start = []
+        with self._lock:
+            if self._active.pop(job.job_id, None) is not None:
+                self.completed += 1
+                remaining = self._active_per_user.get(job.user_id, 1) - 1
+                if remaining > 0:
+                    self._active_per_user[job.user_id] = remaining
+                else:
+                    self._active_per_user.pop(job.user_id, None)
+
+            # Uruchom zadania z kolejki, których użytkownicy nie przekroczyli limitu
+            for queued in list(self._queue):
+                if len(self._active) >= self.max_workers:
+                    break
+                if self._can_start(queued.user_id):
+                    self._queue.remove(queued)
+                    self._mark_started(queued)
+                    to_start.append(queued)
+
+            waiting = list(self._queue)
+
+        for started in to_start:
+            self.socketio.start_background_task(self._run, started)
+        for position, queued in enumerate(waiting, 1):
+            if queued.on_position:
+                try:
+                    queued.on_position(position)
+                except Exception:
+                    pass
+
+    def cancel(self, message_id: str) -> bool:
+        """Usuwa zadanie z kolejki (jeśli jeszcze się nie rozpoczęło)"""
+        with self._lock:
+            for queued in self._queue:
+                if queued.message_id == message_id:
+                    self._queue.remove(queued)
+                    return True
+        return False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            started = self.completed + len(self._active)
+            return {
+                'active': len(self._active),
+                'queued': len(self._queue),
+                'max_workers': self.max_workers,
+                'max_per_user': self.max_per_user,
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_wait_seconds': self.total_wait / started if started else 0.0
+            }
+
+
+_generation_pool = None
+
+
+def init_generation_pool(socketio) -> GenerationPool:
+    """Tworzy globalną pulę generowania dla serwera Socket.IO"""
+    global _generation_pool
+    _generation_pool = GenerationPool(socketio)
+    return _generation_pool
+
+
+def get_generation_pool() -> Optional[GenerationPool]:
+    """Zwraca globalną pulę generowania"""
+    return _generation_pool
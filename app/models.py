@@ -4,11 +4,18 @@
 Modele danych dla aplikacji Aero-Chat
 """
 import json
+import logging
 import os
 import uuid
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from utils.topic_tagger import tag_topics
+from utils.question_index import get_question_index
+from utils.answer_cache import get_answer_cache
+from utils.metrics import record_file_io
+
+logger = logging.getLogger(__name__)
 
 # Przechowywanie aktualnej sesji dla każdego użytkownika
 # user_id -> session_id
@@ -249,6 +256,7 @@ class UserSession:
             try:
                 with open(sessions_file, 'r', encoding='utf-8') as f:
                     sessions = json.load(f)
+                record_file_io('user_sessions', 'read', sessions_file)
             except:
                 sessions = []
         
@@ -277,6 +285,7 @@ class UserSession:
         # Zapisz sesje
         with open(sessions_file, 'w', encoding='utf-8') as f:
             json.dump(sessions, f, ensure_ascii=False, indent=2)
+        record_file_io('user_sessions', 'write', sessions_file)
     
     @staticmethod
     def get_user_sessions(user_id):
@@ -288,6 +297,7 @@ class UserSession:
         try:
             with open(sessions_file, 'r', encoding='utf-8') as f:
                 sessions_data = json.load(f)
+            record_file_io('user_sessions', 'read', sessions_file)
             
             return sorted(sessions_data, key=lambda x: x['updated_at'], reverse=True)
         except:
@@ -355,14 +365,14 @@ class UserSession:
     def set_current_session(user_id, session_id):
         """Ustawia aktualną sesję użytkownika"""
         USER_CURRENT_SESSIONS[user_id] = session_id
-        print(f"🔄 Ustawiono aktualną sesję dla użytkownika {user_id}: {session_id}")
+        logger.debug("Ustawiono aktualną sesję dla użytkownika %s: %s", user_id, session_id)
     
     @staticmethod
     def clear_current_session(user_id):
         """Usuwa aktualną sesję użytkownika"""
         if user_id in USER_CURRENT_SESSIONS:
             del USER_CURRENT_SESSIONS[user_id]
-            print(f"🗑️ Wyczyszczono aktualną sesję dla użytkownika {user_id}")
+            logger.debug("Wyczyszczono aktualną sesję dla użytkownika %s", user_id)
 
 class ChatSession:
     """Model sesji czatu"""
@@ -381,6 +391,7 @@ class ChatSession:
         try:
             with open(self.history_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
+            record_file_io('history', 'read', self.history_file)
             
             # Sprawdź format pliku
             if isinstance(data, list):
@@ -391,14 +402,18 @@ class ChatSession:
                 return data['full_conversation']
             else:
                 # Nieznany format
-                print(f"⚠️  Nieznany format pliku historii: {self.history_file}")
+                logger.warning("Nieznany format pliku historii: %s", self.history_file)
                 return []
         except Exception as e:
-            print(f"❌ Błąd ładowania historii z {self.history_file}: {e}")
+            logger.error("Błąd ładowania historii z %s: %s", self.history_file, e)
             return []
     
-    def save_message(self, message, role='user'):
-        """Zapisuje wiadomość do historii"""
+    def save_message(self, message, role='user', extra=None, count_question=True):
+        """Zapisuje wiadomość do historii (extra - dodatkowe pola, np. usage odpowiedzi)
+
+        count_question=False tylko przypisuje pytanie do klastra podobnych pytań -
+        wystąpienie dolicza count_question() (np. po przyjęciu zadania przez pulę).
+        """
         history = self.load_history()
         
         new_message = {
@@ -407,17 +422,62 @@ class ChatSession:
             'timestamp': datetime.now().isoformat(),
             'user_id': self.user_id
         }
+        if extra:
+            new_message.update(extra)
+        
+        # Tematy i klaster podobnych pytań wyznaczane raz, przy zapisie
+        if role == 'user':
+            new_message['topics'] = tag_topics(message)
+            try:
+                index = get_question_index()
+                if count_question:
+                    new_message['question_cluster'] = index.add_question(
+                        message, self.user_id, self.session_id, new_message['timestamp']
+                    )
+                else:
+                    new_message['question_cluster'] = index.assign_question(message, new_message['timestamp'])
+            except Exception as e:
+                logger.warning("Błąd indeksowania pytania: %s", e)
         
         history.append(new_message)
         
         os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
         with open(self.history_file, 'w', encoding='utf-8') as f:
             json.dump(history, f, ensure_ascii=False, indent=2)
+        record_file_io('history', 'write', self.history_file)
         
         # Aktualizuj sesję użytkownika
         if self.user_id:
             user_session = UserSession(self.user_id, self.session_id)
             user_session.save()
+        
+        return new_message
+    
+    def count_question(self, message):
+        """Dolicza w indeksie pytanie zapisane z count_question=False"""
+        try:
+            return get_question_index().count_question(
+                message.get('question_cluster'), message['content'], self.user_id, self.session_id,
+                message['timestamp']
+            )
+        except Exception as e:
+            logger.warning("Błąd indeksowania pytania: %s", e)
+            return None
+    
+    def remove_message(self, message):
+        """Usuwa z historii zapisaną wcześniej wiadomość (np. odrzuconą przez pulę generowania)"""
+        history = self.load_history()
+        remaining = [msg for msg in history if not (
+            msg.get('timestamp') == message.get('timestamp') and msg.get('role') == message.get('role')
+            and msg.get('user_id') == message.get('user_id') and msg.get('content') == message.get('content')
+        )]
+        if len(remaining) == len(history):
+            return False
+        
+        with open(self.history_file, 'w', encoding='utf-8') as f:
+            json.dump(remaining, f, ensure_ascii=False, indent=2)
+        record_file_io('history', 'write', self.history_file)
+        return True
     
     def save_feedback(self, feedback_data):
         """Zapisuje feedback do pliku"""
@@ -443,6 +503,7 @@ class ChatSession:
         os.makedirs(os.path.dirname(self.feedback_file), exist_ok=True)
         with open(self.feedback_file, 'w', encoding='utf-8') as f:
             json.dump(feedback, f, ensure_ascii=False, indent=2)
+        record_file_io('feedback', 'write', self.feedback_file)
 
 class UploadIndex:
     """Klasa do zarządzania indeksem przesłanych plików"""
@@ -478,6 +539,9 @@ class UploadIndex:
         
         with open(self.index_file, 'w', encoding='utf-8') as f:
             json.dump(index, f, ensure_ascii=False, indent=2)
+        
+        # Nowa wersja dokumentu unieważnia odpowiedzi oparte o poprzednią
+        get_answer_cache().invalidate_documents([filename])
     
     def remove_file(self, filename):
         """Usuwa plik z indeksu"""
@@ -490,6 +554,7 @@ class UploadIndex:
                 
                 with open(self.index_file, 'w', encoding='utf-8') as f:
                     json.dump(index, f, ensure_ascii=False, indent=2)
+                get_answer_cache().invalidate_documents([filename])
                 return True
         except:
             pass
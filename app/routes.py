@@ -4,14 +4,21 @@
 Główne routes aplikacji Aero-Chat
 """
 import os
+import hmac
 import uuid
 import json
+import queue
+import logging
+import threading
 from datetime import datetime
-from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for, flash
+from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for, flash, Response, stream_with_context
 from flask_login import login_required, current_user, login_user, logout_user
 from app.models import ChatSession, UploadIndex, User, UserSession
+from utils.topic_tagger import message_topics, primary_topic
+from utils.metrics import get_metrics, record_message
 
 main_bp = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
 
 @main_bp.route('/')
 def index():
@@ -20,6 +27,30 @@ def index():
         return redirect(url_for('main.chat'))
     return redirect(url_for('main.login'))
 
+@main_bp.route('/metrics')
+def metrics():
+    """Metryki w formacie tekstowym Prometheusa"""
+    token = os.getenv('METRICS_TOKEN')
+    if token:
+        provided = request.headers.get('Authorization', '').replace('Bearer ', '', 1) or request.args.get('token')
+        if not hmac.compare_digest(provided or '', token):
+            return Response('Brak dostępu\n', status=401, mimetype='text/plain')
+    return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@main_bp.route('/healthz')
+def healthz():
+    """Liveness - proces działa i obsługuje żądania"""
+    return jsonify({'status': 'ok'})
+
+@main_bp.route('/readyz')
+def readyz():
+    """Readiness - 200 dopiero po rozgrzaniu pamięci podręcznych, wcześniej 503"""
+    from app.warmup import is_ready, warmup_status, failed_steps
+    ready = is_ready()
+    failed = failed_steps()
+    status = 'ready' if ready else ('failed' if failed_steps(critical_only=True) else 'starting')
+    return jsonify({'status': status, 'failed_steps': failed, 'warmup': warmup_status()}), 200 if ready else 503
+
 @main_bp.route('/login', methods=['GET', 'POST'])
 def login():
     """Strona logowania użytkowników"""
@@ -87,6 +118,136 @@ def create_session():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@main_bp.route('/api/rendered/<content_hash>', methods=['GET'])
+@login_required
+def get_rendered_answer(content_hash):
+    """Zwraca HTML odpowiedzi po skrócie treści (renderowany raz i zapamiętywany)"""
+    try:
+        from utils.markdown_render import get_render_cache
+        
+        html = get_render_cache().html_for(content_hash, current_user.id)
+        if html is None:
+            return jsonify({'error': 'Nie znaleziono odpowiedzi'}), 404
+        return jsonify({'content_hash': content_hash, 'html': html})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def sse_event(event, payload):
+    """Formatuje zdarzenie Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@main_bp.route('/api/chat/stream', methods=['POST'])
+@login_required
+def chat_stream():
+    """Strumieniuje odpowiedź jako Server-Sent Events (ten sam potok co send_message)"""
+    from app.chat_pipeline import accept_user_message, run_generation
+    from app.generation_pool import GenerationPool, get_generation_pool
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        message = (data.get('message') or '').strip()
+        message_id = data.get('message_id') or str(uuid.uuid4())
+        slim_complete = bool(data.get('slim_complete'))
+        user_id = current_user.id
+        
+        if not message:
+            return jsonify({'error': 'Wiadomość nie może być pusta'}), 400
+        
+        session_id = data.get('session_id') or UserSession.get_current_session(user_id)
+        if not session_id:
+            return jsonify({'error': 'Brak aktywnej sesji. Utwórz nową sesję.'}), 400
+        session_ids = [s['session_id'] for s in UserSession.get_user_sessions(user_id)]
+        if session_id not in session_ids:
+            return jsonify({'error': 'Brak dostępu do tej sesji'}), 403
+        
+        generation_pool = get_generation_pool()
+        if generation_pool is None:
+            return jsonify({'error': 'Generowanie odpowiedzi jest niedostępne'}), 503
+        
+        # Zadanie puli przekazuje zdarzenia do kolejki odczytywanej przez odpowiedź HTTP
+        events = queue.Queue()
+        cancel_event = threading.Event()
+        offset = [0]
+        
+        def send(event, payload, final=False):
+            events.put((event, payload))
+        
+        def send_chunk(frame):
+            events.put(('response_chunk', {
+                'chunk': frame,
+                'message_id': message_id,
+                'offset': offset[0],
+                'next_offset': offset[0] + len(frame)
+            }))
+            offset[0] += len(frame)
+        
+        def run():
+            try:
+                run_generation(send, send_chunk, user_id, session_id, message, message_id,
+                               cancel_event, slim_complete)
+            finally:
+                events.put(None)
+        
+        def admit():
+            return generation_pool.submit(
+                user_id, message_id, run,
+                lambda position: send('position', {'message_id': message_id, 'position': position})
+            )
+        
+        # Zapisz wiadomość użytkownika i zgłoś generowanie (odrzucona wiadomość nie zostaje w historii)
+        accepted = accept_user_message(session_id, user_id, message, admit)
+        record_message('sse')
+        result = accepted['admission']
+        if result['status'] == GenerationPool.BUSY:
+            logger.warning("Serwer zajęty - odrzucono wiadomość %s (HTTP)", message_id)
+            response = jsonify({
+                'error': 'Serwer jest teraz przeciążony. Spróbuj ponownie za chwilę.',
+                'message_id': message_id
+            })
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        
+        keepalive_seconds = float(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+        
+        def event_stream():
+            finished = False
+            try:
+                if accepted['title']:
+                    yield sse_event('session_title_updated', {'session_id': session_id, 'new_title': accepted['title']})
+                yield sse_event('message_received', {
+                    'message': message,
+                    'message_id': message_id,
+                    'session_id': session_id,
+                    'timestamp': accepted['timestamp']
+                })
+                if result['status'] == GenerationPool.QUEUED:
+                    yield sse_event('queued', {'message_id': message_id, 'position': result['position']})
+                
+                while True:
+                    try:
+                        item = events.get(timeout=keepalive_seconds)
+                    except queue.Empty:
+                        # Komentarz SSE podtrzymuje połączenie przez proxy
+                        yield ": keep-alive\n\n"
+                        continue
+                    if item is None:
+                        finished = True
+                        break
+                    yield sse_event(*item)
+            finally:
+                if not finished:
+                    # Klient zamknął połączenie - anuluj generowanie (lub usuń je z kolejki)
+                    cancel_event.set()
+                    generation_pool.cancel(message_id)
+                    logger.info("Klient HTTP rozłączony - anulowano generowanie %s", message_id)
+        
+        return Response(stream_with_context(event_stream()), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @main_bp.route('/api/sessions/<session_id>', methods=['DELETE'])
 @login_required
 def delete_session(session_id):
@@ -208,6 +369,116 @@ def upload_file():
     
     return jsonify({'error': 'Niepoprawny format pliku. Akceptowane są tylko pliki PDF.'}), 400
 
+def _batch_job_for_user(job_id):
+    """Zwraca zadanie wsadowe, jeśli należy do użytkownika (administrator widzi wszystkie)"""
+    from app.batch_jobs import get_batch_jobs
+    
+    job = get_batch_jobs().get(job_id)
+    if job and (job['owner_id'] == current_user.id or current_user.is_admin()):
+        return job
+    return None
+
+@main_bp.route('/api/batch', methods=['POST'])
+@login_required
+def create_batch_job():
+    """Tworzy zadanie wsadowe z banku pytań (plik JSONL/CSV lub lista pytań w JSON)"""
+    from app.batch_jobs import get_batch_jobs, parse_question_bank
+    
+    try:
+        if 'file' in request.files:
+            file = request.files['file']
+            fmt = (request.form.get('format') or os.path.splitext(file.filename)[1].lstrip('.')).lower()
+            fmt = 'jsonl' if fmt in ('json', 'jsonl', 'ndjson') else fmt
+            questions = parse_question_bank(file.read().decode('utf-8-sig'), fmt)
+            options = request.form
+            documents = [d.strip() for d in (options.get('documents') or '').split(',') if d.strip()]
+        else:
+            options = request.get_json(silent=True) or {}
+            content = '\n'.join(json.dumps(q, ensure_ascii=False) for q in options.get('questions', []))
+            questions = parse_question_bank(content, 'jsonl')
+            documents = options.get('documents') or []
+            if isinstance(documents, str):
+                documents = [d.strip() for d in documents.split(',') if d.strip()]
+        
+        # Dokumenty spoza indeksu nie mogą trafić do vector store
+        indexed = set(UploadIndex().get_all_files())
+        unknown = [d for d in documents + [d for q in questions for d in (q['documents'] or [])] if d not in indexed]
+        if unknown:
+            return jsonify({'error': f'Nieznane dokumenty: {", ".join(sorted(set(unknown))[:5])}'}), 400
+        
+        job = get_batch_jobs().create_job(
+            current_user.id, questions,
+            name=options.get('name'),
+            documents=documents,
+            concurrency=options.get('concurrency'),
+            rate_per_minute=options.get('rate_per_minute')
+        )
+        return jsonify(job), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/api/batch', methods=['GET'])
+@login_required
+def list_batch_jobs():
+    """Lista zadań wsadowych użytkownika"""
+    from app.batch_jobs import get_batch_jobs
+    
+    try:
+        owner_id = None if current_user.is_admin() and request.args.get('all') else current_user.id
+        return jsonify(get_batch_jobs().list_jobs(owner_id))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/api/batch/<job_id>', methods=['GET'])
+@login_required
+def get_batch_job(job_id):
+    """Status i postęp zadania wsadowego"""
+    from app.batch_jobs import get_batch_jobs
+    
+    job = _batch_job_for_user(job_id)
+    if not job:
+        return jsonify({'error': 'Nie znaleziono zadania'}), 404
+    job['running'] = get_batch_jobs().is_running(job_id)
+    return jsonify(job)
+
+@main_bp.route('/api/batch/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_batch_job(job_id):
+    """Zatrzymuje zadanie wsadowe (zapisane odpowiedzi zostają)"""
+    from app.batch_jobs import get_batch_jobs
+    
+    if not _batch_job_for_user(job_id):
+        return jsonify({'error': 'Nie znaleziono zadania'}), 404
+    if not get_batch_jobs().cancel(job_id):
+        return jsonify({'error': 'Zadanie nie jest uruchomione'}), 409
+    return jsonify({'message': 'Zadanie zostanie zatrzymane'})
+
+@main_bp.route('/api/batch/<job_id>/resume', methods=['POST'])
+@login_required
+def resume_batch_job(job_id):
+    """Wznawia zadanie wsadowe od pytań bez zapisanej odpowiedzi"""
+    from app.batch_jobs import get_batch_jobs
+    
+    if not _batch_job_for_user(job_id):
+        return jsonify({'error': 'Nie znaleziono zadania'}), 404
+    if not get_batch_jobs().start(job_id):
+        return jsonify({'error': 'Zadanie jest uruchomione lub zakończone'}), 409
+    return jsonify({'message': 'Zadanie wznowione'}), 202
+
+@main_bp.route('/api/batch/<job_id>/results', methods=['GET'])
+@login_required
+def download_batch_results(job_id):
+    """Pobiera wyniki zadania wsadowego jako JSONL"""
+    from app.batch_jobs import get_batch_jobs
+    
+    if not _batch_job_for_user(job_id):
+        return jsonify({'error': 'Nie znaleziono zadania'}), 404
+    return Response(get_batch_jobs().iter_results(job_id), mimetype='application/x-ndjson', headers={
+        'Content-Disposition': f'attachment; filename=batch_{job_id}.jsonl'
+    })
+
 @main_bp.route('/api/feedback', methods=['POST'])
 @login_required
 def submit_feedback():
@@ -224,6 +495,10 @@ def submit_feedback():
     chat_session = ChatSession(session_id, current_user.id)
     chat_session.save_feedback(data)
     
+    # Negatywny feedback usuwa odpowiedź z cache (jak w Socket.IO)
+    from app.chat_pipeline import evict_cached_answer
+    evict_cached_answer(data)
+    
     return jsonify({'message': 'Feedback zapisany pomyślnie'})
 
 @main_bp.route('/api/history')
@@ -341,14 +616,12 @@ def get_learning_status():
         
         # Pobierz historię uczenia się
         learning_data = []
-        if os.path.exists(learning_system.learning_data_file):
-            try:
-                with open(learning_system.learning_data_file, 'r', encoding='utf-8') as f:
-                    all_data = json.load(f)
-                    # Znajdź dane dla aktualnej sesji
-                    learning_data = [data for data in all_data if data.get('session_id') == session_id]
-            except Exception as e:
-                print(f"Błąd wczytywania danych uczenia: {e}")
+        try:
+            # Znajdź dane dla aktualnej sesji
+            learning_data = [data for data in learning_system.get_recent_learning_data()
+                             if data.get('session_id') == session_id]
+        except Exception as e:
+            logger.warning("Błąd wczytywania danych uczenia: %s", e)
         
         status = {
             'session_id': session_id,
@@ -419,7 +692,8 @@ def get_user_activity_report(user_id):
                             'timestamp': msg.get('timestamp'),
                             'content': msg.get('content', ''),
                             'session_id': session_id,
-                            'session_title': session_info.get('title', 'Bez tytułu')
+                            'session_title': session_info.get('title', 'Bez tytułu'),
+                            'topics': message_topics(msg)
                         })
                     elif msg.get('role') == 'assistant':
                         session_responses.append({
@@ -453,7 +727,7 @@ def get_user_activity_report(user_id):
                             feedback = json.load(f)
                             feedback_history.append(feedback)
                     except Exception as e:
-                        print(f"Błąd wczytywania feedback: {e}")
+                        logger.warning("Błąd wczytywania feedback: %s", e)
         
         # Sortuj pytania chronologicznie
         questions_history.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
@@ -461,8 +735,7 @@ def get_user_activity_report(user_id):
         # Analizuj tematy pytań
         topics_analysis = {}
         for question in questions_history:
-            content = question.get('content', '').lower()
-            topic = learning_system._detect_topic(content)
+            topic = primary_topic(question.get('topics', []))
             if topic not in topics_analysis:
                 topics_analysis[topic] = []
             topics_analysis[topic].append(question)
@@ -6,10 +6,15 @@ Analityka sesji użytkowników dla panelu administratora
 import logging
 import os
 import json
+import threading
 from datetime import datetime, timedelta
 from collections import defaultdict, Counter
 from typing import Dict, List, Optional
 from app.models import ChatSession, User, UserSession
+from utils.topic_tagger import message_topics, topic_label
+from utils.question_index import get_question_index, normalize_question
+from utils import metrics
+from utils.token_usage import get_usage_ledger
 
 # Skonfiguruj logger
 logger = logging.getLogger(__name__)
@@ -111,57 +116,45 @@ class SessionAnalytics:
     
     def _extract_topics(self, history):
         """Wyodrębnia główne tematy z historii"""
-        aviation_keywords = {
-            'siła nośna': 'Aerodynamika',
-            'nawigacja': 'Nawigacja',
-            'radar': 'Systemy',
-            'meteorologia': 'Meteorologia',
-            'bezpieczeństwo': 'Bezpieczeństwo',
-            'silnik': 'Napęd',
-            'skrzydło': 'Konstrukcja',
-            'lotnisko': 'Operacje',
-            'pilot': 'Pilotaż',
-            'kontrola': 'Kontrola ruchu',
-            'prawo': 'Przepisy',
-            'turbulencja': 'Meteorologia',
-            'avionika': 'Systemy',
-            'komunikacja': 'Komunikacja'
-        }
-        
         topics = set()
-        user_messages = [m for m in history if m['role'] == 'user']
-        
-        for message in user_messages:
-            content = message['content'].lower()
-            for keyword, topic in aviation_keywords.items():
-                if keyword in content:
-                    topics.add(topic)
+        for message in history:
+            if isinstance(message, dict) and message.get('role') == 'user':
+                topics.update(topic_label(topic) for topic in message_topics(message))
         
         return list(topics)
     
     def _find_repeated_questions(self, history):
-        """Znajduje powtarzające się pytania"""
-        user_messages = [m for m in history if m['role'] == 'user']
+        """Znajduje powtarzające się (również podobne) pytania"""
+        user_messages = [m for m in history if isinstance(m, dict) and m.get('role') == 'user' and m.get('content')]
+        index = get_question_index()
         
-        # Normalizuj pytania
-        normalized_questions = []
+        # Grupuj pytania według klastra podobnych pytań
+        question_counts = Counter()
+        labels = {}
         for msg in user_messages:
-            normalized = msg['content'].lower().strip()
-            # Usuń znaki interpunkcyjne
-            import re
-            normalized = re.sub(r'[^\w\s]', '', normalized)
-            normalized_questions.append(normalized)
+            cluster_id = msg.get('question_cluster')
+            if not cluster_id:
+                cluster, _ = index.find_similar(msg['content'])
+                cluster_id = cluster['id'] if cluster else normalize_question(msg['content'])
+            question_counts[cluster_id] += 1
+            labels.setdefault(cluster_id, normalize_question(msg['content']))
         
-        # Znajdź powtórzenia
-        question_counts = Counter(normalized_questions)
-        repeated = {q: count for q, count in question_counts.items() if count > 1}
+        repeated = {labels[key]: count for key, count in question_counts.items() if count > 1}
         
         return {
             'total_repeated': len(repeated),
-            'repetition_rate': len(repeated) / len(set(normalized_questions)) if normalized_questions else 0,
+            'repetition_rate': len(repeated) / len(question_counts) if question_counts else 0,
             'repeated_questions': repeated
         }
     
+    def get_most_asked_questions(self, limit=10):
+        """Najczęściej zadawane pytania (klastry podobnych pytań wszystkich użytkowników)"""
+        try:
+            return get_question_index().most_asked(limit)
+        except Exception as e:
+            logger.error(f"Błąd pobierania najczęstszych pytań: {e}")
+            return []
+    
     def _analyze_response_quality(self, session_id):
         """Analizuje jakość odpowiedzi na podstawie feedbacku"""
         feedback_dir = f'feedback/{session_id}'
@@ -562,27 +555,13 @@ class SessionAnalytics:
             topics = []
             
             # Pobierz historię z pliku
-            history_file = f"/home/dee/chatavioner/history/{session.session_id}.json"
+            history_file = os.path.join('history', f"{session.session_id}.json")
             if os.path.exists(history_file):
                 with open(history_file, 'r', encoding='utf-8') as f:
                     history = json.load(f)
-                    
-                # Analizuj wiadomości użytkownika
-                for message in history:
-                    if message.get('role') == 'user':
-                        content = message.get('content', '').lower()
-                        
-                        # Podstawowe słowa kluczowe
-                        if any(word in content for word in ['lot', 'samolot', 'pilot']):
-                            topics.append('Lotnictwo')
-                        if any(word in content for word in ['prawo', 'przepis', 'regulacja']):
-                            topics.append('Prawo lotnicze')
-                        if any(word in content for word in ['pogoda', 'wiatr', 'chmury']):
-                            topics.append('Meteorologia')
-                        if any(word in content for word in ['silnik', 'mechanika', 'awaria']):
-                            topics.append('Technika')
-                        if any(word in content for word in ['licencja', 'egzamin', 'szkolenie']):
-                            topics.append('Szkolenie')
+                
+                # Tematy zapisane przy wiadomościach użytkownika
+                topics = self._extract_topics(history)
             
             return list(set(topics))  # Usuń duplikaty
         except Exception as e:
@@ -815,28 +794,25 @@ class SessionAnalytics:
             return 0.0
 
     def get_system_uptime(self):
-        """Uptime systemu - usunięto symulację"""
+        """Dostępność - odsetek generowań bez błędu od startu procesu"""
         try:
-            # Bez zewnętrznego systemu monitorowania nie można określić uptime
-            return 0.0
+            return metrics.availability_percentage()
         except Exception as e:
             logger.error(f"Błąd pobierania uptime: {e}")
             return 0.0
 
     def get_system_errors_count(self):
-        """Liczba błędów systemu - usunięto symulację"""
+        """Liczba błędów obsługi wiadomości od startu procesu"""
         try:
-            # Bez systemu logowania błędów nie można określić liczby błędów
-            return 0
+            return metrics.errors_count()
         except Exception as e:
             logger.error(f"Błąd pobierania liczby błędów: {e}")
             return 0
 
     def get_resource_usage(self):
-        """Wykorzystanie zasobów systemu - usunięto symulację"""
+        """Pamięć procesu (RSS) jako procent pamięci maszyny"""
         try:
-            # Bez systemu monitorowania zasobów nie można określić wykorzystania
-            return 0.0
+            return metrics.memory_usage_percentage()
         except Exception as e:
             logger.error(f"Błąd pobierania wykorzystania zasobów: {e}")
             return 0.0
@@ -1123,6 +1099,12 @@ class SessionAnalytics:
         except:
             return f'User_{user_id}'
     
+    def get_user_sessions(self, user_id):
+        """Pobierz sesje użytkownika (najnowsze najpierw)"""
+        sessions = [s for s in self.sessions_data.values() if s['user_id'] == user_id]
+        sessions.sort(key=lambda x: x.get('start_time') or '', reverse=True)
+        return sessions
+
     def get_user_sessions_paginated(self, user_id, page=1, per_page=20):
         """Pobierz paginowane sesje użytkownika"""
         try:
@@ -1250,6 +1232,21 @@ class SessionAnalytics:
             logger.error(f"Błąd pobierania metryk wydajności: {e}")
             return {}
 
+    def get_token_usage(self, days=30, user_id=None):
+        """Zużycie tokenów i koszt (dzień / użytkownik / funkcja / model) z nazwami użytkowników"""
+        try:
+            usage = get_usage_ledger().summary(days, user_id)
+            users = {}
+            for row in usage['per_user']:
+                if row['user_id'] not in users:
+                    user = User.get(row['user_id'])
+                    users[row['user_id']] = user.username if user else row['user_id']
+                row['username'] = users[row['user_id']]
+            return usage
+        except Exception as e:
+            logger.error(f"Błąd pobierania zużycia tokenów: {e}")
+            return {}
+
     def get_user_all_sessions(self, user_id):
         """Pobierz wszystkie sesje użytkownika"""
         return self.get_user_sessions(user_id)
@@ -1286,3 +1283,17 @@ class SessionAnalytics:
 
 # Dodaj import os na początku pliku
 import os
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_analytics() -> SessionAnalytics:
+    """Zwraca wspólną instancję analityki (historia wczytywana przy pierwszym użyciu)"""
+    global _analytics
+    if _analytics is None:
+        with _analytics_lock:
+            if _analytics is None:
+                _analytics = SessionAnalytics()
+    return _analytics
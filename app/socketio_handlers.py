@@ -6,44 +6,74 @@ Obsługa WebSocket dla aplikacji Aero-Chat
 import os
 import json
 import time
-import asyncio
-import markdown
+import logging
+import threading
 from datetime import datetime
 from flask import session, request
 from flask_socketio import emit, disconnect
 from flask_login import current_user
-from app.models import ChatSession, UserSession
-from utils.openai_rag import OpenAIRAG
-from utils.learning_system import LearningSystem
+from app.models import UserSession
+from app.generation_pool import GenerationPool, init_generation_pool
+from app.chat_pipeline import accept_user_message, run_generation, evict_cached_answer
+from utils.learning_system import get_learning_system
+from utils.stream_buffer import StreamBufferRegistry
+from utils.metrics import SOCKETIO_CONNECTIONS, ERRORS_TOTAL, record_message
 
-def markdown_to_html(text):
-    """Konwertuje markdown do HTML"""
-    if not text:
-        return ""
-    
-    # Konfiguracja markdown z rozszerzeniami
-    md = markdown.Markdown(extensions=[
-        'extra',     # Dodatkowe funkcje markdown
-        'codehilite', # Podświetlanie kodu
-        'toc'        # Spis treści
-    ])
-    
-    return md.convert(text)
+logger = logging.getLogger(__name__)
 
 def register_socketio_handlers(socketio):
     """Rejestruje handlery WebSocket"""
     
+    generation_pool = init_generation_pool(socketio)
+    
+    # Generowania w toku i w kolejce: message_id -> użytkownik, flaga anulowania
+    active_generations = {}
+    active_generations_lock = threading.Lock()
+    
+    # Bufory odpowiedzi do wznowienia strumienia po ponownym połączeniu
+    stream_buffers = StreamBufferRegistry(
+        lambda event, payload, sid: socketio.emit(event, payload, to=sid),
+        retention_seconds=float(os.getenv('STREAM_RETENTION_SECONDS', 120))
+    )
+    resume_grace_seconds = float(os.getenv('STREAM_RESUME_GRACE_SECONDS', 30))
+    
+    def cancel_if_still_detached(message_id, detached_at):
+        """Anuluje generowanie, jeśli klient nie wznowił strumienia w okresie karencji"""
+        socketio.sleep(resume_grace_seconds)
+        buffer = stream_buffers.get(message_id)
+        if buffer and buffer.detached_at == detached_at and not buffer.done:
+            cancel_generation(message_id)
+            logger.info("Anulowano generowanie %s - klient nie wrócił po rozłączeniu", message_id)
+    
+    def cancel_generation(message_id):
+        """Anuluje generowanie; zwraca 'queued' gdy zadanie nie zdążyło ruszyć"""
+        with active_generations_lock:
+            generation = active_generations.get(message_id)
+        if not generation:
+            return None
+        generation['cancel'].set()
+        if generation_pool.cancel(message_id):
+            with active_generations_lock:
+                active_generations.pop(message_id, None)
+            buffer = stream_buffers.get(message_id)
+            if buffer:
+                stream_buffers.send(buffer, 'generation_cancelled',
+                                    {'message_id': message_id, 'partial_response': False}, final=True)
+                stream_buffers.finish(buffer)
+            return 'queued'
+        return 'running'
+    
     @socketio.on('connect')
     def handle_connect(auth=None):
         """Obsługuje połączenie WebSocket"""
         if not current_user.is_authenticated:
-            print("⚠️  Nieautoryzowane połączenie WebSocket")
+            logger.warning("Nieautoryzowane połączenie WebSocket")
             disconnect()
             return
         
+        SOCKETIO_CONNECTIONS.inc()
         current_session_id = UserSession.get_current_session(current_user.id)
-        print(f"🔌 Użytkownik {current_user.username} (ID: {current_user.id}) połączony: {current_session_id}")
-        print(f"🔗 Socket SID: {request.sid}")
+        logger.debug("Użytkownik %s połączony (sesja %s, sid %s)", current_user.id, current_session_id, request.sid)
         emit('connected', {
             'message': 'Połączono z serwerem', 
             'session_id': current_session_id,
@@ -55,9 +85,54 @@ def register_socketio_handlers(socketio):
     def handle_disconnect():
         """Obsługuje rozłączenie WebSocket"""
         if current_user.is_authenticated:
-            print(f"Użytkownik {current_user.username} rozłączony")
-        else:
-            print("Nieautoryzowany użytkownik rozłączony")
+            SOCKETIO_CONNECTIONS.dec()
+            logger.debug("Użytkownik %s rozłączony", current_user.id)
+        
+        # Generowania tego połączenia czekają chwilę na wznowienie, potem są anulowane
+        for buffer in stream_buffers.detach(request.sid):
+            logger.info("Strumień %s odłączony - czekam %.0fs na wznowienie", buffer.message_id, resume_grace_seconds)
+            socketio.start_background_task(cancel_if_still_detached, buffer.message_id, buffer.detached_at)
+    
+    @socketio.on('resume_stream')
+    def handle_resume_stream(data):
+        """Wznawia strumień odpowiedzi od ostatniego otrzymanego offsetu"""
+        try:
+            if not current_user.is_authenticated:
+                emit('error', {'message': 'Musisz być zalogowany'})
+                return
+            
+            message_id = data.get('message_id')
+            result = stream_buffers.resume(message_id, current_user.id, request.sid, data.get('offset', 0))
+            if result is None:
+                emit('stream_expired', {'message_id': message_id})
+                return
+            logger.info("Wznowiono strumień %s: %d znaków do uzupełnienia", message_id, result['replayed'])
+            
+        except Exception as e:
+            logger.exception("Błąd podczas wznawiania strumienia: %s", e)
+            emit('error', {'message': f'Błąd wznawiania: {str(e)}'})
+    
+    @socketio.on('cancel_generation')
+    def handle_cancel_generation(data):
+        """Anuluje generowanie odpowiedzi na żądanie użytkownika"""
+        try:
+            if not current_user.is_authenticated:
+                emit('error', {'message': 'Musisz być zalogowany'})
+                return
+            
+            message_id = data.get('message_id')
+            with active_generations_lock:
+                generation = active_generations.get(message_id)
+            if not generation or generation['user_id'] != current_user.id:
+                emit('error', {'message': 'Nie znaleziono generowania do anulowania', 'message_id': message_id})
+                return
+            
+            logger.info("Użytkownik %s anuluje generowanie %s", current_user.id, message_id)
+            cancel_generation(message_id)
+            
+        except Exception as e:
+            logger.exception("Błąd podczas anulowania generowania: %s", e)
+            emit('error', {'message': f'Błąd anulowania: {str(e)}'})
     
     @socketio.on('send_message')
     def handle_message(data):
@@ -67,144 +142,97 @@ def register_socketio_handlers(socketio):
                 emit('error', {'message': 'Musisz być zalogowany'})
                 return
             
-            print(f"🔔 Otrzymano wiadomość od {current_user.username}: {data}")
-            
             message = data.get('message', '').strip()
             message_id = data.get('message_id')  # Pobierz message_id z frontendu
+            # Klient renderujący Markdown sam dostaje na końcu tylko skrót treści
+            slim_complete = bool(data.get('slim_complete'))
             
-            print(f"💬 Message: {message}")
-            print(f"🆔 Message ID: {message_id}")
+            logger.debug("Wiadomość %s od %s (%d znaków)", message_id, current_user.id, len(message))
             
             if not message:
-                print("❌ Pusta wiadomość")
                 emit('error', {'message': 'Wiadomość nie może być pusta'})
                 return
             
             session_id = UserSession.get_current_session(current_user.id)
-            print(f"🔑 Current Session ID for user {current_user.id}: {session_id}")
             
             if not session_id:
-                print("❌ Brak current_session_id dla użytkownika")
+                logger.warning("Brak current_session_id dla użytkownika %s", current_user.id)
                 emit('error', {'message': 'Brak aktywnej sesji. Utwórz nową sesję.'})
                 return
             
-            # Utwórz sesję czatu z poprawnym user_id
-            chat_session = ChatSession(session_id, current_user.id)
-            
-            # Sprawdź czy to pierwsza wiadomość w sesji
-            history = chat_session.load_history()
-            is_first_message = len([msg for msg in history if msg['role'] == 'user' and msg.get('user_id') == current_user.id]) == 0
-            
-            # Zapisz wiadomość użytkownika
-            chat_session.save_message(message, 'user')
+            # Przekaż generowanie do puli (nie blokuje wątku obsługi zdarzeń)
+            sid = request.sid
+            user_id = current_user.id
+            cancel_event = threading.Event()
             
-            # Jeśli to pierwsza wiadomość, zaktualizuj tytuł sesji
-            if is_first_message:
-                # Skróć wiadomość do maksymalnie 50 znaków dla tytułu
-                title = message[:50] + "..." if len(message) > 50 else message
-                print(f"🏷️ Aktualizuję tytuł sesji na: {title}")
+            def admit():
+                with active_generations_lock:
+                    active_generations[message_id] = {'user_id': user_id, 'cancel': cancel_event}
+                buffer = stream_buffers.open(message_id, user_id, sid)
                 
-                # Aktualizuj tytuł sesji
-                UserSession.update_session_title(current_user.id, session_id, title)
+                def on_position(position):
+                    stream_buffers.send(buffer, 'position', {'message_id': message_id, 'position': position})
                 
+                result = generation_pool.submit(
+                    user_id, message_id,
+                    lambda: generate_answer(buffer, user_id, session_id, message, message_id, cancel_event,
+                                            slim_complete),
+                    on_position
+                )
+                if result['status'] == GenerationPool.BUSY:
+                    with active_generations_lock:
+                        active_generations.pop(message_id, None)
+                    stream_buffers.finish(buffer)
+                return result
+            
+            # Zapisz wiadomość użytkownika i zgłoś generowanie (odrzucona wiadomość nie zostaje w historii)
+            accepted = accept_user_message(session_id, user_id, message, admit)
+            record_message('socketio')
+            result = accepted['admission']
+            
+            if result['status'] == GenerationPool.BUSY:
+                logger.warning("Serwer zajęty - odrzucono wiadomość %s", message_id)
+                emit('busy', {
+                    'message': 'Serwer jest teraz przeciążony. Spróbuj ponownie za chwilę.',
+                    'message_id': message_id
+                })
+                return
+            
+            if accepted['title']:
                 # Powiadom frontend o zmianie tytułu
                 emit('session_title_updated', {
                     'session_id': session_id,
-                    'new_title': title
+                    'new_title': accepted['title']
                 })
             
             # Wyślij potwierdzenie
             emit('message_received', {
                 'message': message,
                 'message_id': message_id,
-                'timestamp': chat_session.load_history()[-1]['timestamp']
+                'timestamp': accepted['timestamp']
             })
             
-            # Rozpocznij generowanie odpowiedzi
-            emit('generating_start', {'message': 'Generuję odpowiedź...', 'message_id': message_id})
-            
-            # Inicjalizuj OpenAI RAG
-            rag = OpenAIRAG()
-            
-            # Przygotuj kontekst - PEŁNA HISTORIA ROZMOWY TYLKO DLA TEJ SESJI I TEGO UŻYTKOWNIKA
-            history = chat_session.load_history()
-            context = []
-            
-            print(f"🗂️ Ładuję historię rozmowy dla sesji {session_id}: {len(history)} wiadomości")
-            
-            # Przekaż całą historię rozmowy do asystenta - filtruj tylko dla tego user_id
-            for msg in history:
-                if msg.get('user_id') == current_user.id:  # Tylko wiadomości tego użytkownika
-                    # Sprawdź czy wiadomość ma niepustą treść
-                    if msg.get('content') and msg.get('content').strip():
-                        context.append({
-                            'role': msg['role'],
-                            'content': msg['content']
-                        })
-                    else:
-                        print(f"⚠️  Pomijam pustą wiadomość z historii: {msg}")
-            
-            print(f"📚 Kontekst przygotowany dla user {current_user.id}: {len(context)} wiadomości")
-            print(f"🔍 Ostatnie 3 wiadomości: {[m['role'] + ': ' + m['content'][:50] + '...' for m in context[-3:]]}")
-            
-            print(f"📚 Kontekst przygotowany: {len(context)} wiadomości")
-            print(f"🔍 Ostatnie 3 wiadomości: {[m['role'] + ': ' + m['content'][:50] + '...' for m in context[-3:]]}")
-            
-            # Sprawdź czy kontekst zawiera niepuste wiadomości
-            if context and all(msg.get('content') and msg.get('content').strip() for msg in context):
-                print("✅ Kontekst zawiera tylko niepuste wiadomości")
-            else:
-                print("⚠️  Kontekst może zawierać puste wiadomości")
-                # Dodatkowe filtrowanie
-                context = [msg for msg in context if msg.get('content') and msg.get('content').strip()]
-                print(f"🔧 Przefiltrowano kontekst: {len(context)} wiadomości pozostało")
-            
-            # Zapisz kontekst do pliku dla debugowania
-            rag.save_conversation_context(session_id, context, message)
-            
-            # Ostateczna walidacja przed generowaniem odpowiedzi
-            if not message or not message.strip():
-                print("❌ BŁĄD: Pusta wiadomość przed generowaniem odpowiedzi")
-                emit('error', {'message': 'Wiadomość nie może być pusta'})
-                return
-            
-            print(f"✅ Wszystkie walidacje przeszły pomyślnie, generuję odpowiedź dla: {message[:50]}...")
-            
-            # Generuj odpowiedź ze strumieniem - ASYSTENT OTRZYMUJE PEŁNY KONTEKST
-            response_text = ""
-            documents_used = 0
-            
-            for chunk in rag.generate_response_stream(message, context, session_id):
-                response_text += chunk
-                # Wyślij surowy chunk (markdown)
-                emit('response_chunk', {'chunk': chunk, 'message_id': message_id})
-                
-                # Sprawdź czy użyto dokumentów (można to zrobić w rag.py)
-                if hasattr(rag, 'last_documents_used'):
-                    documents_used = rag.last_documents_used
-            
-            # Wyślij informacje o użytych dokumentach
-            emit('documents_used', {'count': documents_used})
-            
-            # Zapisz pełną odpowiedź
-            chat_session.save_message(response_text, 'assistant')
-            
-            # Wygeneruj raport PDF
-            pdf_path = rag.generate_pdf_report(response_text, session_id)
-            
-            # Zakończ generowanie
-            emit('response_complete', {
-                'message': 'Odpowiedź wygenerowana',
-                'message_id': message_id,
-                'full_response': markdown_to_html(response_text),  # Konwertuj markdown do HTML
-                'documents_used': rag.last_documents_used,
-                'pdf_path': pdf_path
-            })
+            if result['status'] == GenerationPool.QUEUED:
+                emit('queued', {'message_id': message_id, 'position': result['position']})
             
         except Exception as e:
-            print(f"Błąd podczas przetwarzania wiadomości: {str(e)}")
+            ERRORS_TOTAL.inc(source='socketio')
+            logger.exception("Błąd podczas przetwarzania wiadomości: %s", e)
             emit('error', {'message': f'Wystąpił błąd: {str(e)}', 'message_id': message_id})
     
+    def generate_answer(buffer, user_id, session_id, message, message_id, cancel_event, slim_complete=False):
+        """Generuje odpowiedź w zadaniu puli i wysyła ją do klienta (przez bufor strumienia)"""
+        try:
+            run_generation(
+                lambda event, payload, final=False: stream_buffers.send(buffer, event, payload, final),
+                lambda frame: stream_buffers.send_chunk(buffer, frame),
+                user_id, session_id, message, message_id, cancel_event, slim_complete
+            )
+        finally:
+            with active_generations_lock:
+                active_generations.pop(message_id, None)
+            stream_buffers.finish(buffer)
+    
     @socketio.on('section_feedback')
     def handle_section_feedback(data):
         """Obsługuje feedback dla sekcji odpowiedzi z systemem uczenia się"""
@@ -230,11 +258,11 @@ def register_socketio_handlers(socketio):
             
             # SYSTEM UCZENIA SIĘ - Aktualizuj preferencje na podstawie feedbacku
             try:
-                learning_system = LearningSystem()
+                learning_system = get_learning_system()
                 learning_system.update_preferences_from_feedback(session_id, feedback_data, current_user.id)
-                print(f"🧠 Zaktualizowano preferencje uczenia dla sesji {session_id}")
+                logger.debug("Zaktualizowano preferencje uczenia dla sesji %s", session_id)
             except Exception as e:
-                print(f"⚠️ Błąd aktualizacji systemu uczenia się: {e}")
+                logger.warning("Błąd aktualizacji systemu uczenia się: %s", e)
             
             # Zapisz feedback do pliku
             feedback_dir = f'feedback/{session_id}'
@@ -255,10 +283,10 @@ def register_socketio_handlers(socketio):
             with open(feedback_file, 'w', encoding='utf-8') as f:
                 json.dump(all_feedback, f, ensure_ascii=False, indent=2)
             
-            print(f"✅ Feedback sekcji zapisany: {data.get('feedback')} dla {data.get('section_type')}")
+            logger.info("Feedback sekcji zapisany: %s dla %s", data.get('feedback'), data.get('section_type'))
             
         except Exception as e:
-            print(f"Błąd podczas zapisywania feedback sekcji: {str(e)}")
+            logger.exception("Błąd podczas zapisywania feedback sekcji: %s", e)
             emit('error', {'message': f'Błąd zapisywania feedback: {str(e)}'})
     
     @socketio.on('overall_feedback')
@@ -277,11 +305,12 @@ def register_socketio_handlers(socketio):
                 'timestamp': datetime.now().isoformat(),
                 'type': 'overall'
             }
+            evict_cached_answer(data)
             
             # SYSTEM UCZENIA SIĘ - Aktualizuj preferencje na podstawie ogólnego feedbacku
-            learning_system = LearningSystem()
+            learning_system = get_learning_system()
             learning_system.update_preferences_from_feedback(session_id, feedback_data, current_user.id)
-            print(f"🧠 Zaktualizowano preferencje uczenia dla sesji {session_id} (overall feedback)")
+            logger.debug("Zaktualizowano preferencje uczenia dla sesji %s (overall feedback)", session_id)
             
             # Zapisz feedback do pliku
             feedback_dir = f'feedback/{session_id}'
@@ -302,10 +331,10 @@ def register_socketio_handlers(socketio):
             with open(feedback_file, 'w', encoding='utf-8') as f:
                 json.dump(all_feedback, f, ensure_ascii=False, indent=2)
             
-            print(f"✅ Feedback ogólny zapisany: {data.get('feedback')}")
+            logger.info("Feedback ogólny zapisany: %s", data.get('feedback'))
             
         except Exception as e:
-            print(f"Błąd podczas zapisywania feedback ogólnego: {str(e)}")
+            logger.exception("Błąd podczas zapisywania feedback ogólnego: %s", e)
             emit('error', {'message': f'Błąd zapisywania feedback: {str(e)}'})
     
     @socketio.on('detailed_feedback')
@@ -329,9 +358,9 @@ def register_socketio_handlers(socketio):
             }
             
             # SYSTEM UCZENIA SIĘ - Aktualizuj preferencje na podstawie szczegółowego feedbacku
-            learning_system = LearningSystem()
+            learning_system = get_learning_system()
             learning_system.update_preferences_from_feedback(session_id, feedback_data, current_user.id)
-            print(f"🧠 Zaktualizowano preferencje uczenia dla sesji {session_id} (detailed feedback)")
+            logger.debug("Zaktualizowano preferencje uczenia dla sesji %s (detailed feedback)", session_id)
             
             # Zapisz feedback do pliku
             feedback_dir = f'feedback/{session_id}'
@@ -354,16 +383,17 @@ def register_socketio_handlers(socketio):
             
             # Dodaj feedback do uczenia asystenta AI
             try:
+                from utils.openai_rag import OpenAIRAG
                 rag = OpenAIRAG()
                 rag.add_feedback_to_training(feedback_data)
             except Exception as e:
-                print(f"Błąd podczas dodawania feedback do treningu: {str(e)}")
+                logger.warning("Błąd podczas dodawania feedback do treningu: %s", e)
             
-            print(f"✅ Szczegółowy feedback zapisany: {feedback_data['feedback_type']} dla {feedback_data['section_type']}")
+            logger.info("Szczegółowy feedback zapisany: %s dla %s", feedback_data['feedback_type'], feedback_data['section_type'])
             emit('feedback_saved', {'message': 'Feedback zapisany i dodany do treningu!'})
             
         except Exception as e:
-            print(f"Błąd podczas zapisywania szczegółowego feedback: {str(e)}")
+            logger.exception("Błąd podczas zapisywania szczegółowego feedback: %s", e)
             emit('error', {'message': f'Błąd zapisywania feedback: {str(e)}'})
     
     @socketio.on('request_pdf')
@@ -383,6 +413,7 @@ def register_socketio_handlers(socketio):
                 return
             
             # Wygeneruj PDF
+            from utils.openai_rag import OpenAIRAG
             rag = OpenAIRAG()
             pdf_path = rag.generate_pdf_report(content, session_id, message_id)
             
@@ -393,7 +424,7 @@ def register_socketio_handlers(socketio):
             })
             
         except Exception as e:
-            print(f"Błąd podczas generowania PDF: {str(e)}")
+            logger.exception("Błąd podczas generowania PDF: %s", e)
             emit('error', {'message': f'Błąd generowania PDF: {str(e)}'})
     
     @socketio.on('submit_feedback')
@@ -428,18 +459,18 @@ def register_socketio_handlers(socketio):
             with open(feedback_file, 'w', encoding='utf-8') as f:
                 json.dump(feedback_data, f, ensure_ascii=False, indent=2)
             
-            print(f"📝 Otrzymano feedback: {feedback_type} dla sekcji {section_id} w sesji {session_id}")
+            logger.info("Otrzymano feedback: %s dla sekcji %s w sesji %s", feedback_type, section_id, session_id)
             emit('feedback_received', {'message': 'Dziękuję za opinię!'})
             
         except Exception as e:
-            print(f"Błąd podczas zapisywania feedbacku: {str(e)}")
+            logger.exception("Błąd podczas zapisywania feedbacku: %s", e)
             emit('error', {'message': f'Błąd zapisywania feedbacku: {str(e)}'})
     
     @socketio.on('feedback')
     def handle_feedback(data):
         """Obsługuje feedback z komentarzem użytkownika"""
         try:
-            print(f"💬 Otrzymano feedback: {data}")
+            logger.debug("Otrzymano feedback: %s", data)
             
             session_id = session.get('session_id')
             if not session_id:
@@ -458,6 +489,7 @@ def register_socketio_handlers(socketio):
                 'timestamp': data.get('timestamp', datetime.now().isoformat()),
                 'type': 'section_with_comment'
             }
+            evict_cached_answer(data)
             
             # Zapisz feedback do pliku
             feedback_dir = f'feedback/{session_id}'
@@ -478,7 +510,7 @@ def register_socketio_handlers(socketio):
             with open(feedback_file, 'w', encoding='utf-8') as f:
                 json.dump(all_feedback, f, ensure_ascii=False, indent=2)
             
-            print(f"✅ Feedback zapisany: {data.get('feedback_type')} - {data.get('description')}")
+            logger.info("Feedback zapisany: %s", data.get('feedback_type'))
             
             # Poinformuj o zapisaniu
             emit('feedback_saved', {
@@ -487,9 +519,7 @@ def register_socketio_handlers(socketio):
             })
             
         except Exception as e:
-            print(f"❌ Błąd podczas zapisywania feedback: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Błąd podczas zapisywania feedback: %s", e)
             emit('error', {'message': f'Błąd zapisywania feedback: {str(e)}'})
 
     return socketio
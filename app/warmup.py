@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rozgrzewanie aplikacji po starcie serwera
+
+Import aplikacji ładuje tylko to, co potrzebne do przyjęcia połączeń.
+Ciężkie moduły (klient OpenAI, reportlab, markdown), współdzielony klient
+OpenAI ze sprawdzeniem asystenta, indeksy (dokumenty, podobne pytania,
+tematy), pamięci podręczne, analityka sesji (wczytuje całą historię)
+i generator podręcznika powstają w zadaniu w tle uruchamianym chwilę po
+starcie serwera, więc start nie jest przez nie opóźniany. Każdy krok
+wykonuje się w puli prawdziwych wątków (run_blocking), żeby w trybie
+eventlet/gevent nie blokować pętli zdarzeń.
+
+Do zakończenia rozgrzewania /readyz odpowiada 503 - load balancer kieruje
+ruch do instancji dopiero wtedy, gdy pierwsze wiadomości nie zapłacą za
+zimne pamięci podręczne. Gotowość blokuje tylko błąd kroku krytycznego
+(CRITICAL_STEPS - klient OpenAI i indeksy, bez których czat nie odpowie);
+taki krok jest ponawiany co WARMUP_RETRY_SECONDS. Błędy pozostałych kroków
+są widoczne w odpowiedzi /readyz, ale nie wyłączają instancji z ruchu.
+
+Zmienne: WARMUP_ENABLED (1), WARMUP_DELAY_SECONDS (1), WARMUP_RETRY_SECONDS (30).
+"""
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from utils.async_support import run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+def _import_heavy_modules():
+    import utils.openai_rag  # noqa: F401 - openai, httpx
+    import reportlab.platypus  # noqa: F401
+    import markdown  # noqa: F401
+
+
+def _build_rag_client():
+    # Współdzielona pula połączeń i jednorazowe sprawdzenie asystenta
+    from utils.openai_rag import OpenAIRAG
+    OpenAIRAG()
+
+
+def _load_indexes():
+    from app.models import UploadIndex
+    from utils.question_index import get_question_index
+    from utils.topic_tagger import tag_topics
+    UploadIndex().get_all_files()
+    get_question_index()
+    tag_topics('Rozgrzewanie indeksu tematów: nawigacja VOR, meteorologia')
+
+
+def _load_caches():
+    from utils.answer_cache import get_answer_cache
+    from utils.learning_system import get_learning_system
+    from utils.preference_store import get_preference_store
+    get_answer_cache()
+    get_learning_system()
+    get_preference_store()
+
+
+def _build_analytics():
+    from app.session_analytics import get_analytics
+    get_analytics()
+
+
+def _build_handbook_generator():
+    from utils.atpl_handbook_generator import get_handbook_generator
+    get_handbook_generator()
+
+
+# Kroki rozgrzewania w kolejności wykonania: (nazwa, funkcja)
+WARMUP_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ('modules', _import_heavy_modules),
+    ('rag_client', _build_rag_client),
+    ('indexes', _load_indexes),
+    ('caches', _load_caches),
+    ('analytics', _build_analytics),
+    ('handbook', _build_handbook_generator),
+]
+
+# Kroki, bez których instancja nie może przyjmować ruchu
+CRITICAL_STEPS = ('rag_client', 'indexes')
+
+_status = {'state': 'pending', 'started_at': None, 'finished_at': None, 'steps': {}}
+_status_lock = threading.Lock()
+
+
+def warmup_status() -> Dict:
+    """Stan rozgrzewania: pending / running / done / disabled oraz czas i wynik każdego kroku"""
+    with _status_lock:
+        return {**_status, 'steps': {name: dict(step) for name, step in _status['steps'].items()}}
+
+
+def failed_steps(critical_only: bool = False) -> List[str]:
+    """Nazwy kroków zakończonych błędem (opcjonalnie tylko krytycznych)"""
+    with _status_lock:
+        return [name for name, step in _status['steps'].items()
+                if not step['ok'] and (not critical_only or name in CRITICAL_STEPS)]
+
+
+def is_ready() -> bool:
+    """Czy instancja może przyjmować ruch (bez błędu kroku krytycznego)"""
+    with _status_lock:
+        if _status['state'] == 'disabled':
+            return True
+        if _status['state'] != 'done':
+            return False
+        return all(step['ok'] for name, step in _status['steps'].items() if name in CRITICAL_STEPS)
+
+
+def run_warmup(steps: List[Tuple[str, Callable[[], None]]] = None, retry: bool = False) -> Dict:
+    """Wykonuje kroki rozgrzewania; błąd kroku jest logowany i nie przerywa kolejnych
+
+    retry=True ponawia podane kroki, zachowując wyniki pozostałych.
+    """
+    with _status_lock:
+        _status.update(state='running', started_at=time.time(), finished_at=None)
+        if not retry:
+            _status['steps'] = {}
+
+    for name, func in steps or WARMUP_STEPS:
+        started = time.perf_counter()
+        try:
+            run_blocking(func)
+            step = {'ok': True}
+        except Exception as e:
+            logger.warning("Krok rozgrzewania %s nie powiódł się: %s", name, e)
+            step = {'ok': False, 'error': str(e)}
+        step['seconds'] = round(time.perf_counter() - started, 3)
+        with _status_lock:
+            _status['steps'][name] = step
+
+    with _status_lock:
+        _status.update(state='done', finished_at=time.time())
+    status = warmup_status()
+    logger.info("Rozgrzewanie zakończone w %.2fs", status['finished_at'] - status['started_at'],
+                extra={'steps': {name: step['seconds'] for name, step in status['steps'].items()}})
+    critical = failed_steps(critical_only=True)
+    if critical:
+        logger.error("Instancja niegotowa - nieudane kroki krytyczne: %s", ', '.join(critical))
+    return status
+
+
+def retry_critical_steps() -> Dict:
+    """Ponawia nieudane kroki krytyczne"""
+    critical = set(failed_steps(critical_only=True))
+    return run_warmup([(name, func) for name, func in WARMUP_STEPS if name in critical], retry=True)
+
+
+def start_warmup(socketio, reloader: bool = False):
+    """Uruchamia rozgrzewanie w tle (po WARMUP_DELAY_SECONDS, gdy serwer już nasłuchuje)"""
+    if os.getenv('WARMUP_ENABLED', '1').lower() in ('0', 'false', 'no'):
+        with _status_lock:
+            _status['state'] = 'disabled'
+        return None
+    # Z przeładowywaniem kodu serwer działa w procesie potomnym - proces nadrzędny tylko obserwuje pliki
+    if reloader and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return None
+
+    delay = float(os.getenv('WARMUP_DELAY_SECONDS', 1))
+    retry_delay = float(os.getenv('WARMUP_RETRY_SECONDS', 30))
+
+    def delayed_warmup():
+        socketio.sleep(delay)
+        run_warmup()
+        # Bez klienta OpenAI lub indeksów instancja zostaje poza ruchem, dopóki krok się nie uda
+        while failed_steps(critical_only=True):
+            socketio.sleep(retry_delay)
+            retry_critical_steps()
+
+    return socketio.start_background_task(delayed_warmup)
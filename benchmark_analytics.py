@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark analityki, raportów uczenia się i eksportu danych treningowych
+
+Dla każdej skali (liczby sesji) generuje korpus syntetyczny
+(generate_synthetic_corpus.py), a następnie w osobnym procesie, z katalogiem
+roboczym ustawionym na korpus, mierzy czasy operacji panelu administratora:
+ładowanie dashboardu, stronę analityki, zapytania o aktywność użytkowników,
+raport dzienny, raport LearningMonitor i eksport JSONL z trainer.py.
+
+Wyniki (min/mediana/średnia/max jak w pytest-benchmark) trafiają do tabeli
+i opcjonalnie do pliku JSON; --compare porównuje je z zapisanym wcześniej
+wynikiem i kończy się kodem 1, gdy któraś operacja zwolniła ponad próg.
+
+Przykład:
+    python benchmark_analytics.py --scales 1000,10000 --save bench_baseline.json
+    python benchmark_analytics.py --scales 1000,10000 --compare bench_baseline.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SCALES = '1000,10000,100000'
+DEFAULT_WORKDIR = os.path.join('data', 'benchmarks')
+
+# Metody wywoływane przez widok /admin/analytics
+ANALYTICS_PAGE_METHODS = [
+    'get_active_users_count', 'get_user_growth_percentage', 'get_daily_sessions_count',
+    'get_average_session_duration', 'get_average_engagement', 'get_engagement_trend',
+    'get_response_quality_percentage', 'get_positive_feedback_percentage',
+    'get_top_topics_with_stats', 'get_top_users_detailed', 'get_average_response_time',
+    'get_activity_growth_percentage', 'get_predicted_users', 'get_positive_feedback_count',
+    'get_negative_feedback_count', 'get_negative_feedback_percentage',
+    'get_feedback_response_rate', 'get_recent_sessions', 'get_activity_labels',
+    'get_activity_data'
+]
+
+
+class BenchmarkRunner:
+    """Powtarza operację i zbiera statystyki czasu (styl pytest-benchmark)"""
+
+    def __init__(self, rounds: int = 3, max_time: float = 30.0, quiet: bool = True):
+        self.rounds = max(1, rounds)
+        self.max_time = max_time
+        self.quiet = quiet
+        self.results = {}
+
+    def run(self, name: str, func, teardown=None):
+        timings = []
+        error = None
+        started = time.perf_counter()
+        while len(timings) < self.rounds:
+            try:
+                with self._output():
+                    t0 = time.perf_counter()
+                    result = func()
+                    timings.append(time.perf_counter() - t0)
+                if teardown:
+                    teardown(result)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                break
+            # Pierwsza runda zawsze; kolejne tylko w budżecie czasu
+            if time.perf_counter() - started > self.max_time:
+                break
+
+        self.results[name] = self.summarize(timings, error)
+        return self.results[name]
+
+    @contextlib.contextmanager
+    def _output(self):
+        if not self.quiet:
+            yield
+            return
+        # Wycisza też logi błędów (logging pisze na stderr)
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            yield
+
+    @staticmethod
+    def summarize(timings, error=None):
+        if not timings:
+            return {'rounds': 0, 'error': error}
+        summary = {
+            'rounds': len(timings),
+            'min': round(min(timings), 4),
+            'max': round(max(timings), 4),
+            'mean': round(statistics.mean(timings), 4),
+            'median': round(statistics.median(timings), 4),
+            'stddev': round(statistics.stdev(timings), 4) if len(timings) > 1 else 0.0
+        }
+        if error:
+            summary['error'] = error
+        return summary
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+        # Linux podaje ru_maxrss w KB, macOS w bajtach
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except Exception:
+        return None
+
+
+def run_worker(corpus_dir: str, rounds: int, max_time: float, only=None, quiet: bool = True):
+    """Mierzy operacje na korpusie w bieżącym procesie (katalog roboczy = korpus)"""
+    sys.path.insert(0, ROOT_DIR)
+    os.chdir(corpus_dir)
+
+    from generate_synthetic_corpus import load_corpus_info
+    from app.models import User
+    from app.session_analytics import SessionAnalytics
+    from utils.learning_reports import LearningReportsSystem
+    from learning_monitor import LearningMonitor
+    from trainer import FeedbackTrainer
+
+    info = load_corpus_info('.')
+    report_date = datetime.fromisoformat(info['end_time']) if info.get('end_time') else datetime.now()
+    runner = BenchmarkRunner(rounds, max_time, quiet)
+
+    def wanted(name):
+        return not only or name in only
+
+    # Wspólny obiekt analityki, jak w module app.admin
+    with runner._output():
+        analytics = SessionAnalytics()
+        users = User.get_all_users()
+    by_activity = sorted(users, key=lambda u: -len(analytics.get_user_sessions(u.id)))
+    top_users = [u.id for u in by_activity[:10]]
+
+    def dashboard():
+        analytics.load_all_data()
+        stats = analytics.get_global_statistics()
+        stats['total_users'] = len(User.get_all_users())
+        return stats
+
+    def analytics_page():
+        page_analytics = SessionAnalytics()
+        stats = {name: getattr(page_analytics, name)() for name in ANALYTICS_PAGE_METHODS}
+        stats['most_asked_questions'] = page_analytics.get_most_asked_questions(10)
+        return stats
+
+    def user_activity():
+        # Lista użytkowników i szczegóły najaktywniejszych (bez ponownego ładowania danych)
+        listing = [analytics.get_user_statistics(u.id) for u in User.get_all_users()]
+        details = [(analytics.get_user_statistics(user_id), analytics.get_user_all_sessions(user_id))
+                   for user_id in top_users]
+        return listing, details
+
+    def daily_report():
+        return LearningReportsSystem().generate_daily_report(report_date)
+
+    def learning_monitor():
+        return LearningMonitor().generate_learning_report()
+
+    def training_export():
+        return FeedbackTrainer().generate_training_jsonl()
+
+    def remove_export(output_file):
+        if output_file and os.path.exists(output_file):
+            os.remove(output_file)
+
+    benchmarks = [
+        ('dashboard_load', dashboard, None),
+        ('analytics_page', analytics_page, None),
+        ('user_activity', user_activity, None),
+        ('daily_report', daily_report, None),
+        ('learning_monitor', learning_monitor, None),
+        ('training_export', training_export, remove_export),
+    ]
+    for name, func, teardown in benchmarks:
+        if wanted(name):
+            runner.run(name, func, teardown=teardown)
+
+    return {
+        'corpus': info,
+        'benchmarks': runner.results,
+        'peak_rss_mb': _peak_rss_mb()
+    }
+
+
+def ensure_corpus(workdir: str, sessions: int, users: int, messages: int, seed: int) -> str:
+    """Zwraca katalog korpusu; generuje go, jeśli brak lub parametry się różnią"""
+    from generate_synthetic_corpus import CorpusGenerator, load_corpus_info
+
+    corpus_dir = os.path.abspath(os.path.join(workdir, f'sessions_{sessions}'))
+    info = load_corpus_info(corpus_dir)
+    if (info.get('sessions') == sessions and info.get('users') == users and
+            info.get('messages_per_session') == messages and info.get('seed') == seed):
+        print(f"♻️  Używam istniejącego korpusu {corpus_dir}")
+        return corpus_dir
+
+    if info:
+        import shutil
+        shutil.rmtree(corpus_dir)
+    print(f"🏗️  Generuję korpus: {sessions} sesji, {users} użytkowników")
+    CorpusGenerator(corpus_dir, users=users, sessions=sessions, messages=messages, seed=seed).generate()
+    return corpus_dir
+
+
+def run_scale(corpus_dir: str, args) -> dict:
+    """Uruchamia pomiary w osobnym procesie (czyste singletony i pamięć)"""
+    result_file = os.path.join(corpus_dir, 'benchmark_result.json')
+    command = [sys.executable, os.path.abspath(__file__), '--worker', corpus_dir,
+               '--result', result_file, '--rounds', str(args.rounds), '--max-time', str(args.max_time)]
+    if args.only:
+        command += ['--only', args.only]
+    if args.verbose:
+        command.append('--verbose')
+
+    completed = subprocess.run(command, cwd=ROOT_DIR)
+    if completed.returncode != 0 or not os.path.exists(result_file):
+        return {'error': f'Proces pomiarowy zakończył się kodem {completed.returncode}', 'benchmarks': {}}
+    with open(result_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_results(current: dict, baseline: dict, threshold: float) -> list:
+    """Zwraca listę regresji (mediana wolniejsza o więcej niż próg)"""
+    regressions = []
+    for scale, scale_result in current.get('scales', {}).items():
+        base_scale = baseline.get('scales', {}).get(scale, {})
+        for name, stats in scale_result.get('benchmarks', {}).items():
+            base = base_scale.get('benchmarks', {}).get(name)
+            if not base or not base.get('median') or not stats.get('median'):
+                continue
+            change = stats['median'] / base['median'] - 1.0
+            stats['change_vs_baseline'] = round(change, 3)
+            if change > threshold:
+                regressions.append({
+                    'scale': scale,
+                    'benchmark': name,
+                    'baseline_median': base['median'],
+                    'median': stats['median'],
+                    'change': round(change, 3)
+                })
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"\n{'skala':>8}  {'operacja':<18} {'rundy':>5} {'min [s]':>9} {'mediana':>9} "
+          f"{'średnia':>9} {'max':>9}  {'zmiana':>7}")
+    for scale, scale_result in results['scales'].items():
+        if scale_result.get('error'):
+            print(f"{scale:>8}  ❌ {scale_result['error']}")
+        for name, stats in scale_result.get('benchmarks', {}).items():
+            if not stats.get('rounds'):
+                print(f"{scale:>8}  {name:<18} ❌ {stats.get('error')}")
+                continue
+            change = stats.get('change_vs_baseline')
+            change_text = f"{change * 100:+.0f}%" if change is not None else ''
+            print(f"{scale:>8}  {name:<18} {stats['rounds']:>5} {stats['min']:>9.3f} "
+                  f"{stats['median']:>9.3f} {stats['mean']:>9.3f} {stats['max']:>9.3f}  {change_text:>7}")
+        if scale_result.get('peak_rss_mb'):
+            print(f"{'':>8}  szczytowa pamięć procesu: {scale_result['peak_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark analityki i raportów na danych syntetycznych')
+    parser.add_argument('--scales', default=DEFAULT_SCALES, help='Liczby sesji, np. 1000,10000,100000')
+    parser.add_argument('--users', type=int, default=0,
+                        help='Liczba użytkowników (domyślnie 1 na 50 sesji, min. 10)')
+    parser.add_argument('--messages', type=int, default=6, help='Średnia liczba wiadomości w sesji')
+    parser.add_argument('--seed', type=int, default=42, help='Ziarno generatora korpusu')
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help='Katalog na korpusy (zachowywane)')
+    parser.add_argument('--rounds', type=int, default=3, help='Maksymalna liczba rund na operację')
+    parser.add_argument('--max-time', type=float, default=30.0,
+                        help='Budżet czasu na operację w sekundach (min. 1 runda)')
+    parser.add_argument('--only', help='Tylko wybrane operacje (po przecinku)')
+    parser.add_argument('--save', help='Zapisz wyniki do pliku JSON')
+    parser.add_argument('--compare', help='Porównaj z wcześniej zapisanymi wynikami')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Próg regresji mediany (0.2 = 20%%)')
+    parser.add_argument('--verbose', action='store_true', help='Nie wyciszaj wyjścia mierzonych funkcji')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        only = set(args.only.split(',')) if args.only else None
+        result = run_worker(args.worker, args.rounds, args.max_time, only, quiet=not args.verbose)
+        with open(args.result, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        return
+
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    results = {
+        'generated_at': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'rounds': args.rounds,
+        'max_time': args.max_time,
+        'scales': {}
+    }
+
+    for sessions in scales:
+        users = args.users or max(10, sessions // 50)
+        corpus_dir = ensure_corpus(args.workdir, sessions, users, args.messages, args.seed)
+        print(f"⏱️  Pomiary dla {sessions} sesji...")
+        results['scales'][str(sessions)] = run_scale(corpus_dir, args)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        results['regressions'] = regressions
+        exit_code = 1 if regressions else 0
+
+    print_table(results)
+
+    if args.compare:
+        if results['regressions']:
+            print(f"\n❌ Regresje powyżej {args.threshold * 100:.0f}%:")
+            for item in results['regressions']:
+                print(f"   {item['scale']} sesji / {item['benchmark']}: "
+                      f"{item['baseline_median']}s -> {item['median']}s ({item['change'] * 100:+.0f}%)")
+        else:
+            print(f"\n✅ Brak regresji względem {args.compare}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Wyniki zapisane do {args.save}")
+
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
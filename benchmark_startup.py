@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark zimnego startu serwera
+
+Uruchamia `python run.py` (lub inne polecenie) na wolnym porcie i mierzy:
+- listening - czas do pierwszego przyjętego połączenia TCP,
+- first_response - czas do pierwszej odpowiedzi HTTP (GET /login),
+- warmup_done - czas do zakończenia rozgrzewania w tle (linia logu app.warmup).
+
+Każda runda to osobny proces (z całą grupą procesów, także przeładowującym
+kodem), zatrzymywany po pomiarze. Wyniki w stylu benchmark_analytics.py:
+min/mediana/średnia/max, zapis do JSON (--save) i porównanie z poprzednim
+wynikiem (--compare, kod wyjścia 1 przy regresji ponad --threshold).
+
+Przykład:
+    python benchmark_startup.py --rounds 5 --save startup_baseline.json
+    python benchmark_startup.py --rounds 5 --compare startup_baseline.json
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import socket
+import signal
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from benchmark_analytics import BenchmarkRunner
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+WARMUP_DONE_MARKER = 'Rozgrzewanie zakończone'
+METRICS = ('listening', 'first_response', 'warmup_done')
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _accepts(port: int) -> bool:
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+            return True
+    except OSError:
+        return False
+
+
+def _responds(port: int, path: str) -> bool:
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=5) as response:
+            return response.status < 500
+    except urllib.error.HTTPError as e:
+        return e.code < 500
+    except (OSError, ValueError):
+        return False
+
+
+def measure_once(command: list, cwd: str, timeout: float, path: str, wait_warmup: bool) -> dict:
+    """Jeden zimny start: czasy od uruchomienia procesu (w sekundach)"""
+    port = free_port()
+    env = {**os.environ, 'PORT': str(port), 'PYTHONUNBUFFERED': '1'}
+    result = {'port': port}
+    warmup_seen = threading.Event()
+    output_tail = []
+
+    # Serwer deweloperski Werkzeuga odmawia startu bez terminala - stdin to pseudoterminal
+    master_fd, slave_fd = os.openpty()
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdin=slave_fd, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, start_new_session=True)
+    os.close(slave_fd)
+
+    def read_output():
+        for raw in process.stdout:
+            line = raw.decode('utf-8', errors='replace')
+            output_tail[:] = (output_tail + [line.rstrip()])[-5:]
+            if WARMUP_DONE_MARKER in line:
+                result.setdefault('warmup_done', round(time.perf_counter() - started, 4))
+                warmup_seen.set()
+
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
+
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline and process.poll() is None:
+            if _accepts(port):
+                result['listening'] = round(time.perf_counter() - started, 4)
+                break
+            time.sleep(0.01)
+        else:
+            result['error'] = f'proces zakończył się kodem {process.returncode}' \
+                if process.returncode is not None else 'przekroczono limit czasu'
+            reader.join(timeout=2)
+            result['output'] = output_tail[-5:]
+            return result
+
+        while time.perf_counter() < deadline:
+            if _responds(port, path):
+                result['first_response'] = round(time.perf_counter() - started, 4)
+                break
+            time.sleep(0.01)
+
+        if wait_warmup:
+            warmup_seen.wait(max(0.0, deadline - time.perf_counter()))
+        return result
+    finally:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=10)
+        except (ProcessLookupError, subprocess.TimeoutExpired):
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        reader.join(timeout=2)
+        os.close(master_fd)
+
+
+def compare_results(current: dict, baseline: dict, threshold: float) -> list:
+    """Regresje median względem zapisanego wyniku"""
+    regressions = []
+    for name, stats in current['benchmarks'].items():
+        base = baseline.get('benchmarks', {}).get(name)
+        if not base or not base.get('median') or not stats.get('median'):
+            continue
+        change = stats['median'] / base['median'] - 1.0
+        stats['change_vs_baseline'] = round(change, 3)
+        if change > threshold:
+            regressions.append({'benchmark': name, 'baseline_median': base['median'],
+                                'median': stats['median'], 'change': round(change, 3)})
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"\n{'pomiar':<16} {'rundy':>5} {'min [s]':>9} {'mediana':>9} {'średnia':>9} {'max':>9}  {'zmiana':>7}")
+    for name, stats in results['benchmarks'].items():
+        if not stats.get('rounds'):
+            print(f"{name:<16} ❌ {stats.get('error') or 'brak pomiarów'}")
+            continue
+        change = stats.get('change_vs_baseline')
+        change_text = f"{change * 100:+.0f}%" if change is not None else ''
+        print(f"{name:<16} {stats['rounds']:>5} {stats['min']:>9.3f} {stats['median']:>9.3f} "
+              f"{stats['mean']:>9.3f} {stats['max']:>9.3f}  {change_text:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark zimnego startu serwera (czas do pierwszego połączenia)')
+    parser.add_argument('--command', default=f'{shlex.quote(sys.executable)} run.py',
+                        help='Polecenie uruchamiające serwer (port w zmiennej PORT)')
+    parser.add_argument('--cwd', default=ROOT_DIR, help='Katalog roboczy serwera')
+    parser.add_argument('--rounds', type=int, default=5, help='Liczba zimnych startów')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Limit czasu jednej rundy w sekundach')
+    parser.add_argument('--path', default='/login', help='Ścieżka pierwszego żądania HTTP')
+    parser.add_argument('--no-warmup', action='store_true', help='Nie czekaj na zakończenie rozgrzewania')
+    parser.add_argument('--save', help='Zapisz wyniki do pliku JSON')
+    parser.add_argument('--compare', help='Porównaj z wcześniej zapisanymi wynikami')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Próg regresji mediany (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    command = shlex.split(args.command)
+    rounds = []
+    for i in range(max(1, args.rounds)):
+        rounds.append(measure_once(command, args.cwd, args.timeout, args.path, not args.no_warmup))
+        summary = ', '.join(f"{name} {rounds[-1][name]:.2f}s" for name in METRICS if name in rounds[-1])
+        print(f"⏱️  Runda {i + 1}: {summary or rounds[-1].get('error')}")
+        for line in rounds[-1].get('output', []):
+            print(f"   {line}")
+
+    errors = [r['error'] for r in rounds if r.get('error')]
+    results = {
+        'generated_at': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'command': args.command,
+        'rounds': rounds,
+        'benchmarks': {
+            name: BenchmarkRunner.summarize([r[name] for r in rounds if name in r],
+                                            errors[0] if errors else None)
+            for name in METRICS if not (name == 'warmup_done' and args.no_warmup)
+        }
+    }
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        results['regressions'] = compare_results(results, baseline, args.threshold)
+        exit_code = 1 if results['regressions'] else 0
+
+    print_table(results)
+
+    if args.compare:
+        if results['regressions']:
+            print(f"\n❌ Regresje powyżej {args.threshold * 100:.0f}%:")
+            for item in results['regressions']:
+                print(f"   {item['benchmark']}: {item['baseline_median']}s -> {item['median']}s "
+                      f"({item['change'] * 100:+.0f}%)")
+        else:
+            print(f"\n✅ Brak regresji względem {args.compare}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Wyniki zapisane do {args.save}")
+
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
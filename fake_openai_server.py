@@ -0,0 +1,570 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lokalny serwer udający OpenAI API - do testów i benchmarków bez klucza
+
+Implementuje podzbiór API używany przez OpenAIRAG i ATPLHandbookGenerator:
+assistants, files, vector_stores (z file_batches), threads, strumieniowane
+runy i chat.completions. Opóźnienie, szybkość generowania tokenów i
+wstrzykiwanie błędów są konfigurowalne, a odpowiedzi deterministyczne
+(zależne od pytania i ziarna), więc pomiary są powtarzalne.
+
+Uruchomienie:
+    python fake_openai_server.py --port 8765 --tokens-per-second 80
+
+Przełączenie aplikacji na serwer:
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=sk-fake python run.py
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import itertools
+from flask import Flask, Response, jsonify, request
+
+FAILURE_KINDS = ('error', 'rate_limit', 'run_failed', 'stall')
+
+WORDS = (
+    'samolot', 'skrzydło', 'siła nośna', 'opór', 'ciąg', 'prędkość', 'wysokość', 'nawigacja',
+    'VOR', 'ILS', 'podejście', 'procedura', 'pilot', 'kontrola', 'meteorologia', 'front',
+    'ciśnienie', 'altimetr', 'przepisy', 'EASA', 'masa', 'wyważenie', 'silnik', 'paliwo',
+    'lądowanie', 'start', 'pas', 'wiatr', 'widzialność', 'chmury', 'oblodzenie', 'turbulencja'
+)
+
+ATPL_STRUCTURE = {
+    'title': 'Program Szkolenia ATPL',
+    'description': 'Struktura wygenerowana przez lokalny serwer testowy',
+    'total_hours': '650',
+    'modules': [{
+        'id': 'module_1',
+        'title': 'Moduł 1 - Prawo lotnicze',
+        'description': 'Przepisy i procedury',
+        'hours': '40',
+        'chapters': [{
+            'id': 'chapter_1_1',
+            'title': 'Rozdział 1.1 - ICAO',
+            'description': 'Organizacje międzynarodowe',
+            'topics': [{
+                'id': 'topic_1_1_1',
+                'title': 'Konwencja chicagowska',
+                'description': 'Podstawy prawa lotniczego',
+                'subtopics': ['Historia', 'Załączniki']
+            }]
+        }]
+    }]
+}
+
+
+class FakeOpenAIConfig:
+    """Ustawienia serwera (zmienne środowiskowe, argumenty lub POST /_fake/config)"""
+
+    def __init__(self):
+        self.latency_ms = float(os.getenv('FAKE_OPENAI_LATENCY_MS', 50))
+        self.first_token_ms = float(os.getenv('FAKE_OPENAI_FIRST_TOKEN_MS', 300))
+        self.tokens_per_second = float(os.getenv('FAKE_OPENAI_TOKENS_PER_SECOND', 50))
+        self.answer_tokens = int(os.getenv('FAKE_OPENAI_ANSWER_TOKENS', 300))
+        self.failure_rate = float(os.getenv('FAKE_OPENAI_FAILURE_RATE', 0.0))
+        self.failure_kinds = [k.strip() for k in os.getenv('FAKE_OPENAI_FAILURE_KINDS', 'error,run_failed').split(',')
+                              if k.strip() in FAILURE_KINDS]
+        self.seed = int(os.getenv('FAKE_OPENAI_SEED', 42))
+
+    def update(self, values: dict):
+        for key, value in values.items():
+            if key == 'failure_kinds':
+                value = [k for k in value if k in FAILURE_KINDS]
+            elif hasattr(self, key):
+                value = type(getattr(self, key))(value)
+            else:
+                continue
+            setattr(self, key, value)
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+class FakeOpenAIState:
+    """Obiekty API trzymane w pamięci i liczniki żądań"""
+
+    def __init__(self, config: FakeOpenAIConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.random = random.Random(config.seed)
+        self.assistants = {}
+        self.files = {}
+        self.vector_stores = {}
+        self.threads = {}
+        self.runs = {}
+        self.counters = {}
+        self.active_streams = 0
+        self.tokens_streamed = 0
+
+    def new_id(self, prefix: str) -> str:
+        return f'{prefix}_fake{next(self.ids):08d}'
+
+    def count(self, name: str):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def pick_failure(self, allowed):
+        """Losuje błąd do wstrzyknięcia (None gdy żądanie ma się udać)"""
+        kinds = [k for k in self.config.failure_kinds if k in allowed]
+        with self.lock:
+            if not kinds or self.random.random() >= self.config.failure_rate:
+                return None
+            return self.random.choice(kinds)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': dict(self.counters),
+                'objects': {
+                    'assistants': len(self.assistants),
+                    'files': len(self.files),
+                    'vector_stores': len(self.vector_stores),
+                    'threads': len(self.threads),
+                    'runs': len(self.runs)
+                },
+                'active_streams': self.active_streams,
+                'tokens_streamed': self.tokens_streamed,
+                'config': self.config.to_dict()
+            }
+
+
+def answer_tokens(prompt: str, count: int, seed: int):
+    """Zwraca deterministyczną odpowiedź (HTML) podzieloną na tokeny"""
+    digest = hashlib.sha1(f'{seed}|{prompt}'.encode('utf-8')).hexdigest()
+    rng = random.Random(int(digest[:8], 16))
+    tokens = ['<h2>', 'Odpowiedź ', 'testowa', '</h2>', '<p>']
+    while len(tokens) < count - 1:
+        word = rng.choice(WORDS)
+        tokens.append(word + ('. ' if rng.random() < 0.12 else ' '))
+        if rng.random() < 0.03:
+            tokens.append('</p><p>')
+    tokens.append('</p>')
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """Przybliżona liczba tokenów tekstu (4 znaki na token)"""
+    return max(1, len(text or '') // 4)
+
+
+def sse(event: str, data) -> str:
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+def create_fake_openai_app(config: FakeOpenAIConfig = None) -> Flask:
+    """Tworzy aplikację WSGI serwera"""
+    config = config or FakeOpenAIConfig()
+    state = FakeOpenAIState(config)
+    app = Flask(__name__)
+    app.config['FAKE_STATE'] = state
+
+    def error(status, message, code=None, kind='invalid_request_error'):
+        return jsonify({'error': {'message': message, 'type': kind, 'param': None, 'code': code}}), status
+
+    def not_found(what, object_id):
+        return error(404, f"No {what} found with id '{object_id}'.")
+
+    def page(items):
+        data = sorted(items, key=lambda o: o['created_at'], reverse=True)
+        return jsonify({
+            'object': 'list',
+            'data': data,
+            'first_id': data[0]['id'] if data else None,
+            'last_id': data[-1]['id'] if data else None,
+            'has_more': False
+        })
+
+    @app.before_request
+    def simulate_network():
+        if request.path.startswith('/_fake'):
+            return None
+        state.count(f'{request.method} {request.url_rule.rule if request.url_rule else request.path}')
+        if config.latency_ms:
+            time.sleep(config.latency_ms / 1000.0)
+        # Runy zgłaszają błędy w strumieniu, pozostałe żądania kodem HTTP
+        failure = state.pick_failure(('error', 'rate_limit', 'stall'))
+        if failure == 'error':
+            return error(500, 'Injected server error', 'server_error', 'server_error')
+        if failure == 'rate_limit':
+            return error(429, 'Injected rate limit', 'rate_limit_exceeded', 'requests')
+        if failure == 'stall':
+            time.sleep(30)
+        return None
+
+    # --------------------------------------------------------------
+    # Sterowanie serwerem
+    # --------------------------------------------------------------
+
+    @app.route('/_fake/stats')
+    def fake_stats():
+        return jsonify(state.stats())
+
+    @app.route('/_fake/config', methods=['GET', 'POST'])
+    def fake_config():
+        if request.method == 'POST':
+            config.update(request.get_json(silent=True) or {})
+        return jsonify(config.to_dict())
+
+    # --------------------------------------------------------------
+    # Assistants
+    # --------------------------------------------------------------
+
+    @app.route('/v1/assistants', methods=['POST'])
+    def create_assistant():
+        data = request.get_json(silent=True) or {}
+        assistant = {
+            'id': state.new_id('asst'), 'object': 'assistant', 'created_at': int(time.time()),
+            'name': data.get('name'), 'description': None, 'model': data.get('model', 'gpt-4o'),
+            'instructions': data.get('instructions'), 'tools': data.get('tools', []),
+            'metadata': {}, 'tool_resources': {}
+        }
+        with state.lock:
+            state.assistants[assistant['id']] = assistant
+        return jsonify(assistant)
+
+    @app.route('/v1/assistants/<assistant_id>', methods=['GET'])
+    def retrieve_assistant(assistant_id):
+        # Każdy identyfikator jest poprawny - aplikacja może używać ASSISTANT_ID z .env
+        with state.lock:
+            assistant = state.assistants.setdefault(assistant_id, {
+                'id': assistant_id, 'object': 'assistant', 'created_at': int(time.time()),
+                'name': 'Fake Assistant', 'description': None, 'model': 'gpt-4o',
+                'instructions': '', 'tools': [{'type': 'file_search'}], 'metadata': {}, 'tool_resources': {}
+            })
+        return jsonify(assistant)
+
+    # --------------------------------------------------------------
+    # Files
+    # --------------------------------------------------------------
+
+    @app.route('/v1/files', methods=['GET'])
+    def list_files():
+        with state.lock:
+            return page(list(state.files.values()))
+
+    @app.route('/v1/files', methods=['POST'])
+    def create_file():
+        upload = request.files.get('file')
+        size = len(upload.read()) if upload else 0
+        file_obj = {
+            'id': state.new_id('file'), 'object': 'file', 'bytes': size, 'created_at': int(time.time()),
+            'filename': upload.filename if upload else 'upload', 'purpose': request.form.get('purpose', 'assistants'),
+            'status': 'processed', 'status_details': None
+        }
+        with state.lock:
+            state.files[file_obj['id']] = file_obj
+        return jsonify(file_obj)
+
+    @app.route('/v1/files/<file_id>', methods=['DELETE'])
+    def delete_file(file_id):
+        with state.lock:
+            if state.files.pop(file_id, None) is None:
+                return not_found('file', file_id)
+        return jsonify({'id': file_id, 'object': 'file', 'deleted': True})
+
+    # --------------------------------------------------------------
+    # Vector stores
+    # --------------------------------------------------------------
+
+    def file_counts(total):
+        return {'in_progress': 0, 'completed': total, 'failed': 0, 'cancelled': 0, 'total': total}
+
+    @app.route('/v1/vector_stores', methods=['GET'])
+    def list_vector_stores():
+        with state.lock:
+            return page(list(state.vector_stores.values()))
+
+    @app.route('/v1/vector_stores', methods=['POST'])
+    def create_vector_store():
+        data = request.get_json(silent=True) or {}
+        now = int(time.time())
+        store = {
+            'id': state.new_id('vs'), 'object': 'vector_store', 'created_at': now, 'name': data.get('name'),
+            'usage_bytes': 0, 'file_counts': file_counts(0), 'status': 'completed',
+            'expires_after': None, 'expires_at': None, 'last_active_at': now, 'metadata': {},
+            'file_ids': list(data.get('file_ids') or [])
+        }
+        with state.lock:
+            state.vector_stores[store['id']] = store
+        return jsonify(store)
+
+    @app.route('/v1/vector_stores/<store_id>', methods=['DELETE'])
+    def delete_vector_store(store_id):
+        with state.lock:
+            if state.vector_stores.pop(store_id, None) is None:
+                return not_found('vector store', store_id)
+        return jsonify({'id': store_id, 'object': 'vector_store.deleted', 'deleted': True})
+
+    @app.route('/v1/vector_stores/<store_id>/file_batches', methods=['POST'])
+    def create_file_batch(store_id):
+        data = request.get_json(silent=True) or {}
+        file_ids = data.get('file_ids') or []
+        with state.lock:
+            store = state.vector_stores.get(store_id)
+            if store is None:
+                return not_found('vector store', store_id)
+            store['file_ids'].extend(file_ids)
+            store['file_counts'] = file_counts(len(store['file_ids']))
+        return jsonify({
+            'id': state.new_id('vsfb'), 'object': 'vector_store.files_batch', 'created_at': int(time.time()),
+            'vector_store_id': store_id, 'status': 'completed', 'file_counts': file_counts(len(file_ids))
+        })
+
+    # --------------------------------------------------------------
+    # Threads i runy
+    # --------------------------------------------------------------
+
+    @app.route('/v1/threads', methods=['POST'])
+    def create_thread():
+        data = request.get_json(silent=True) or {}
+        thread = {
+            'id': state.new_id('thread'), 'object': 'thread', 'created_at': int(time.time()),
+            'metadata': {}, 'tool_resources': data.get('tool_resources') or {}
+        }
+        with state.lock:
+            state.threads[thread['id']] = dict(thread, messages=list(data.get('messages') or []))
+        return jsonify(thread)
+
+    @app.route('/v1/threads/<thread_id>', methods=['DELETE'])
+    def delete_thread(thread_id):
+        with state.lock:
+            if state.threads.pop(thread_id, None) is None:
+                return not_found('thread', thread_id)
+            for run_id in [r for r, run in state.runs.items() if run['thread_id'] == thread_id]:
+                del state.runs[run_id]
+        return jsonify({'id': thread_id, 'object': 'thread.deleted', 'deleted': True})
+
+    @app.route('/v1/threads/<thread_id>/runs', methods=['GET'])
+    def list_runs(thread_id):
+        with state.lock:
+            if thread_id not in state.threads:
+                return not_found('thread', thread_id)
+            return page([r for r in state.runs.values() if r['thread_id'] == thread_id])
+
+    @app.route('/v1/threads/<thread_id>/runs/<run_id>', methods=['GET'])
+    def retrieve_run(thread_id, run_id):
+        with state.lock:
+            run = state.runs.get(run_id)
+            if run is None or run['thread_id'] != thread_id:
+                return not_found('run', run_id)
+            return jsonify(run)
+
+    @app.route('/v1/threads/<thread_id>/runs/<run_id>/cancel', methods=['POST'])
+    def cancel_run(thread_id, run_id):
+        with state.lock:
+            run = state.runs.get(run_id)
+            if run is None or run['thread_id'] != thread_id:
+                return not_found('run', run_id)
+            if run['status'] in ('queued', 'in_progress'):
+                run['status'] = 'cancelling'
+            return jsonify(run)
+
+    @app.route('/v1/threads/<thread_id>/runs', methods=['POST'])
+    def create_run(thread_id):
+        data = request.get_json(silent=True) or {}
+        with state.lock:
+            thread = state.threads.get(thread_id)
+            if thread is None:
+                return not_found('thread', thread_id)
+            messages = list(thread['messages'])
+        prompt = messages[-1].get('content', '') if messages else ''
+        if not isinstance(prompt, str):
+            prompt = json.dumps(prompt, ensure_ascii=False)
+        prompt_tokens = sum(estimate_tokens(m.get('content') if isinstance(m.get('content'), str) else '')
+                            for m in messages)
+
+        run = {
+            'id': state.new_id('run'), 'object': 'thread.run', 'created_at': int(time.time()),
+            'thread_id': thread_id, 'assistant_id': data.get('assistant_id'), 'status': 'queued',
+            'model': data.get('model') or 'gpt-4o', 'instructions': '', 'tools': [],
+            'last_error': None, 'usage': None, 'temperature': data.get('temperature'),
+            'max_completion_tokens': data.get('max_completion_tokens'), 'metadata': {}
+        }
+        with state.lock:
+            state.runs[run['id']] = run
+
+        if not data.get('stream'):
+            # Runy bez strumienia kończą się od razu (aplikacja używa tylko strumieni)
+            run['status'] = 'completed'
+            return jsonify(run)
+
+        limit = data.get('max_completion_tokens') or config.answer_tokens
+        tokens = answer_tokens(prompt, min(config.answer_tokens, int(limit)), config.seed)
+        failure = state.pick_failure(('run_failed',))
+        message_id = state.new_id('msg')
+
+        def usage(sent):
+            return {'prompt_tokens': prompt_tokens, 'completion_tokens': sent,
+                    'total_tokens': prompt_tokens + sent}
+
+        def stream():
+            with state.lock:
+                state.active_streams += 1
+            sent = 0
+            try:
+                run['status'] = 'in_progress'
+                yield sse('thread.run.created', dict(run, status='queued'))
+                yield sse('thread.run.in_progress', run)
+                time.sleep(config.first_token_ms / 1000.0)
+                yield sse('thread.message.created', {
+                    'id': message_id, 'object': 'thread.message', 'created_at': int(time.time()),
+                    'thread_id': thread_id, 'run_id': run['id'], 'role': 'assistant',
+                    'status': 'in_progress', 'content': [], 'metadata': {}
+                })
+
+                # Błąd w połowie odpowiedzi
+                fail_at = len(tokens) // 2 if failure else None
+                delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+                for index, token in enumerate(tokens):
+                    if run['status'] == 'cancelling':
+                        run['status'] = 'cancelled'
+                        run['usage'] = usage(sent)
+                        yield sse('thread.run.cancelled', run)
+                        return
+                    if index == fail_at:
+                        run['status'] = 'failed'
+                        run['last_error'] = {'code': 'server_error', 'message': 'Injected run failure'}
+                        yield sse('thread.run.failed', run)
+                        return
+                    yield sse('thread.message.delta', {
+                        'id': message_id, 'object': 'thread.message.delta',
+                        'delta': {'content': [{'index': 0, 'type': 'text', 'text': {'value': token, 'annotations': []}}]}
+                    })
+                    sent += 1
+                    if delay:
+                        time.sleep(delay)
+
+                yield sse('thread.message.completed', {
+                    'id': message_id, 'object': 'thread.message', 'created_at': int(time.time()),
+                    'thread_id': thread_id, 'run_id': run['id'], 'role': 'assistant', 'status': 'completed',
+                    'content': [{'type': 'text', 'text': {'value': ''.join(tokens), 'annotations': []}}],
+                    'metadata': {}
+                })
+                run['status'] = 'completed'
+                run['usage'] = usage(sent)
+                yield sse('thread.run.completed', run)
+                yield sse('done', '[DONE]')
+            finally:
+                if run['status'] in ('queued', 'in_progress', 'cancelling'):
+                    # Klient zamknął połączenie przed końcem runu - jak w API, anulowany
+                    # run ma usage za wygenerowane dotąd tokeny
+                    run['status'] = 'cancelled'
+                    run['usage'] = usage(sent)
+                with state.lock:
+                    state.active_streams -= 1
+                    state.tokens_streamed += sent
+
+        return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    # --------------------------------------------------------------
+    # Chat completions
+    # --------------------------------------------------------------
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    def chat_completions():
+        data = request.get_json(silent=True) or {}
+        messages = data.get('messages') or []
+        system = ' '.join(m.get('content', '') for m in messages if m.get('role') == 'system')
+        prompt = messages[-1].get('content', '') if messages else ''
+        prompt_tokens = sum(estimate_tokens(m.get('content', '')) for m in messages)
+        completion_id = state.new_id('chatcmpl')
+        model = data.get('model', 'gpt-4o')
+
+        if 'JSON' in system:
+            tokens = [json.dumps(ATPL_STRUCTURE, ensure_ascii=False)]
+        else:
+            limit = data.get('max_tokens') or data.get('max_completion_tokens') or config.answer_tokens
+            tokens = answer_tokens(prompt, min(config.answer_tokens, int(limit)), config.seed)
+        delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+
+        if data.get('stream'):
+            def stream():
+                for token in tokens:
+                    yield 'data: ' + json.dumps({
+                        'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                        'model': model, 'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]
+                    }, ensure_ascii=False) + '\n\n'
+                    if delay:
+                        time.sleep(delay)
+                yield 'data: ' + json.dumps({
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                    'model': model, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+                }) + '\n\n'
+                yield 'data: [DONE]\n\n'
+            return Response(stream(), mimetype='text/event-stream')
+
+        # Bez strumienia klient czeka na całą odpowiedź
+        time.sleep(config.first_token_ms / 1000.0 + delay * len(tokens))
+        with state.lock:
+            state.tokens_streamed += len(tokens)
+        return jsonify({
+            'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                         'finish_reason': 'stop', 'logprobs': None}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                      'total_tokens': prompt_tokens + len(tokens)}
+        })
+
+    return app
+
+
+def make_fake_openai_server(host: str = '127.0.0.1', port: int = 0, config: FakeOpenAIConfig = None,
+                            quiet: bool = True):
+    """Tworzy serwer HTTP (wielowątkowy); quiet wyłącza log każdego żądania"""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    return make_server(host, port, create_fake_openai_app(config), threaded=True,
+                       request_handler=QuietRequestHandler if quiet else None)
+
+
+def start_fake_openai_server(host: str = '127.0.0.1', port: int = 0, config: FakeOpenAIConfig = None):
+    """Uruchamia serwer w wątku w tle; zwraca (serwer, base_url)"""
+    server = make_fake_openai_server(host, port, config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_port}/v1'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lokalny serwer udający OpenAI API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('FAKE_OPENAI_PORT', 8765)))
+    parser.add_argument('--latency-ms', type=float, help='Opóźnienie każdego żądania')
+    parser.add_argument('--first-token-ms', type=float, help='Czas do pierwszego tokenu runu')
+    parser.add_argument('--tokens-per-second', type=float, help='Szybkość strumieniowania (0 = bez limitu)')
+    parser.add_argument('--answer-tokens', type=int, help='Długość odpowiedzi w tokenach')
+    parser.add_argument('--failure-rate', type=float, help='Odsetek żądań kończących się błędem (0-1)')
+    parser.add_argument('--failure-kinds', help=f'Rodzaje błędów: {",".join(FAILURE_KINDS)}')
+    parser.add_argument('--seed', type=int, help='Ziarno losowania (powtarzalność)')
+    parser.add_argument('--quiet', action='store_true', help='Nie loguj każdego żądania')
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig()
+    overrides = {k: v for k, v in vars(args).items() if v is not None and k not in ('host', 'port', 'quiet')}
+    if 'failure_kinds' in overrides:
+        overrides['failure_kinds'] = overrides['failure_kinds'].split(',')
+    config.update(overrides)
+
+    server = make_fake_openai_server(args.host, args.port, config, quiet=args.quiet)
+    print(f"🧪 Fake OpenAI API: http://{args.host}:{server.server_port}/v1")
+    print(f"⚙️  {json.dumps(config.to_dict(), ensure_ascii=False)}")
+    print(f"💡 OPENAI_BASE_URL=http://{args.host}:{server.server_port}/v1 OPENAI_API_KEY=sk-fake python run.py")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Zatrzymano serwer")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generator syntetycznych danych aplikacji (historia, feedback, sesje użytkowników)
+
+Tworzy w katalogu docelowym drzewa history/, feedback/ i data/ w tych samych
+formatach, które zapisuje aplikacja, dla zadanej liczby użytkowników, sesji
+i wiadomości. Dane służą do testów wydajności analityki, raportów uczenia się
+i eksportu danych treningowych (zob. benchmark_analytics.py).
+
+Użycie:
+    python generate_synthetic_corpus.py --output /tmp/corpus --users 50 --sessions 1000
+"""
+import os
+import json
+import uuid
+import random
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from werkzeug.security import generate_password_hash
+
+from utils.topic_tagger import tag_topics
+
+CORPUS_INFO_FILE = 'corpus.json'
+SYNTHETIC_PASSWORD = 'synthetic123'
+
+# Pytania budowane z szablonów - słowa kluczowe trafiają w tematy topic_tagger
+QUESTION_TEMPLATES = [
+    "Wyjaśnij czym jest {subject} i jak wpływa na {context}.",
+    "Jakie są najważniejsze zasady dotyczące {subject}?",
+    "Czym różni się {subject} od {other}?",
+    "Jak obliczyć {subject} w warunkach {context}?",
+    "Podaj przykład pytania egzaminacyjnego ATPL o {subject}.",
+    "Co mówią przepisy EASA o {subject}?",
+    "Dlaczego {subject} jest istotny podczas {context}?",
+    "Opisz procedurę związaną z {subject} krok po kroku.",
+]
+
+SUBJECTS = [
+    'siła nośna', 'kąt natarcia', 'przeciągnięcie', 'opór indukowany', 'profil skrzydła',
+    'nawigacja VOR', 'podejście ILS', 'namierzanie NDB', 'kurs magnetyczny', 'pozycja GPS',
+    'ciśnienie QNH', 'oblodzenie', 'turbulencja', 'komunikat METAR', 'prognoza TAF',
+    'silnik tłokowy', 'turbina gazowa', 'zużycie paliwa', 'moc silnika', 'śmigło nastawne',
+    'instalacja hydrauliczna', 'transponder', 'autopilot', 'altimetr', 'procedury awaryjne',
+    'frazeologia radiowa', 'kontrola ruchu ATC', 'licencja PPL', 'wytrzymałość kadłuba', 'podwozie',
+]
+
+CONTEXTS = [
+    'lotu w chmurach', 'startu z krótkiego pasa', 'lądowania przy bocznym wietrze',
+    'przelotu nad górami', 'lotu nocnego', 'podejścia nieprecyzyjnego', 'wznoszenia',
+]
+
+FOLLOW_UPS = [
+    "Możesz to rozwinąć?", "Podaj więcej szczegółów.", "A jak to wygląda w praktyce?",
+    "Dlaczego tak jest?", "Wyjaśnij to prościej.", "Jakie są typowe błędy?",
+]
+
+ANSWER_SECTIONS = [
+    "Zasada działania", "Wzory i zależności", "Zastosowanie w praktyce",
+    "Typowe błędy", "Wymagania egzaminacyjne", "Podsumowanie",
+]
+
+ANSWER_SENTENCES = [
+    "W praktyce lotniczej {subject} ma bezpośredni wpływ na bezpieczeństwo lotu.",
+    "Pilot powinien uwzględnić {subject} już na etapie planowania.",
+    "Podręczniki ATPL omawiają {subject} w kontekście osiągów samolotu.",
+    "Zmiana warunków atmosferycznych modyfikuje {subject} w sposób nieliniowy.",
+    "Na egzaminie pojawiają się pytania łączące {subject} z meteorologią i nawigacją.",
+    "Dokumentacja producenta określa dopuszczalne wartości dla {subject}.",
+]
+
+FEEDBACK_COMMENTS = [
+    "Bardzo pomocne", "Za mało szczegółów", "Brakuje przykładu", "Świetne wyjaśnienie",
+    "Odpowiedź zbyt długa", "Proszę o źródła", "",
+]
+
+
+class CorpusGenerator:
+    """Generuje spójny zestaw danych syntetycznych"""
+
+    def __init__(self, output_dir: str, users: int = 50, sessions: int = 1000,
+                 messages: int = 6, days: int = 30, feedback_rate: float = 0.3,
+                 repeat_rate: float = 0.2, seed: int = 42, end_time: datetime = None):
+        self.output_dir = output_dir
+        self.users = max(1, users)
+        self.sessions = max(0, sessions)
+        self.messages = max(1, messages)
+        self.days = max(1, days)
+        self.feedback_rate = feedback_rate
+        self.repeat_rate = repeat_rate
+        self.seed = seed
+        self.end_time = end_time or datetime.now()
+        self.random = random.Random(seed)
+        self._asked = []
+
+    # ------------------------------------------------------------------
+    # Treść
+    # ------------------------------------------------------------------
+
+    def _question(self) -> str:
+        if self._asked and self.random.random() < self.repeat_rate:
+            # Powtarzające się pytania tworzą klastry w indeksie pytań
+            return self.random.choice(self._asked)
+        question = self.random.choice(QUESTION_TEMPLATES).format(
+            subject=self.random.choice(SUBJECTS),
+            other=self.random.choice(SUBJECTS),
+            context=self.random.choice(CONTEXTS)
+        )
+        if len(self._asked) < 500:
+            self._asked.append(question)
+        return question
+
+    def _answer(self, question: str) -> str:
+        subject = next((s for s in SUBJECTS if s in question), self.random.choice(SUBJECTS))
+        parts = [f"## {subject.capitalize()}"]
+        for heading in self.random.sample(ANSWER_SECTIONS, self.random.randint(2, 4)):
+            parts.append(f"### {heading}")
+            sentences = [self.random.choice(ANSWER_SENTENCES).format(subject=subject)
+                         for _ in range(self.random.randint(2, 5))]
+            parts.append(' '.join(sentences))
+            if self.random.random() < 0.4:
+                parts.append('\n'.join(f"- {self.random.choice(SUBJECTS)}" for _ in range(3)))
+        return '\n\n'.join(parts)
+
+    # ------------------------------------------------------------------
+    # Struktura danych
+    # ------------------------------------------------------------------
+
+    def _make_users(self) -> List[Dict]:
+        # Jeden hash dla wszystkich kont - haszowanie hasła jest celowo kosztowne
+        password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+        created = (self.end_time - timedelta(days=self.days + 7)).isoformat()
+        users = [{
+            'id': 'admin',
+            'username': 'admin',
+            'password_hash': generate_password_hash('admin123'),
+            'role': 'admin',
+            'created_at': created
+        }]
+        for i in range(self.users):
+            users.append({
+                'id': str(uuid.UUID(int=self.random.getrandbits(128))),
+                'username': f'pilot{i + 1:04d}',
+                'password_hash': password_hash,
+                'role': 'user',
+                'created_at': created
+            })
+        return users
+
+    def _session_start(self) -> datetime:
+        # Więcej ruchu w ostatnich dniach i w godzinach 8-22
+        day = min(int(self.random.expovariate(3.0 / self.days)), self.days - 1)
+        start = (self.end_time - timedelta(days=day)).replace(
+            hour=self.random.randint(8, 21), minute=self.random.randint(0, 59),
+            second=self.random.randint(0, 59), microsecond=0
+        )
+        if start > self.end_time:
+            start = self.end_time - timedelta(minutes=self.random.randint(5, 120))
+        return start
+
+    def _make_session(self, user_id: str) -> Dict:
+        session_id = str(uuid.UUID(int=self.random.getrandbits(128)))
+        moment = self._session_start()
+        turns = max(1, int(self.random.gauss(self.messages / 2, self.messages / 4)))
+
+        history = []
+        question = self._question()
+        for turn in range(turns):
+            if turn > 0:
+                question = self.random.choice(FOLLOW_UPS) if self.random.random() < 0.4 else self._question()
+            history.append({
+                'role': 'user',
+                'content': question,
+                'timestamp': moment.isoformat(),
+                'user_id': user_id,
+                'topics': tag_topics(question)
+            })
+            moment += timedelta(seconds=self.random.randint(5, 40))
+            history.append({
+                'role': 'assistant',
+                'content': self._answer(question),
+                'timestamp': moment.isoformat(),
+                'user_id': user_id
+            })
+            moment += timedelta(seconds=self.random.randint(20, 300))
+
+        return {
+            'session_id': session_id,
+            'user_id': user_id,
+            'title': history[0]['content'][:50] + ('...' if len(history[0]['content']) > 50 else ''),
+            'history': history
+        }
+
+    def _make_feedback(self, session: Dict) -> Dict[str, List[Dict]]:
+        """Zwraca pliki feedbacku sesji w formatach zapisywanych przez aplikację"""
+        files = {}
+        session_id = session['session_id']
+        user_id = session['user_id']
+        answers = [m for m in session['history'] if m['role'] == 'assistant']
+
+        for index, answer in enumerate(answers):
+            if self.random.random() >= self.feedback_rate:
+                continue
+            given_at = (datetime.fromisoformat(answer['timestamp']) +
+                        timedelta(seconds=self.random.randint(5, 120))).isoformat()
+            message_id = f'msg_{session_id[:8]}_{index}'
+            kind = self.random.choices(['positive', 'negative', 'improve'], weights=[6, 3, 1])[0]
+
+            # /api/feedback (ChatSession.save_feedback) - feedback/<sesja>.json
+            files.setdefault(f'{session_id}.json', []).append({
+                'timestamp': given_at,
+                'type': kind,
+                'content': self.random.choice(FEEDBACK_COMMENTS),
+                'message_id': message_id,
+                'user_id': user_id
+            })
+
+            # Socket.IO 'feedback' - feedback/<sesja>/feedback.json
+            files.setdefault(f'{session_id}/feedback.json', []).append({
+                'session_id': session_id,
+                'message_id': message_id,
+                'section_id': f'{message_id}_section_0',
+                'feedback_type': 'negative' if kind == 'negative' else 'positive',
+                'section_type': 'paragraph',
+                'content': answer['content'][:500],
+                'description': self.random.choice(FEEDBACK_COMMENTS),
+                'timestamp': given_at,
+                'type': 'section_with_comment',
+                'user_id': user_id
+            })
+
+            # Socket.IO 'detailed_feedback' - feedback/<sesja>/detailed_feedback.json
+            if self.random.random() < 0.3:
+                files.setdefault(f'{session_id}/detailed_feedback.json', []).append({
+                    'session_id': session_id,
+                    'section_id': f'{message_id}_section_{self.random.randint(1, 5)}',
+                    'section_type': self.random.choice(['paragraph', 'list', 'heading']),
+                    'feedback_type': 'negative' if kind == 'negative' else 'positive',
+                    'content': answer['content'][:200],
+                    'description': self.random.choice(FEEDBACK_COMMENTS),
+                    'timestamp': given_at,
+                    'type': 'detailed',
+                    'user_id': user_id
+                })
+        return files
+
+    def _write_json(self, relative_path: str, data):
+        path = os.path.join(self.output_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def generate(self, verbose: bool = True) -> Dict:
+        """Zapisuje dane na dysk i zwraca podsumowanie"""
+        started = time.time()
+        users = self._make_users()
+        self._write_json('data/users.json', users)
+
+        regular_users = [u['id'] for u in users if u['role'] == 'user']
+        # Rozkład Zipfa - kilku bardzo aktywnych użytkowników, długi ogon
+        weights = [1.0 / (rank + 1) for rank in range(len(regular_users))]
+
+        user_sessions = {}
+        totals = {'messages': 0, 'feedback_entries': 0, 'feedback_files': 0}
+        progress_every = max(1, self.sessions // 10)
+
+        for number in range(self.sessions):
+            user_id = self.random.choices(regular_users, weights=weights)[0]
+            session = self._make_session(user_id)
+            history = session['history']
+            self._write_json(f"history/{session['session_id']}.json", history)
+            totals['messages'] += len(history)
+
+            for relative_path, entries in self._make_feedback(session).items():
+                self._write_json(f'feedback/{relative_path}', entries)
+                totals['feedback_files'] += 1
+                totals['feedback_entries'] += len(entries)
+
+            user_sessions.setdefault(user_id, []).append({
+                'session_id': session['session_id'],
+                'title': session['title'],
+                'created_at': history[0]['timestamp'],
+                'updated_at': history[-1]['timestamp']
+            })
+
+            if verbose and (number + 1) % progress_every == 0:
+                print(f"📝 Wygenerowano {number + 1}/{self.sessions} sesji")
+
+        for user_id, sessions in user_sessions.items():
+            self._write_json(f'data/user_sessions/{user_id}.json', sessions)
+
+        info = {
+            'generated_at': datetime.now().isoformat(),
+            'end_time': self.end_time.isoformat(),
+            'users': self.users,
+            'sessions': self.sessions,
+            'messages_per_session': self.messages,
+            'days': self.days,
+            'feedback_rate': self.feedback_rate,
+            'repeat_rate': self.repeat_rate,
+            'seed': self.seed,
+            'totals': totals,
+            'generation_seconds': round(time.time() - started, 2)
+        }
+        self._write_json(CORPUS_INFO_FILE, info)
+        if verbose:
+            print(f"✅ Korpus zapisany w {self.output_dir}: {self.sessions} sesji, "
+                  f"{totals['messages']} wiadomości, {totals['feedback_entries']} feedbacków "
+                  f"({info['generation_seconds']}s)")
+        return info
+
+
+def load_corpus_info(output_dir: str) -> Dict:
+    """Zwraca opis istniejącego korpusu (lub pusty słownik)"""
+    path = os.path.join(output_dir, CORPUS_INFO_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generator syntetycznych danych aplikacji')
+    parser.add_argument('--output', required=True, help='Katalog docelowy (history/, feedback/, data/)')
+    parser.add_argument('--users', type=int, default=50, help='Liczba użytkowników')
+    parser.add_argument('--sessions', type=int, default=1000, help='Liczba sesji')
+    parser.add_argument('--messages', type=int, default=6, help='Średnia liczba wiadomości w sesji')
+    parser.add_argument('--days', type=int, default=30, help='Zakres dni wstecz od teraz')
+    parser.add_argument('--feedback-rate', type=float, default=0.3,
+                        help='Prawdopodobieństwo feedbacku do odpowiedzi')
+    parser.add_argument('--repeat-rate', type=float, default=0.2,
+                        help='Udział powtarzających się pytań')
+    parser.add_argument('--seed', type=int, default=42, help='Ziarno generatora')
+    args = parser.parse_args()
+
+    if os.path.exists(os.path.join(args.output, 'history')):
+        print(f"⚠️  Katalog {args.output} zawiera już dane - nowe pliki zostaną dopisane")
+
+    CorpusGenerator(
+        args.output, users=args.users, sessions=args.sessions, messages=args.messages,
+        days=args.days, feedback_rate=args.feedback_rate, repeat_rate=args.repeat_rate,
+        seed=args.seed
+    ).generate()
+
+
+if __name__ == '__main__':
+    main()
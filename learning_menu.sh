@@ -48,6 +48,7 @@ case $choice in
         read -p "Czy na pewno chcesz usunąć wszystkie dane uczenia się? (y/N): " confirm
         if [[ $confirm == [yY] ]]; then
             rm -f data/learning_data.json
+            rm -rf data/learning_log data/learning_profiles data/user_preferences
             rm -f data/user_preferences.json
             rm -f data/user_patterns.json
             rm -f data/learning_report.json
@@ -135,42 +135,45 @@ class LearningMonitor:
         print("="*60)
         
         # Sprawdź dane uczenia się
-        if os.path.exists(self.learning_system.learning_data_file):
-            try:
-                with open(self.learning_system.learning_data_file, 'r', encoding='utf-8') as f:
-                    learning_data = json.load(f)
+        try:
+            learning_data = self.learning_system.get_recent_learning_data()
+            if learning_data:
                 print(f"📚 Dane uczenia się: {len(learning_data)} sesji przeanalizowanych")
                 
-                if learning_data:
-                    latest = learning_data[-1]
-                    print(f"📅 Ostatnia analiza: {latest.get('timestamp', 'N/A')}")
-                    print(f"💬 Ostatnia sesja: {latest.get('session_id', 'N/A')}")
-                    print(f"📝 Liczba wiadomości: {latest.get('total_messages', 0)}")
-            except Exception as e:
-                print(f"❌ Błąd wczytywania danych uczenia: {e}")
-        else:
-            print("⚠️  Brak danych uczenia się")
+                latest = learning_data[-1]
+                print(f"📅 Ostatnia analiza: {latest.get('timestamp', 'N/A')}")
+                print(f"💬 Ostatnia sesja: {latest.get('session_id', 'N/A')}")
+                print(f"📝 Liczba wiadomości: {latest.get('total_messages', 0)}")
+            else:
+                print("⚠️  Brak danych uczenia się")
+        except Exception as e:
+            print(f"❌ Błąd wczytywania danych uczenia: {e}")
         
         # Sprawdź preferencje
-        if os.path.exists(self.learning_system.preferences_file):
-            try:
-                with open(self.learning_system.preferences_file, 'r', encoding='utf-8') as f:
-                    preferences = json.load(f)
-                print(f"🎯 Preferencje użytkowników: {len(preferences)} sesji")
+        try:
+            records = self.learning_system.preference_store.all_records()
+            if records:
+                print(f"🎯 Preferencje użytkowników: {len(records)} użytkowników")
                 
                 # Podsumowanie preferencji
-                total_examples = sum(1 for p in preferences.values() if p.get('prefers_examples', False))
-                total_procedures = sum(1 for p in preferences.values() if p.get('prefers_procedures', False))
-                total_theory = sum(1 for p in preferences.values() if p.get('prefers_theory', False))
+                # Preferencja użytkownika: nadpisanie ogólne lub w którejkolwiek z jego sesji
+                preferences = []
+                for record in records:
+                    flags = dict(record.get('overrides', {}))
+                    for session_flags in record.get('sessions', {}).values():
+                        flags.update({key: True for key, value in session_flags.items() if value is True})
+                    preferences.append(flags)
+                total_examples = sum(1 for p in preferences if p.get('prefers_examples', False))
+                total_procedures = sum(1 for p in preferences if p.get('prefers_procedures', False))
+                total_theory = sum(1 for p in preferences if p.get('prefers_theory', False))
                 
                 print(f"  📊 Preferują przykłady: {total_examples}/{len(preferences)}")
                 print(f"  📋 Preferują procedury: {total_procedures}/{len(preferences)}")
                 print(f"  🧠 Preferują teorię: {total_theory}/{len(preferences)}")
-                
-            except Exception as e:
-                print(f"❌ Błąd wczytywania preferencji: {e}")
-        else:
-            print("⚠️  Brak zapisanych preferencji")
+            else:
+                print("⚠️  Brak zapisanych preferencji")
+        except Exception as e:
+            print(f"❌ Błąd wczytywania preferencji: {e}")
         
         # Sprawdź aktywne sesje
         history_dir = 'history'
@@ -196,35 +199,13 @@ class LearningMonitor:
         """Usuwa stare dane uczenia się"""
         print(f"🧹 Czyszczenie danych starszych niż {days_old} dni...")
         
-        cleanup_count = 0
-        
         # Wyczyść stare dane uczenia się
-        if os.path.exists(self.learning_system.learning_data_file):
-            try:
-                with open(self.learning_system.learning_data_file, 'r', encoding='utf-8') as f:
-                    learning_data = json.load(f)
-                
-                cutoff_date = datetime.now() - timedelta(days=days_old)
-                new_data = []
-                
-                for data in learning_data:
-                    try:
-                        data_date = datetime.fromisoformat(data.get('timestamp', ''))
-                        if data_date > cutoff_date:
-                            new_data.append(data)
-                        else:
-                            cleanup_count += 1
-                    except:
-                        # Zachowaj dane z nieprawidłową datą
-                        new_data.append(data)
-                
-                if cleanup_count > 0:
-                    with open(self.learning_system.learning_data_file, 'w', encoding='utf-8') as f:
-                        json.dump(new_data, f, ensure_ascii=False, indent=2)
-                    print(f"🗑️  Usunięto {cleanup_count} starych zapisów uczenia się")
-                
-            except Exception as e:
-                print(f"❌ Błąd podczas czyszczenia danych uczenia: {e}")
+        try:
+            cleanup_count = self.learning_system.learning_log.cleanup(days_old)
+            if cleanup_count > 0:
+                print(f"🗑️  Usunięto {cleanup_count} starych zapisów uczenia się")
+        except Exception as e:
+            print(f"❌ Błąd podczas czyszczenia danych uczenia: {e}")
         
         print("✅ Czyszczenie zakończone")
 
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test obciążeniowy czatu przez Socket.IO
+
+Loguje N użytkowników, tworzy każdemu sesję przez /api/sessions i wysyła
+wiadomości send_message z zadaną częstotliwością (jedna wiadomość w toku na
+użytkownika, jak w interfejsie). Dla każdej wiadomości mierzy czas do
+message_received, pierwszego response_chunk i response_complete, a na końcu
+zapisuje raport JSON z przepustowością, percentylami opóźnień i błędami.
+
+Harmonogram wysyłek jest otwarty (czasy kolejnych wiadomości nie zależą od
+odpowiedzi serwera). Jeśli w chwili wysyłki wszyscy użytkownicy czekają na
+odpowiedź, wiadomość przepada - raport podaje wtedy osiągniętą częstotliwość
+obok docelowej, a test kończy się kodem 1, gdy przepadło więcej niż
+--rate-tolerance zaplanowanych wiadomości (trzeba zwiększyć --users).
+
+Przykład (aplikacja podłączona do fake_openai_server.py):
+    python load_test.py --url http://localhost:5000 --users 20 --rate 2 --duration 60 \\
+        --admin-user admin --admin-password admin123 --output load_report.json
+
+Wymaga klienta Socket.IO: pip install "python-socketio[client]"
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from datetime import datetime
+
+DEFAULT_QUESTIONS = [
+    'Jak działa radiolatarnia VOR i jak odczytać radial?',
+    'Czym różni się podejście ILS kategorii I od kategorii II?',
+    'Jakie są minima VFR w przestrzeni klasy G?',
+    'Od czego zależy siła nośna skrzydła?',
+    'Jak obliczyć środek ciężkości samolotu przed lotem?',
+    'Co to jest przeciągnięcie i jak z niego wyprowadzić samolot?',
+    'Jak działa altimetr i jakie są nastawy QNH oraz QNE?',
+    'Jakie zjawiska pogodowe towarzyszą przejściu frontu chłodnego?',
+    'Jakie dokumenty muszą być na pokładzie samolotu według EASA?',
+    'Jak wpływa oblodzenie na osiągi samolotu?',
+    'Co oznacza skrót METAR i jak go odczytać?',
+    'Jakie są zasady korzystania z transpondera w kodzie 7700?'
+]
+
+
+def percentile(values, p):
+    """Percentyl z interpolacją liniową (p w zakresie 0-100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def latency_summary(values):
+    """Podsumowanie opóźnień w sekundach"""
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 4),
+        'p50': round(percentile(values, 50), 4),
+        'p90': round(percentile(values, 90), 4),
+        'p95': round(percentile(values, 95), 4),
+        'p99': round(percentile(values, 99), 4),
+        'max': round(max(values), 4)
+    }
+
+
+def provision_users(requests_module, base_url, admin_user, admin_password, usernames, password):
+    """Loguje administratora i zakłada konta (istniejące są pomijane); zwraca sesję administratora"""
+    admin = requests_module.Session()
+    response = admin.post(f'{base_url}/login', allow_redirects=False,
+                          data={'username': admin_user, 'password': admin_password})
+    if response.status_code != 302:
+        raise RuntimeError('Logowanie administratora nie powiodło się')
+    for username in usernames:
+        admin.post(f'{base_url}/admin/users/add', allow_redirects=False, data={
+            'username': username, 'password': password, 'role': 'user'
+        })
+    return admin
+
+
+class MessageProbe:
+    """Pomiar czasu jednej wiadomości"""
+
+    def __init__(self, message_id, user_index, question):
+        self.message_id = message_id
+        self.user_index = user_index
+        self.question = question
+        self.sent_at = time.monotonic()
+        self.received_at = None
+        self.first_chunk_at = None
+        self.completed_at = None
+        self.chars = 0
+        self.frames = 0
+        self.outcome = None
+        self.error = None
+        self.queued = False
+        self.cached = False
+        self.done = threading.Event()
+
+    def finish(self, outcome, error=None):
+        if self.outcome is None:
+            self.outcome = outcome
+            self.error = error
+            self.done.set()
+
+    def to_dict(self):
+        def since(t):
+            return round(t - self.sent_at, 4) if t is not None else None
+        return {
+            'message_id': self.message_id,
+            'user': self.user_index,
+            'outcome': self.outcome,
+            'error': self.error,
+            'queued': self.queued,
+            'cached': self.cached,
+            'message_received': since(self.received_at),
+            'first_chunk': since(self.first_chunk_at),
+            'complete': since(self.completed_at),
+            'chars': self.chars,
+            'frames': self.frames
+        }
+
+
+class VirtualUser:
+    """Użytkownik testu: sesja HTTP (ciasteczka logowania) i połączenie Socket.IO"""
+
+    def __init__(self, index, base_url, username, password, socketio_module, requests_module,
+                 session_title=None):
+        self.index = index
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.session_title = session_title
+        self.http = requests_module.Session()
+        self.sio = socketio_module.Client(http_session=self.http, reconnection=False)
+        self.session_id = None
+        self.current = None
+        self._register_handlers()
+
+    def login(self):
+        response = self.http.post(f'{self.base_url}/login', allow_redirects=False,
+                                  data={'username': self.username, 'password': self.password})
+        if response.status_code != 302 or 'login' in response.headers.get('Location', '').split('?')[0]:
+            raise RuntimeError(f'Logowanie {self.username} nie powiodło się ({response.status_code})')
+
+        # Nowa sesja czatu dla użytkownika testu
+        response = self.http.post(f'{self.base_url}/api/sessions',
+                                  json={'title': self.session_title or f'Test obciążeniowy {datetime.now().strftime("%H:%M:%S")}'})
+        response.raise_for_status()
+        self.session_id = response.json()['session_id']
+        self.http.post(f'{self.base_url}/api/current_session', json={'session_id': self.session_id}).raise_for_status()
+
+        self.sio.connect(self.base_url, transports=['websocket'], wait_timeout=10)
+
+    def _probe(self, data):
+        probe = self.current
+        if probe and (not isinstance(data, dict) or data.get('message_id') in (None, probe.message_id)):
+            return probe
+        return None
+
+    def _register_handlers(self):
+        sio = self.sio
+
+        @sio.on('message_received')
+        def on_received(data):
+            probe = self._probe(data)
+            if probe and probe.received_at is None:
+                probe.received_at = time.monotonic()
+
+        @sio.on('queued')
+        def on_queued(data):
+            probe = self._probe(data)
+            if probe:
+                probe.queued = True
+
+        @sio.on('response_chunk')
+        def on_chunk(data):
+            probe = self._probe(data)
+            if probe:
+                if probe.first_chunk_at is None:
+                    probe.first_chunk_at = time.monotonic()
+                probe.chars += len(data.get('chunk', ''))
+                probe.frames += 1
+
+        @sio.on('response_complete')
+        def on_complete(data):
+            probe = self._probe(data)
+            if probe:
+                probe.completed_at = time.monotonic()
+                probe.cached = bool(data.get('cached'))
+                probe.finish('ok')
+
+        @sio.on('busy')
+        def on_busy(data):
+            probe = self._probe(data)
+            if probe:
+                probe.finish('busy')
+
+        @sio.on('generation_cancelled')
+        def on_cancelled(data):
+            probe = self._probe(data)
+            if probe:
+                probe.finish('cancelled')
+
+        @sio.on('error')
+        def on_error(data):
+            probe = self._probe(data)
+            if probe:
+                probe.finish('error', (data or {}).get('message'))
+
+        @sio.on('disconnect')
+        def on_disconnect():
+            probe = self.current
+            if probe:
+                probe.finish('disconnected')
+
+    def send(self, question):
+        probe = MessageProbe(str(uuid.uuid4()), self.index, question)
+        self.current = probe
+        self.sio.emit('send_message', {'message': question, 'message_id': probe.message_id, 'slim_complete': True})
+        return probe
+
+    def close(self):
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+class LoadTest:
+    """Generator ruchu: wiadomości z zadaną częstotliwością do wolnych użytkowników"""
+
+    def __init__(self, args, socketio_module, requests_module):
+        self.args = args
+        self.socketio = socketio_module
+        self.requests = requests_module
+        self.random = random.Random(args.seed)
+        self.users = []
+        self.probes = []
+        self.skipped = 0
+        self.lock = threading.Lock()
+        self.questions = DEFAULT_QUESTIONS
+        if args.questions:
+            with open(args.questions, 'r', encoding='utf-8') as f:
+                self.questions = [line.strip() for line in f if line.strip()]
+
+    def provision_users(self):
+        """Tworzy użytkowników testu przez panel administratora (istniejący są pomijani)"""
+        usernames = [f'{self.args.user_prefix}{i}' for i in range(self.args.users)]
+        return provision_users(self.requests, self.args.url, self.args.admin_user, self.args.admin_password,
+                               usernames, self.args.user_password)
+
+    def connect_users(self):
+        errors = []
+
+        def connect(i):
+            user = VirtualUser(i, self.args.url, f'{self.args.user_prefix}{i}', self.args.user_password,
+                               self.socketio, self.requests)
+            try:
+                user.login()
+                with self.lock:
+                    self.users.append(user)
+            except Exception as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=connect, args=(i,)) for i in range(self.args.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            print(f"⚠️  Nie połączono {len(errors)} użytkowników, np.: {errors[0]}")
+        print(f"🔌 Połączono {len(self.users)}/{self.args.users} użytkowników")
+
+    def next_question(self, n):
+        question = self.random.choice(self.questions)
+        if self.args.unique:
+            # Warianty pytań nie są łączone w jedno generowanie i rzadziej trafiają w cache
+            question = f'{question} (wariant {n})'
+        return question
+
+    def drive(self):
+        """Wysyła wiadomości przez zadany czas z częstotliwością --rate na sekundę"""
+        interval = 1.0 / self.args.rate
+        deadline = time.monotonic() + self.args.duration
+        next_at = time.monotonic()
+        n = 0
+        while time.monotonic() < deadline:
+            idle = [u for u in self.users if u.current is None or u.current.done.is_set()]
+            if idle:
+                user = self.random.choice(idle)
+                probe = user.send(self.next_question(n))
+                with self.lock:
+                    self.probes.append(probe)
+                n += 1
+            else:
+                # Wszyscy użytkownicy czekają na odpowiedź - klient nie nadąża z ruchem
+                self.skipped += 1
+
+            gap = self.random.expovariate(self.args.rate) if self.args.arrival == 'poisson' else interval
+            next_at += gap
+            time.sleep(max(0.0, next_at - time.monotonic()))
+
+    def wait_for_inflight(self):
+        deadline = time.monotonic() + self.args.timeout
+        for probe in list(self.probes):
+            remaining = deadline - time.monotonic()
+            if not probe.done.wait(max(0.0, remaining)):
+                probe.finish('timeout')
+
+    def report(self, started, finished, server_stats=None):
+        probes = [p.to_dict() for p in self.probes]
+        ok = [p for p in probes if p['outcome'] == 'ok']
+        outcomes = {}
+        for p in probes:
+            outcomes[p['outcome']] = outcomes.get(p['outcome'], 0) + 1
+        wall = finished - started
+        report = {
+            'generated_at': datetime.now().isoformat(),
+            'config': {
+                'url': self.args.url,
+                'users': self.args.users,
+                'connected_users': len(self.users),
+                'rate': self.args.rate,
+                'arrival': self.args.arrival,
+                'duration': self.args.duration,
+                'unique_questions': self.args.unique
+            },
+            'wall_seconds': round(wall, 2),
+            'scheduled': len(probes) + self.skipped,
+            'sent': len(probes),
+            'skipped_no_idle_user': self.skipped,
+            'rate': {
+                'target_per_second': self.args.rate,
+                'achieved_per_second': round(len(probes) / self.args.duration, 3),
+                'skipped_fraction': round(self.skipped / (len(probes) + self.skipped), 4) if probes or self.skipped else 0.0,
+                'tolerance': self.args.rate_tolerance
+            },
+            'outcomes': outcomes,
+            'error_rate': round(1 - len(ok) / len(probes), 4) if probes else 0.0,
+            'throughput': {
+                'sent_per_second': round(len(probes) / self.args.duration, 3),
+                'completed_per_second': round(len(ok) / wall, 3) if wall else 0.0,
+                'chars_per_second': round(sum(p['chars'] for p in ok) / wall, 1) if wall else 0.0
+            },
+            'latency_seconds': {
+                'message_received': latency_summary([p['message_received'] for p in probes if p['message_received'] is not None]),
+                'first_chunk': latency_summary([p['first_chunk'] for p in ok if p['first_chunk'] is not None]),
+                'complete': latency_summary([p['complete'] for p in ok if p['complete'] is not None])
+            },
+            'queued': sum(1 for p in probes if p['queued']),
+            'cached': sum(1 for p in ok if p['cached']),
+            'errors': sorted({p['error'] for p in probes if p['error']})[:20]
+        }
+        if server_stats is not None:
+            report['server_streaming_stats'] = server_stats
+        if self.args.include_messages:
+            report['messages'] = probes
+        return report
+
+    def run(self):
+        admin = self.provision_users() if self.args.admin_user else None
+        self.connect_users()
+        if not self.users:
+            raise RuntimeError('Brak połączonych użytkowników')
+
+        print(f"🚀 Wysyłam {self.args.rate}/s przez {self.args.duration}s ({self.args.arrival})")
+        started = time.monotonic()
+        try:
+            self.drive()
+            print(f"⏳ Czekam na {sum(1 for p in self.probes if not p.done.is_set())} odpowiedzi w toku...")
+            self.wait_for_inflight()
+        finally:
+            finished = time.monotonic()
+            for user in self.users:
+                user.close()
+
+        server_stats = None
+        if admin is not None:
+            try:
+                server_stats = admin.get(f'{self.args.url}/admin/api/streaming-stats').json()
+            except Exception as e:
+                print(f"⚠️  Nie pobrano statystyk serwera: {e}")
+        return self.report(started, finished, server_stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Test obciążeniowy czatu (Socket.IO)')
+    parser.add_argument('--url', default=os.getenv('LOAD_TEST_URL', 'http://localhost:5000'))
+    parser.add_argument('--users', type=int, default=10, help='Liczba użytkowników')
+    parser.add_argument('--rate', type=float, default=1.0, help='Wiadomości na sekundę (łącznie)')
+    parser.add_argument('--duration', type=float, default=60, help='Czas wysyłania w sekundach')
+    parser.add_argument('--arrival', choices=['uniform', 'poisson'], default='poisson', help='Rozkład odstępów')
+    parser.add_argument('--timeout', type=float, default=180, help='Maksymalne oczekiwanie na odpowiedzi w toku')
+    parser.add_argument('--rate-tolerance', type=float, default=0.05,
+                        help='Dopuszczalny odsetek zaplanowanych wiadomości pominiętych z braku wolnego użytkownika')
+    parser.add_argument('--questions', help='Plik z pytaniami (jedno w linii)')
+    parser.add_argument('--unique', action='store_true', help='Numerowane warianty pytań (mniej trafień w cache)')
+    parser.add_argument('--user-prefix', default='loadtest_user_')
+    parser.add_argument('--user-password', default='loadtest123')
+    parser.add_argument('--admin-user', help='Administrator do tworzenia użytkowników i statystyk serwera')
+    parser.add_argument('--admin-password')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--include-messages', action='store_true', help='Dołącz pomiary każdej wiadomości')
+    parser.add_argument('--output', default='load_report.json')
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+
+    try:
+        import requests
+        import socketio
+    except ImportError as e:
+        print(f"❌ Błąd importu: {e}")
+        print('💡 Zainstaluj klienta Socket.IO: pip install "python-socketio[client]"')
+        sys.exit(1)
+
+    report = LoadTest(args, socketio, requests).run()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    latency = report['latency_seconds']
+    print(f"📊 Wysłano {report['sent']}, wyniki: {report['outcomes']}")
+    print(f"⚡ Przepustowość: {report['throughput']['completed_per_second']} odpowiedzi/s")
+    for stage in ('message_received', 'first_chunk', 'complete'):
+        if latency[stage]['count']:
+            print(f"⏱️  {stage}: p50 {latency[stage]['p50']}s, p95 {latency[stage]['p95']}s, p99 {latency[stage]['p99']}s")
+    print(f"💾 Raport zapisany: {args.output}")
+
+    rate = report['rate']
+    print(f"🎯 Częstotliwość: {rate['achieved_per_second']}/s (docelowo {rate['target_per_second']}/s, "
+          f"pominięto {report['skipped_no_idle_user']} z {report['scheduled']})")
+    if rate['skipped_fraction'] > args.rate_tolerance:
+        print(f"❌ Test nie utrzymał zadanej częstotliwości - wszyscy użytkownicy czekali na odpowiedź. "
+              f"Zwiększ --users (obecnie {args.users}).")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
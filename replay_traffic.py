@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Odtwarzanie ruchu z historii rozmów
+
+Czyta sesje z history/*.json i wysyła pytania użytkowników do działającej
+instancji przez Socket.IO (send_message), zachowując kolejność pytań w sesji
+i odstępy między nimi. Prędkość: 1 (czas rzeczywisty), 10 (dziesięciokrotnie
+szybciej) lub max (bez czekania - kolejne pytanie zaraz po odpowiedzi).
+Bardzo długie przerwy (noc, kolejne dni) są skracane do --max-gap sekund.
+
+Każda sesja historyczna dostaje nową sesję czatu; oryginalni użytkownicy są
+mapowani na konta replay_user_N (zakładane przez administratora). Raport JSON
+zawiera percentyle dla etapów: połączenie sesji, opóźnienie względem planu,
+message_received, pierwszy fragment i response_complete.
+
+Przykład (aplikacja podłączona do fake_openai_server.py):
+    python replay_traffic.py --url http://localhost:5000 --history-dir history --speed 10 \\
+        --admin-user admin --admin-password admin123 --output replay_report.json
+
+Wymaga klienta Socket.IO: pip install "python-socketio[client]"
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from load_test import VirtualUser, latency_summary, provision_users
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    # Porównujemy tylko czasy lokalne bez strefy
+    return parsed.replace(tzinfo=None)
+
+
+def load_sessions(history_dir: str, limit: int = 0, since: datetime = None,
+                  until: datetime = None, session_ids=None) -> List[Dict]:
+    """Wczytuje sesje z pytaniami użytkownika posortowane po czasie pierwszego pytania"""
+    sessions = []
+    for filename in sorted(os.listdir(history_dir)):
+        if not filename.endswith('.json') or filename.endswith('_context.json'):
+            continue
+        session_id = filename[:-len('.json')]
+        if session_ids and session_id not in session_ids:
+            continue
+        try:
+            with open(os.path.join(history_dir, filename), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Pomijam {filename}: {e}")
+            continue
+        # Ten sam podział formatów co ChatSession.load_history
+        if isinstance(data, dict):
+            data = data.get('full_conversation', [])
+        if not isinstance(data, list):
+            continue
+
+        turns = []
+        for message in data:
+            if not isinstance(message, dict) or message.get('role') != 'user':
+                continue
+            content = (message.get('content') or '').strip()
+            moment = parse_timestamp(message.get('timestamp'))
+            if not content or moment is None:
+                continue
+            if (since and moment < since) or (until and moment >= until):
+                continue
+            turns.append({'content': content, 'timestamp': moment})
+
+        if turns:
+            turns.sort(key=lambda t: t['timestamp'])
+            sessions.append({
+                'session_id': session_id,
+                'user_id': next((m.get('user_id') for m in data
+                                 if isinstance(m, dict) and m.get('user_id')), None),
+                'turns': turns
+            })
+
+    sessions.sort(key=lambda s: s['turns'][0]['timestamp'])
+    return sessions[:limit] if limit else sessions
+
+
+def build_schedule(sessions: List[Dict], max_gap: float) -> float:
+    """Wyznacza czas wirtualny (sekundy od początku) każdego pytania
+
+    Przerwy dłuższe niż max_gap na wspólnej osi czasu są skracane do max_gap,
+    więc względny porządek i odstępy krótsze od progu zostają zachowane.
+    Zwraca długość całego nagrania w czasie wirtualnym.
+    """
+    moments = sorted({turn['timestamp'] for s in sessions for turn in s['turns']})
+    offsets = {}
+    virtual = 0.0
+    previous = None
+    for moment in moments:
+        if previous is not None:
+            gap = (moment - previous).total_seconds()
+            virtual += min(gap, max_gap) if max_gap > 0 else gap
+        offsets[moment] = virtual
+        previous = moment
+
+    for session in sessions:
+        for turn in session['turns']:
+            turn['offset'] = offsets[turn['timestamp']]
+    return virtual
+
+
+class ReplaySession:
+    """Jedna sesja historyczna odtwarzana przez wirtualnego użytkownika"""
+
+    def __init__(self, index: int, source: Dict, username: str):
+        self.index = index
+        self.source = source
+        self.username = username
+        self.connect_seconds = None
+        self.start_lag = None
+        self.turns = []
+        self.error = None
+
+
+class TrafficReplay:
+    """Planista odtwarzania: start sesji wg czasu wirtualnego, pytania po kolei w sesji"""
+
+    def __init__(self, args, sessions: List[Dict], socketio_module, requests_module):
+        self.args = args
+        self.sessions = sessions
+        self.socketio = socketio_module
+        self.requests = requests_module
+        self.speed = None if args.speed == 'max' else float(args.speed)
+        self.slots = threading.Semaphore(args.concurrency)
+        self.replays = []
+        self.lock = threading.Lock()
+        self.started = None
+
+        # Oryginalni użytkownicy -> konta testowe
+        self.usernames = {}
+        for session in sessions:
+            key = session['user_id'] or session['session_id']
+            if key not in self.usernames:
+                self.usernames[key] = f'{args.user_prefix}{len(self.usernames)}'
+
+    def due_at(self, offset: float) -> float:
+        """Czas zegara monotonicznego, w którym zaplanowano zdarzenie"""
+        if self.speed is None:
+            return self.started
+        return self.started + offset / self.speed
+
+    def _wait_until(self, moment: float):
+        delay = moment - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _replay_session(self, replay: ReplaySession):
+        source = replay.source
+        user = None
+        try:
+            user = VirtualUser(replay.index, self.args.url, replay.username, self.args.user_password,
+                               self.socketio, self.requests,
+                               session_title=f"Replay {source['session_id'][:8]}")
+            connect_started = time.monotonic()
+            user.login()
+            replay.connect_seconds = time.monotonic() - connect_started
+
+            for number, turn in enumerate(source['turns']):
+                # Kolejność w sesji: następne pytanie dopiero po odpowiedzi i nie przed planem
+                due = self.due_at(turn['offset'])
+                self._wait_until(due)
+                probe = user.send(turn['content'])
+                # Przy prędkości max nie ma planu, więc nie ma też opóźnienia względem niego
+                lag = max(0.0, probe.sent_at - due) if self.speed is not None else None
+                if not probe.done.wait(self.args.timeout):
+                    probe.finish('timeout')
+                result = probe.to_dict()
+                result.update({'turn': number, 'schedule_lag': round(lag, 4) if lag is not None else None})
+                replay.turns.append(result)
+                if self.args.stop_on_error and probe.outcome != 'ok':
+                    break
+        except Exception as e:
+            replay.error = str(e)
+        finally:
+            if user is not None:
+                user.close()
+            self.slots.release()
+
+    def run(self):
+        admin = None
+        if self.args.admin_user:
+            admin = provision_users(self.requests, self.args.url, self.args.admin_user, self.args.admin_password,
+                                    sorted(set(self.usernames.values())), self.args.user_password)
+
+        speed_text = 'max' if self.speed is None else f'{self.speed:g}x'
+        print(f"▶️  Odtwarzam {len(self.sessions)} sesji "
+              f"({sum(len(s['turns']) for s in self.sessions)} pytań) z prędkością {speed_text}")
+
+        threads = []
+        self.started = time.monotonic()
+        for index, source in enumerate(self.sessions):
+            key = source['user_id'] or source['session_id']
+            replay = ReplaySession(index, source, self.usernames[key])
+            due = self.due_at(source['turns'][0]['offset'])
+            self._wait_until(due)
+            # Limit równoczesnych sesji - opóźnienie startu trafia do raportu
+            self.slots.acquire()
+            if self.speed is not None:
+                replay.start_lag = max(0.0, time.monotonic() - due)
+            with self.lock:
+                self.replays.append(replay)
+            thread = threading.Thread(target=self._replay_session, args=(replay,), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+        finished = time.monotonic()
+
+        server_stats = None
+        if admin is not None:
+            try:
+                server_stats = admin.get(f'{self.args.url}/admin/api/streaming-stats').json()
+            except Exception as e:
+                print(f"⚠️  Nie pobrano statystyk serwera: {e}")
+        return self.report(finished - self.started, server_stats)
+
+    def report(self, wall: float, server_stats=None) -> Dict:
+        turns = [t for r in self.replays for t in r.turns]
+        ok = [t for t in turns if t['outcome'] == 'ok']
+        outcomes = {}
+        for turn in turns:
+            outcomes[turn['outcome']] = outcomes.get(turn['outcome'], 0) + 1
+
+        def values(items, key):
+            return [item[key] for item in items if item.get(key) is not None]
+
+        report = {
+            'generated_at': datetime.now().isoformat(),
+            'config': {
+                'url': self.args.url,
+                'history_dir': self.args.history_dir,
+                'speed': self.args.speed,
+                'max_gap': self.args.max_gap,
+                'concurrency': self.args.concurrency,
+                'sessions': len(self.sessions),
+                'users': len(self.usernames)
+            },
+            'wall_seconds': round(wall, 2),
+            'sent': len(turns),
+            'outcomes': outcomes,
+            'session_errors': sorted({r.error for r in self.replays if r.error})[:20],
+            'error_rate': round(1 - len(ok) / len(turns), 4) if turns else 0.0,
+            'throughput': {
+                'completed_per_second': round(len(ok) / wall, 3) if wall else 0.0,
+                'chars_per_second': round(sum(t['chars'] for t in ok) / wall, 1) if wall else 0.0
+            },
+            'latency_seconds': {
+                'session_connect': latency_summary([r.connect_seconds for r in self.replays
+                                                    if r.connect_seconds is not None]),
+                'session_start_lag': latency_summary([r.start_lag for r in self.replays
+                                                      if r.start_lag is not None]),
+                'schedule_lag': latency_summary(values(turns, 'schedule_lag')),
+                'message_received': latency_summary(values(turns, 'message_received')),
+                'first_chunk': latency_summary(values(ok, 'first_chunk')),
+                'complete': latency_summary(values(ok, 'complete')),
+                'complete_cached': latency_summary(values([t for t in ok if t['cached']], 'complete')),
+                'complete_uncached': latency_summary(values([t for t in ok if not t['cached']], 'complete'))
+            },
+            'queued': sum(1 for t in turns if t['queued']),
+            'cached': sum(1 for t in ok if t['cached']),
+            'errors': sorted({t['error'] for t in turns if t['error']})[:20]
+        }
+        if server_stats is not None:
+            report['server_streaming_stats'] = server_stats
+        if self.args.include_messages:
+            report['sessions'] = [{
+                'source_session': r.source['session_id'],
+                'user': r.username,
+                'error': r.error,
+                'turns': r.turns
+            } for r in self.replays]
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Odtwarzanie ruchu z historii rozmów (Socket.IO)')
+    parser.add_argument('--url', default=os.getenv('LOAD_TEST_URL', 'http://localhost:5000'))
+    parser.add_argument('--history-dir', default='history', help='Katalog z plikami historii')
+    parser.add_argument('--speed', default='1', help='Mnożnik prędkości (1, 10, ...) lub max')
+    parser.add_argument('--max-gap', type=float, default=300,
+                        help='Maksymalna przerwa w sekundach czasu oryginalnego (0 = bez skracania)')
+    parser.add_argument('--concurrency', type=int, default=50, help='Maksymalna liczba równoczesnych sesji')
+    parser.add_argument('--limit', type=int, default=0, help='Odtwórz tylko N pierwszych sesji')
+    parser.add_argument('--since', help='Tylko pytania od daty/czasu ISO')
+    parser.add_argument('--until', help='Tylko pytania przed datą/czasem ISO')
+    parser.add_argument('--session', action='append', help='Wybrana sesja (można powtórzyć)')
+    parser.add_argument('--timeout', type=float, default=180, help='Maksymalne oczekiwanie na odpowiedź')
+    parser.add_argument('--stop-on-error', action='store_true', help='Przerwij sesję po pierwszym błędzie')
+    parser.add_argument('--user-prefix', default='replay_user_')
+    parser.add_argument('--user-password', default='replay123')
+    parser.add_argument('--admin-user', help='Administrator do tworzenia użytkowników i statystyk serwera')
+    parser.add_argument('--admin-password')
+    parser.add_argument('--dry-run', action='store_true', help='Tylko pokaż plan odtwarzania')
+    parser.add_argument('--include-messages', action='store_true', help='Dołącz pomiary każdego pytania')
+    parser.add_argument('--output', default='replay_report.json')
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+
+    if args.speed != 'max':
+        try:
+            if float(args.speed) <= 0:
+                raise ValueError
+        except ValueError:
+            parser.error('--speed musi być liczbą dodatnią lub "max"')
+
+    if not os.path.isdir(args.history_dir):
+        print(f"❌ Brak katalogu historii: {args.history_dir}")
+        sys.exit(1)
+
+    sessions = load_sessions(args.history_dir, args.limit, parse_timestamp(args.since),
+                             parse_timestamp(args.until), set(args.session or []))
+    if not sessions:
+        print("❌ Brak sesji z pytaniami do odtworzenia")
+        sys.exit(1)
+
+    duration = build_schedule(sessions, args.max_gap)
+    turns = sum(len(s['turns']) for s in sessions)
+    planned = 'zależny od odpowiedzi' if args.speed == 'max' else f'{duration / float(args.speed):.1f}s'
+    print(f"📼 {len(sessions)} sesji, {turns} pytań, nagranie {duration:.1f}s (po skróceniu przerw), "
+          f"plan odtwarzania: {planned}")
+    if args.dry_run:
+        return
+
+    try:
+        import requests
+        import socketio
+    except ImportError as e:
+        print(f"❌ Błąd importu: {e}")
+        print('💡 Zainstaluj klienta Socket.IO: pip install "python-socketio[client]"')
+        sys.exit(1)
+
+    report = TrafficReplay(args, sessions, socketio, requests).run()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    latency = report['latency_seconds']
+    print(f"📊 Wysłano {report['sent']}, wyniki: {report['outcomes']}")
+    for stage in ('session_connect', 'schedule_lag', 'message_received', 'first_chunk', 'complete'):
+        if latency[stage]['count']:
+            print(f"⏱️  {stage}: p50 {latency[stage]['p50']}s, p95 {latency[stage]['p95']}s, p99 {latency[stage]['p99']}s")
+    print(f"💾 Raport zapisany: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,13 @@
 """
 Punkt startowy aplikacji Aero-Chat
 """
+from utils.async_support import monkey_patch
+monkey_patch()
+
 import os
-from app import create_app
-from flask_socketio import SocketIO
+from app import create_app, socketio
 
 app = create_app()
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
 
 if __name__ == "__main__":
     # Uruchom watcher w osobnym wątku
@@ -16,4 +17,9 @@ if __name__ == "__main__":
     start_watcher()
     
     port = int(os.environ.get("PORT", 5000))
+    
+    # Analityka, podręcznik i ciężkie moduły ładują się w tle, gdy serwer już przyjmuje połączenia
+    from app.warmup import start_warmup
+    start_warmup(socketio, reloader=True)
+    
     socketio.run(app, host="0.0.0.0", port=port, debug=True)
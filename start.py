@@ -10,6 +10,10 @@ from dotenv import load_dotenv
 # Załaduj zmienne środowiskowe na początku
 load_dotenv()
 
+# Tryb eventlet/gevent wymaga podmiany modułów przed importem aplikacji
+from utils.async_support import monkey_patch
+monkey_patch()
+
 def check_requirements():
     """Sprawdza czy wszystkie wymagania są spełnione"""
     required_env_vars = ['OPENAI_API_KEY']
@@ -186,14 +190,12 @@ def main():
     
     # Importuj i uruchom aplikację
     try:
-        from app import create_app
-        from flask_socketio import SocketIO
+        from app import create_app, socketio
         from watcher import start_watcher
         
         print("\n🚀 Uruchamianie serwera...")
         
         app = create_app()
-        socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
         
         # Pobierz port z zmiennych środowiskowych
         port = int(os.environ.get("PORT", 5000))
@@ -202,16 +204,16 @@ def main():
         start_watcher()
         print("👁️  Watcher uruchomiony")
         
-        # Rejestruj handlery WebSocket
-        from app.socketio_handlers import register_socketio_handlers
-        register_socketio_handlers(socketio)
-        
         print("\n✅ Aplikacja gotowa!")
         print(f"🌐 Adres: http://localhost:{port}")
         print(f"⚙️  Panel admin: http://localhost:{port}/admin")
         print("\n💡 Aby zatrzymać serwer naciśnij Ctrl+C")
         print("=" * 50)
         
+        # Rozgrzewanie w tle (analityka, podręcznik, moduły OpenAI)
+        from app.warmup import start_warmup
+        start_warmup(socketio, reloader=True)
+        
         # Uruchom serwer
         socketio.run(app, host="0.0.0.0", port=port, debug=True)
         
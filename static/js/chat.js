@@ -5,6 +5,9 @@ class ChatApp {
         this.isConnected = false;
         this.messageIdCounter = 0;
         this.currentTypingMessageId = null;
+        this.streamOffsets = {};
+        this.activeStreams = new Set();
+        this.hasConnected = false;
         this.messageCount = 0;
         this.questionsAsked = 0;
         this.documentsUsed = 0;
@@ -29,6 +32,18 @@ class ChatApp {
             this.updateConnectionStatus(true);
             console.log('✅ Połączono z serwerem');
             console.log('🔗 Socket ID:', this.socket.id);
+            
+            // Po ponownym połączeniu dokończ przerwane odpowiedzi
+            if (this.hasConnected) {
+                this.activeStreams.forEach((messageId) => this.resumeStream(messageId));
+            }
+            this.hasConnected = true;
+        });
+        
+        this.socket.on('stream_expired', (data) => {
+            console.warn('⌛ Otrzymano stream_expired:', data);
+            this.finishStream(data.message_id);
+            this.handleError({ error: 'Połączenie zostało przerwane, a odpowiedź wygasła. Zadaj pytanie ponownie.' });
         });
         
         this.socket.on('connected', (data) => {
@@ -53,6 +68,9 @@ class ChatApp {
 
         this.socket.on('error', (data) => {
             console.error('❌ Otrzymano error:', data);
+            if (data.message_id) {
+                this.finishStream(data.message_id);
+            }
             this.handleError(data);
         });
 
@@ -73,6 +91,30 @@ class ChatApp {
         
         this.socket.on('generating_start', (data) => {
             console.log('🔄 Otrzymano generating_start:', data);
+            this.updateTypingStatus(data.message_id, 'Analizuję dokumenty...');
+        });
+        
+        // Obsługa kolejki generowania
+        this.socket.on('queued', (data) => {
+            console.log('⏳ Otrzymano queued:', data);
+            this.updateTypingStatus(data.message_id, `Oczekuję w kolejce (pozycja ${data.position})...`);
+        });
+        
+        this.socket.on('position', (data) => {
+            console.log('⏳ Otrzymano position:', data);
+            this.updateTypingStatus(data.message_id, `Oczekuję w kolejce (pozycja ${data.position})...`);
+        });
+        
+        this.socket.on('busy', (data) => {
+            console.warn('🚦 Otrzymano busy:', data);
+            this.finishStream(data.message_id);
+            this.handleError({ error: data.message });
+        });
+        
+        this.socket.on('generation_cancelled', (data) => {
+            console.log('⏹️ Otrzymano generation_cancelled:', data);
+            this.finishStream(data.message_id);
+            this.handleGenerationCancelled(data);
         });
         
         // Obsługa aktualizacji tytułu sesji
@@ -262,13 +304,16 @@ class ChatApp {
         
         // Dodaj wskaźnik pisania
         this.addTypingIndicator(messageId);
+        this.activeStreams.add(messageId);
+        this.streamOffsets[messageId] = 0;
 
         // Wyślij do serwera
         const messageData = {
             message: message,
             session_id: this.sessionId,
             message_id: messageId,
-            context: this.getContext()
+            context: this.getContext(),
+            slim_complete: true
         };
         
         console.log('📤 Wysyłam dane:', messageData);
@@ -353,6 +398,7 @@ class ChatApp {
                 <div class="font-semibold mb-2 flex items-center">
                     <span class="mr-2">🤖</span>
                     Asystent AI
+                    ${this.stopButtonHtml(messageId)}
                 </div>
                 <div class="flex items-center space-x-1">
                     <div class="typing-dots">
@@ -371,6 +417,14 @@ class ChatApp {
         this.scrollToBottom();
     }
 
+    updateTypingStatus(messageId, text) {
+        const messageElement = messageId ? document.getElementById(messageId) : null;
+        const statusElement = messageElement?.querySelector('.typing-dots + span');
+        if (statusElement) {
+            statusElement.textContent = text;
+        }
+    }
+
     handleResponseChunk(data) {
         console.log('📨 Otrzymano chunk:', data);
         
@@ -391,6 +445,7 @@ class ChatApp {
                     <div class="font-semibold mb-2 flex items-center">
                         <i class="fas fa-robot mr-2"></i>
                         Asystent AI
+                        ${this.stopButtonHtml(data.message_id)}
                     </div>
                     <div class="prose" id="content-${data.message_id}"></div>
                 </div>
@@ -403,6 +458,20 @@ class ChatApp {
             return;
         }
 
+        // Kontrola ciągłości strumienia (offset nadawany przez serwer)
+        if (data.offset !== undefined) {
+            const expected = this.streamOffsets[data.message_id] || 0;
+            if (data.offset > expected) {
+                console.warn('⚠️ Luka w strumieniu, wznawiam od offsetu', expected);
+                this.resumeStream(data.message_id);
+                return;
+            }
+            if (data.offset < expected) {
+                return;  // Fragment już otrzymany
+            }
+            this.streamOffsets[data.message_id] = data.next_offset;
+        }
+
         // Akumuluj surowy tekst markdown
         if (!contentElement.dataset.rawContent) {
             contentElement.dataset.rawContent = '';
@@ -416,19 +485,73 @@ class ChatApp {
         this.scrollToBottom();
     }
 
+    resumeStream(messageId) {
+        const offset = this.streamOffsets[messageId] || 0;
+        console.log('▶️ Wznawiam strumień:', messageId, 'od offsetu', offset);
+        this.socket.emit('resume_stream', { message_id: messageId, offset: offset });
+    }
+
+    finishStream(messageId) {
+        this.activeStreams.delete(messageId);
+        delete this.streamOffsets[messageId];
+    }
+
+    stopButtonHtml(messageId) {
+        return `<button type="button" class="stop-generation-btn ml-auto text-xs text-red-600 hover:text-red-800"
+                        onclick="chatApp.cancelGeneration('${messageId}')" title="Zatrzymaj generowanie">⏹ Zatrzymaj</button>`;
+    }
+
+    cancelGeneration(messageId) {
+        console.log('⏹️ Anuluję generowanie:', messageId);
+        this.socket.emit('cancel_generation', { message_id: messageId });
+        document.getElementById(messageId)?.querySelector('.stop-generation-btn')?.remove();
+    }
+
+    handleGenerationCancelled(data) {
+        const messageElement = data.message_id ? document.getElementById(data.message_id) : null;
+        if (!messageElement) return;
+
+        messageElement.querySelector('.stop-generation-btn')?.remove();
+        if (messageElement.querySelector('.typing-dots')) {
+            this.updateTypingStatus(data.message_id, 'Generowanie zatrzymane.');
+            messageElement.querySelector('.typing-dots')?.remove();
+        } else {
+            const note = document.createElement('div');
+            note.className = 'text-xs text-gray-500 mt-2';
+            note.textContent = 'Generowanie zatrzymane - odpowiedź może być niepełna.';
+            messageElement.querySelector('.p-4')?.appendChild(note);
+        }
+        if (this.currentTypingMessageId === data.message_id) {
+            this.currentTypingMessageId = null;
+        }
+    }
+
     handleResponseComplete(data) {
         console.log('✅ Odpowiedź kompletna:', data);
         
         if (!data.message_id) return;
 
+        this.finishStream(data.message_id);
+
         const messageElement = document.getElementById(data.message_id);
         if (!messageElement) return;
+        
+        messageElement.querySelector('.stop-generation-btn')?.remove();
 
         const contentElement = messageElement.querySelector(`#content-${data.message_id}`);
         if (!contentElement) return;
 
         // Ustaw finalną odpowiedź HTML z feedbackami przy każdym akapicie/nagłówku
-        contentElement.innerHTML = this.addFeedbackToEachSection(data.full_response, data.message_id);
+        if (data.full_response !== undefined) {
+            contentElement.innerHTML = this.addFeedbackToEachSection(data.full_response, data.message_id);
+        } else {
+            // Tryb skrócony: renderuj Markdown otrzymany w strumieniu
+            const rawContent = contentElement.dataset.rawContent || '';
+            contentElement.innerHTML = this.addFeedbackToEachSection(this.markdownToHtml(rawContent), data.message_id);
+            if (data.content_hash && this.needsServerRender(rawContent)) {
+                this.loadServerHtml(data.content_hash, data.message_id, contentElement);
+            }
+        }
 
         this.scrollToBottom();
         this.updateMessageCounter();
@@ -1165,6 +1288,22 @@ class ChatApp {
         }, 3000);
     }
 
+    needsServerRender(text) {
+        // Tabele i bloki kodu wymagają pełnego renderera po stronie serwera
+        return /```|^\s*\|.*\|\s*$/m.test(text);
+    }
+
+    async loadServerHtml(contentHash, messageId, contentElement) {
+        try {
+            const response = await fetch(`/api/rendered/${contentHash}`);
+            if (!response.ok) return;
+            const data = await response.json();
+            contentElement.innerHTML = this.addFeedbackToEachSection(data.html, messageId);
+        } catch (error) {
+            console.warn('⚠️ Nie udało się pobrać HTML odpowiedzi:', error);
+        }
+    }
+
     markdownToHtml(text) {
         // Prosta konwersja markdown do HTML
         let html = text
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy pamięci podręcznej odpowiedzi (podobne pytania, dokumenty, LRU, feedback)
+"""
+import os
+import time
+import shutil
+import tempfile
+
+import utils.question_index as question_index
+from utils.answer_cache import AnswerCache
+
+QUESTION = 'Jak działa radiolatarnia VOR i jak odczytać radial?'
+
+
+def _in_workdir(test):
+    """Uruchamia test w katalogu tymczasowym z własnym indeksem pytań"""
+    def wrapper():
+        cwd = os.getcwd()
+        workdir = tempfile.mkdtemp()
+        original = question_index._question_index
+        try:
+            os.chdir(workdir)
+            os.makedirs('uploads')
+            for name in ('nawigacja.pdf', 'meteo.pdf'):
+                with open(os.path.join('uploads', name), 'w') as f:
+                    f.write(name)
+            question_index._question_index = None
+            test()
+        finally:
+            question_index._question_index = original
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+    wrapper.__name__ = test.__name__
+    wrapper.__doc__ = test.__doc__
+    return wrapper
+
+
+@_in_workdir
+def test_similar_question_hits_same_documents():
+    """Wariant pytania trafia w cache tylko dla tego samego zestawu dokumentów"""
+    cache = AnswerCache('data/answer_cache')
+    question_index.get_question_index().add_question(QUESTION, 'u1', 's1', autosave=False)
+    key = cache.store(QUESTION, ['nawigacja.pdf'], 'VOR nadaje radiale co 1°.', 1)
+
+    assert cache.lookup(QUESTION, ['nawigacja.pdf'])['key'] == key
+    assert cache.lookup('jak dziala radiolatarnia VOR i jak odczytac radial', ['nawigacja.pdf'])['key'] == key
+    assert cache.lookup(QUESTION, ['meteo.pdf']) is None
+    assert cache.lookup('Jakie są minima VFR w przestrzeni klasy G?', ['nawigacja.pdf']) is None
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 2
+
+    # Wpisy przetrwają restart
+    assert AnswerCache('data/answer_cache').lookup(QUESTION, ['nawigacja.pdf'])['key'] == key
+    print("✅ Podobne pytanie trafia w cache dla tych samych dokumentów")
+
+
+@_in_workdir
+def test_personalized_answers_stay_with_their_prompt():
+    """Odpowiedź z promptem uczenia nie trafia do innych użytkowników ani do pytań bez personalizacji"""
+    cache = AnswerCache('data/answer_cache')
+    alice = 'Użytkownik preferuje wzory i przykłady'
+    key = cache.store(QUESTION, ['nawigacja.pdf'], 'Odpowiedź ze wzorami', learning_prompt=alice)
+
+    assert cache.lookup(QUESTION, ['nawigacja.pdf'], learning_prompt=alice)['key'] == key
+    assert cache.lookup(QUESTION, ['nawigacja.pdf'], learning_prompt='Użytkownik woli krótko') is None
+    assert cache.lookup(QUESTION, ['nawigacja.pdf']) is None
+
+    generic = cache.store(QUESTION, ['nawigacja.pdf'], 'Odpowiedź ogólna')
+    assert generic != key
+    assert cache.lookup(QUESTION, ['nawigacja.pdf'])['answer'] == 'Odpowiedź ogólna'
+    assert cache.lookup(QUESTION, ['nawigacja.pdf'], learning_prompt=alice)['answer'] == 'Odpowiedź ze wzorami'
+    print("✅ Spersonalizowane odpowiedzi tylko dla tego samego promptu")
+
+
+@_in_workdir
+def test_invalidation():
+    """Zmiana dokumentu, negatywny feedback i TTL usuwają wpisy"""
+    cache = AnswerCache('data/answer_cache')
+    key = cache.store(QUESTION, ['nawigacja.pdf'], 'VOR nadaje radiale co 1°.')
+    cache.mark_served('m1', key)
+    assert cache.evict_for_message('m1')
+    assert cache.lookup(QUESTION, ['nawigacja.pdf']) is None
+
+    cache.store(QUESTION, ['nawigacja.pdf'], 'VOR nadaje radiale co 1°.')
+    with open(os.path.join('uploads', 'nawigacja.pdf'), 'a') as f:
+        f.write(' - nowe wydanie')
+    assert cache.purge_stale() == 1
+    assert cache.stats()['entries'] == 0
+
+    cache.ttl_seconds = 0
+    cache.store(QUESTION, ['meteo.pdf'], 'Odpowiedź')
+    time.sleep(0.01)
+    assert cache.lookup(QUESTION, ['meteo.pdf']) is None
+    print("✅ Unieważnianie wpisów cache")
+
+
+@_in_workdir
+def test_lru_capacity():
+    """Po przekroczeniu pojemności usuwany jest najdawniej używany wpis"""
+    cache = AnswerCache('data/answer_cache', capacity=2)
+    questions = ['Co to jest QNH?', 'Czym jest prędkość przeciągnięcia?', 'Jak działa transponder?']
+    cache.store(questions[0], ['nawigacja.pdf'], 'A')
+    cache.store(questions[1], ['nawigacja.pdf'], 'B')
+    assert cache.lookup(questions[0], ['nawigacja.pdf'], exact=True)
+    cache.store(questions[2], ['nawigacja.pdf'], 'C')
+
+    assert cache.stats()['entries'] == 2
+    assert cache.lookup(questions[1], ['nawigacja.pdf'], exact=True) is None
+    assert cache.lookup(questions[0], ['nawigacja.pdf'], exact=True)['answer'] == 'A'
+    assert len(os.listdir('data/answer_cache')) == 2
+    print("✅ LRU ogranicza liczbę wpisów")
+
+
+if __name__ == "__main__":
+    test_similar_question_hits_same_documents()
+    test_personalized_answers_stay_with_their_prompt()
+    test_invalidation()
+    test_lru_capacity()
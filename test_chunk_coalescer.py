@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy łączenia fragmentów odpowiedzi w ramki (ChunkCoalescer)
+"""
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+from utils.chunk_coalescer import ChunkCoalescer
+
+
+def _wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_flush_on_deadline():
+    """Zaległa ramka wychodzi po interwale, nawet gdy dostawca nie przysyła kolejnych fragmentów"""
+    frames = []
+    coalescer = ChunkCoalescer(frames.append, flush_interval=0.05, flush_bytes=10_000)
+    coalescer.add('Pierwszy')
+    assert frames == ['Pierwszy']  # pierwszy fragment bez opóźnienia
+
+    coalescer.add(' drugi')
+    coalescer.add(' trzeci')
+    assert frames == ['Pierwszy']
+    assert _wait_for(lambda: len(frames) == 2)
+    assert frames[1] == ' drugi trzeci'
+
+    coalescer.close()
+    assert ''.join(frames) == 'Pierwszy drugi trzeci'
+    assert coalescer.frames == 2 and coalescer.deltas == 3
+    print("✅ Ramka wysyłana po terminie bez kolejnego fragmentu")
+
+
+def test_close_sends_rest_without_duplicates():
+    """close() wysyła resztę bufora, a termin po zamknięciu niczego nie powtarza"""
+    frames = []
+    coalescer = ChunkCoalescer(frames.append, flush_interval=0.05, flush_bytes=10_000)
+    coalescer.add('A')
+    coalescer.add('B')
+    coalescer.close()
+    time.sleep(0.1)
+    assert frames == ['A', 'B']
+    print("✅ Zamknięcie wysyła resztę bufora dokładnie raz")
+
+
+class _FailingRAG:
+    """RAG, którego strumień przerywa się błędem dostawcy po kilku fragmentach"""
+    last_documents_used = 0
+
+    def save_conversation_context(self, *args):
+        pass
+
+    def generate_response_stream(self, *args):
+        yield 'Radio'
+        yield 'latarnia '
+        yield 'VOR'
+        raise RuntimeError('upstream 500')
+
+
+def test_flush_on_error():
+    """Przy błędzie strumienia zebrane fragmenty docierają do klienta przed zdarzeniem error"""
+    import utils.openai_rag as openai_rag
+    from app.chat_pipeline import run_generation
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp()
+    original = openai_rag.OpenAIRAG
+    events = []
+    try:
+        os.chdir(workdir)
+        openai_rag.OpenAIRAG = _FailingRAG
+        run_generation(lambda event, payload, final=False: events.append((event, payload)),
+                       lambda frame: events.append(('chunk', frame)),
+                       'pilot', 'error_session', 'Co to jest VOR?', 'm1', threading.Event())
+    finally:
+        openai_rag.OpenAIRAG = original
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    names = [event for event, _ in events]
+    assert names[-1] == 'error'
+    assert ''.join(payload for event, payload in events if event == 'chunk') == 'Radiolatarnia VOR'
+    assert names.index('error') > max(i for i, name in enumerate(names) if name == 'chunk')
+    print("✅ Bufor wysłany przed zdarzeniem błędu")
+
+
+if __name__ == "__main__":
+    test_flush_on_deadline()
+    test_close_sends_rest_without_duplicates()
+    test_flush_on_error()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy puli generowania i przyjmowania wiadomości (kontrola przyjęć)
+"""
+import os
+import shutil
+import tempfile
+import threading
+
+from app.generation_pool import GenerationPool
+from app.chat_pipeline import accept_user_message
+from app.models import ChatSession
+from utils import question_index
+from utils.question_index import QuestionIndex
+
+
+class _ThreadSocketIO:
+    """Minimalny zamiennik socketio.start_background_task"""
+
+    def start_background_task(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+
+def _full_pool(release: threading.Event) -> GenerationPool:
+    """Pula z jednym miejscem i jednym miejscem w kolejce - obydwa zajęte"""
+    pool = GenerationPool(_ThreadSocketIO(), max_workers=1, max_per_user=1, max_queue=1,
+                          max_queued_per_user=1)
+    assert pool.submit('pilot', 'm1', lambda: release.wait(5))['status'] == GenerationPool.STARTED
+    assert pool.submit('pilot', 'm2', lambda: None)['status'] == GenerationPool.QUEUED
+    return pool
+
+
+def test_pool_admission():
+    """Zadania ponad limit kolejki są odrzucane, a po zwolnieniu miejsca kolejka rusza"""
+    release = threading.Event()
+    pool = _full_pool(release)
+    assert pool.submit('pilot', 'm3', lambda: None)['status'] == GenerationPool.BUSY
+    assert pool.stats()['rejected'] == 1
+
+    release.set()
+    for _ in range(50):
+        if pool.stats()['completed'] == 2:
+            break
+        threading.Event().wait(0.05)
+    assert pool.stats()['completed'] == 2
+    print("✅ Pula odrzuca zadania ponad limit kolejki")
+
+
+def test_busy_rejection_leaves_history_unchanged():
+    """Wiadomość odrzucona przez pulę (BUSY) nie zostaje w historii sesji"""
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp()
+    release = threading.Event()
+    original_index = question_index._question_index
+    try:
+        os.chdir(workdir)
+        # Własny indeks pytań ze ścieżkami bezwzględnymi - zapis w tle nie trafi do repozytorium
+        question_index._question_index = QuestionIndex(
+            index_file=os.path.join(workdir, 'data', 'question_index.json'),
+            history_dir=os.path.join(workdir, 'history'))
+        pool = _full_pool(release)
+        session = ChatSession('busy_session', 'pilot')
+        session.save_message('Co to jest QNH?', 'user')
+        before = session.load_history()
+
+        admit = lambda: pool.submit('pilot', 'm3', lambda: None)
+        for _ in range(2):  # klient ponawia po odrzuceniu
+            accepted = accept_user_message('busy_session', 'pilot', 'Jak działa VOR?', admit)
+            assert accepted['admission']['status'] == GenerationPool.BUSY
+            assert accepted['title'] is None
+            assert session.load_history() == before
+        # Odrzucone ponowienia nie są liczone w "najczęstszych pytaniach"
+        index = question_index.get_question_index()
+        cluster, _ = index.find_similar('Jak działa VOR?')
+        assert cluster is None or cluster['count'] == 0
+
+        release.set()
+        accepted = accept_user_message('busy_session', 'pilot', 'Jak działa VOR?',
+                                       lambda: {'status': GenerationPool.STARTED, 'position': 0})
+        history = session.load_history()
+        assert [msg['content'] for msg in history] == ['Co to jest QNH?', 'Jak działa VOR?']
+        assert history[-1]['timestamp'] == accepted['timestamp']
+        assert index.get_cluster(history[-1]['question_cluster'])['count'] == 1
+        print("✅ Odrzucona wiadomość nie zostaje w historii")
+    finally:
+        release.set()
+        if question_index._question_index is not None:
+            question_index._question_index.flush()
+        question_index._question_index = original_index
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_pool_admission()
+    test_busy_rejection_leaves_history_unchanged()
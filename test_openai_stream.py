@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy strumieniowania odpowiedzi asystenta przez współdzieloną pulę połączeń
+(na lokalnym fake_openai_server.py)
+"""
+import os
+import shutil
+import time
+import tempfile
+import threading
+
+import utils.answer_cache as answer_cache
+import utils.openai_rag as openai_rag
+import utils.question_index as question_index
+from fake_openai_server import FakeOpenAIConfig, start_fake_openai_server
+
+
+def _with_fake_openai(test):
+    """Uruchamia test z fałszywym API OpenAI, własnym klientem (mała pula) i katalogiem tymczasowym"""
+    def wrapper():
+        config = FakeOpenAIConfig()
+        config.update({'tokens_per_second': 400, 'latency_ms': 1, 'first_token_ms': 10, 'answer_tokens': 30})
+        server, url = start_fake_openai_server(config=config)
+        env = {'OPENAI_BASE_URL': url, 'OPENAI_API_KEY': 'sk-fake', 'ASSISTANT_ID': 'asst_test',
+               'OPENAI_MAX_CONNECTIONS': '2'}
+        saved_env = {name: os.environ.get(name) for name in env}
+        cwd = os.getcwd()
+        workdir = tempfile.mkdtemp()
+        originals = (openai_rag._client, answer_cache._answer_cache, question_index._question_index)
+        try:
+            os.environ.update(env)
+            os.chdir(workdir)
+            openai_rag._client = answer_cache._answer_cache = question_index._question_index = None
+            test()
+        finally:
+            # Klienta testu nie zamykamy - przy zablokowanej puli close() też by się zawiesił
+            openai_rag._client, answer_cache._answer_cache, question_index._question_index = originals
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+            server.shutdown()
+    wrapper.__name__ = test.__name__
+    wrapper.__doc__ = test.__doc__
+    return wrapper
+
+
+def _pool_requests():
+    """Żądania wciąż trzymające połączenie puli httpcore (niezamknięte odpowiedzi)"""
+    return list(openai_rag.get_openai_client()._client._transport._pool._requests)
+
+
+def _stream(question, results, is_cancelled=None):
+    rag = openai_rag.OpenAIRAG()
+    text = ''.join(rag._stream_from_assistant(question, [], [], '', is_cancelled=is_cancelled))
+    results[question] = (text, rag.last_error, rag.last_usage)
+
+
+@_with_fake_openai
+def test_concurrent_streams_release_connections():
+    """Więcej równoległych strumieni niż połączeń w puli - każdy run zwalnia połączenie"""
+    results = {}
+    questions = [f'Jak działa VOR? (wariant {i})' for i in range(6)]
+    threads = [threading.Thread(target=_stream, args=(q, results), daemon=True) for q in questions]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 30
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    assert not any(thread.is_alive() for thread in threads), 'Strumienie zablokowane na puli połączeń'
+    assert sorted(results) == sorted(questions)
+    for text, error, usage in results.values():
+        assert text and error is None
+        assert usage['completion_tokens'] > 0
+    assert _pool_requests() == []
+    print("✅ Równoległe strumienie zwalniają połączenia puli")
+
+
+@_with_fake_openai
+def test_cancelled_stream_releases_connection():
+    """Anulowany run zamyka strumień i zwalnia połączenie"""
+    results = {}
+    chunks = []
+
+    def cancel_after_first_chunk():
+        chunks.append(None)
+        return len(chunks) > 3
+
+    _stream('Co to jest QNH?', results, cancel_after_first_chunk)
+    text, error, usage = results['Co to jest QNH?']
+    assert error == 'Generowanie anulowane'
+    assert _pool_requests() == []
+    # Usage anulowanego runu pobrane od dostawcy, nie szacowane
+    assert usage['completion_tokens'] > 0 and usage['prompt_tokens'] > 0
+    assert not usage.get('partial')
+    print("✅ Anulowany strumień zwalnia połączenie i ma usage")
+
+
+@_with_fake_openai
+def test_cancelled_run_without_usage_is_estimated():
+    """Bez usage od dostawcy zużycie anulowanego runu jest szacowane i oznaczone jako częściowe"""
+    from utils.token_usage import UsageLedger
+
+    rag = openai_rag.OpenAIRAG()
+    rag._add_cancelled_run_usage('thread_brak', None, [{'role': 'user', 'content': 'x' * 400}], 'y' * 80)
+    assert rag.last_usage['prompt_tokens'] == 100 and rag.last_usage['completion_tokens'] == 20
+    assert rag.last_usage['partial'] is True
+
+    ledger = UsageLedger('data/token_usage.json')
+    ledger.record(rag.last_usage, 'pilot')
+    assert ledger.summary(1)['totals']['partial'] == 1
+    print("✅ Szacowane zużycie anulowanego runu")
+
+
+@_with_fake_openai
+def test_missing_vector_store_is_not_cached():
+    """Odpowiedź bez utworzonego vector store nie trafia do cache, a pytanie wsadowe kończy się błędem"""
+    from app.batch_jobs import BatchJobManager
+
+    rag = openai_rag.OpenAIRAG()
+    answer, cached = rag.answer_question('Jak działa VOR?', ['brak.pdf'])
+    assert answer and not cached
+    assert rag.last_cache_key is None
+    assert answer_cache.get_answer_cache().stats()['entries'] == 0
+
+    manager = BatchJobManager('data/batch_jobs')
+    job = manager.create_job('pilot', [{'index': 0, 'id': '1', 'question': 'Co to jest QNH?',
+                                        'documents': ['brak.pdf']}])
+    deadline = time.monotonic() + 30
+    while manager.is_running(job['job_id']) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    result = manager._load_results(job['job_id'])[0]
+    assert result['status'] == 'error' and 'vector store' in result['error']
+    assert manager.get(job['job_id'])['status'] == 'partial'
+    assert answer_cache.get_answer_cache().stats()['entries'] == 0
+    print("✅ Brak vector store - bez odpowiedzi z cache i z błędem zadania")
+
+
+if __name__ == "__main__":
+    test_concurrent_streams_release_connections()
+    test_cancelled_stream_releases_connection()
+    test_cancelled_run_without_usage_is_estimated()
+    test_missing_vector_store_is_not_cached()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy magazynu preferencji użytkowników
+"""
+import shutil
+import tempfile
+
+from utils.preference_store import PreferenceStore
+
+
+def test_session_overrides_are_bounded():
+    """Rekord trzyma nadpisania tylko ostatnio aktualizowanych sesji"""
+    workdir = tempfile.mkdtemp()
+    try:
+        store = PreferenceStore(store_dir=workdir, legacy_file=None)
+        store.MAX_SESSIONS = 3
+        for i in range(5):
+            store.update('pilot', {'prefers_examples': True}, session_id=f's{i}')
+        store.update('pilot', {'prefers_theory': True}, session_id='s2')
+        store.update('pilot', {'prefers_procedures': True}, session_id='s5')
+
+        record = store.all_records()[0]
+        assert list(record['sessions']) == ['s4', 's2', 's5']
+        assert store.get('pilot', 's2') == {'prefers_examples': True, 'prefers_theory': True}
+        assert store.get('pilot', 's0') == {}
+        print("✅ Liczba sesji w rekordzie preferencji ograniczona")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_session_overrides_are_bounded()
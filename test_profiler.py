@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy profilera próbkującego i raportu tracemalloc
+"""
+import time
+
+from utils.profiler import profile_threads, tracemalloc_report, _session_lock
+
+
+def test_non_finite_values_are_rejected():
+    """NaN i nieskończoność są odrzucane od razu, bez blokowania sesji diagnostycznej"""
+    for value in (float('nan'), float('inf')):
+        for call in (lambda: profile_threads(value), lambda: profile_threads(0.1, interval=value),
+                     lambda: tracemalloc_report(seconds=value)):
+            started = time.perf_counter()
+            try:
+                call()
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f'{value} nie został odrzucony')
+            assert time.perf_counter() - started < 1.0
+            assert not _session_lock.locked()
+
+    profiler = profile_threads(0.1, interval=0.01)
+    assert profiler.duration < 1.0
+    print("✅ Nieskończone wartości odrzucane przez profiler")
+
+
+if __name__ == "__main__":
+    test_non_finite_values_are_rejected()
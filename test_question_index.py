@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy indeksu podobnych pytań (MinHash/LSH, dziennik zmian, przebudowa z historii)
+"""
+import os
+import json
+import time
+import shutil
+import tempfile
+
+from utils.question_index import QuestionIndex
+
+
+def _index(workdir: str, **kwargs) -> QuestionIndex:
+    return QuestionIndex(index_file=os.path.join(workdir, 'data', 'question_index.json'),
+                         history_dir=os.path.join(workdir, 'history'), **kwargs)
+
+
+def _wait_rebuilt(index: QuestionIndex):
+    for _ in range(100):
+        if not index.rebuilding:
+            return
+        time.sleep(0.02)
+    raise AssertionError('Przebudowa indeksu nie zakończyła się')
+
+
+def test_similar_questions_share_cluster():
+    """Warianty tego samego pytania trafiają do jednego klastra, inne pytania do osobnych"""
+    workdir = tempfile.mkdtemp()
+    try:
+        index = _index(workdir)
+        _wait_rebuilt(index)
+        first = index.add_question('Jak działa wysokościomierz ciśnieniowy?', 'u1', 's1')
+        second = index.add_question('jak dziala wysokosciomierz cisnieniowy', 'u2', 's2')
+        other = index.add_question('Co to jest prędkość przeciągnięcia?', 'u1', 's1')
+        assert first == second
+        assert other != first
+        assert index.get_cluster(first)['count'] == 2
+        assert index.most_asked(5)[0]['users_count'] == 2
+        index.add_question('Jak działa wysokościomierz?', 'u1', 's3')
+        assert index.most_asked(5)[0]['users_count'] == 2
+
+        # Dziennik przechowuje tylko licznik użytkowników, nie ich listę
+        index.flush()
+        with open(index.log_file, 'r', encoding='utf-8') as f:
+            logged = [json.loads(line)['cluster'] for line in f]
+        assert all('users' not in cluster for cluster in logged)
+        assert _index(workdir).get_cluster(first)['users_count'] == 2
+        print("✅ Podobne pytania w jednym klastrze")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_assigned_question_counts_only_when_confirmed():
+    """assign_question wyznacza klaster bez liczenia - wystąpienie dolicza count_question"""
+    workdir = tempfile.mkdtemp()
+    try:
+        index = _index(workdir)
+        _wait_rebuilt(index)
+        rejected = index.assign_question('Jak działa VOR?')
+        assert index.get_cluster(rejected)['count'] == 0
+        assert index.stats()['clusters'] == 0
+        index.flush()
+        assert index.stats()['log_entries'] == 0
+
+        assigned = index.assign_question('jak dziala VOR')
+        assert assigned == rejected
+        assert index.count_question(assigned, 'jak dziala VOR', 'u1', 's1') == assigned
+        assert index.get_cluster(assigned)['count'] == 1
+        assert index.stats()['clusters'] == 1
+        print("✅ Przypisane pytanie liczone dopiero po potwierdzeniu")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_log_persistence_and_compaction():
+    """Zmiany trafiają do dziennika (tylko zmienione klastry), a scalanie tworzy migawkę"""
+    workdir = tempfile.mkdtemp()
+    try:
+        index = _index(workdir, compact_every=1000)
+        _wait_rebuilt(index)
+        for i in range(3):
+            index.add_question(f'Pytanie testowe numer {i} o nawigacji VOR', 'u1', 's1', autosave=False)
+        index.flush()
+        with open(index.log_file, 'r', encoding='utf-8') as f:
+            assert len(f.readlines()) == index.stats()['log_entries'] > 0
+
+        # Jedna zmiana - jeden dopisany wpis, niezależnie od rozmiaru indeksu
+        entries = index.stats()['log_entries']
+        index.add_question('Pytanie testowe numer 0 o nawigacji VOR', 'u2', 's2', autosave=False)
+        index.flush()
+        assert index.stats()['log_entries'] == entries + 1
+
+        reloaded = _index(workdir)
+        assert reloaded.stats()['total_questions'] == 4
+        assert reloaded.stats()['clusters'] == index.stats()['clusters']
+
+        index.compact_every = 1
+        index.add_question('Czym jest QNH?', 'u3', 's3', autosave=False)
+        index.flush()
+        assert index.stats()['log_entries'] == 0
+        with open(index.index_file, 'r', encoding='utf-8') as f:
+            assert len(json.load(f)['clusters']) == index.stats()['clusters']
+        assert _index(workdir).stats()['total_questions'] == 5
+        print("✅ Dziennik zmian i scalanie migawki")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_legacy_user_lists_become_counts():
+    """Dawne wpisy z pełną listą użytkowników wczytywane są jako licznik"""
+    workdir = tempfile.mkdtemp()
+    try:
+        index = _index(workdir)
+        _wait_rebuilt(index)
+        cluster_id = index.add_question('Czym jest QNH?', 'u1', 's1', autosave=False)
+        index.flush()
+        with open(index.log_file, 'r', encoding='utf-8') as f:
+            entry = json.loads(f.readline())
+        entry['cluster'].pop('users_count')
+        entry['cluster']['users'] = ['u1', 'u2']
+        with open(index.log_file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+        reloaded = _index(workdir)
+        assert 'users' not in reloaded.get_cluster(cluster_id)
+        assert reloaded.get_cluster(cluster_id)['users_count'] == 2
+        reloaded.add_question('Czym jest QNH?', 'u2', 's2', autosave=False)
+        assert reloaded.get_cluster(cluster_id)['users_count'] == 2
+        print("✅ Lista użytkowników z dawnych wpisów zamieniona na licznik")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_background_rebuild_from_history():
+    """Brak indeksu - budowa z historii w tle, bez podwójnego liczenia nowych pytań"""
+    workdir = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(workdir, 'history'))
+        history = [
+            {'role': 'user', 'content': 'Jak działa VOR?', 'user_id': 'u1', 'timestamp': '2024-01-01T10:00:00'},
+            {'role': 'assistant', 'content': 'VOR to...', 'timestamp': '2024-01-01T10:00:05'},
+            {'role': 'user', 'content': 'jak dziala VOR', 'user_id': 'u2', 'timestamp': '2024-01-02T10:00:00'},
+        ]
+        with open(os.path.join(workdir, 'history', 's1.json'), 'w', encoding='utf-8') as f:
+            json.dump(history, f)
+
+        index = _index(workdir)
+        _wait_rebuilt(index)
+        assert index.stats()['total_questions'] == 2
+        assert os.path.exists(index.index_file)
+        print("✅ Przebudowa z historii w tle")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_similar_questions_share_cluster()
+    test_assigned_question_counts_only_when_confirmed()
+    test_log_persistence_and_compaction()
+    test_legacy_user_lists_become_counts()
+    test_background_rebuild_from_history()
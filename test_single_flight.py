@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy łączenia identycznych generowań (single-flight)
+"""
+import threading
+
+from utils.single_flight import SingleFlight, single_flight_key
+
+
+def test_key_isolation():
+    """Różne prompty uczenia (profile użytkowników) nie mogą dzielić generowania"""
+    context = [{'role': 'user', 'content': 'Co to jest VOR?'}]
+    docs = ['nawigacja.pdf']
+
+    base = single_flight_key('Co to jest VOR?', context, docs)
+    assert base == single_flight_key('co to jest  VOR', context, docs)
+    assert base == single_flight_key('Co to jest VOR?', context, docs, '')
+
+    alice = single_flight_key('Co to jest VOR?', context, docs, 'Użytkownik lubi wzory')
+    bob = single_flight_key('Co to jest VOR?', context, docs, 'Użytkownik woli krótkie odpowiedzi')
+    assert alice != bob
+    assert alice != base
+    assert alice == single_flight_key('Co to jest VOR?', context, docs, 'Użytkownik lubi wzory')
+    print("✅ Klucz single-flight uwzględnia prompt uczenia")
+
+
+def _run_shared_flight(producer, result):
+    """Lider i jeden odbiorca dołączający w trakcie; zwraca (fragmenty, wyniki) obu"""
+    flight = SingleFlight(chunk_timeout=5.0)
+    release = threading.Event()
+    started = threading.Event()
+    results = {}
+
+    def gated(is_cancelled):
+        started.set()
+        release.wait(5)
+        yield from producer(is_cancelled)
+
+    def on_result(name):
+        return lambda value, shared: results.__setitem__(name, (value, shared))
+
+    leader = flight.stream('k', gated, result=result, on_result=on_result('leader'))
+    leader_chunks = []
+    reader = threading.Thread(target=lambda: leader_chunks.extend(leader))
+    reader.start()
+    assert started.wait(5)
+
+    follower = flight.stream('k', lambda c: iter(()), result=lambda: {'usage': 'obcy'},
+                             on_result=on_result('follower'))
+    release.set()
+    follower_chunks = list(follower)
+    reader.join(5)
+    assert flight.stats()['started'] == 1 and flight.stats()['coalesced'] == 1
+    return leader_chunks, follower_chunks, results
+
+
+def test_follower_result_propagation():
+    """Odbiorca dostaje klucz cache i błąd lidera, ale tokeny zalicza tylko lider"""
+    usage = {'model': 'gpt-4o', 'total_tokens': 280}
+
+    def producer(is_cancelled):
+        yield 'Radiolatarnia '
+        yield 'VOR'
+
+    leader_chunks, follower_chunks, results = _run_shared_flight(
+        producer, lambda: {'usage': usage, 'cache_key': 'abc', 'error': None})
+
+    assert leader_chunks == follower_chunks == ['Radiolatarnia ', 'VOR']
+    assert results['leader'] == ({'usage': usage, 'cache_key': 'abc', 'error': None}, False)
+    follower_result, shared = results['follower']
+    assert shared is True
+    assert follower_result['cache_key'] == 'abc'
+    print("✅ Wynik generowania trafia do wszystkich odbiorców")
+
+
+def test_follower_sees_upstream_error():
+    """Wyjątek producenta jest raportowany jako błąd każdemu odbiorcy"""
+    def producer(is_cancelled):
+        yield 'Początek'
+        raise RuntimeError('upstream 500')
+
+    _, follower_chunks, results = _run_shared_flight(producer, lambda: {'error': None})
+
+    assert follower_chunks == ['Początek']
+    assert results['leader'][0]['error'] == 'upstream 500'
+    assert results['follower'][0]['error'] == 'upstream 500'
+    print("✅ Błąd dostawcy widoczny u wszystkich odbiorców")
+
+
+def test_cancelling_leader_gets_result():
+    """Lider, który anulował generowanie, dostaje wynik producenta (usage anulowanego runu)"""
+    flight = SingleFlight(chunk_timeout=5.0)
+    cancelled = threading.Event()
+    results = []
+
+    def producer(is_cancelled):
+        yield 'Początek'
+        while not is_cancelled():
+            threading.Event().wait(0.01)
+        threading.Event().wait(0.1)  # domykanie runu u dostawcy
+        results.append('producer_done')
+
+    stream = flight.stream('k', producer, cancelled.is_set, result=lambda: {'usage': {'total_tokens': 42}},
+                           on_result=lambda value, shared: results.append((value, shared)))
+    assert next(stream) == 'Początek'
+    cancelled.set()
+    assert list(stream) == []
+    assert results == ['producer_done', ({'usage': {'total_tokens': 42}}, False)]
+    print("✅ Anulujący lider dostaje usage producenta")
+
+
+if __name__ == "__main__":
+    test_key_isolation()
+    test_follower_result_propagation()
+    test_follower_sees_upstream_error()
+    test_cancelling_leader_gets_result()
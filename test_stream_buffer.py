@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy wznawiania strumieni odpowiedzi po ponownym połączeniu
+"""
+from utils.stream_buffer import StreamBufferRegistry
+
+
+def _registry(**kwargs):
+    sent = []
+    registry = StreamBufferRegistry(lambda event, payload, sid: sent.append((sid, event, payload)), **kwargs)
+    return registry, sent
+
+
+def test_resume_replays_missing_text():
+    """Po wznowieniu klient dostaje brakującą część od offsetu, a dalsze fragmenty trafiają do nowego połączenia"""
+    registry, sent = _registry()
+    stream = registry.open('m1', 'pilot', 'sid-1')
+    registry.send_chunk(stream, 'Radiolatarnia ')
+    registry.send_chunk(stream, 'VOR ')
+    assert [p['next_offset'] for _, _, p in sent] == [14, 18]
+
+    assert registry.detach('sid-1') == [stream]
+    registry.send_chunk(stream, 'nadaje radiale')  # klient już tego nie odebrał
+
+    result = registry.resume('m1', 'pilot', 'sid-2', offset=14)
+    assert result == {'replayed': 18, 'done': False}
+    sid, event, payload = sent[-1]
+    assert (sid, event) == ('sid-2', 'response_chunk')
+    assert payload['chunk'] == 'VOR nadaje radiale' and payload['offset'] == 14 and payload['resumed']
+
+    registry.send_chunk(stream, '.')
+    assert sent[-1][0] == 'sid-2' and sent[-1][2]['offset'] == 32
+    print("✅ Wznowienie uzupełnia brakujący tekst")
+
+
+def test_resume_after_finish_and_ownership():
+    """Zdarzenia końcowe są powtarzane po wznowieniu; cudzy bufor nie jest wydawany"""
+    registry, sent = _registry()
+    stream = registry.open('m1', 'pilot', 'sid-1')
+    registry.send_chunk(stream, 'Odpowiedź')
+    registry.send(stream, 'response_complete', {'message_id': 'm1'}, final=True)
+    registry.finish(stream)
+
+    assert registry.resume('m1', 'intruz', 'sid-x') is None
+    assert registry.resume('nieznany', 'pilot', 'sid-2') is None
+
+    sent.clear()
+    assert registry.resume('m1', 'pilot', 'sid-2', offset=len('Odpowiedź')) == {'replayed': 0, 'done': True}
+    assert [(sid, event) for sid, event, _ in sent] == [('sid-2', 'response_complete')]
+    print("✅ Zdarzenia końcowe powtarzane tylko właścicielowi")
+
+
+def test_purge_keeps_active_streams():
+    """Czyszczenie usuwa tylko zakończone bufory po okresie przechowywania"""
+    registry, _ = _registry(retention_seconds=0)
+    finished = registry.open('m1', 'pilot', 'sid-1')
+    registry.open('m2', 'pilot', 'sid-1')
+    registry.finish(finished)
+    finished.finished_at -= 1
+
+    assert registry.purge() == 1
+    assert registry.get('m1') is None and registry.get('m2') is not None
+    assert registry.stats()['active'] == 1
+    print("✅ Czyszczenie zachowuje aktywne bufory")
+
+
+if __name__ == "__main__":
+    test_resume_replays_missing_text()
+    test_resume_after_finish_and_ownership()
+    test_purge_keeps_active_streams()
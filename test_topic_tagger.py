@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy klasyfikatora tematów lotniczych
+"""
+from utils.topic_tagger import tag_topics, primary_topic, DEFAULT_TOPIC
+
+
+def test_overlapping_keywords():
+    """Nakładające się słowa kluczowe różnych tematów dają wszystkie tematy"""
+    assert tag_topics('Procedury awaryjne przy starcie') == ['procedury', 'bezpieczeństwo']
+    assert tag_topics('PROCEDURY AWARYJNE') == ['procedury', 'bezpieczeństwo']
+    assert tag_topics('Siła nośna przy przeciągnięciu i pogoda') == ['aerodynamika', 'meteorologia']
+    print("✅ Nakładające się słowa kluczowe")
+
+
+def test_whole_word_keywords():
+    """"lot" jako całe słowo - także na końcu tekstu, ale nie jako przedrostek"""
+    assert tag_topics('Planuję lot') == ['pilotaż']
+    assert tag_topics('Jak wygląda lot po kręgu?') == ['pilotaż']
+    assert tag_topics('Gdzie jest lotnisko?') == ['operacje']
+    assert tag_topics('Czas lotu do Gdańska') == ['pilotaż']
+    print("✅ Słowa dopasowywane jako całe słowa")
+
+
+def test_word_boundaries_and_default():
+    """Słowa kluczowe dopasowywane od początku słowa; brak tematu - temat domyślny"""
+    assert tag_topics('Jak działa VOR?') == ['nawigacja']
+    assert 'nawigacja' not in tag_topics('Faworyt')
+    assert tag_topics('Dzień dobry') == []
+    assert tag_topics('') == []
+    assert primary_topic(tag_topics('Dzień dobry')) == DEFAULT_TOPIC
+    print("✅ Granice słów i temat domyślny")
+
+
+if __name__ == "__main__":
+    test_overlapping_keywords()
+    test_whole_word_keywords()
+    test_word_boundaries_and_default()
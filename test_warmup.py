@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testy rozgrzewania i gotowości instancji (/readyz)
+"""
+from app import warmup
+
+
+def _failing():
+    raise RuntimeError('brak połączenia z OpenAI')
+
+
+def test_critical_step_blocks_readiness():
+    """Błąd kroku krytycznego blokuje gotowość do udanego ponowienia"""
+    calls = []
+    steps = [('rag_client', _failing), ('indexes', lambda: calls.append('indexes'))]
+    original = warmup.WARMUP_STEPS
+    try:
+        warmup.run_warmup(steps)
+        assert not warmup.is_ready()
+        assert warmup.failed_steps() == ['rag_client']
+        assert warmup.failed_steps(critical_only=True) == ['rag_client']
+
+        warmup.WARMUP_STEPS = [('rag_client', lambda: calls.append('rag_client')), steps[1]]
+        warmup.retry_critical_steps()
+        assert calls == ['indexes', 'rag_client']
+        assert warmup.is_ready()
+        assert warmup.failed_steps() == []
+    finally:
+        warmup.WARMUP_STEPS = original
+    print("✅ Krok krytyczny blokuje gotowość do udanego ponowienia")
+
+
+def test_optional_step_failure_keeps_ready():
+    """Błąd kroku niekrytycznego jest raportowany, ale nie blokuje gotowości"""
+    warmup.run_warmup([('rag_client', lambda: None), ('analytics', _failing)])
+    assert warmup.is_ready()
+    assert warmup.failed_steps() == ['analytics']
+    assert warmup.failed_steps(critical_only=True) == []
+    print("✅ Błąd kroku niekrytycznego nie blokuje gotowości")
+
+
+if __name__ == "__main__":
+    test_critical_step_blocks_readiness()
+    test_optional_step_failure_keeps_ready()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pamięć podręczna odpowiedzi na powtarzające się pytania
+
+Klucz wpisu to znormalizowane pytanie i skrót zestawu dokumentów użytych
+do odpowiedzi. Pytania podobne (ten sam klaster w indeksie pytań i
+podobieństwo sygnatur powyżej progu) trafiają w ten sam wpis. Odpowiedź
+wygenerowana ze spersonalizowanym promptem uczenia jest dostępna tylko dla
+tego samego promptu (odcisk w kluczu), więc nie trafia do innych
+użytkowników. Wpisy mają
+czas życia, są usuwane według LRU, unieważniane przy zmianie dokumentów
+i po negatywnym feedbacku.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from utils.question_index import get_question_index, estimate_similarity
+
+logger = logging.getLogger(__name__)
+
+
+def documents_fingerprint(file_paths: List[str], base_dir: str = 'uploads') -> List[Dict]:
+    """Zwraca opis wersji dokumentów (ścieżka, rozmiar, czas modyfikacji)"""
+    fingerprint = []
+    for file_path in sorted(file_paths):
+        try:
+            stat = os.stat(os.path.join(base_dir, file_path))
+            fingerprint.append({'path': file_path, 'size': stat.st_size, 'mtime': int(stat.st_mtime)})
+        except OSError:
+            fingerprint.append({'path': file_path, 'size': None, 'mtime': None})
+    return fingerprint
+
+
+def documents_hash(fingerprint: List[Dict]) -> str:
+    """Zwraca skrót zestawu dokumentów"""
+    payload = json.dumps(fingerprint, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def prompt_fingerprint(learning_prompt: Optional[str]) -> str:
+    """Zwraca odcisk promptu uczenia ('' dla odpowiedzi bez personalizacji)"""
+    if not learning_prompt:
+        return ''
+    return hashlib.sha1(learning_prompt.encode('utf-8')).hexdigest()[:16]
+
+
+class AnswerCache:
+    """Pamięć podręczna odpowiedzi z TTL, LRU i dopasowaniem podobnych pytań"""
+
+    MAX_SERVED = 5000
+
+    def __init__(self, cache_dir: str = 'data/answer_cache', capacity: int = 500,
+                 ttl_seconds: int = 7 * 24 * 3600, threshold: float = 0.8,
+                 chunk_size: int = 80):
+        self.cache_dir = cache_dir
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self._by_cluster = {}
+        self._served = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Klucze i pliki
+    # ------------------------------------------------------------------
+
+    def _entry_key(self, normalized: str, doc_hash: str, variant: str = '') -> str:
+        raw = f'{normalized}|{doc_hash}|{variant}' if variant else f'{normalized}|{doc_hash}'
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def _load(self):
+        """Wczytuje zapisane wpisy (od najstarszego użycia)"""
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.cache_dir, filename), 'r', encoding='utf-8') as f:
+                    entries.append(json.load(f))
+            except Exception:
+                continue
+
+        entries.sort(key=lambda e: e.get('last_used', 0))
+        with self._lock:
+            for entry in entries:
+                # Wpisy sprzed rozdzielenia promptów uczenia mogą zawierać spersonalizowane odpowiedzi
+                if self._expired(entry) or 'variant' not in entry:
+                    self._remove_file(entry['key'])
+                    continue
+                self._index(entry)
+            self._evict_overflow()
+
+    def _write_entry(self, entry: Dict):
+        path = self._entry_path(entry['key'])
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error("Błąd zapisu odpowiedzi do cache: %s", e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _remove_file(self, key: str):
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Indeks w pamięci
+    # ------------------------------------------------------------------
+
+    def _index(self, entry: Dict):
+        self._entries[entry['key']] = entry
+        if entry.get('cluster_id'):
+            self._by_cluster.setdefault(entry['cluster_id'], set()).add(entry['key'])
+
+    def _drop(self, key: str, reason: str = ''):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        cluster_keys = self._by_cluster.get(entry.get('cluster_id'))
+        if cluster_keys:
+            cluster_keys.discard(key)
+            if not cluster_keys:
+                self._by_cluster.pop(entry.get('cluster_id'), None)
+        self._remove_file(key)
+        if reason:
+            logger.info("Usunięto odpowiedź z cache (%s): %s", reason, entry.get('question', '')[:50])
+
+    def _expired(self, entry: Dict) -> bool:
+        return time.time() - entry.get('created_at', 0) > self.ttl_seconds
+
+    def _evict_overflow(self):
+        while len(self._entries) > self.capacity:
+            oldest_key = next(iter(self._entries))
+            self._drop(oldest_key, 'LRU')
+
+    def _documents_changed(self, entry: Dict) -> bool:
+        current = documents_fingerprint([doc['path'] for doc in entry.get('documents', [])])
+        return documents_hash(current) != entry.get('doc_hash')
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def lookup(self, question: str, file_paths: List[str], exact: bool = False,
+               learning_prompt: str = None) -> Optional[Dict]:
+        """Szuka odpowiedzi na to samo lub podobne pytanie dla tego samego zestawu dokumentów
+
+        Przy exact=True pasuje tylko to samo pytanie po normalizacji. Pasują tylko
+        odpowiedzi wygenerowane z tym samym promptem uczenia.
+        """
+        index = get_question_index()
+        normalized, signature = index.signature_for(question)
+        if not normalized:
+            return None
+        doc_hash = documents_hash(documents_fingerprint(file_paths))
+        variant = prompt_fingerprint(learning_prompt)
+
+        with self._lock:
+            candidates = [self._entry_key(normalized, doc_hash, variant)]
+            cluster, _ = index.find_similar(question) if not exact else (None, 0.0)
+            if cluster:
+                candidates.extend(self._by_cluster.get(cluster['id'], ()))
+
+            best, best_score = None, 0.0
+            for key in candidates:
+                entry = self._entries.get(key)
+                if not entry or entry['doc_hash'] != doc_hash or entry.get('variant') != variant:
+                    continue
+                if self._expired(entry):
+                    self._drop(key, 'TTL')
+                    continue
+                score = 1.0 if entry['normalized'] == normalized else estimate_similarity(signature, entry['signature'])
+                if score > best_score:
+                    best, best_score = entry, score
+
+            if best is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+
+            best['hits'] = best.get('hits', 0) + 1
+            best['last_used'] = time.time()
+            self._entries.move_to_end(best['key'])
+            self.hits += 1
+            logger.debug("Odpowiedź z cache (podobieństwo %.2f, trafienia %d)", best_score, best['hits'])
+            return best
+
+    def store(self, question: str, file_paths: List[str], answer: str, documents_used: int = 0,
+              learning_prompt: str = None) -> Optional[str]:
+        """Zapisuje odpowiedź w cache (dla promptu uczenia, z którym powstała) i zwraca klucz wpisu"""
+        if not answer or not answer.strip():
+            return None
+        index = get_question_index()
+        normalized, signature = index.signature_for(question)
+        if not normalized:
+            return None
+
+        fingerprint = documents_fingerprint(file_paths)
+        doc_hash = documents_hash(fingerprint)
+        cluster, _ = index.find_similar(question)
+        variant = prompt_fingerprint(learning_prompt)
+        now = time.time()
+        entry = {
+            'key': self._entry_key(normalized, doc_hash, variant),
+            'question': question.strip()[:300],
+            'normalized': normalized,
+            'signature': signature,
+            'cluster_id': cluster['id'] if cluster else None,
+            'doc_hash': doc_hash,
+            'variant': variant,
+            'documents': fingerprint,
+            'documents_used': documents_used,
+            'answer': answer,
+            'hits': 0,
+            'created_at': now,
+            'last_used': now,
+            'created_at_iso': datetime.now().isoformat()
+        }
+
+        with self._lock:
+            self._drop(entry['key'])
+            self._index(entry)
+            self._evict_overflow()
+        self._write_entry(entry)
+        return entry['key']
+
+    def replay_chunks(self, entry: Dict):
+        """Odtwarza zapisaną odpowiedź jako strumień fragmentów"""
+        answer = entry['answer']
+        for start in range(0, len(answer), self.chunk_size):
+            yield answer[start:start + self.chunk_size]
+
+    def mark_served(self, message_id: str, key: str):
+        """Zapamiętuje, który wpis cache został wysłany jako dana wiadomość"""
+        if not message_id or not key:
+            return
+        with self._lock:
+            self._served[message_id] = key
+            self._served.move_to_end(message_id)
+            while len(self._served) > self.MAX_SERVED:
+                self._served.popitem(last=False)
+
+    def evict_for_message(self, message_id: str) -> bool:
+        """Usuwa wpis cache powiązany z wiadomością (np. po negatywnym feedbacku)"""
+        with self._lock:
+            key = self._served.pop(message_id, None)
+            if key and key in self._entries:
+                self._drop(key, 'negatywny feedback')
+                return True
+        return False
+
+    def invalidate_documents(self, file_paths: List[str]) -> int:
+        """Usuwa wpisy oparte o zmienione lub usunięte dokumenty"""
+        paths = set(file_paths)
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if any(doc['path'] in paths for doc in entry.get('documents', []))
+            ]
+            for key in stale:
+                self._drop(key, 'zmiana dokumentów')
+        return len(stale)
+
+    def purge_stale(self) -> int:
+        """Usuwa wpisy przeterminowane lub z nieaktualnymi dokumentami"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if self._expired(entry) or self._documents_changed(entry)]
+            for key in stale:
+                self._drop(key, 'nieaktualny')
+        return len(stale)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Zwraca globalną pamięć podręczną odpowiedzi"""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache()
+    return _answer_cache
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tryb pracy serwera Socket.IO (threading / eventlet / gevent)
+
+Tryb wybiera zmienna SOCKETIO_ASYNC_MODE. W trybie eventlet lub gevent
+moduły standardowe (socket, ssl, threading, time) muszą zostać podmienione
+na wersje kooperacyjne zanim zaimportowana zostanie aplikacja - wtedy
+strumieniowanie z OpenAI (httpx), wątki w tle i harmonogram raportów
+działają jako lekkie zielone wątki. Operacje blokujące CPU lub dysk
+(np. generowanie PDF) przekazywane są do puli prawdziwych wątków.
+"""
+import os
+from dotenv import load_dotenv
+
+# Tryb musi być znany przed importem aplikacji, więc .env wczytujemy tutaj
+load_dotenv()
+
+SUPPORTED_MODES = ('threading', 'eventlet', 'gevent')
+
+_patched = False
+
+
+def get_async_mode() -> str:
+    """Zwraca skonfigurowany tryb pracy serwera"""
+    mode = os.getenv('SOCKETIO_ASYNC_MODE', 'threading').strip().lower()
+    if mode not in SUPPORTED_MODES:
+        print(f"⚠️  Nieznany tryb SOCKETIO_ASYNC_MODE={mode}, używam threading")
+        mode = 'threading'
+    return mode
+
+
+def monkey_patch():
+    """Podmienia moduły standardowe na kooperacyjne (wywołać przed importem aplikacji)"""
+    global _patched
+    if _patched:
+        return get_async_mode()
+
+    mode = get_async_mode()
+    if mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+    _patched = True
+    if mode != 'threading':
+        print(f"🧵 Tryb kooperacyjny: {mode}")
+    return mode
+
+
+def run_blocking(func, *args, **kwargs):
+    """Wykonuje operację blokującą bez zatrzymywania pętli zdarzeń"""
+    mode = get_async_mode() if _patched else 'threading'
+    if mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(func, *args, **kwargs)
+    if mode == 'gevent':
+        from gevent import get_hub
+        return get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
+
+
+def real_sleep(seconds: float):
+    """Usypia prawdziwy wątek systemowy (także w puli wątków po monkey_patch)"""
+    mode = get_async_mode() if _patched else 'threading'
+    if mode == 'eventlet':
+        from eventlet import patcher
+        return patcher.original('time').sleep(seconds)
+    if mode == 'gevent':
+        from gevent import monkey
+        return monkey.get_original('time', 'sleep')(seconds)
+    import time
+    return time.sleep(seconds)
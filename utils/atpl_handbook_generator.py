@@ -8,10 +8,12 @@ Automatyczne tworzenie podręcznika na podstawie dostępnych dokumentów i AI
 import os
 import json
 import uuid
+import threading
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 import PyPDF2
 from .openai_rag import OpenAIRAG
+from .token_usage import usage_from_response, get_usage_ledger
 import re
 
 
@@ -27,6 +29,9 @@ class ATPLHandbookGenerator:
             print(f"⚠️  Błąd inicjalizacji OpenAI: {e}")
             self.client = None
         
+        # Zużycie tokenów ostatniego wywołania AI
+        self.last_usage = None
+        
         self.handbook_dir = 'handbook'
         self.program_file = None
         self.handbook_structure = {}
@@ -66,7 +71,16 @@ class ATPLHandbookGenerator:
             print(f"❌ Błąd wyciągania tekstu z PDF: {e}")
             return ""
     
-    def analyze_program_structure(self) -> Dict[str, Any]:
+    def _record_usage(self, response, user_id: str = None) -> Optional[Dict]:
+        """Zapamiętuje usage odpowiedzi chat.completions i dolicza je do liczników"""
+        self.last_usage = usage_from_response(getattr(response, 'usage', None), getattr(response, 'model', None))
+        try:
+            get_usage_ledger().record(self.last_usage, user_id, 'handbook')
+        except Exception as e:
+            print(f"⚠️  Błąd zapisu zużycia tokenów: {e}")
+        return self.last_usage
+    
+    def analyze_program_structure(self, user_id: str = None) -> Dict[str, Any]:
         """Analizuj strukturę programu ATPL używając AI"""
         if not self.program_file:
             if not self.find_program_file():
@@ -155,6 +169,7 @@ class ATPLHandbookGenerator:
                 timeout=60  # 60 sekund timeout
             )
             
+            self._record_usage(response, user_id)
             structure_text = response.choices[0].message.content
             print(f"📝 Otrzymano odpowiedź AI ({len(structure_text)} znaków)")
             
@@ -306,7 +321,8 @@ class ATPLHandbookGenerator:
             return self.analyze_program_structure()
         return self.handbook_structure
     
-    def generate_chapter_content(self, module_id: str, chapter_id: str = None, topic_id: str = None, ai_type: str = 'comprehensive') -> str:
+    def generate_chapter_content(self, module_id: str, chapter_id: str = None, topic_id: str = None, ai_type: str = 'comprehensive',
+                                 user_id: str = None) -> str:
         """Generuj treść rozdziału/tematu używając AI i dostępnych dokumentów"""
         structure = self.get_handbook_structure()
         
@@ -370,12 +386,13 @@ class ATPLHandbookGenerator:
             )
             
             content = response.choices[0].message.content
+            usage = self._record_usage(response, user_id)
             
             # Zapisz wygenerowaną treść
             self._save_generated_content(module_id, chapter_id, topic_id, content)
             
-            # Zaktualizuj postęp
-            self._update_progress(module_id, chapter_id, topic_id, 'generated')
+            # Zaktualizuj postęp (razem ze zużyciem tokenów)
+            self._update_progress(module_id, chapter_id, topic_id, 'generated', usage)
             
             return content
             
@@ -592,7 +609,8 @@ class ATPLHandbookGenerator:
         
         print(f"💾 Zapisano treść: {filepath}")
     
-    def _update_progress(self, module_id: str, chapter_id: str = None, topic_id: str = None, status: str = 'unknown'):
+    def _update_progress(self, module_id: str, chapter_id: str = None, topic_id: str = None, status: str = 'unknown',
+                         usage: Dict = None):
         """Zaktualizuj postęp generowania"""
         if 'progress' not in self.handbook_structure:
             self.handbook_structure['progress'] = {}
@@ -612,6 +630,8 @@ class ATPLHandbookGenerator:
             'chapter_id': chapter_id,
             'topic_id': topic_id
         }
+        if usage:
+            self.handbook_structure['progress'][key]['usage'] = usage
         
         self.save_progress()
     
@@ -769,12 +789,15 @@ class ATPLHandbookGenerator:
         print("🔄 Podręcznik został zresetowany")
 
 
-# Globalna instancja generatora
+# Globalna instancja generatora (tworzona przy pierwszym użyciu lub w rozgrzewaniu po starcie)
 _handbook_generator = None
+_handbook_generator_lock = threading.Lock()
 
 def get_handbook_generator():
     """Pobierz globalną instancję generatora podręcznika"""
     global _handbook_generator
     if _handbook_generator is None:
-        _handbook_generator = ATPLHandbookGenerator()
+        with _handbook_generator_lock:
+            if _handbook_generator is None:
+                _handbook_generator = ATPLHandbookGenerator()
     return _handbook_generator
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Łączenie fragmentów strumienia odpowiedzi w większe ramki Socket.IO
+
+Dostawca zwraca odpowiedź w bardzo małych fragmentach (kilka znaków).
+Koalescer wysyła pierwszy fragment od razu, a kolejne zbiera w bufor
+i wysyła jedną ramką po upływie interwału lub po przekroczeniu progu
+rozmiaru. Jeśli dostawca zamilknie, zaległa ramka jest wysyłana przez
+wspólny wątek terminów po upływie interwału (a nie dopiero przy kolejnym
+fragmencie). Globalne liczniki pozwalają porównać liczbę wysłanych ramek
+z liczbą otrzymanych fragmentów.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Domyślne ustawienia (nadpisywane zmiennymi środowiskowymi)
+DEFAULT_FLUSH_INTERVAL = float(os.getenv('STREAM_FLUSH_INTERVAL_MS', 50)) / 1000.0
+DEFAULT_FLUSH_BYTES = int(os.getenv('STREAM_FLUSH_BYTES', 512))
+
+_stats_lock = threading.Lock()
+_stats = {'streams': 0, 'deltas': 0, 'frames': 0, 'bytes': 0, 'deadline_frames': 0}
+
+
+class _DeadlineFlusher:
+    """Jeden wątek w tle wysyłający zaległe ramki wszystkich koalescerów po terminie"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._deadlines = {}
+        self._thread = None
+
+    def schedule(self, coalescer: 'ChunkCoalescer', deadline: float):
+        with self._cond:
+            if coalescer in self._deadlines:
+                return
+            self._deadlines[coalescer] = deadline
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name='chunk-flusher')
+                self._thread.start()
+            self._cond.notify()
+
+    def cancel(self, coalescer: 'ChunkCoalescer'):
+        with self._cond:
+            self._deadlines.pop(coalescer, None)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._deadlines:
+                    self._cond.wait()
+                now = time.monotonic()
+                due = [c for c, deadline in self._deadlines.items() if deadline <= now]
+                if not due:
+                    self._cond.wait(min(self._deadlines.values()) - now)
+                    continue
+                for coalescer in due:
+                    del self._deadlines[coalescer]
+            for coalescer in due:
+                coalescer._flush_due()
+
+
+_flusher = _DeadlineFlusher()
+
+
+class ChunkCoalescer:
+    """Bufor fragmentów odpowiedzi dla jednego klienta"""
+
+    def __init__(self, send: Callable[[str], None], flush_interval: float = None,
+                 flush_bytes: int = None):
+        self.send = send
+        self.flush_interval = DEFAULT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.flush_bytes = DEFAULT_FLUSH_BYTES if flush_bytes is None else flush_bytes
+        self._lock = threading.RLock()
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._last_flush = 0.0
+        self._closed = False
+        self.deltas = 0
+        self.frames = 0
+
+        with _stats_lock:
+            _stats['streams'] += 1
+
+    def add(self, delta: str):
+        """Dodaje fragment i wysyła ramkę, jeśli minął interwał lub bufor jest pełny"""
+        if not delta:
+            return
+        with self._lock:
+            self.deltas += 1
+            self._buffer.append(delta)
+            self._buffer_bytes += len(delta.encode('utf-8'))
+
+            # Pierwszy fragment bez opóźnienia, żeby nie zwiększać czasu do pierwszego znaku
+            if (self.frames == 0
+                    or self._buffer_bytes >= self.flush_bytes
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+            else:
+                # Reszta bufora wyjdzie najpóźniej po interwale, nawet bez kolejnych fragmentów
+                _flusher.schedule(self, self._last_flush + self.flush_interval)
+
+    def flush(self):
+        """Wysyła zebrane fragmenty jako jedną ramkę"""
+        with self._lock:
+            if not self._buffer:
+                return
+            frame = ''.join(self._buffer)
+            frame_bytes = self._buffer_bytes
+            self._buffer = []
+            self._buffer_bytes = 0
+            self._last_flush = time.monotonic()
+            self.frames += 1
+            # Wysyłka pod blokadą zachowuje kolejność ramek względem wątku terminów
+            self.send(frame)
+
+        with _stats_lock:
+            _stats['frames'] += 1
+            _stats['bytes'] += frame_bytes
+
+    def _flush_due(self):
+        """Wysyłka po terminie (wątek terminów); błąd transportu nie zatrzymuje wątku"""
+        with self._lock:
+            if self._closed or not self._buffer:
+                return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Błąd wysyłania zaległej ramki: %s", e)
+                return
+        with _stats_lock:
+            _stats['deadline_frames'] += 1
+
+    def close(self):
+        """Wysyła resztę bufora i dolicza fragmenty do statystyk globalnych"""
+        _flusher.cancel(self)
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            with _stats_lock:
+                _stats['deltas'] += self.deltas
+            self.flush()
+
+
+def get_stream_stats() -> Dict:
+    """Zwraca globalne statystyki ramek i fragmentów"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['deltas_per_frame'] = stats['deltas'] / stats['frames'] if stats['frames'] else 0.0
+    return stats
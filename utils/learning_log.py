@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Segmentowany dziennik analiz uczenia się (append-only z ograniczoną retencją)
+
+Każda analiza to jedna linia JSON dopisywana na koniec bieżącego segmentu.
+Segmenty są rotowane po przekroczeniu rozmiaru, a najstarsze usuwane
+zgodnie z limitem liczby wpisów i wieku. Zapis ma stały koszt i jest
+bezpieczny dla wielu wątków i procesów (blokada pliku).
+"""
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows - tylko blokada w obrębie procesu
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class LearningLog:
+    """Dziennik analiz uczenia się w postaci pierścienia segmentów JSONL"""
+
+    SEGMENT_PREFIX = 'segment_'
+    SEGMENT_SUFFIX = '.jsonl'
+
+    def __init__(self, log_dir: str = 'data/learning_log', max_entries: int = 100,
+                 max_age_days: int = 30, segment_max_bytes: int = 256 * 1024,
+                 legacy_file: Optional[str] = 'data/learning_data.json'):
+        self.log_dir = log_dir
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.segment_max_bytes = segment_max_bytes
+        self.lock_file = os.path.join(log_dir, '.lock')
+        self._thread_lock = threading.Lock()
+
+        is_new = not os.path.exists(self.log_dir)
+        os.makedirs(self.log_dir, exist_ok=True)
+        if is_new and legacy_file:
+            self._import_legacy(legacy_file)
+
+    # ------------------------------------------------------------------
+    # Blokady i segmenty
+    # ------------------------------------------------------------------
+
+    def _acquire(self):
+        """Zakłada blokadę wątku i pliku, zwraca uchwyt pliku blokady"""
+        self._thread_lock.acquire()
+        handle = None
+        try:
+            handle = open(self.lock_file, 'a')
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        except Exception:
+            if handle:
+                handle.close()
+            self._thread_lock.release()
+            raise
+        return handle
+
+    def _release(self, handle):
+        """Zwalnia blokady założone przez _acquire"""
+        try:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            handle.close()
+        finally:
+            self._thread_lock.release()
+
+    def _segments(self) -> List[str]:
+        """Zwraca ścieżki segmentów od najstarszego do najnowszego"""
+        names = [
+            name for name in os.listdir(self.log_dir)
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX)
+        ]
+        names.sort()
+        return [os.path.join(self.log_dir, name) for name in names]
+
+    def _segment_path(self, sequence: int) -> str:
+        return os.path.join(self.log_dir, f'{self.SEGMENT_PREFIX}{sequence:08d}{self.SEGMENT_SUFFIX}')
+
+    def _segment_sequence(self, path: str) -> int:
+        name = os.path.basename(path)
+        return int(name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)])
+
+    def _read_segment(self, path: str) -> List[Dict]:
+        """Wczytuje wpisy segmentu, pomijając uszkodzone linie"""
+        entries = []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _count_lines(self, path: str) -> int:
+        try:
+            with open(path, 'rb') as f:
+                return sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    # ------------------------------------------------------------------
+    # Zapis
+    # ------------------------------------------------------------------
+
+    def append(self, entry: Dict):
+        """Dopisuje jedną analizę na koniec dziennika"""
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        handle = self._acquire()
+        try:
+            segments = self._segments()
+            if segments and os.path.getsize(segments[-1]) < self.segment_max_bytes:
+                current = segments[-1]
+            else:
+                sequence = self._segment_sequence(segments[-1]) + 1 if segments else 1
+                current = self._segment_path(sequence)
+                segments.append(current)
+                # Retencja sprawdzana tylko przy rotacji segmentu
+                self._enforce_retention(segments[:-1])
+
+            with open(current, 'a', encoding='utf-8') as f:
+                f.write(line)
+        finally:
+            self._release(handle)
+
+    def _enforce_retention(self, closed_segments: List[str]):
+        """Usuwa zamknięte segmenty wykraczające poza limit liczby wpisów i wieku"""
+        cutoff = datetime.now() - timedelta(days=self.max_age_days)
+
+        # Segmenty, których ostatni zapis jest starszy niż limit wieku
+        remaining = []
+        for path in closed_segments:
+            try:
+                if datetime.fromtimestamp(os.path.getmtime(path)) < cutoff:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            remaining.append(path)
+
+        # Najstarsze segmenty, bez których nadal mamy co najmniej max_entries wpisów
+        counts = [self._count_lines(path) for path in remaining]
+        total = sum(counts)
+        for path, count in zip(remaining, counts):
+            if total - count < self.max_entries:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= count
+
+    def _import_legacy(self, legacy_file: str):
+        """Jednorazowo importuje dane z dawnego pliku learning_data.json"""
+        if not os.path.exists(legacy_file):
+            return
+        try:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                legacy_data = json.load(f)
+            if isinstance(legacy_data, list):
+                for entry in legacy_data[-self.max_entries:]:
+                    if isinstance(entry, dict):
+                        self.append(entry)
+                logger.info("Zaimportowano %d analiz z %s", len(legacy_data[-self.max_entries:]), legacy_file)
+        except Exception as e:
+            logger.warning("Błąd importu danych uczenia z %s: %s", legacy_file, e)
+
+    # ------------------------------------------------------------------
+    # Odczyt
+    # ------------------------------------------------------------------
+
+    def read_last(self, n: Optional[int] = None) -> List[Dict]:
+        """Zwraca ostatnie n analiz (od najstarszej do najnowszej) w granicach retencji"""
+        limit = self.max_entries if n is None else min(n, self.max_entries)
+        if limit <= 0:
+            return []
+
+        cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+        collected = []
+        for path in reversed(self._segments()):
+            entries = self._read_segment(path)
+            for entry in reversed(entries):
+                if entry.get('timestamp', '') and str(entry.get('timestamp')) < cutoff:
+                    continue
+                collected.append(entry)
+                if len(collected) >= limit:
+                    return list(reversed(collected))
+        return list(reversed(collected))
+
+    def latest(self) -> Optional[Dict]:
+        """Zwraca najnowszą analizę"""
+        entries = self.read_last(1)
+        return entries[-1] if entries else None
+
+    def count(self) -> int:
+        """Zwraca liczbę analiz w granicach retencji"""
+        return len(self.read_last())
+
+    def cleanup(self, days_old: Optional[int] = None) -> int:
+        """Usuwa analizy starsze niż days_old dni, zwraca liczbę usuniętych wpisów"""
+        cutoff = (datetime.now() - timedelta(days=days_old or self.max_age_days)).isoformat()
+        removed = 0
+        handle = self._acquire()
+        try:
+            for path in self._segments():
+                entries = self._read_segment(path)
+                kept = [e for e in entries if not e.get('timestamp') or str(e.get('timestamp')) >= cutoff]
+                if len(kept) == len(entries):
+                    continue
+                removed += len(entries) - len(kept)
+                if not kept:
+                    os.remove(path)
+                    continue
+                tmp_path = f'{path}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    for entry in kept:
+                        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                os.replace(tmp_path, path)
+        finally:
+            self._release(handle)
+        return removed
+
+
+_learning_log = None
+_learning_log_lock = threading.Lock()
+
+
+def get_learning_log() -> LearningLog:
+    """Zwraca globalny dziennik analiz uczenia się"""
+    global _learning_log
+    if _learning_log is None:
+        with _learning_log_lock:
+            if _learning_log is None:
+                _learning_log = LearningLog()
+    return _learning_log
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Przyrostowe profile uczenia się użytkowników
+
+Profil przechowuje zagregowane liczniki (słowa kluczowe, typy próśb, sygnały
+poziomu szczegółowości, progresję tematów) i jest aktualizowany wyłącznie
+na podstawie nowej wiadomości - bez ponownego wczytywania całej historii.
+"""
+import os
+import copy
+import json
+import logging
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from utils.topic_tagger import tag_topics, primary_topic
+
+logger = logging.getLogger(__name__)
+
+# Wzorce typów próśb użytkownika
+REQUEST_TYPE_PATTERNS = {
+    'examples': r'(przykład|przykłady|np\.|na przykład|pokaż|wzór|wzory)',
+    'explanations': r'(jak działa|wyjaśnij|objaśnij|co to jest|czym jest)',
+    'procedures': r'(procedura|krok po kroku|jak wykonać|instrukcja)',
+    'comparisons': r'(różnica|porównaj|lepszy|gorszy|vs|przeciwko)',
+    'calculations': r'(oblicz|wylicz|wzór|formuła|równanie)',
+    'definitions': r'(definicja|znaczenie|oznacza|definiuj)',
+    'practical': r'(praktyczne|w praktyce|zastosowanie|użycie)',
+    'theory': r'(teoria|teoretyczne|podstawy|zasady)'
+}
+
+# Wzorce kategorii pytań
+QUESTION_TYPE_PATTERNS = {
+    'definition': r'(co to jest|czym jest|definicja|znaczenie)',
+    'explanation': r'(jak działa|dlaczego|wyjaśnij|objaśnij)',
+    'procedure': r'(jak wykonać|procedura|krok po kroku|instrukcja)',
+    'comparison': r'(różnica|porównaj|lepszy|gorszy|vs)',
+    'example': r'(przykład|przykłady|wzór|wzory|dawaj|pokaż)',
+    'calculation': r'(oblicz|wylicz|ile|jaka wartość)',
+    'application': r'(zastosowanie|użycie|praktyce|gdzie używa)'
+}
+
+# Wzorce pytań następnych
+FOLLOW_UP_PATTERNS = {
+    'more_detail': r'(więcej|szczegółowo|dokładniej|szerzej|głębiej)',
+    'examples': r'(przykład|przykłady|wzór|wzory|dawaj|pokaż)',
+    'simplification': r'(prościej|prostymi słowami|łatwiej|jasniej)',
+    'practical': r'(praktyczne|w praktyce|jak zastosować|jak użyć)',
+    'related': r'(a co z|jak z|również|także|jeszcze|dodatkowo)'
+}
+
+# Sygnały preferowanego poziomu szczegółowości
+DETAIL_PATTERNS = {
+    'high': r'(szczegółowo|dokładnie|precyzyjnie|wszystko|kompletnie|wyczerpująco)',
+    'medium': r'(wyjaśnij|objaśnij|opisz|przedstaw)',
+    'low': r'(krótko|zwięźle|w skrócie|najważniejsze|podsumuj)'
+}
+
+# Typowe słowa pomijane przy zliczaniu słów kluczowych
+STOP_WORDS = {
+    'jak', 'co', 'czy', 'kiedy', 'gdzie', 'dlaczego', 'który', 'która', 'które',
+    'w', 'na', 'do', 'z', 'za', 'o', 'przy', 'dla', 'przez', 'od', 'po',
+    'jest', 'są', 'było', 'będzie', 'może', 'można', 'powinien', 'powinna',
+    'i', 'a', 'ale', 'lub', 'oraz', 'to', 'ta', 'te', 'ten', 'tej', 'tym'
+}
+
+_REQUEST_TYPE_RE = {name: re.compile(pattern) for name, pattern in REQUEST_TYPE_PATTERNS.items()}
+_QUESTION_TYPE_RE = {name: re.compile(pattern) for name, pattern in QUESTION_TYPE_PATTERNS.items()}
+_FOLLOW_UP_RE = {name: re.compile(pattern) for name, pattern in FOLLOW_UP_PATTERNS.items()}
+_DETAIL_RE = {name: re.compile(pattern) for name, pattern in DETAIL_PATTERNS.items()}
+_WORD_RE = re.compile(r'\b\w+\b')
+
+# Limity rozmiaru profilu
+MAX_KEYWORDS = 200
+MAX_TOPIC_PROGRESSION = 50
+
+
+def analyze_message(content: str, is_follow_up: bool = False, topics: List[str] = None) -> Dict:
+    """Analizuje pojedynczą wiadomość użytkownika"""
+    text = content.lower()
+    words = _WORD_RE.findall(text)
+
+    return {
+        'keywords': [word for word in words if len(word) > 3 and word not in STOP_WORDS],
+        'word_count': len(content.split()),
+        'request_types': [name for name, regex in _REQUEST_TYPE_RE.items() if regex.search(text)],
+        'question_types': [name for name, regex in _QUESTION_TYPE_RE.items() if regex.search(text)],
+        'follow_up': [name for name, regex in _FOLLOW_UP_RE.items() if regex.search(text)] if is_follow_up else [],
+        'detail': {level: len(regex.findall(text)) for level, regex in _DETAIL_RE.items()},
+        'topic': primary_topic(tag_topics(content) if topics is None else topics)
+    }
+
+
+def empty_profile(key: str, user_id=None) -> Dict:
+    """Tworzy pusty profil uczenia się"""
+    now = datetime.now().isoformat()
+    return {
+        'key': key,
+        'user_id': user_id,
+        'session_id': None,
+        'message_count': 0,
+        'keyword_counts': {},
+        'request_types': {},
+        'question_types': {},
+        'follow_up_patterns': {},
+        'detail_scores': {level: 0 for level in DETAIL_PATTERNS},
+        'topic_progression': [],
+        'question_length': {'total_words': 0, 'min_length': 0, 'max_length': 0},
+        'created_at': now,
+        'updated_at': now
+    }
+
+
+def apply_message(profile: Dict, content: str, session_id: str = None, topics: List[str] = None) -> Dict:
+    """Aktualizuje profil o jedną nową wiadomość użytkownika"""
+    result = analyze_message(content, is_follow_up=profile['message_count'] > 0, topics=topics)
+
+    keyword_counts = profile['keyword_counts']
+    for word in result['keywords']:
+        keyword_counts[word] = keyword_counts.get(word, 0) + 1
+    if len(keyword_counts) > 2 * MAX_KEYWORDS:
+        top = sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True)[:MAX_KEYWORDS]
+        profile['keyword_counts'] = dict(top)
+
+    for field in ('request_types', 'question_types'):
+        for name in result[field]:
+            profile[field][name] = profile[field].get(name, 0) + 1
+    for name in result['follow_up']:
+        profile['follow_up_patterns'][name] = profile['follow_up_patterns'].get(name, 0) + 1
+    for level, matches in result['detail'].items():
+        profile['detail_scores'][level] = profile['detail_scores'].get(level, 0) + matches
+
+    profile['topic_progression'].append(result['topic'])
+    profile['topic_progression'] = profile['topic_progression'][-MAX_TOPIC_PROGRESSION:]
+
+    length = profile['question_length']
+    words = result['word_count']
+    if profile['message_count'] == 0:
+        length['min_length'] = words
+        length['max_length'] = words
+    else:
+        length['min_length'] = min(length['min_length'], words)
+        length['max_length'] = max(length['max_length'], words)
+    length['total_words'] += words
+
+    profile['message_count'] += 1
+    if session_id:
+        profile['session_id'] = session_id
+    profile['updated_at'] = datetime.now().isoformat()
+    return profile
+
+
+def preferred_detail_level(profile: Dict) -> str:
+    """Zwraca dominujący poziom szczegółowości z profilu"""
+    scores = profile.get('detail_scores') or {}
+    if not scores:
+        return 'medium'
+    return max(scores.items(), key=lambda x: x[1])[0]
+
+
+def question_length_stats(profile: Dict) -> Dict:
+    """Zwraca statystyki długości pytań w formacie analizy historii"""
+    length = profile.get('question_length', {})
+    count = profile.get('message_count', 0)
+    if not count:
+        return {'avg_length': 0, 'preferred_range': 'short'}
+
+    avg_length = length.get('total_words', 0) / count
+    if avg_length < 5:
+        preferred_range = 'short'
+    elif avg_length < 15:
+        preferred_range = 'medium'
+    else:
+        preferred_range = 'long'
+
+    return {
+        'avg_length': avg_length,
+        'min_length': length.get('min_length', 0),
+        'max_length': length.get('max_length', 0),
+        'preferred_range': preferred_range
+    }
+
+
+def common_keywords(profile: Dict, limit: int = 20) -> List:
+    """Zwraca najczęstsze słowa kluczowe profilu"""
+    counts = profile.get('keyword_counts', {})
+    return sorted(counts.items(), key=lambda x: x[1], reverse=True)[:limit]
+
+
+class LearningProfileStore:
+    """Trwały magazyn profili uczenia się z pamięcią podręczną"""
+
+    def __init__(self, profiles_dir: str = 'data/learning_profiles'):
+        self.profiles_dir = profiles_dir
+        self._cache = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.profiles_dir, exist_ok=True)
+
+    def _profile_path(self, key: str) -> str:
+        """Zwraca ścieżkę pliku profilu"""
+        safe_key = re.sub(r'[^\w\-]', '_', str(key))
+        return os.path.join(self.profiles_dir, f'{safe_key}.json')
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Pobiera kopię profilu z pamięci lub z dysku
+
+        Profil w pamięci zmienia add_message pod blokadą, więc na zewnątrz
+        trafia wyłącznie kopia - analiza może ją iterować bez blokady.
+        """
+        with self._lock:
+            profile = self._load(key)
+            return copy.deepcopy(profile) if profile is not None else None
+
+    def has_profile(self, key: str) -> bool:
+        """Sprawdza, czy profil istnieje (bez kopiowania)"""
+        with self._lock:
+            return self._load(key) is not None
+
+    def _load(self, key: str) -> Optional[Dict]:
+        if key in self._cache:
+            return self._cache[key]
+
+        path = self._profile_path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                profile = json.load(f)
+        except Exception as e:
+            logger.error("Błąd wczytywania profilu uczenia %s: %s", key, e)
+            return None
+
+        self._cache[key] = profile
+        return profile
+
+    def _save(self, profile: Dict):
+        """Zapisuje profil atomowo (plik tymczasowy + rename)"""
+        path = self._profile_path(profile['key'])
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(profile, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error("Błąd zapisywania profilu uczenia %s: %s", profile['key'], e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def add_message(self, key: str, content: str, user_id=None, session_id: str = None,
+                    topics: List[str] = None) -> Dict:
+        """Dodaje nową wiadomość do profilu, zapisuje go i zwraca kopię"""
+        with self._lock:
+            profile = self._load(key) or empty_profile(key, user_id)
+            apply_message(profile, content, session_id, topics)
+            self._cache[key] = profile
+            self._save(profile)
+            return copy.deepcopy(profile)
+
+    def bootstrap(self, key: str, messages: List[Dict], user_id=None, session_id: str = None) -> Dict:
+        """Buduje profil od zera z wiadomości historii (jednorazowo, przy braku profilu)"""
+        with self._lock:
+            profile = self._load(key)
+            if profile is None:
+                profile = empty_profile(key, user_id)
+                for message in messages:
+                    apply_message(profile, message.get('content', ''), session_id, message.get('topics'))
+                self._cache[key] = profile
+                self._save(profile)
+            return copy.deepcopy(profile)
+
+
+_profile_store = None
+_profile_store_lock = threading.Lock()
+
+
+def get_profile_store() -> LearningProfileStore:
+    """Zwraca globalny magazyn profili uczenia się"""
+    global _profile_store
+    if _profile_store is None:
+        with _profile_store_lock:
+            if _profile_store is None:
+                _profile_store = LearningProfileStore()
+    return _profile_store
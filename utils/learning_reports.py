@@ -7,10 +7,13 @@ Generuje raporty o aktywności użytkowników, pytaniach, feedbackach i wzorcach
 import os
 import json
 import uuid
+import threading
 from datetime import datetime, timedelta
 from collections import defaultdict, Counter
 from typing import Dict, List, Any, Optional
 import glob
+from utils.learning_log import get_learning_log
+from utils.topic_tagger import tag_topics, message_topics, primary_topic
 
 class LearningReportsSystem:
     """System generowania raportów uczenia się"""
@@ -21,6 +24,7 @@ class LearningReportsSystem:
         self.history_dir = "history"
         self.feedback_dir = "feedback"
         self.learning_data_file = "data/learning_data.json"
+        self.learning_log = get_learning_log()
         self.users_file = "data/users.json"
         
         # Utwórz katalogi jeśli nie istnieją
@@ -146,7 +150,7 @@ class LearningReportsSystem:
                                 
                                 # Wykryj temat
                                 content = message.get('content', '').lower()
-                                topic = self._detect_topic(content)
+                                topic = primary_topic(message_topics(message))
                                 if topic:
                                     stats["topics_discussed"].add(topic)
                                     session_topics.add(topic)
@@ -438,26 +442,18 @@ class LearningReportsSystem:
         }
         
         try:
-            if os.path.exists(self.learning_data_file):
-                with open(self.learning_data_file, 'r', encoding='utf-8') as f:
-                    learning_data = json.load(f)
-                
-                # Obsługa listy lub słownika
-                if isinstance(learning_data, dict):
-                    items = learning_data.items()
-                elif isinstance(learning_data, list):
-                    items = [(entry.get('user_id', f'unknown_{i}'), entry) for i, entry in enumerate(learning_data) if isinstance(entry, dict)]
-                else:
-                    items = []
-                for user_id, data in items:
-                    if isinstance(data, dict):
-                        preferences = data.get('preferences', {})
-                        learning_patterns["user_preferences"][user_id] = {
-                            "detail_level": preferences.get('detail_level', 'medium'),
-                            "preferred_topics": preferences.get('preferred_topics', []),
-                            "learning_speed": preferences.get('learning_speed', 'normal'),
-                            "question_style": preferences.get('question_style', 'direct')
-                        }
+            learning_data = self.learning_log.read_last()
+            items = [(entry.get('user_id') or f'unknown_{i}', entry) for i, entry in enumerate(learning_data) if isinstance(entry, dict)]
+            for user_id, data in items:
+                if isinstance(data, dict):
+                    preferences = data.get('preferences', {})
+                    user_patterns = data.get('user_patterns', {})
+                    learning_patterns["user_preferences"][user_id] = {
+                        "detail_level": preferences.get('detail_level', user_patterns.get('preferred_detail_level', 'medium')),
+                        "preferred_topics": preferences.get('preferred_topics', []),
+                        "learning_speed": preferences.get('learning_speed', 'normal'),
+                        "question_style": preferences.get('question_style', 'direct')
+                    }
         
         except Exception as e:
             print(f"⚠️  Błąd analizy wzorców uczenia: {e}")
@@ -486,8 +482,7 @@ class LearningReportsSystem:
                             if not msg_time or not (start_time <= msg_time < end_time):
                                 continue
                             
-                            content = message.get('content', '').lower()
-                            topic = self._detect_topic(content)
+                            topic = primary_topic(message_topics(message))
                             
                             if topic:
                                 topic_counter[topic] += 1
@@ -521,52 +516,37 @@ class LearningReportsSystem:
     def _enrich_with_learning_data(self, user_stats: Dict[str, Dict[str, Any]]) -> None:
         """Wzbogaca statystyki użytkowników o dane z systemu uczenia"""
         try:
-            if os.path.exists(self.learning_data_file):
-                with open(self.learning_data_file, 'r', encoding='utf-8') as f:
-                    learning_data = json.load(f)
-                
-                for user_id, stats in user_stats.items():
-                    if user_id in learning_data:
-                        user_learning = learning_data[user_id]
-                        
-                        # Dodaj informacje o uczeniu się
-                        stats["learning_level"] = user_learning.get('level', 'beginner')
-                        stats["preferred_detail_level"] = user_learning.get('preferences', {}).get('detail_level', 'medium')
-                        stats["learning_progress"] = user_learning.get('progress', {})
-                        
-                        # Dodaj informacje o preferencjach
-                        preferences = user_learning.get('preferences', {})
-                        stats["preferences"] = {
-                            "topics": preferences.get('preferred_topics', []),
-                            "question_style": preferences.get('question_style', 'direct'),
-                            "response_length": preferences.get('response_length', 'medium')
-                        }
+            # Najnowsza analiza dla każdego użytkownika
+            learning_data = {}
+            for entry in self.learning_log.read_last():
+                if isinstance(entry, dict) and entry.get('user_id'):
+                    learning_data[entry['user_id']] = entry
+            
+            for user_id, stats in user_stats.items():
+                if user_id in learning_data:
+                    user_learning = learning_data[user_id]
+                    user_patterns = user_learning.get('user_patterns', {})
+                    
+                    # Dodaj informacje o uczeniu się
+                    stats["learning_level"] = user_learning.get('level', 'beginner')
+                    stats["preferred_detail_level"] = user_learning.get('preferences', {}).get(
+                        'detail_level', user_patterns.get('preferred_detail_level', 'medium'))
+                    stats["learning_progress"] = user_learning.get('progress', {})
+                    
+                    # Dodaj informacje o preferencjach
+                    preferences = user_learning.get('preferences', {})
+                    stats["preferences"] = {
+                        "topics": preferences.get('preferred_topics', list(dict.fromkeys(user_learning.get('topic_progression', [])))[-5:]),
+                        "question_style": preferences.get('question_style', 'direct'),
+                        "response_length": preferences.get('response_length', 'medium')
+                    }
         
         except Exception as e:
             print(f"⚠️  Błąd wzbogacania danych uczenia: {e}")
     
     def _detect_topic(self, content: str) -> str:
         """Wykrywa temat pytania"""
-        content_lower = content.lower()
-        
-        # Słownik tematów lotniczych
-        topics = {
-            'aerodynamika': ['aerodynamika', 'siła nośna', 'siła ciągu', 'opór', 'profil skrzydła', 'kąt natarcia', 'przeciągnięcie'],
-            'nawigacja': ['nawigacja', 'gps', 'kompas', 'kurs', 'namierzanie', 'pozycja', 'współrzędne'],
-            'meteorologia': ['pogoda', 'wiatr', 'chmury', 'burza', 'oblodzenie', 'turbulencje', 'widoczność'],
-            'przepisy': ['przepisy', 'regulacje', 'icao', 'certyfikacja', 'licencja', 'prawo lotnicze'],
-            'bezpieczeństwo': ['bezpieczeństwo', 'awaria', 'procedury awaryjne', 'lądowanie awaryjne', 'ryzyko'],
-            'awionika': ['awionika', 'radar', 'autopilot', 'instrumenty', 'systemy pokładowe'],
-            'silniki': ['silnik', 'turbina', 'spalanie', 'paliwo', 'moc', 'ciąg'],
-            'struktury': ['konstrukcja', 'materiały', 'wytrzymałość', 'kadłub', 'skrzydła'],
-            'pilotaż': ['pilotaż', 'sterowanie', 'manewr', 'start', 'lądowanie', 'lot']
-        }
-        
-        for topic, keywords in topics.items():
-            if any(keyword in content_lower for keyword in keywords):
-                return topic
-        
-        return 'ogólne'
+        return primary_topic(tag_topics(content))
     
     def _analyze_question(self, content: str) -> Dict[str, str]:
         """Analizuje typ i złożoność pytania"""
@@ -768,67 +748,56 @@ class LearningReportsSystem:
         }
         
         try:
-            if os.path.exists(self.learning_data_file):
-                with open(self.learning_data_file, 'r', encoding='utf-8') as f:
-                    learning_data = json.load(f)
+            learning_data = self.learning_log.read_last()
+            
+            # Szukaj danych dla tego użytkownika
+            user_sessions = [entry for entry in learning_data
+                             if isinstance(entry, dict) and entry.get('user_id') == user_id]
+            
+            if user_sessions:
+                # Analizuj dane uczenia się
+                profile['statistics']['total_sessions'] = len(user_sessions)
+                profile['statistics']['total_messages'] = sum(
+                    session.get('total_messages', 0) for session in user_sessions
+                )
                 
-                # Szukaj danych dla tego użytkownika
-                user_sessions = []
-                if isinstance(learning_data, list):
-                    for entry in learning_data:
-                        if isinstance(entry, dict) and entry.get('user_id') == user_id:
-                            user_sessions.append(entry)
-                elif isinstance(learning_data, dict):
-                    # Jeśli learning_data to słownik, sprawdź czy user_id jest kluczem
-                    if user_id in learning_data:
-                        user_data = learning_data[user_id]
-                        if isinstance(user_data, dict):
-                            user_sessions.append(user_data)
+                # Znajdź najnowszą sesję
+                latest_session = user_sessions[0]
+                if len(user_sessions) > 1:
+                    latest_session = max(user_sessions, key=lambda x: x.get('session_id', ''))
                 
-                if user_sessions:
-                    # Analizuj dane uczenia się
-                    profile['statistics']['total_sessions'] = len(user_sessions)
-                    profile['statistics']['total_messages'] = sum(
-                        session.get('total_messages', 0) for session in user_sessions
-                    )
-                    
-                    # Znajdź najnowszą sesję
-                    latest_session = user_sessions[0]
-                    if len(user_sessions) > 1:
-                        latest_session = max(user_sessions, key=lambda x: x.get('session_id', ''))
-                    
-                    # Wyciągnij preferencje z najnowszej sesji
-                    if 'user_patterns' in latest_session:
-                        patterns = latest_session['user_patterns']
-                        profile['preferred_detail_level'] = patterns.get('preferred_detail_level', 'medium')
-                        
-                        # Analiza długości pytań
-                        question_length = patterns.get('question_length', {})
-                        preferred_range = question_length.get('preferred_range', 'medium')
-                        profile['preferences']['question_style'] = preferred_range
-                    
-                    # Analiza progresji tematów
-                    all_topics = []
-                    for session in user_sessions:
-                        topics = session.get('topic_progression', [])
-                        if isinstance(topics, list):
-                            all_topics.extend(topics)
+                # Wyciągnij preferencje z najnowszej sesji
+                if 'user_patterns' in latest_session:
+                    patterns = latest_session['user_patterns']
+                    profile['preferred_detail_level'] = patterns.get('preferred_detail_level', 'medium')
                     
-                    # Najczęstsze tematy
-                    if all_topics:
-                        from collections import Counter
-                        topic_counts = Counter(all_topics)
-                        profile['preferences']['topics'] = [topic for topic, count in topic_counts.most_common(5)]
-                        profile['recent_activity']['recent_topics'] = list(topic_counts.keys())[-3:]
-                    
-                    # Określ poziom na podstawie liczby sesji i tematów
-                    session_count = profile['statistics']['total_sessions']
-                    if session_count > 10:
-                        profile['learning_level'] = 'advanced'
-                    elif session_count > 5:
-                        profile['learning_level'] = 'intermediate'
-                    else:
-                        profile['learning_level'] = 'beginner'
+                    # Analiza długości pytań
+                    question_length = patterns.get('question_length', {})
+                    preferred_range = question_length.get('preferred_range', 'medium')
+                    profile['preferences']['question_style'] = preferred_range
+                
+                # Analiza progresji tematów
+                all_topics = []
+                for session in user_sessions:
+                    topics = session.get('topic_progression', [])
+                    if isinstance(topics, list):
+                        all_topics.extend(topics)
+                
+                # Najczęstsze tematy
+                if all_topics:
+                    from collections import Counter
+                    topic_counts = Counter(all_topics)
+                    profile['preferences']['topics'] = [topic for topic, count in topic_counts.most_common(5)]
+                    profile['recent_activity']['recent_topics'] = list(topic_counts.keys())[-3:]
+                
+                # Określ poziom na podstawie liczby sesji i tematów
+                session_count = profile['statistics']['total_sessions']
+                if session_count > 10:
+                    profile['learning_level'] = 'advanced'
+                elif session_count > 5:
+                    profile['learning_level'] = 'intermediate'
+                else:
+                    profile['learning_level'] = 'beginner'
         
         except Exception as e:
             print(f"⚠️  Błąd ładowania profilu uczenia dla {user_id}: {e}")
@@ -866,3 +835,17 @@ class LearningReportsSystem:
         except Exception as e:
             print(f"❌ Błąd usuwania raportu {report_id}: {e}")
             return False
+
+
+_learning_reports_system = None
+_learning_reports_lock = threading.Lock()
+
+
+def get_learning_reports_system() -> LearningReportsSystem:
+    """Zwraca wspólną instancję systemu raportów (tworzoną przy pierwszym użyciu)"""
+    global _learning_reports_system
+    if _learning_reports_system is None:
+        with _learning_reports_lock:
+            if _learning_reports_system is None:
+                _learning_reports_system = LearningReportsSystem()
+    return _learning_reports_system
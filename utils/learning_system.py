@@ -6,10 +6,23 @@ System uczenia się asystenta na podstawie historii rozmów i preferencji użytk
 import os
 import json
 import re
+import logging
+import threading
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from collections import defaultdict, Counter
 from app.models import ChatSession
+from utils.learning_profiles import (
+    REQUEST_TYPE_PATTERNS, QUESTION_TYPE_PATTERNS, FOLLOW_UP_PATTERNS, DETAIL_PATTERNS,
+    STOP_WORDS, get_profile_store, preferred_detail_level,
+    question_length_stats, common_keywords
+)
+from utils.learning_log import get_learning_log
+from utils.preference_store import get_preference_store
+from utils.topic_tagger import message_topics, primary_topic
+from utils.question_index import get_question_index, normalize_question
+
+logger = logging.getLogger(__name__)
 
 class LearningSystem:
     """Główna klasa systemu uczenia się"""
@@ -17,8 +30,11 @@ class LearningSystem:
     def __init__(self):
         self.learning_data_file = 'data/learning_data.json'
         self.patterns_file = 'data/user_patterns.json'
-        self.preferences_file = 'data/user_preferences.json'
+        self.preferences_file = 'data/user_preferences.json'  # dawny format, importowany do magazynu preferencji
         self.ensure_directories()
+        self.profile_store = get_profile_store()
+        self.learning_log = get_learning_log()
+        self.preference_store = get_preference_store()
         
     def ensure_directories(self):
         """Tworzy wymagane katalogi"""
@@ -131,19 +147,12 @@ class LearningSystem:
                 return []
             
             # Usuń typowe słowa i znaki interpunkcyjne
-            stop_words = {
-                'jak', 'co', 'czy', 'kiedy', 'gdzie', 'dlaczego', 'który', 'która', 'które',
-                'w', 'na', 'do', 'z', 'za', 'o', 'przy', 'dla', 'przez', 'od', 'po',
-                'jest', 'są', 'było', 'będzie', 'może', 'można', 'powinien', 'powinna',
-                'i', 'a', 'ale', 'lub', 'oraz', 'to', 'ta', 'te', 'ten', 'tej', 'tym'
-            }
-            
             words = re.findall(r'\b\w+\b', all_text)
-            words = [word for word in words if len(word) > 3 and word not in stop_words]
+            words = [word for word in words if len(word) > 3 and word not in STOP_WORDS]
             
             return Counter(words).most_common(20)
         except Exception as e:
-            print(f"❌ Błąd w _find_common_keywords: {e}")
+            logger.error("Błąd w _find_common_keywords: %s", e)
             return []
     
     def _analyze_question_length(self, messages: List[Dict]) -> Dict:
@@ -170,21 +179,12 @@ class LearningSystem:
                 'preferred_range': preferred_range
             }
         except Exception as e:
-            print(f"❌ Błąd w _analyze_question_length: {e}")
+            logger.error("Błąd w _analyze_question_length: %s", e)
             return {'avg_length': 0, 'preferred_range': 'short'}
     
     def _categorize_request_types(self, messages: List[Dict]) -> Dict:
         """Kategoryzuje typy próśb użytkownika"""
-        request_patterns = {
-            'examples': r'(przykład|przykłady|np\.|na przykład|pokaż|wzór|wzory)',
-            'explanations': r'(jak działa|wyjaśnij|objaśnij|co to jest|czym jest)',
-            'procedures': r'(procedura|krok po kroku|jak wykonać|instrukcja)',
-            'comparisons': r'(różnica|porównaj|lepszy|gorszy|vs|przeciwko)',
-            'calculations': r'(oblicz|wylicz|wzór|formuła|równanie)',
-            'definitions': r'(definicja|znaczenie|oznacza|definiuj)',
-            'practical': r'(praktyczne|w praktyce|zastosowanie|użycie)',
-            'theory': r'(teoria|teoretyczne|podstawy|zasady)'
-        }
+        request_patterns = REQUEST_TYPE_PATTERNS
         
         categories = defaultdict(int)
         
@@ -198,13 +198,7 @@ class LearningSystem:
     
     def _analyze_follow_up_patterns(self, messages: List[Dict]) -> Dict:
         """Analizuje wzorce w pytaniach następnych"""
-        follow_up_indicators = {
-            'more_detail': r'(więcej|szczegółowo|dokładniej|szerzej|głębiej)',
-            'examples': r'(przykład|przykłady|wzór|wzory|dawaj|pokaż)',
-            'simplification': r'(prościej|prostymi słowami|łatwiej|jasniej)',
-            'practical': r'(praktyczne|w praktyce|jak zastosować|jak użyć)',
-            'related': r'(a co z|jak z|również|także|jeszcze|dodatkowo)'
-        }
+        follow_up_indicators = FOLLOW_UP_PATTERNS
         
         patterns = defaultdict(int)
         
@@ -219,11 +213,7 @@ class LearningSystem:
     
     def _detect_detail_preference(self, messages: List[Dict]) -> str:
         """Wykrywa preferowany poziom szczegółowości"""
-        detail_indicators = {
-            'high': r'(szczegółowo|dokładnie|precyzyjnie|wszystko|kompletnie|wyczerpująco)',
-            'medium': r'(wyjaśnij|objaśnij|opisz|przedstaw)',
-            'low': r'(krótko|zwięźle|w skrócie|najważniejsze|podsumuj)'
-        }
+        detail_indicators = DETAIL_PATTERNS
         
         scores = defaultdict(int)
         
@@ -240,30 +230,7 @@ class LearningSystem:
     
     def _analyze_topic_progression(self, history: List[Dict]) -> List[str]:
         """Analizuje progresję tematów w rozmowie"""
-        topics = []
-        
-        # Słownik tematów lotniczych
-        topic_keywords = {
-            'aerodynamika': ['siła nośna', 'opór', 'profil', 'skrzydło', 'aerodynamik'],
-            'nawigacja': ['gps', 'vor', 'kompas', 'nawigacja', 'kurs', 'pozycja'],
-            'meteorologia': ['pogoda', 'wiatr', 'ciśnienie', 'temperatura', 'chmury'],
-            'silniki': ['silnik', 'spalanie', 'turbina', 'śmigło', 'moc'],
-            'procedury': ['start', 'lądowanie', 'podejście', 'procedura', 'maneuwr'],
-            'systemy': ['hydraulika', 'elektryka', 'paliwowy', 'system', 'awionika'],
-            'regulacje': ['przepis', 'regulacja', 'prawo', 'icao', 'easa', 'faa']
-        }
-        
-        for msg in history:
-            if msg['role'] == 'user':
-                content = msg['content'].lower()
-                for topic, keywords in topic_keywords.items():
-                    if any(keyword in content for keyword in keywords):
-                        topics.append(topic)
-                        break
-                else:
-                    topics.append('ogólne')
-        
-        return topics
+        return [primary_topic(message_topics(msg)) for msg in history if msg['role'] == 'user']
     
     def _analyze_response_length(self, messages: List[Dict]) -> Dict:
         """Analizuje długość odpowiedzi asystenta"""
@@ -373,15 +340,7 @@ class LearningSystem:
             'application': 0
         }
         
-        patterns = {
-            'definition': r'(co to jest|czym jest|definicja|znaczenie)',
-            'explanation': r'(jak działa|dlaczego|wyjaśnij|objaśnij)',
-            'procedure': r'(jak wykonać|procedura|krok po kroku|instrukcja)',
-            'comparison': r'(różnica|porównaj|lepszy|gorszy|vs)',
-            'example': r'(przykład|przykłady|wzór|wzory|dawaj|pokaż)',
-            'calculation': r'(oblicz|wylicz|ile|jaka wartość)',
-            'application': r'(zastosowanie|użycie|praktyce|gdzie używa)'
-        }
+        patterns = QUESTION_TYPE_PATTERNS
         
         for msg in user_messages:
             content = msg['content'].lower()
@@ -392,54 +351,93 @@ class LearningSystem:
         return categories
     
     def save_learning_data(self, analysis: Dict):
-        """Zapisuje dane uczenia do pliku"""
-        learning_data = []
-        
-        if os.path.exists(self.learning_data_file):
-            try:
-                with open(self.learning_data_file, 'r', encoding='utf-8') as f:
-                    learning_data = json.load(f)
-            except Exception as e:
-                print(f"Błąd wczytywania danych uczenia: {e}")
-                learning_data = []
-        
-        learning_data.append(analysis)
-        
-        # Zachowaj tylko ostatnie 100 analiz
-        if len(learning_data) > 100:
-            learning_data = learning_data[-100:]
-        
+        """Dopisuje analizę do dziennika uczenia (stały koszt zapisu)"""
         try:
-            with open(self.learning_data_file, 'w', encoding='utf-8') as f:
-                json.dump(learning_data, f, ensure_ascii=False, indent=2)
-            print(f"✅ Zapisano dane uczenia dla sesji {analysis['session_id']}")
+            self.learning_log.append(analysis)
+            logger.debug("Zapisano dane uczenia dla sesji %s", analysis['session_id'])
         except Exception as e:
-            print(f"❌ Błąd zapisywania danych uczenia: {e}")
+            logger.error("Błąd zapisywania danych uczenia: %s", e)
+    
+    def get_recent_learning_data(self, limit: int = None) -> List[Dict]:
+        """Zwraca ostatnie analizy uczenia (od najstarszej do najnowszej)"""
+        return self.learning_log.read_last(limit)
+    
+    def _profile_key(self, session_id: str, user_id=None) -> str:
+        """Zwraca klucz profilu uczenia (użytkownik lub sesja anonimowa)"""
+        if user_id:
+            return str(user_id)
+        return f'session_{session_id}'
+    
+    def get_learning_profile(self, session_id: str, user_id=None) -> Optional[Dict]:
+        """Pobiera profil uczenia, budując go jednorazowo z historii przy braku profilu"""
+        key = self._profile_key(session_id, user_id)
+        profile = self.profile_store.get(key)
+        if profile is not None:
+            return profile
+        
+        history = ChatSession(session_id, user_id).load_history()
+        if user_id:
+            history = [msg for msg in history if isinstance(msg, dict) and msg.get('user_id') == user_id]
+        messages = self._filter_valid_messages(history, 'user')
+        
+        logger.debug("Budowanie profilu uczenia %s z %d wiadomości", key, len(messages))
+        return self.profile_store.bootstrap(key, messages, user_id, session_id)
+    
+    def record_user_message(self, session_id: str, content: str, user_id=None, topics: List[str] = None) -> Dict:
+        """Aktualizuje profil uczenia o nową wiadomość użytkownika"""
+        key = self._profile_key(session_id, user_id)
+        if not self.profile_store.has_profile(key):
+            # Wiadomość jest już zapisana w historii, więc trafi do profilu podczas budowania
+            return self.get_learning_profile(session_id, user_id)
+        return self.profile_store.add_message(key, content, user_id, session_id, topics)
+    
+    def analysis_from_profile(self, profile: Dict, session_id: str) -> Dict:
+        """Tworzy migawkę analizy (format analyze_conversation_history) z profilu"""
+        return {
+            'session_id': session_id,
+            'user_id': profile.get('user_id'),
+            'total_messages': profile.get('message_count', 0),
+            'user_patterns': {
+                'common_keywords': common_keywords(profile),
+                'question_length': question_length_stats(profile),
+                'request_types': dict(profile.get('request_types', {})),
+                'follow_up_patterns': dict(profile.get('follow_up_patterns', {})),
+                'preferred_detail_level': preferred_detail_level(profile)
+            },
+            'topic_progression': list(profile.get('topic_progression', [])),
+            'question_types': dict(profile.get('question_types', {})),
+            'timestamp': datetime.now().isoformat()
+        }
     
     def get_user_preferences(self, session_id: str, user_id: int = None) -> Dict:
-        """Pobiera preferencje użytkownika na podstawie historii"""
-        analysis = self.analyze_conversation_history(session_id, user_id)
+        """Pobiera preferencje użytkownika na podstawie profilu uczenia"""
+        profile = self.get_learning_profile(session_id, user_id)
         
-        if not analysis:
+        if not profile or not profile.get('message_count'):
             return self._get_default_preferences()
         
         # Sprawdź czy użytkownik często prosi o przykłady
-        request_types = analysis['user_patterns'].get('request_types', {})
+        request_types = profile.get('request_types', {})
         
         preferences = {
-            'detail_level': analysis['user_patterns'].get('preferred_detail_level', 'medium'),
-            'question_types': analysis['question_types'],
+            'detail_level': preferred_detail_level(profile),
+            'question_types': dict(profile.get('question_types', {})),
             'prefers_examples': request_types.get('examples', 0) > 0,
             'prefers_procedures': request_types.get('procedures', 0) > 0,
             'prefers_theory': request_types.get('theory', 0) > 0,
             'prefers_practical': request_types.get('practical', 0) > 0,
-            'common_topics': analysis['topic_progression'],
-            'response_structure_preference': self._determine_structure_preference(analysis),
+            'common_topics': list(profile.get('topic_progression', [])),
+            'response_structure_preference': self._determine_structure_preference(
+                {'user_patterns': {'request_types': request_types}}
+            ),
             'session_id': session_id,
             'user_id': user_id,
-            'updated_at': datetime.now().isoformat()
+            'updated_at': profile.get('updated_at', datetime.now().isoformat())
         }
         
+        # Preferencje wyuczone z feedbacku mają pierwszeństwo
+        preferences.update(self.preference_store.get(self._profile_key(session_id, user_id), session_id))
+        
         return preferences
     
     def _get_default_preferences(self) -> Dict:
@@ -516,47 +514,30 @@ class LearningSystem:
     
     def update_preferences_from_feedback(self, session_id: str, feedback_data: Dict, user_id: int = None):
         """Aktualizuje preferencje na podstawie feedbacku"""
-        preferences = self.get_user_preferences(session_id, user_id)
+        changes = {}
         
         # Analiza pozytywnego feedbacku
         if feedback_data.get('feedback') == 'positive':
-            section_type = feedback_data.get('section_type', '')
             content = feedback_data.get('content', '').lower()
             
             # Jeśli pozytywny feedback na przykłady
             if 'przykład' in content or 'wzór' in content:
-                preferences['prefers_examples'] = True
+                changes['prefers_examples'] = True
             
             # Jeśli pozytywny feedback na procedury
             if 'krok' in content or 'procedura' in content:
-                preferences['prefers_procedures'] = True
+                changes['prefers_procedures'] = True
             
             # Jeśli pozytywny feedback na teorię
             if 'teoria' in content or 'zasada' in content:
-                preferences['prefers_theory'] = True
-        
-        # Zapisz zaktualizowane preferencje
-        self._save_preferences(session_id, preferences)
-    
-    def _save_preferences(self, session_id: str, preferences: Dict):
-        """Zapisuje preferencje użytkownika"""
-        all_preferences = {}
-        
-        if os.path.exists(self.preferences_file):
-            try:
-                with open(self.preferences_file, 'r', encoding='utf-8') as f:
-                    all_preferences = json.load(f)
-            except Exception as e:
-                print(f"Błąd wczytywania preferencji: {e}")
-        
-        all_preferences[session_id] = preferences
-        
-        try:
-            with open(self.preferences_file, 'w', encoding='utf-8') as f:
-                json.dump(all_preferences, f, ensure_ascii=False, indent=2)
-            print(f"✅ Zapisano preferencje dla sesji {session_id}")
-        except Exception as e:
-            print(f"❌ Błąd zapisywania preferencji: {e}")
+                changes['prefers_theory'] = True
+        
+        # Zapisz zaktualizowane preferencje (zapis na dysk odbywa się w tle)
+        if changes:
+            # Feedback dotyczy bieżącej sesji (jak w dawnym zapisie preferencji per sesja)
+            self.preference_store.update(self._profile_key(session_id, user_id), changes,
+                                         session_id=session_id)
+            logger.debug("Zaktualizowano preferencje dla sesji %s: %s", session_id, changes)
     
     def analyze_all_sessions(self) -> Dict:
         """Analizuje wszystkie sesje i generuje globalne wzorce"""
@@ -598,8 +579,15 @@ class LearningSystem:
         
         return global_patterns
     
+    def _question_cluster(self, message: Dict) -> str:
+        """Zwraca klaster podobnych pytań (lub znormalizowany tekst, gdy brak klastra)"""
+        if message.get('question_cluster'):
+            return message['question_cluster']
+        cluster, _ = get_question_index().find_similar(message.get('content', ''))
+        return cluster['id'] if cluster else normalize_question(message.get('content', ''))
+    
     def detect_repeated_questions(self, history: List[Dict]) -> Dict:
-        """Wykrywa powtarzające się pytania w historii"""
+        """Wykrywa powtarzające się (również podobne) pytania w historii"""
         user_messages = [msg for msg in history if msg['role'] == 'user']
         
         # Normalizuj pytania (usuń znaki interpunkcyjne, małe litery)
@@ -609,28 +597,30 @@ class LearningSystem:
             normalized_questions.append({
                 'original': msg['content'],
                 'normalized': normalized,
+                'cluster_id': self._question_cluster(msg),
                 'timestamp': msg['timestamp']
             })
         
-        # Znajdź powtarzające się pytania
-        question_counts = Counter([q['normalized'] for q in normalized_questions])
-        repeated_questions = {q: count for q, count in question_counts.items() if count > 1}
+        # Znajdź powtarzające się pytania (grupowane klastrami podobieństwa)
+        question_counts = Counter([q['cluster_id'] for q in normalized_questions])
+        repeated_clusters = {c: count for c, count in question_counts.items() if count > 1}
         
         # Przygotuj szczegółowe informacje o powtarzających się pytaniach
         repeated_details = {}
-        for normalized_q, count in repeated_questions.items():
-            instances = [q for q in normalized_questions if q['normalized'] == normalized_q]
-            repeated_details[normalized_q] = {
+        for cluster_id, count in repeated_clusters.items():
+            instances = [q for q in normalized_questions if q['cluster_id'] == cluster_id]
+            repeated_details[instances[0]['normalized']] = {
                 'count': count,
+                'cluster_id': cluster_id,
                 'instances': instances,
                 'first_asked': instances[0]['timestamp'],
                 'last_asked': instances[-1]['timestamp']
             }
         
         return {
-            'total_repeated': len(repeated_questions),
+            'total_repeated': len(repeated_clusters),
             'repeated_questions': repeated_details,
-            'repetition_rate': len(repeated_questions) / len(set(question_counts.keys())) if question_counts else 0
+            'repetition_rate': len(repeated_clusters) / len(question_counts) if question_counts else 0
         }
     
     def generate_context_aware_prompt(self, session_id: str, current_question: str, history: List[Dict]) -> str:
@@ -642,13 +632,14 @@ class LearningSystem:
         repeated_info = self.detect_repeated_questions(history)
         
         # Sprawdź czy obecne pytanie to powtórzenie
-        normalized_current = re.sub(r'[^\w\s]', '', current_question.lower().strip())
+        current_cluster = self._question_cluster({'content': current_question})
+        repeat_info = next((info for info in repeated_info['repeated_questions'].values()
+                            if info['cluster_id'] == current_cluster), None)
         
         prompt_parts = []
         
         # Jeśli to powtarzające się pytanie
-        if normalized_current in repeated_info['repeated_questions']:
-            repeat_info = repeated_info['repeated_questions'][normalized_current]
+        if repeat_info:
             prompt_parts.append(f"""
             UWAGA: Użytkownik zadał to pytanie już {repeat_info['count']} razy.
             Pierwsze pytanie: {repeat_info['first_asked']}
@@ -687,25 +678,9 @@ class LearningSystem:
     
     def _extract_topics_from_messages(self, messages: List[Dict]) -> List[str]:
         """Wyodrębnia główne tematy z wiadomości"""
-        aviation_keywords = {
-            'siła nośna': 'aerodynamika',
-            'nawigacja': 'nawigacja lotnicza',
-            'radar': 'systemy awioniczne',
-            'meteorologia': 'meteorologia lotnicza',
-            'bezpieczeństwo': 'bezpieczeństwo lotów',
-            'silnik': 'napęd lotniczy',
-            'skrzydło': 'konstrukcja statku powietrznego',
-            'lotnisko': 'operacje lotnicze',
-            'pilot': 'pilotaż',
-            'kontrola': 'kontrola ruchu lotniczego'
-        }
-        
         topics = set()
         for msg in messages:
-            content = msg['content'].lower()
-            for keyword, topic in aviation_keywords.items():
-                if keyword in content:
-                    topics.add(topic)
+            topics.update(message_topics(msg))
         
         return list(topics)
     
@@ -723,3 +698,17 @@ class LearningSystem:
                 if role is None or msg.get('role') == role:
                     valid_messages.append(msg)
         return valid_messages
+
+
+_learning_system = None
+_learning_system_lock = threading.Lock()
+
+
+def get_learning_system() -> LearningSystem:
+    """Zwraca współdzieloną instancję systemu uczenia się"""
+    global _learning_system
+    if _learning_system is None:
+        with _learning_system_lock:
+            if _learning_system is None:
+                _learning_system = LearningSystem()
+    return _learning_system
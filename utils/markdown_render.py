@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Renderowanie odpowiedzi Markdown do HTML na żądanie
+
+Po zakończeniu strumienia serwer wysyła tylko skrót treści odpowiedzi,
+a klient renderuje Markdown, który już otrzymał. Gdy klient potrzebuje
+HTML z serwera (np. tabele, bloki kodu), pobiera go po skrócie - HTML
+powstaje przy pierwszym żądaniu i jest zapamiętywany w pamięci podręcznej.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+def markdown_to_html(text):
+    """Konwertuje markdown do HTML"""
+    if not text:
+        return ""
+
+    import markdown
+
+    # Konfiguracja markdown z rozszerzeniami
+    md = markdown.Markdown(extensions=[
+        'extra',     # Dodatkowe funkcje markdown
+        'codehilite', # Podświetlanie kodu
+        'toc'        # Spis treści
+    ])
+
+    return md.convert(text)
+
+
+def content_hash(text: str) -> str:
+    """Zwraca skrót treści odpowiedzi"""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """Pamięć podręczna odpowiedzi (Markdown i leniwie renderowany HTML) kluczowana skrótem"""
+
+    def __init__(self, capacity: int = 512):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.renders = 0
+        self.hits = 0
+
+    def remember(self, text: str, user_id=None) -> str:
+        """Zapamiętuje treść odpowiedzi i zwraca jej skrót"""
+        digest = content_hash(text)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                entry = {'markdown': text, 'html': None, 'users': set()}
+                self._entries[digest] = entry
+            if user_id is not None:
+                entry['users'].add(str(user_id))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return digest
+
+    def html_for(self, digest: str, user_id=None) -> Optional[str]:
+        """Zwraca HTML odpowiedzi (renderuje przy pierwszym żądaniu)"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or (user_id is not None and str(user_id) not in entry['users']):
+                return None
+            self._entries.move_to_end(digest)
+            if entry['html'] is not None:
+                self.hits += 1
+                return entry['html']
+            text = entry['markdown']
+
+        html = markdown_to_html(text)
+        with self._lock:
+            entry['html'] = html
+            self.renders += 1
+        return html
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'rendered': sum(1 for e in self._entries.values() if e['html'] is not None),
+                'renders': self.renders,
+                'hits': self.hits
+            }
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache() -> RenderCache:
+    """Zwraca globalną pamięć podręczną renderowania odpowiedzi"""
+    global _render_cache
+    if _render_cache is None:
+        with _render_cache_lock:
+            if _render_cache is None:
+                _render_cache = RenderCache()
+    return _render_cache
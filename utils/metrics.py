@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rejestr metryk aplikacji w formacie tekstowym Prometheusa
+
+Liczniki, wskaźniki i histogramy z etykietami, bez zewnętrznych zależności.
+Wartości odczytywane z innych modułów (cache, kolejka generowania, pamięć
+procesu) są zbierane dopiero przy odczycie /metrics przez funkcje zbierające,
+więc ścieżka obsługi wiadomości płaci tylko za inkrementację pod blokadą.
+"""
+import os
+import re
+import sys
+import logging
+import time
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+INF_BUCKET = 'le="+Inf"'
+
+PROCESS_START_TIME = time.time()
+_MONOTONIC_START = time.monotonic()
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    """Wspólna część metryk: nazwa, opis, etykiety i blokada"""
+
+    TYPE = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metryka {self.name} wymaga etykiet {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.TYPE}']
+
+
+class Counter(_Metric):
+    """Licznik rosnący monotonicznie"""
+
+    TYPE = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self) -> Dict[Tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        samples = self.samples()
+        if not samples and not self.labelnames:
+            samples = {(): 0.0}
+        for key, value in sorted(samples.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    """Wartość chwilowa (może rosnąć i maleć)"""
+
+    TYPE = 'gauge'
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    """Histogram z kubełkami skumulowanymi (le) oraz sumą i liczbą obserwacji"""
+
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][index] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def time(self, **labels):
+        """Kontekst mierzący czas bloku"""
+        return _Timer(self, labels)
+
+    def snapshot(self, **labels) -> Dict:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            if entry is None:
+                return {'count': 0, 'sum': 0.0}
+            return {'count': entry['count'], 'sum': entry['sum'],
+                    'mean': entry['sum'] / entry['count'] if entry['count'] else 0.0}
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            items = sorted((key, {'counts': list(e['counts']), 'sum': e['sum'], 'count': e['count']})
+                           for key, e in self._values.items())
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry['counts']):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, INF_BUCKET)} {entry["count"]}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(entry["sum"])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {entry["count"]}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class RateMeter:
+    """Liczba zdarzeń na sekundę w przesuwnym oknie czasu"""
+
+    def __init__(self, window_seconds: float = 60.0):
+        self.window_seconds = window_seconds
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def mark(self):
+        now = time.monotonic()
+        with self._lock:
+            self._events.append(now)
+            self._trim(now)
+
+    def _trim(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._events and self._events[0] < cutoff:
+            self._events.popleft()
+
+    def rate(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            count = len(self._events)
+        # Na starcie procesu okno jest krótsze niż window_seconds
+        window = min(self.window_seconds, max(now - _MONOTONIC_START, 1.0))
+        return count / window
+
+
+class MetricsRegistry:
+    """Rejestr metryk i funkcji zbierających wartości przy odczycie"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labelnames=(), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metryka {name} jest już zarejestrowana jako {metric.TYPE}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames=(),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple]]):
+        """Dodaje funkcję zwracającą krotki (nazwa, typ, opis, [(etykiety, wartość)])"""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Zwraca wszystkie metryki w formacie tekstowym Prometheusa (0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning("Błąd zbierania metryk %s: %s", getattr(collector, '__name__', collector), e)
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f'{name}{_format_labels(names, tuple(labels[n] for n in names))} '
+                                 f'{_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Zwraca globalny rejestr metryk"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = MetricsRegistry()
+    return _metrics
+
+
+# ----------------------------------------------------------------------
+# Metryki aplikacji
+# ----------------------------------------------------------------------
+
+_registry = get_metrics()
+
+SOCKETIO_CONNECTIONS = _registry.gauge(
+    'aerochat_socketio_connections', 'Aktywne połączenia Socket.IO')
+MESSAGES_TOTAL = _registry.counter(
+    'aerochat_messages_total', 'Przyjęte wiadomości użytkowników', ('transport',))
+GENERATIONS_TOTAL = _registry.counter(
+    'aerochat_generations_total', 'Zakończone generowania odpowiedzi', ('outcome',))
+GENERATION_SECONDS = _registry.histogram(
+    'aerochat_generation_stage_seconds', 'Czas etapów generowania odpowiedzi', ('stage',))
+UPSTREAM_REQUESTS = _registry.counter(
+    'aerochat_upstream_requests_total', 'Wywołania API OpenAI', ('endpoint', 'method', 'status'))
+UPSTREAM_ERRORS = _registry.counter(
+    'aerochat_upstream_errors_total', 'Błędy wywołań API OpenAI', ('endpoint', 'kind'))
+UPSTREAM_SECONDS = _registry.histogram(
+    'aerochat_upstream_request_seconds', 'Czas do nagłówków odpowiedzi API OpenAI', ('endpoint',))
+FILE_IO_BYTES = _registry.counter(
+    'aerochat_file_io_bytes_total', 'Bajty odczytane i zapisane w plikach danych', ('kind', 'direction'))
+ERRORS_TOTAL = _registry.counter(
+    'aerochat_errors_total', 'Błędy obsługi żądań aplikacji', ('source',))
+
+MESSAGE_RATE = RateMeter(60.0)
+
+
+def record_message(transport: str):
+    """Zlicza przyjętą wiadomość (licznik i okno wiadomości na sekundę)"""
+    MESSAGES_TOTAL.inc(transport=transport)
+    MESSAGE_RATE.mark()
+
+
+def record_file_io(kind: str, direction: str, path: str):
+    """Dolicza rozmiar pliku do bajtów odczytanych ('read') lub zapisanych ('write')"""
+    try:
+        FILE_IO_BYTES.inc(os.path.getsize(path), kind=kind, direction=direction)
+    except OSError:
+        pass
+
+
+# Identyfikatory w ścieżkach API (asst_..., thread_..., run_..., file-...) zamieniane na {id}
+_ID_SEGMENT = re.compile(r'^(?=.*\d)([a-z]+[_-][A-Za-z0-9_-]{6,}|[0-9a-f-]{16,})$')
+
+
+def endpoint_label(path: str) -> str:
+    """Ścieżka API bez identyfikatorów, np. /threads/{id}/runs"""
+    segments = [s for s in path.split('/') if s and s != 'v1']
+    return '/' + '/'.join('{id}' if _ID_SEGMENT.match(s) else s for s in segments)
+
+
+def instrument_http_client(client):
+    """Dodaje do klienta httpx zliczanie wywołań, statusów i czasu odpowiedzi"""
+
+    def on_request(request):
+        request.extensions['metrics_started'] = time.perf_counter()
+
+    def on_response(response):
+        request = response.request
+        endpoint = endpoint_label(request.url.path)
+        UPSTREAM_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        started = request.extensions.get('metrics_started')
+        if started is not None:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        if response.status_code == 429:
+            UPSTREAM_ERRORS.inc(endpoint=endpoint, kind='rate_limit')
+        elif response.status_code >= 500:
+            UPSTREAM_ERRORS.inc(endpoint=endpoint, kind='server')
+        elif response.status_code >= 400:
+            UPSTREAM_ERRORS.inc(endpoint=endpoint, kind='client')
+
+    client.event_hooks['request'].append(on_request)
+    client.event_hooks['response'].append(on_response)
+    return client
+
+
+# ----------------------------------------------------------------------
+# Wartości zbierane przy odczycie
+# ----------------------------------------------------------------------
+
+def process_rss_bytes() -> Optional[int]:
+    """Bieżąca pamięć rezydentna procesu (Linux: /proc, inaczej szczyt z getrusage)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except Exception:
+        return None
+
+
+def total_memory_bytes() -> Optional[int]:
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def collect_process_metrics():
+    times = os.times()
+    families = [
+        ('process_start_time_seconds', 'gauge', 'Czas uruchomienia procesu (epoch)',
+         [({}, PROCESS_START_TIME)]),
+        ('process_uptime_seconds', 'gauge', 'Czas działania procesu', [({}, time.time() - PROCESS_START_TIME)]),
+        ('process_cpu_seconds_total', 'counter', 'Czas procesora (user + system)',
+         [({}, times.user + times.system)]),
+        ('aerochat_messages_per_second', 'gauge', 'Wiadomości na sekundę (okno 60 s)',
+         [({}, MESSAGE_RATE.rate())]),
+    ]
+    rss = process_rss_bytes()
+    if rss is not None:
+        families.append(('process_resident_memory_bytes', 'gauge', 'Pamięć rezydentna procesu', [({}, rss)]))
+    return families
+
+
+def _loaded_singleton(module_name: str, attribute: str):
+    """Zwraca singleton modułu tylko, jeśli już istnieje (odczyt metryk go nie tworzy)"""
+    module = sys.modules.get(module_name)
+    return getattr(module, attribute, None) if module else None
+
+
+def collect_component_metrics():
+    families = []
+
+    cache = _loaded_singleton('utils.answer_cache', '_answer_cache')
+    if cache is not None:
+        stats = cache.stats()
+        families += [
+            ('aerochat_answer_cache_lookups_total', 'counter', 'Wyszukiwania w cache odpowiedzi',
+             [({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])]),
+            ('aerochat_answer_cache_hit_ratio', 'gauge', 'Odsetek trafień cache odpowiedzi',
+             [({}, stats['hit_rate'])]),
+            ('aerochat_answer_cache_entries', 'gauge', 'Wpisy w cache odpowiedzi', [({}, stats['entries'])]),
+        ]
+
+    render_cache = _loaded_singleton('utils.markdown_render', '_render_cache')
+    if render_cache is not None:
+        stats = render_cache.stats()
+        lookups = stats['hits'] + stats['renders']
+        families += [
+            ('aerochat_render_cache_lookups_total', 'counter', 'Odczyty HTML z cache renderowania',
+             [({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['renders'])]),
+            ('aerochat_render_cache_hit_ratio', 'gauge', 'Odsetek trafień cache renderowania',
+             [({}, stats['hits'] / lookups if lookups else 0.0)]),
+        ]
+
+    flights = _loaded_singleton('utils.single_flight', '_single_flight')
+    if flights is not None:
+        stats = flights.stats()
+        families.append(('aerochat_single_flight_total', 'counter', 'Generowania uruchomione i dołączone',
+                         [({'result': 'started'}, stats['started']),
+                          ({'result': 'coalesced'}, stats['coalesced'])]))
+
+    pool = _loaded_singleton('app.generation_pool', '_generation_pool')
+    if pool is not None:
+        stats = pool.stats()
+        families += [
+            ('aerochat_generation_queue_depth', 'gauge', 'Zadania generowania w kolejce', [({}, stats['queued'])]),
+            ('aerochat_generation_active', 'gauge', 'Generowania w toku', [({}, stats['active'])]),
+            ('aerochat_generation_rejected_total', 'counter', 'Zadania odrzucone (busy)',
+             [({}, stats['rejected'])]),
+        ]
+
+    streams = sys.modules.get('utils.chunk_coalescer')
+    if streams is not None:
+        stats = streams.get_stream_stats()
+        families.append(('aerochat_stream_frames_total', 'counter', 'Wysłane ramki strumienia',
+                         [({}, stats['frames'])]))
+    return families
+
+
+_registry.register_collector(collect_process_metrics)
+_registry.register_collector(collect_component_metrics)
+
+
+# ----------------------------------------------------------------------
+# Wskaźniki dla panelu administratora
+# ----------------------------------------------------------------------
+
+def availability_percentage() -> float:
+    """Odsetek generowań zakończonych bez błędu od startu procesu"""
+    ok = GENERATIONS_TOTAL.value(outcome='ok') + GENERATIONS_TOTAL.value(outcome='cancelled')
+    failed = GENERATIONS_TOTAL.value(outcome='error') + GENERATIONS_TOTAL.value(outcome='upstream_error')
+    return 100.0 * ok / (ok + failed) if ok + failed else 100.0
+
+
+def errors_count() -> int:
+    return int(ERRORS_TOTAL.total())
+
+
+def memory_usage_percentage() -> float:
+    rss = process_rss_bytes()
+    total = total_memory_bytes()
+    return 100.0 * rss / total if rss and total else 0.0
@@ -6,16 +6,75 @@ Moduł OpenAI RAG dla aplikacji Aero-Chat
 import os
 import json
 import time
+import logging
+import threading
 from datetime import datetime
 import httpx
 from openai import OpenAI
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER
 from app.models import UploadIndex
-from utils.learning_system import LearningSystem
+from utils.learning_system import get_learning_system
+from utils.answer_cache import get_answer_cache
+from utils.single_flight import get_single_flight, single_flight_key
+from utils.metrics import instrument_http_client
+from utils.token_usage import usage_from_response, merge_usage, estimate_usage
+
+logger = logging.getLogger(__name__)
+
+# Zasoby współdzielone przez zadania wsadowe - pomijane przy czyszczeniu pamięci asystenta
+_pinned_resources = set()
+_pinned_lock = threading.Lock()
+
+# Klient OpenAI współdzielony przez wszystkie instancje OpenAIRAG (httpx.Client jest bezpieczny wątkowo)
+_client = None
+_client_lock = threading.Lock()
+# Asystenci sprawdzeni w tym procesie
+_verified_assistants = set()
+
+# Jak długo czekać po anulowaniu, aż run dojdzie do stanu końcowego z usage
+CANCELLED_RUN_USAGE_TIMEOUT = float(os.getenv('CANCELLED_RUN_USAGE_TIMEOUT', 5))
+_TERMINAL_RUN_STATUSES = ('cancelled', 'completed', 'failed', 'expired', 'incomplete')
+
+
+def _create_openai_client():
+    """Tworzy klienta OpenAI z własną pulą połączeń httpx"""
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key or 'twoj-klucz' in api_key:
+        raise ValueError("Nieprawidłowy klucz OpenAI API")
+    
+    # Alternatywny adres API (np. lokalny fake_openai_server.py do benchmarków)
+    base_url = os.getenv('OPENAI_BASE_URL') or None
+    is_local_api = bool(base_url) and any(
+        host in base_url for host in ('://127.0.0.1', '://localhost', '://0.0.0.0')
+    )
+    
+    # Pula połączeń dzielona przez wszystkie wątki obsługujące wiadomości
+    limits = httpx.Limits(max_connections=int(os.getenv('OPENAI_MAX_CONNECTIONS', 100)),
+                          max_keepalive_connections=int(os.getenv('OPENAI_MAX_KEEPALIVE', 20)))
+    
+    # Konfiguracja proxy jeśli jest ustawiona (lokalny serwer API bez proxy)
+    proxy_url = os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY")
+    if proxy_url and not is_local_api:
+        transport = httpx.HTTPTransport(proxy=proxy_url, limits=limits)
+        http_client = httpx.Client(transport=transport, timeout=30.0)
+    else:
+        http_client = httpx.Client(timeout=30.0, limits=limits, trust_env=not is_local_api)
+    # Liczniki wywołań, statusów i czasu odpowiedzi dla /metrics
+    instrument_http_client(http_client)
+    
+    if base_url:
+        logger.debug("OpenAI API: %s", base_url)
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+
+
+def get_openai_client():
+    """Zwraca współdzielonego klienta OpenAI (tworzy go przy pierwszym użyciu)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_openai_client()
+    return _client
+
 
 class OpenAIRAG:
     """Klasa do obsługi RAG z OpenAI Assistants API"""
@@ -23,54 +82,47 @@ class OpenAIRAG:
     def __init__(self):
         """Inicjalizuje klienta OpenAI"""
         try:
-            api_key = os.getenv('OPENAI_API_KEY')
-            if not api_key or 'twoj-klucz' in api_key:
-                raise ValueError("Nieprawidłowy klucz OpenAI API")
-            
-            # Konfiguracja proxy jeśli jest ustawiona
-            proxy_url = os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY")
-            if proxy_url:
-                transport = httpx.HTTPTransport(proxy=proxy_url)
-                http_client = httpx.Client(transport=transport, timeout=30.0)
-            else:
-                http_client = httpx.Client(timeout=30.0)
-            
-            # Inicjalizuj klienta OpenAI z poprawną konfiguracją
-            self.client = OpenAI(
-                api_key=api_key,
-                http_client=http_client
-            )
+            # Wspólny klient (pula połączeń) - kolejne instancje nie otwierają nowych połączeń
+            self.client = get_openai_client()
             
             self.assistant_id = os.getenv('ASSISTANT_ID')
             self.model = "gpt-4o"
             
             # Sprawdź czy assistant_id jest pusty lub zawiera placeholder
             if not self.assistant_id or self.assistant_id.strip() == '' or 'twoj-assistant' in self.assistant_id:
-                print("🔄 Brak ID asystenta, tworzę nowego...")
+                logger.info("Brak ID asystenta, tworzę nowego...")
                 self.assistant_id = self.create_assistant()
-            else:
-                # Sprawdź czy asystent nadal istnieje
+            elif self.assistant_id not in _verified_assistants:
+                # Sprawdź czy asystent nadal istnieje (raz na proces, nie przy każdej wiadomości)
                 try:
                     self.client.beta.assistants.retrieve(self.assistant_id)
-                    print(f"✅ Asystent znaleziony: {self.assistant_id}")
+                    logger.debug("Asystent znaleziony: %s", self.assistant_id)
+                    _verified_assistants.add(self.assistant_id)
                 except Exception as e:
-                    print(f"⚠️  Asystent {self.assistant_id} nie istnieje, tworzę nowego...")
+                    logger.warning("Asystent %s nie istnieje, tworzę nowego...", self.assistant_id)
                     self.assistant_id = self.create_assistant()
                 
         except Exception as e:
-            print(f"❌ Błąd inicjalizacji OpenAI: {e}")
+            logger.error("Błąd inicjalizacji OpenAI: %s", e)
             raise
     
         # Inicjalizuj system uczenia się
-        self.learning_system = LearningSystem()
+        self.learning_system = get_learning_system()
         
         # Inicjalizuj zmienne śledzące
         self.last_documents_used = 0
+        self.last_cache_key = None
+        self.last_cache_hit = False
+        # Odpowiedź współdzielona z generowania innego zapytania (single-flight) - bez własnych tokenów
+        self.last_shared = False
+        self.last_error = None
+        # Zużycie tokenów ostatniej odpowiedzi (utils.token_usage.usage_from_response)
+        self.last_usage = None
         
     def create_assistant(self):
         """Tworzy nowego asystenta AI"""
         try:
-            print("🔄 Tworzenie nowego asystenta OpenAI...")
+            logger.info("Tworzenie nowego asystenta OpenAI...")
             assistant = self.client.beta.assistants.create(
                 name="Aero-Chat Assistant",
                 instructions="""Jesteś ekspertem w dziedzinie lotnictwa i awioniki z zaawansowanym systemem uczenia się. 
@@ -177,15 +229,17 @@ class OpenAIRAG:
                 tools=[{"type": "file_search"}]
             )
             
-            # Zapisz ID asystenta do .env
+            # Zapisz ID asystenta do .env i użyj go w kolejnych instancjach w tym procesie
             self.save_assistant_id_to_env(assistant.id)
+            os.environ['ASSISTANT_ID'] = assistant.id
+            _verified_assistants.add(assistant.id)
             
-            print(f"✅ Nowy asystent utworzony: {assistant.id}")
+            logger.info("Nowy asystent utworzony: %s", assistant.id)
             return assistant.id
             
         except Exception as e:
-            print(f"❌ Błąd podczas tworzenia asystenta: {str(e)}")
-            print(f"💡 Sprawdź czy klucz OpenAI API jest poprawny")
+            logger.error("Błąd podczas tworzenia asystenta: %s", e)
+            logger.warning("Sprawdź czy klucz OpenAI API jest poprawny")
             return None
     
     def save_assistant_id_to_env(self, assistant_id):
@@ -212,21 +266,26 @@ class OpenAIRAG:
                 with open(env_file, 'w', encoding='utf-8') as f:
                     f.writelines(lines)
                     
-                print(f"💾 ID asystenta zapisany do .env: {assistant_id}")
+                logger.info("ID asystenta zapisany do .env: %s", assistant_id)
                 
         except Exception as e:
-            print(f"⚠️  Nie udało się zapisać ID asystenta do .env: {e}")
+            logger.warning("Nie udało się zapisać ID asystenta do .env: %s", e)
     
     def clean_assistant_memory(self):
         """Czyści pamięć asystenta - usuwa stare pliki i vector stores"""
         try:
-            print("🧹 Czyszczenie pamięci asystenta...")
+            logger.debug("Czyszczenie pamięci asystenta")
             
             # Pobierz wszystkie pliki z OpenAI
             files_response = self.client.files.list()
             files_to_delete = []
             
+            with _pinned_lock:
+                pinned = set(_pinned_resources)
+            
             for file in files_response.data:
+                if file.id in pinned:
+                    continue
                 # Usuń pliki starsze niż 1 godzina (3600 sekund)
                 file_age = time.time() - file.created_at
                 if file_age > 3600:  # 1 godzina
@@ -236,15 +295,17 @@ class OpenAIRAG:
             for file_id in files_to_delete:
                 try:
                     self.client.files.delete(file_id)
-                    print(f"🗑️  Usunięto stary plik: {file_id}")
+                    logger.debug("Usunięto stary plik: %s", file_id)
                 except Exception as e:
-                    print(f"⚠️  Nie udało się usunąć pliku {file_id}: {e}")
+                    logger.warning("Nie udało się usunąć pliku %s: %s", file_id, e)
             
             # Pobierz wszystkie vector stores
             vector_stores_response = self.client.beta.vector_stores.list()
             stores_to_delete = []
             
             for store in vector_stores_response.data:
+                if store.id in pinned:
+                    continue
                 # Usuń vector stores starsze niż 1 godzina
                 store_age = time.time() - store.created_at
                 if store_age > 3600:  # 1 godzina
@@ -254,19 +315,19 @@ class OpenAIRAG:
             for store_id in stores_to_delete:
                 try:
                     self.client.beta.vector_stores.delete(store_id)
-                    print(f"🗑️  Usunięto stary vector store: {store_id}")
+                    logger.debug("Usunięto stary vector store: %s", store_id)
                 except Exception as e:
-                    print(f"⚠️  Nie udało się usunąć vector store {store_id}: {e}")
+                    logger.warning("Nie udało się usunąć vector store %s: %s", store_id, e)
                     
-            print(f"✅ Wyczyszczono {len(files_to_delete)} plików i {len(stores_to_delete)} vector stores")
+            logger.debug("Wyczyszczono %d plików i %d vector stores", len(files_to_delete), len(stores_to_delete))
             
         except Exception as e:
-            print(f"❌ Błąd podczas czyszczenia pamięci: {str(e)}")
+            logger.error("Błąd podczas czyszczenia pamięci: %s", e)
 
     def cancel_active_runs(self, thread_id):
         """Anuluje wszystkie aktywne runy w wątku"""
         try:
-            print(f"🔍 Sprawdzam aktywne runy w wątku {thread_id}")
+            logger.debug("Sprawdzam aktywne runy w wątku %s", thread_id)
             
             # Pobierz wszystkie runy w wątku
             runs = self.client.beta.threads.runs.list(thread_id=thread_id)
@@ -280,30 +341,28 @@ class OpenAIRAG:
             for run_id in active_runs:
                 try:
                     self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
-                    print(f"⚠️  Anulowano aktywny run: {run_id}")
+                    logger.warning("Anulowano aktywny run: %s", run_id)
                 except Exception as e:
-                    print(f"❌ Nie udało się anulować run {run_id}: {e}")
+                    logger.error("Nie udało się anulować run %s: %s", run_id, e)
                     
             if active_runs:
-                print(f"✅ Anulowano {len(active_runs)} aktywnych runów")
+                logger.info("Anulowano %d aktywnych runów", len(active_runs))
                 time.sleep(1)  # Krótkie opóźnienie aby anulowanie się dokończyło
             else:
-                print("✅ Brak aktywnych runów do anulowania")
+                logger.debug("Brak aktywnych runów do anulowania")
                 
         except Exception as e:
-            print(f"❌ Błąd podczas anulowania aktywnych runów: {str(e)}")
+            logger.error("Błąd podczas anulowania aktywnych runów: %s", e)
 
     def select_relevant_documents(self, query, max_docs=5):  # Zmniejszono z 10 do 5
         """Wybiera najistotniejsze dokumenty dla zapytania"""
-        print(f"🔍 Wybieranie dokumentów dla zapytania: {query[:50]}...")
-        
         upload_index = UploadIndex()
         all_files = upload_index.get_all_files()
         
-        print(f"🔍 Znaleziono {len(all_files)} plików w indeksie")
+        logger.debug("Znaleziono %d plików w indeksie", len(all_files))
         
         if not all_files:
-            print("⚠️  Brak plików w indeksie!")
+            logger.debug("Brak plików w indeksie")
             self.last_documents_used = 0
             return []
 
@@ -316,17 +375,16 @@ class OpenAIRAG:
                 if file_size < 20 * 1024 * 1024:  # 20MB limit
                     selected_files.append(file_path)
                 else:
-                    print(f"⚠️  Plik {file_path} jest za duży ({file_size/1024/1024:.1f}MB), pomijam")
+                    logger.warning("Plik %s jest za duży (%.1fMB), pomijam", file_path, file_size/1024/1024)
                     
         self.last_documents_used = len(selected_files)
-        print(f"🔍 Wybrano {len(selected_files)} plików: {selected_files[:3]}...")
         return selected_files
 
     def create_vector_store_with_files(self, file_paths):
         """Tworzy vector store z wybranymi plikami"""
         try:
             if not file_paths:
-                print("⚠️  Brak plików do przesłania")
+                logger.debug("Brak plików do przesłania")
                 return None, []
                 
             # Utwórz vector store
@@ -346,12 +404,12 @@ class OpenAIRAG:
                                 purpose='assistants'
                             )
                             file_ids.append(file_obj.id)
-                            print(f"📄 Przesłano plik: {file_path} -> {file_obj.id}")
+                            logger.debug("Przesłano plik: %s -> %s", file_path, file_obj.id)
                     except Exception as e:
-                        print(f"❌ Błąd przesyłania pliku {file_path}: {e}")
+                        logger.error("Błąd przesyłania pliku %s: %s", file_path, e)
                         
             if not file_ids:
-                print("⚠️  Nie udało się przesłać żadnych plików")
+                logger.warning("Nie udało się przesłać żadnych plików")
                 self.client.beta.vector_stores.delete(vector_store.id)
                 return None, []
                 
@@ -361,7 +419,7 @@ class OpenAIRAG:
                     vector_store_id=vector_store.id,
                     file_ids=file_ids
                 )
-                print(f"✅ Dodano {len(file_ids)} plików do vector store")
+                logger.debug("Dodano %d plików do vector store", len(file_ids))
                 
                 # Poczekaj na przetworzenie
                 time.sleep(2)
@@ -369,23 +427,65 @@ class OpenAIRAG:
                 return vector_store.id, file_ids
                 
             except Exception as e:
-                print(f"❌ Błąd dodawania plików do vector store: {e}")
+                logger.error("Błąd dodawania plików do vector store: %s", e)
                 # Usuń utworzone zasoby
                 self.cleanup_resources(vector_store.id, file_ids, None)
                 return None, []
                 
         except Exception as e:
-            print(f"❌ Błąd tworzenia vector store: {e}")
+            logger.error("Błąd tworzenia vector store: %s", e)
             return None, []
 
-    def generate_response_stream(self, query, context, session_id):
+    def create_shared_vector_store(self, file_paths):
+        """Tworzy vector store współdzielony przez wiele pytań (chroniony przed czyszczeniem)"""
+        vector_store_id, file_ids = self.create_vector_store_with_files(file_paths)
+        if vector_store_id:
+            with _pinned_lock:
+                _pinned_resources.add(vector_store_id)
+                _pinned_resources.update(file_ids)
+        return vector_store_id, file_ids
+
+    def release_shared_vector_store(self, vector_store_id, file_ids):
+        """Zwalnia i usuwa współdzielony vector store"""
+        with _pinned_lock:
+            _pinned_resources.discard(vector_store_id)
+            _pinned_resources.difference_update(file_ids or [])
+        self.cleanup_resources(vector_store_id, file_ids or [], None)
+
+    def answer_question(self, query, file_paths, vector_store=None, is_cancelled=None):
+        """Generuje pełną odpowiedź na pojedyncze pytanie bez historii rozmowy
+
+        Używane przez zadania wsadowe. Zwraca (odpowiedź, czy_z_cache); błąd
+        generowania jest dostępny w last_error.
+        """
+        self.last_error = None
+        self.last_cache_hit = False
+        self.last_usage = None
+        self.last_documents_used = len(file_paths)
+        
+        # Tylko identyczne pytania - warianty pytań testowych różnią się szczegółami
+        cached = get_answer_cache().lookup(query, file_paths, exact=True)
+        if cached:
+            self.last_cache_key = cached['key']
+            self.last_cache_hit = True
+            return cached['answer'], True
+        
+        answer = ''.join(self._stream_from_assistant(
+            query, [], file_paths, None, use_cache=True, is_cancelled=is_cancelled, vector_store=vector_store
+        ))
+        if not self.last_error and not answer.strip():
+            self.last_error = 'Pusta odpowiedź asystenta'
+        return answer, False
+
+    def generate_response_stream(self, query, context, session_id, user_id=None, is_cancelled=None):
         """Generuje odpowiedź w trybie strumieniowym z systemem uczenia się"""
+        self.last_usage = None
         try:
-            print(f"🔍 Rozpoczynam generowanie odpowiedzi dla: {query[:50]}...")
+            logger.debug("Generowanie odpowiedzi dla sesji %s (%d znaków pytania)", session_id, len(query))
             
             # Sprawdź czy pytanie dotyczy lotnictwa - uwzględnij kontekst rozmowy
             if not self.is_aviation_related_with_context(query, context):
-                print(f"⚠️  Pytanie nie dotyczy lotnictwa: {query[:100]}...")
+                logger.info("Pytanie nie dotyczy lotnictwa (sesja %s)", session_id)
                 rejection_message = ("Przepraszam, ale jestem asystentem specjalizującym się wyłącznie w tematyce lotniczej. "
                                    "Mogę pomóc w następujących obszarach:\n"
                                    "- Pilotaż i procedury lotnicze\n"
@@ -398,67 +498,152 @@ class OpenAIRAG:
                                    "- Maintenance i serwis\n\n"
                                    "Proszę zadać pytanie związane z lotnictwem.")
                 
-                # Zwróć odpowiedź jako generator dla zachowania zgodności
-                def rejection_generator():
-                    yield rejection_message
-                
-                return rejection_generator()
+                # Metoda jest generatorem - odmowę trzeba zwrócić przez yield
+                yield rejection_message
+                return
             
-            # Wyciągnij user_id z kontekstu (jeśli dostępny)
-            user_id = None
-            if context:
+            # Wyciągnij user_id z kontekstu (jeśli nie został przekazany)
+            if user_id is None and context:
                 # Znajdź pierwszą wiadomość z user_id
                 for msg in context:
                     if isinstance(msg, dict) and 'user_id' in msg:
                         user_id = msg['user_id']
                         break
             
-            print(f"🆔 User ID z kontekstu: {user_id}")
-            
             # ANALIZUJ PREFERENCJE UŻYTKOWNIKA I UCZEŚSIA
-            print("🧠 Analizuję preferencje użytkownika...")
+            # Profil aktualizowany jest tylko o nowe pytanie - bez ponownej analizy całej historii
+            profile = self.learning_system.record_user_message(session_id, query, user_id)
             learning_prompt = self.learning_system.generate_learning_prompt(session_id, query, user_id)
-            print(f"📚 Prompt uczenia: {learning_prompt}")
+            logger.debug("Prompt uczenia dla %s: %d znaków", user_id, len(learning_prompt or ''))
             
-            # Zapisz analizę sesji dla przyszłego uczenia
-            session_analysis = self.learning_system.analyze_conversation_history(session_id, user_id)
-            if session_analysis:
-                self.learning_system.save_learning_data(session_analysis)
-                print("💾 Zapisano dane uczenia")
-            
-            # WYCZYŚĆ PAMIĘĆ ASYSTENTA PRZED ROZPOCZĘCIEM
-            self.clean_assistant_memory()
+            # Zapisz migawkę profilu dla przyszłego uczenia
+            if profile and profile.get('message_count'):
+                self.learning_system.save_learning_data(
+                    self.learning_system.analysis_from_profile(profile, session_id)
+                )
             
             # Wybierz istotne dokumenty (maksymalnie 5)
             relevant_docs = self.select_relevant_documents(query, max_docs=5)
-            print(f"🔍 Wybrano {len(relevant_docs)} dokumentów: {relevant_docs[:3]}...")
+            logger.debug("Wybrano %d dokumentów: %s", len(relevant_docs), relevant_docs[:3])
             
             # Ustaw liczbę użytych dokumentów
             self.last_documents_used = len(relevant_docs)
             
-            # Utwórz vector store z dokumentami
-            vector_store_id, file_ids = self.create_vector_store_with_files(relevant_docs)
+            # Pytanie bez wcześniejszej rozmowy - sprawdź cache odpowiedzi
+            self.last_cache_key = None
+            self.last_cache_hit = False
+            self.last_shared = False
+            use_cache = len(context or []) <= 1
+            if use_cache:
+                # Odpowiedzi spersonalizowane są dzielone tylko przy tym samym prompcie uczenia
+                cached = get_answer_cache().lookup(query, relevant_docs, learning_prompt=learning_prompt)
+                if cached:
+                    self.last_cache_key = cached['key']
+                    self.last_cache_hit = True
+                    self.last_documents_used = cached.get('documents_used', len(relevant_docs))
+                    for chunk in get_answer_cache().replay_chunks(cached):
+                        yield chunk
+                    return
+            
+            # Identyczne pytania w toku (z tym samym promptem uczenia) obsługuje jeden wspólny run
+            flight_key = single_flight_key(query, context, relevant_docs, learning_prompt)
+            for chunk in get_single_flight().stream(
+                flight_key,
+                lambda flight_cancelled: self._stream_from_assistant(
+                    query, context, relevant_docs, learning_prompt, use_cache, flight_cancelled
+                ),
+                is_cancelled,
+                result=self._flight_result,
+                on_result=self._apply_flight_result
+            ):
+                yield chunk
+            
+        except Exception as e:
+            logger.exception("Błąd podczas generowania odpowiedzi: %s", e)
+            yield f"Przepraszam, wystąpił błąd: {str(e)}"
+    
+    def _flight_result(self):
+        """Wynik generowania przekazywany wszystkim odbiorcom single-flight"""
+        return {'usage': self.last_usage, 'cache_key': self.last_cache_key, 'error': self.last_error}
+    
+    def _apply_flight_result(self, result, shared):
+        """Przyjmuje wynik wspólnego generowania; tokeny zalicza tylko zapytanie, które je uruchomiło"""
+        self.last_cache_key = result.get('cache_key')
+        self.last_error = result.get('error')
+        self.last_shared = shared
+        self.last_usage = None if shared else result.get('usage')
+    
+    def _add_run_usage(self, run):
+        """Dolicza usage zakończonego runu (także nieudanego - tokeny zostały zużyte)"""
+        usage = usage_from_response(getattr(run, 'usage', None), getattr(run, 'model', None) or self.model)
+        self.last_usage = merge_usage(self.last_usage, usage)
+    
+    def _add_cancelled_run_usage(self, thread_id, run_id, messages, response_text):
+        """Dolicza usage anulowanego runu
+
+        Dostawca podaje usage dopiero, gdy run dojdzie do stanu końcowego - po anulowaniu
+        odpytujemy go krótko. Bez usage zużycie jest szacowane z wysłanych wiadomości
+        i odebranej części odpowiedzi (wpis oznaczony partial).
+        """
+        deadline = time.monotonic() + CANCELLED_RUN_USAGE_TIMEOUT
+        while run_id:
+            try:
+                run = self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            except Exception as e:
+                logger.warning("Nie udało się pobrać anulowanego runu %s: %s", run_id, e)
+                break
+            if run.usage is not None:
+                self._add_run_usage(run)
+                return
+            if run.status in _TERMINAL_RUN_STATUSES or time.monotonic() >= deadline:
+                break
+            time.sleep(0.25)
+
+        logger.info("Brak usage anulowanego runu %s - szacuję zużycie", run_id)
+        prompt = ''.join(msg['content'] for msg in messages)
+        self.last_usage = merge_usage(self.last_usage, estimate_usage(prompt, response_text, self.model))
+    
+    def _stream_from_assistant(self, query, context, relevant_docs, learning_prompt, use_cache=False,
+                               is_cancelled=None, vector_store=None):
+        """Tworzy vector store, wątek i run asystenta oraz strumieniuje odpowiedź
+
+        Przekazany vector_store (id, file_ids) jest współdzielony - nie jest tworzony ani usuwany.
+        Zużycie tokenów (suma ponowionych runów) trafia do self.last_usage.
+        """
+        self.last_error = None
+        self.last_usage = None
+        try:
+            if vector_store is None:
+                # WYCZYŚĆ PAMIĘĆ ASYSTENTA PRZED ROZPOCZĘCIEM
+                self.clean_assistant_memory()
+                
+                # Utwórz vector store z dokumentami
+                vector_store_id, file_ids = self.create_vector_store_with_files(relevant_docs)
+                owned_store_id, owned_file_ids = vector_store_id, file_ids
+            else:
+                vector_store_id, file_ids = vector_store
+                owned_store_id, owned_file_ids = None, []
             
-            if not vector_store_id:
-                print("⚠️  Nie udało się utworzyć vector store, kontynuuję bez plików")
+            # Odpowiedź bez dokumentów nie może trafić do cache pod skrótem wybranych dokumentów
+            documents_missing = bool(relevant_docs) and not vector_store_id
+            if documents_missing:
+                logger.warning("Nie udało się utworzyć vector store, kontynuuję bez plików (bez zapisu do cache)")
                 
-            print(f"🔍 Vector store ID: {vector_store_id}, Pliki: {len(file_ids)}")
+            logger.debug("Vector store %s, pliki: %d", vector_store_id, len(file_ids))
+            
+            # Anulowano zanim powstał wątek - nie uruchamiaj asystenta
+            if is_cancelled and is_cancelled():
+                logger.info("Generowanie anulowane przed uruchomieniem asystenta")
+                self.last_error = 'Generowanie anulowane'
+                self.cleanup_resources(owned_store_id, owned_file_ids, None)
+                return
             
             # Przygotuj kontekst rozmowy (pełna historia, zwiększ do 30 wiadomości)
             messages = []
             # Zwiększ kontekst do 30 ostatnich wiadomości (15 par pytanie-odpowiedź)
             recent_context = context[-30:] if len(context) > 30 else context
             
-            print(f"🔍 Przygotowuję kontekst z {len(recent_context)} wiadomości (z {len(context)} całkowitych)")
-            print(f"📚 Pierwsze pytanie w sesji: {context[0]['content'][:100] if context else 'Brak kontekstu'}...")
-            print(f"📚 Ostatnie pytanie w sesji: {context[-1]['content'][:100] if context else 'Brak kontekstu'}...")
-            
-            # Wyświetl streszczenie całej historii
-            if len(context) > 0:
-                user_questions = [msg['content'][:50] + "..." for msg in context if msg['role'] == 'user']
-                print(f"📋 Wszystkie pytania użytkownika w sesji ({len(user_questions)}):")
-                for i, q in enumerate(user_questions, 1):
-                    print(f"   {i}. {q}")
+            logger.debug("Kontekst: %d z %d wiadomości", len(recent_context), len(context))
             
             for msg in recent_context:
                 # Sprawdź czy wiadomość ma niepustą treść
@@ -468,9 +653,7 @@ class OpenAIRAG:
                         "content": msg["content"]
                     })
                 else:
-                    print(f"⚠️  Pomijam pustą wiadomość: {msg}")
-                
-            print(f"🔍 Dodano {len(messages)} niepustych wiadomości z kontekstu")
+                    logger.debug("Pomijam pustą wiadomość kontekstu (%s)", msg.get("role"))
                 
             # Dodaj szczegółowe instrukcje dotyczące kontekstu sesji
             context_instruction = ""
@@ -521,7 +704,7 @@ class OpenAIRAG:
             
             # Sprawdź czy final_query nie jest pusty
             if not final_query or not final_query.strip():
-                print("⚠️  Ostrzeżenie: final_query jest pusty, używam bezpośrednio pytania")
+                logger.warning("final_query jest pusty, używam bezpośrednio pytania")
                 final_query = query
             
             # Dodaj aktualne pytanie z promptem uczenia
@@ -530,19 +713,15 @@ class OpenAIRAG:
                 "content": final_query
             })
             
-            print(f"🔍 Przygotowano {len(messages)} wiadomości w kontekście (z promptem uczenia)")
+            logger.debug("Przygotowano %d wiadomości w kontekście (z promptem uczenia)", len(messages))
             
             # Sprawdź czy wszystkie wiadomości mają niepustą treść
             for i, msg in enumerate(messages):
                 if not msg.get("content") or not msg.get("content").strip():
-                    print(f"❌ BŁĄD: Wiadomość {i} ma pustą treść: {msg}")
-                    print(f"🔍 Wszystkie wiadomości: {messages}")
+                    logger.error("Wiadomość %d (%s) ma pustą treść", i, msg.get("role"))
                     raise ValueError(f"Wiadomość {i} ma pustą treść")
-                else:
-                    print(f"✅ Wiadomość {i} ({msg['role']}): {msg['content'][:100]}...")
             
             # Utwórz wątek
-            print(f"🔍 Tworzę wątek z asystentem {self.assistant_id}")
             
             thread_data = {
                 "messages": messages
@@ -558,15 +737,16 @@ class OpenAIRAG:
             
             thread = self.client.beta.threads.create(**thread_data)
             
-            print(f"🔍 Wątek utworzony: {thread.id}")
+            logger.debug("Wątek %s utworzony dla asystenta %s", thread.id, self.assistant_id)
             
             # Uruchom asystenta z dodatkowym zabezpieczeniem i retry
-            print(f"🔍 Uruchamiam asystenta w trybie strumieniowym...")
             
             max_retries = 3
             retry_count = 0
+            cancelled = False
             
             while retry_count < max_retries:
+                run = None
                 try:
                     # Sprawdź czy wątek ma aktywne runy i je anuluj
                     self.cancel_active_runs(thread.id)
@@ -585,7 +765,7 @@ class OpenAIRAG:
                         run_params['temperature'] = 0.7
                         run = self.client.beta.threads.runs.create(**run_params)
                     except Exception as temp_error:
-                        print(f"⚠️  Model nie obsługuje temperature, używam bez tego parametru: {temp_error}")
+                        logger.warning("Model nie obsługuje temperature, używam bez tego parametru: %s", temp_error)
                         # Usuń temperature i spróbuj ponownie
                         run_params.pop('temperature', None)
                         run = self.client.beta.threads.runs.create(**run_params)
@@ -594,8 +774,15 @@ class OpenAIRAG:
                     response_text = ""
                     chunk_count = 0
                     stream_failed = False
+                    run_id = None
                 
                     for event in run:
+                        if event.event == 'thread.run.created':
+                            run_id = event.data.id
+                        if is_cancelled and is_cancelled():
+                            logger.info("Przerywam generowanie na żądanie użytkownika (wątek %s)", thread.id)
+                            cancelled = True
+                            break
                         if event.event == 'thread.message.delta':
                             if hasattr(event.data, 'delta') and hasattr(event.data.delta, 'content'):
                                 for content in event.data.delta.content:
@@ -603,52 +790,75 @@ class OpenAIRAG:
                                         chunk = content.text.value
                                         response_text += chunk
                                         chunk_count += 1
-                                        if chunk_count <= 3:  # Loguj tylko pierwsze 3 chunki
-                                            print(f"🔍 Otrzymano chunk #{chunk_count}: {chunk[:30]}...")
                                         yield chunk
                         elif event.event == 'thread.run.completed':
-                            print("✅ Ukończono generowanie odpowiedzi")
+                            self._add_run_usage(event.data)
                             break
                         elif event.event == 'thread.run.failed':
+                            self._add_run_usage(event.data)
                             error_details = getattr(event.data, 'last_error', None)
                             if error_details:
                                 error_msg = f"OpenAI API Error: {error_details.code} - {error_details.message}"
-                                print(f"❌ {error_msg}")
+                                logger.error(error_msg)
                                 stream_failed = True
                                 if retry_count < max_retries - 1:
-                                    print(f"🔄 Próbuję ponownie ({retry_count + 1}/{max_retries})...")
+                                    logger.warning("Próbuję ponownie (%d/%d)", retry_count + 1, max_retries)
                                     break
                                 else:
+                                    self.last_error = error_msg
                                     yield f"Przepraszam, wystąpił błąd po stronie OpenAI: {error_details.message}. Spróbuj ponownie za chwilę."
                             else:
-                                print(f"❌ Błąd podczas generowania: {event.data}")
+                                logger.error("Błąd podczas generowania: %s", event.data)
                                 stream_failed = True
                                 if retry_count < max_retries - 1:
-                                    print(f"🔄 Próbuję ponownie ({retry_count + 1}/{max_retries})...")
+                                    logger.warning("Próbuję ponownie (%d/%d)", retry_count + 1, max_retries)
                                     break
                                 else:
+                                    self.last_error = str(event.data)
                                     yield "Przepraszam, wystąpił nieoczekiwany błąd. Spróbuj ponownie."
                             break
                         elif event.event == 'thread.run.cancelled':
-                            print("⚠️ Generowanie zostało anulowane")
+                            logger.warning("Run anulowany po stronie OpenAI (wątek %s)", thread.id)
+                            self.last_error = 'Run anulowany'
+                            self._add_run_usage(event.data)
                             yield "Generowanie odpowiedzi zostało anulowane."
                             return
                     
+                    # Zatrzymaj run u dostawcy, żeby nie generował dalej
+                    if cancelled:
+                        self.last_error = 'Generowanie anulowane'
+                        run.close()
+                        self.cancel_active_runs(thread.id)
+                        # Tokeny anulowanego runu też są płatne - usage z runu po anulowaniu
+                        self._add_cancelled_run_usage(thread.id, run_id, messages, response_text)
+                        break
+                    
                     # Jeśli nie było błędu, zakończ retry loop
                     if not stream_failed:
-                        print(f"🔍 Otrzymano łącznie {chunk_count} chunków, długość odpowiedzi: {len(response_text)}")
+                        logger.debug("Otrzymano %d fragmentów, długość odpowiedzi: %d", chunk_count, len(response_text))
+                        if use_cache and not documents_missing and response_text.strip():
+                            self.last_cache_key = get_answer_cache().store(
+                                query, relevant_docs, response_text, len(relevant_docs),
+                                learning_prompt=learning_prompt
+                            )
                         break
                         
                 except Exception as stream_error:
-                    print(f"❌ Błąd podczas streamowania: {stream_error}")
+                    logger.error("Błąd podczas streamowania: %s", stream_error)
                     if retry_count < max_retries - 1:
-                        print(f"🔄 Próbuję ponownie ({retry_count + 1}/{max_retries})...")
+                        logger.warning("Próbuję ponownie (%d/%d)", retry_count + 1, max_retries)
                         retry_count += 1
                         time.sleep(2 ** retry_count)  # Exponential backoff
                         continue
                     else:
+                        self.last_error = str(stream_error)
                         yield f"Przepraszam, wystąpił błąd podczas generowania odpowiedzi: {str(stream_error)}"
                         break
+                finally:
+                    # Strumień zamykany na każdej ścieżce - niezamknięta odpowiedź zamykana przez GC
+                    # wewnątrz puli httpcore próbuje ponownie wziąć jej blokadę i zawiesza proces
+                    if run is not None:
+                        run.close()
                 
                 retry_count += 1
                 if stream_failed and retry_count < max_retries:
@@ -658,13 +868,11 @@ class OpenAIRAG:
             time.sleep(1)
             
             # Usuń tymczasowe zasoby
-            self.cleanup_resources(vector_store_id, file_ids, thread.id)
-            print(f"🔍 Zakończono generowanie odpowiedzi")
+            self.cleanup_resources(owned_store_id, owned_file_ids, thread.id)
             
         except Exception as e:
-            print(f"❌ Błąd podczas generowania odpowiedzi: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Błąd podczas generowania odpowiedzi: %s", e)
+            self.last_error = str(e)
             yield f"Przepraszam, wystąpił błąd: {str(e)}"
     
     def cleanup_resources(self, vector_store_id, file_ids, thread_id):
@@ -692,10 +900,15 @@ class OpenAIRAG:
                     pass
                     
         except Exception as e:
-            print(f"Błąd podczas usuwania zasobów: {str(e)}")
+            logger.warning("Błąd podczas usuwania zasobów: %s", e)
     
     def generate_pdf_report(self, content, session_id, message_id=None):
         """Generuje raport PDF z odpowiedzi"""
+        # reportlab ładowany przy pierwszym raporcie - nie spowalnia startu serwera
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+        from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER
         try:
             # Utwórz katalog dla sesji
             reports_dir = f'reports/{session_id}'
@@ -757,7 +970,7 @@ class OpenAIRAG:
             return filepath
             
         except Exception as e:
-            print(f"Błąd podczas generowania PDF: {str(e)}")
+            logger.error("Błąd podczas generowania PDF: %s", e)
             return None
     
     def add_feedback_to_training(self, feedback_data):
@@ -787,14 +1000,14 @@ class OpenAIRAG:
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(training_data, f, ensure_ascii=False, indent=2)
             
-            print(f"✅ Feedback dodany do bazy treningowej: {filename}")
+            logger.info("Feedback dodany do bazy treningowej: %s", filename)
             
             # Jeśli feedback jest negatywny, spróbuj poprawić odpowiedź
             if feedback_data['feedback_type'] == 'negative':
                 self.process_negative_feedback(feedback_data)
                 
         except Exception as e:
-            print(f"❌ Błąd podczas dodawania feedback do treningu: {str(e)}")
+            logger.error("Błąd podczas dodawania feedback do treningu: %s", e)
     
     def generate_improvement_notes(self, feedback_data):
         """Generuje notatki o poprawach na podstawie feedbacku"""
@@ -844,10 +1057,10 @@ class OpenAIRAG:
             with open(negative_feedback_file, 'w', encoding='utf-8') as f:
                 json.dump(all_negative, f, ensure_ascii=False, indent=2)
             
-            print(f"✅ Negatywny feedback dodany do analizy: {feedback_data['section_type']}")
+            logger.info("Negatywny feedback dodany do analizy: %s", feedback_data['section_type'])
             
         except Exception as e:
-            print(f"❌ Błąd podczas przetwarzania negatywnego feedbacku: {str(e)}")
+            logger.error("Błąd podczas przetwarzania negatywnego feedbacku: %s", e)
 
     def get_training_insights(self):
         """Pobiera insights z feedbacku treningowego"""
@@ -887,7 +1100,7 @@ class OpenAIRAG:
             return insights
             
         except Exception as e:
-            print(f"❌ Błąd podczas pobierania insights: {str(e)}")
+            logger.error("Błąd podczas pobierania insights: %s", e)
             return {}
     
     def save_conversation_context(self, session_id, context, current_message):
@@ -913,11 +1126,11 @@ class OpenAIRAG:
             with open(context_file, 'w', encoding='utf-8') as f:
                 json.dump(conversation_data, f, ensure_ascii=False, indent=2)
             
-            print(f"💾 Kontekst rozmowy zapisany do {context_file}")
-            print(f"📊 Statystyki: {conversation_data['summary']}")
+            logger.debug("Kontekst rozmowy zapisany do %s", context_file)
+            logger.debug("Statystyki: %s", conversation_data['summary'])
             
         except Exception as e:
-            print(f"⚠️  Błąd zapisu kontekstu rozmowy: {e}")
+            logger.warning("Błąd zapisu kontekstu rozmowy: %s", e)
 
     def load_conversation_context(self, session_id):
         """Ładuje kontekst rozmowy z pliku"""
@@ -929,7 +1142,7 @@ class OpenAIRAG:
                 return data.get('full_conversation', [])
             return []
         except Exception as e:
-            print(f"⚠️  Błąd ładowania kontekstu rozmowy: {e}")
+            logger.warning("Błąd ładowania kontekstu rozmowy: %s", e)
             return []
     
     def is_aviation_related(self, query: str) -> bool:
@@ -1012,12 +1225,12 @@ class OpenAIRAG:
         is_aviation_query = self.is_aviation_related(query)
         
         if is_aviation_query:
-            print(f"✅ Pytanie bezpośrednio dotyczy lotnictwa: {query[:50]}...")
+            logger.debug("Pytanie bezpośrednio dotyczy lotnictwa")
             return True
         
         # Jeśli pytanie nie wygląda na lotnicze, sprawdź kontekst rozmowy
         if context and len(context) > 0:
-            print(f"🔍 Pytanie '{query}' nie wygląda na lotnicze, sprawdzam kontekst rozmowy...")
+            logger.debug("Pytanie nie wygląda na lotnicze, sprawdzam kontekst rozmowy")
             
             # Sprawdź ostatnie wiadomości asystenta czy dotyczyły lotnictwa
             recent_assistant_messages = []
@@ -1029,10 +1242,10 @@ class OpenAIRAG:
             if recent_assistant_messages:
                 combined_context = " ".join(recent_assistant_messages)
                 if self.is_aviation_related(combined_context):
-                    print(f"✅ Kontekst rozmowy dotyczy lotnictwa - akceptuję pytanie follow-up")
+                    logger.debug("Kontekst rozmowy dotyczy lotnictwa - akceptuję pytanie follow-up")
                     return True
                 else:
-                    print(f"❌ Kontekst rozmowy nie dotyczy lotnictwa")
+                    logger.debug("Kontekst rozmowy nie dotyczy lotnictwa")
             
             # Sprawdź czy poprzednie pytania użytkownika dotyczyły lotnictwa
             recent_user_messages = []
@@ -1049,10 +1262,10 @@ class OpenAIRAG:
                 
                 # Jeśli więcej niż połowa ostatnich pytań dotyczyła lotnictwa
                 if aviation_context_count > len(recent_user_messages) / 2:
-                    print(f"✅ Kontekst użytkownika ({aviation_context_count}/{len(recent_user_messages)}) dotyczy lotnictwa - akceptuję pytanie follow-up")
+                    logger.debug("Kontekst użytkownika (%d/%d) dotyczy lotnictwa - akceptuję pytanie follow-up", aviation_context_count, len(recent_user_messages))
                     return True
                 else:
-                    print(f"❌ Kontekst użytkownika ({aviation_context_count}/{len(recent_user_messages)}) nie dotyczy lotnictwa")
+                    logger.debug("Kontekst użytkownika (%d/%d) nie dotyczy lotnictwa", aviation_context_count, len(recent_user_messages))
         
         # Sprawdź czy pytanie to typowe follow-up do rozmowy lotniczej
         follow_up_patterns = [
@@ -1067,13 +1280,13 @@ class OpenAIRAG:
         has_follow_up_pattern = any(pattern in query_lower for pattern in follow_up_patterns)
         
         if has_follow_up_pattern and context and len(context) > 0:
-            print(f"🔍 Pytanie '{query}' wygląda na follow-up, ponownie sprawdzam kontekst...")
+            logger.debug("Pytanie wygląda na follow-up, ponownie sprawdzam kontekst")
             
             # Sprawdź szerszy kontekst dla pytań follow-up
             all_messages = " ".join([msg.get('content', '') for msg in context[-15:] if msg.get('content')])
             if self.is_aviation_related(all_messages):
-                print(f"✅ Szerszy kontekst zawiera tematykę lotniczą - akceptuję pytanie follow-up")
+                logger.debug("Szerszy kontekst zawiera tematykę lotniczą - akceptuję pytanie follow-up")
                 return True
         
-        print(f"❌ Pytanie '{query}' nie dotyczy lotnictwa ani nie jest kontynuacją rozmowy lotniczej")
+        logger.debug("Pytanie nie dotyczy lotnictwa ani nie jest kontynuacją rozmowy lotniczej")
         return False
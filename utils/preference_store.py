@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Magazyn preferencji użytkowników z pamięcią podręczną LRU
+
+Preferencje przechowywane są per użytkownik (jeden plik na użytkownika)
+z opcjonalnymi nadpisaniami dla poszczególnych sesji. Odczyty obsługuje
+pamięć podręczna, a zapisy trafiają do niej natychmiast i są zrzucane
+na dysk paczkami przez wątek w tle.
+"""
+import os
+import re
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PreferenceStore:
+    """Skonsolidowany magazyn preferencji użytkowników"""
+
+    # Nadpisania sesji trzymane tylko dla ostatnio aktualizowanych sesji użytkownika
+    MAX_SESSIONS = 50
+
+    def __init__(self, store_dir: str = 'data/user_preferences', capacity: int = 256,
+                 flush_interval: float = 2.0, legacy_dir: str = 'data',
+                 legacy_file: Optional[str] = 'data/user_preferences.json'):
+        self.store_dir = store_dir
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.legacy_dir = legacy_dir
+        self._cache = OrderedDict()
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._flush_event = threading.Event()
+        self._flush_thread = None
+
+        is_new = not os.path.exists(self.store_dir)
+        os.makedirs(self.store_dir, exist_ok=True)
+        if is_new and legacy_file:
+            self._import_legacy_sessions(legacy_file)
+        atexit.register(self.flush)
+
+    # ------------------------------------------------------------------
+    # Pliki
+    # ------------------------------------------------------------------
+
+    def _safe_key(self, user_key: str) -> str:
+        return re.sub(r'[^\w\-]', '_', str(user_key))
+
+    def _record_path(self, user_key: str) -> str:
+        return os.path.join(self.store_dir, f'{self._safe_key(user_key)}.json')
+
+    def _empty_record(self, user_key: str) -> Dict:
+        return {
+            'user_key': str(user_key),
+            'overrides': {},
+            'sessions': {},
+            'updated_at': None
+        }
+
+    def _learned_flags(self, preferences: Dict) -> Dict:
+        """Wybiera z dawnych preferencji tylko włączone flagi prefers_*"""
+        return {key: True for key, value in preferences.items() if key.startswith('prefers_') and value is True}
+
+    def _read_record(self, user_key: str) -> Dict:
+        """Wczytuje rekord z dysku (lub migruje dawny plik user_preferences_<id>.json)"""
+        path = self._record_path(user_key)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error("Błąd wczytywania preferencji %s: %s", user_key, e)
+                return self._empty_record(user_key)
+
+        record = self._empty_record(user_key)
+        legacy_path = os.path.join(self.legacy_dir, f'user_preferences_{self._safe_key(user_key)}.json')
+        if os.path.exists(legacy_path):
+            try:
+                with open(legacy_path, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+                record['overrides'] = self._learned_flags(legacy)
+                record['updated_at'] = legacy.get('updated_at')
+                self._write_record(record)
+                os.remove(legacy_path)
+                logger.info("Przeniesiono preferencje z %s", legacy_path)
+            except Exception as e:
+                logger.warning("Błąd migracji preferencji z %s: %s", legacy_path, e)
+        return record
+
+    def _write_record(self, record: Dict):
+        """Zapisuje rekord atomowo"""
+        path = self._record_path(record['user_key'])
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _import_legacy_sessions(self, legacy_file: str):
+        """Jednorazowo przenosi dawny plik preferencji kluczowany sesjami"""
+        if not os.path.exists(legacy_file):
+            return
+        try:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+            for session_id, preferences in legacy.items():
+                if not isinstance(preferences, dict):
+                    continue
+                user_key = preferences.get('user_id') or f'session_{session_id}'
+                self.update(user_key, self._learned_flags(preferences), session_id=session_id)
+            self.flush()
+            logger.info("Zaimportowano preferencje %d sesji z %s", len(legacy), legacy_file)
+        except Exception as e:
+            logger.warning("Błąd importu preferencji z %s: %s", legacy_file, e)
+
+    # ------------------------------------------------------------------
+    # Pamięć podręczna
+    # ------------------------------------------------------------------
+
+    def _get_record(self, user_key: str) -> Dict:
+        """Zwraca rekord z pamięci podręcznej, wczytując go przy braku"""
+        user_key = str(user_key)
+        record = self._cache.get(user_key)
+        if record is not None:
+            self._cache.move_to_end(user_key)
+            return record
+
+        record = self._read_record(user_key)
+        self._cache[user_key] = record
+        while len(self._cache) > self.capacity:
+            evicted_key, evicted = self._cache.popitem(last=False)
+            if evicted_key in self._dirty:
+                self._dirty.discard(evicted_key)
+                self._write_record(evicted)
+        return record
+
+    def get(self, user_key: str, session_id: str = None) -> Dict:
+        """Zwraca nadpisania preferencji użytkownika (z uwzględnieniem sesji)"""
+        with self._lock:
+            record = self._get_record(user_key)
+            preferences = dict(record['overrides'])
+            if session_id and session_id in record['sessions']:
+                preferences.update(record['sessions'][session_id])
+            return preferences
+
+    def update(self, user_key: str, changes: Dict, session_id: str = None):
+        """Aktualizuje preferencje w pamięci i planuje zapis na dysk"""
+        if not changes:
+            return
+        with self._lock:
+            record = self._get_record(user_key)
+            if session_id:
+                sessions = record['sessions']
+                # Ostatnio zmieniona sesja na koniec - najstarsze odpadają ponad MAX_SESSIONS
+                sessions[session_id] = {**sessions.pop(session_id, {}), **changes}
+                for stale in list(sessions)[:-self.MAX_SESSIONS]:
+                    del sessions[stale]
+            else:
+                record['overrides'].update(changes)
+            record['updated_at'] = datetime.now().isoformat()
+            self._dirty.add(record['user_key'])
+        self._schedule_flush()
+
+    # ------------------------------------------------------------------
+    # Zapis paczkami
+    # ------------------------------------------------------------------
+
+    def _schedule_flush(self):
+        """Uruchamia wątek zrzucający zmiany (jeśli jeszcze nie działa)"""
+        if self._flush_thread is None or not self._flush_thread.is_alive():
+            with self._lock:
+                if self._flush_thread is None or not self._flush_thread.is_alive():
+                    self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+                    self._flush_thread.start()
+        self._flush_event.set()
+
+    def _flush_loop(self):
+        while True:
+            self._flush_event.wait()
+            # Zbierz zmiany z krótkiego okna w jeden zapis
+            time.sleep(self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
+
+    def flush(self):
+        """Zapisuje wszystkie zmienione rekordy na dysk"""
+        with self._lock:
+            dirty = [self._cache[key] for key in self._dirty if key in self._cache]
+            self._dirty.clear()
+            for record in dirty:
+                try:
+                    self._write_record(record)
+                except Exception as e:
+                    logger.error("Błąd zapisywania preferencji %s: %s", record['user_key'], e)
+                    self._dirty.add(record['user_key'])
+
+    def all_records(self) -> List[Dict]:
+        """Zwraca wszystkie rekordy (zrzuca zmiany i czyta katalog magazynu)"""
+        self.flush()
+        records = []
+        for filename in sorted(os.listdir(self.store_dir)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.store_dir, filename), 'r', encoding='utf-8') as f:
+                    records.append(json.load(f))
+            except Exception:
+                continue
+        return records
+
+
+_preference_store = None
+_preference_store_lock = threading.Lock()
+
+
+def get_preference_store() -> PreferenceStore:
+    """Zwraca globalny magazyn preferencji"""
+    global _preference_store
+    if _preference_store is None:
+        with _preference_store_lock:
+            if _preference_store is None:
+                _preference_store = PreferenceStore()
+    return _preference_store
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Profilowanie działającego serwera na żądanie administratora
+
+SamplingProfiler co zadany interwał odczytuje stosy wszystkich wątków
+(sys._current_frames) i zlicza je w formacie "collapsed" (ramki rozdzielone
+średnikiem i liczba próbek), który przyjmują flamegraph.pl, speedscope
+i inferno. Próbkowanie mierzy czas zegarowy, więc widać też czekanie na
+sieć i blokady. W trybie eventlet/gevent próbkowanie działa w prawdziwym
+wątku systemowym i widzi zielony wątek aktualnie wykonywany przez pętlę.
+
+tracemalloc_report porównuje dwa zrzuty alokacji wykonane w odstępie kilku
+sekund i zwraca miejsca, które przydzieliły najwięcej pamięci.
+
+Jednocześnie może działać tylko jedna sesja diagnostyczna, a czas trwania
+jest ograniczony (PROFILER_MAX_SECONDS), żeby narzędzie było bezpieczne na
+produkcji.
+"""
+import os
+import sys
+import math
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Dict, List
+
+from utils.async_support import real_sleep
+
+MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', 60))
+MAX_DEPTH = 128
+
+# Funkcje, w których wątek czeka (pomijane przy include_idle=False)
+IDLE_FUNCTIONS = {
+    'wait', 'select', 'poll', 'epoll', 'sleep', 'acquire', '_wait_for_tstate_lock', 'accept',
+    'recv', 'recv_into', 'readinto', 'readline', 'get', 'wait_for', '_recv', 'trampoline',
+    'switch', 'wait_read'
+}
+
+_session_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Inna sesja diagnostyczna jest w toku"""
+
+
+def _require_finite(name: str, value: float) -> float:
+    """NaN omija min/max (pętla próbkowania nie dociera do terminu) - odrzucamy go wcześniej"""
+    if not math.isfinite(value):
+        raise ValueError(f'{name} musi być skończoną liczbą')
+    return value
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for prefix in sys.path:
+        if prefix and filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    # Średnik rozdziela ramki w formacie collapsed
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ',')
+
+
+class SamplingProfiler:
+    """Próbkujący profiler wszystkich wątków procesu"""
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = True):
+        self.interval = min(max(_require_finite('interval', interval), 0.001), 1.0)
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.duration = 0.0
+        self.threads = set()
+
+    def _thread_names(self) -> Dict[int, str]:
+        return {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+
+    def _sample(self, own_code):
+        names = self._thread_names()
+        for ident, frame in sys._current_frames().items():
+            stack = []
+            own = False
+            while frame is not None and len(stack) < MAX_DEPTH:
+                if frame.f_code is own_code:
+                    own = True
+                    break
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if own or not stack:
+                continue
+
+            if not self.include_idle and stack[0].co_name in IDLE_FUNCTIONS:
+                self.idle_samples += 1
+                continue
+
+            thread = names.get(ident, f'thread-{ident}').replace(';', ',')
+            self.threads.add(thread)
+            key = ';'.join([thread] + [_frame_label(code) for code in reversed(stack)])
+            self.stacks[key] += 1
+            self.samples += 1
+
+    def run(self, seconds: float) -> 'SamplingProfiler':
+        """Próbkuje przez zadany czas (blokuje bieżący wątek)"""
+        seconds = min(max(_require_finite('seconds', seconds), 0.1), MAX_SECONDS)
+        own_code = SamplingProfiler.run.__code__
+        started = time.perf_counter()
+        deadline = started + seconds
+        while True:
+            tick = time.perf_counter()
+            if tick >= deadline:
+                break
+            self._sample(own_code)
+            # Czas próbkowania wliczamy w interwał, żeby nie zwalniać przy wielu wątkach
+            real_sleep(max(0.0, self.interval - (time.perf_counter() - tick)))
+        self.duration = time.perf_counter() - started
+        return self
+
+    def collapsed(self) -> str:
+        """Stosy w formacie collapsed (flamegraph.pl / speedscope)"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def summary(self, top: int = 30) -> Dict:
+        """Najczęstsze funkcje: własne (liść stosu) i łączne (gdziekolwiek na stosie)"""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')[1:]
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+
+        def rows(counter):
+            return [{'function': name, 'samples': count,
+                     'percent': round(100.0 * count / self.samples, 2) if self.samples else 0.0}
+                    for name, count in counter.most_common(top)]
+
+        return {
+            'duration_seconds': round(self.duration, 3),
+            'interval_seconds': self.interval,
+            'samples': self.samples,
+            'idle_samples_skipped': self.idle_samples,
+            'threads': sorted(self.threads),
+            'unique_stacks': len(self.stacks),
+            'top_self': rows(own),
+            'top_cumulative': rows(total)
+        }
+
+
+def profile_threads(seconds: float, interval: float = 0.01, include_idle: bool = True) -> SamplingProfiler:
+    """Uruchamia profiler, jeśli żadna inna sesja diagnostyczna nie jest w toku"""
+    _require_finite('seconds', seconds)
+    profiler = SamplingProfiler(interval, include_idle)
+    if not _session_lock.acquire(blocking=False):
+        raise ProfilerBusy('Profilowanie jest już w toku')
+    try:
+        return profiler.run(seconds)
+    finally:
+        _session_lock.release()
+
+
+def tracemalloc_report(seconds: float = 10.0, top: int = 25, group_by: str = 'lineno',
+                       frames: int = 1) -> Dict:
+    """Największe przyrosty alokacji między dwoma zrzutami w odstępie `seconds`"""
+    if group_by not in ('lineno', 'filename', 'traceback'):
+        raise ValueError('group_by musi być jednym z: lineno, filename, traceback')
+    _require_finite('seconds', seconds)
+    if not _session_lock.acquire(blocking=False):
+        raise ProfilerBusy('Profilowanie jest już w toku')
+
+    started_here = False
+    try:
+        seconds = min(max(seconds, 0.0), MAX_SECONDS)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, min(frames, 25)))
+            started_here = True
+
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ]
+        before = tracemalloc.take_snapshot().filter_traces(filters)
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot().filter_traces(filters)
+        current, peak = tracemalloc.get_traced_memory()
+
+        stats = after.compare_to(before, group_by)
+        rows: List[Dict] = []
+        for stat in stats[:max(1, min(top, 200))]:
+            rows.append({
+                'location': [f'{frame.filename}:{frame.lineno}' for frame in stat.traceback],
+                'size_diff_bytes': stat.size_diff,
+                'size_bytes': stat.size,
+                'count_diff': stat.count_diff,
+                'count': stat.count
+            })
+
+        return {
+            'seconds': seconds,
+            'group_by': group_by,
+            'started_tracing': started_here,
+            'traced_current_bytes': current,
+            'traced_peak_bytes': peak,
+            'tracemalloc_overhead_bytes': tracemalloc.get_tracemalloc_memory(),
+            'top': rows
+        }
+    finally:
+        # Śledzenie uruchomione tylko na potrzeby raportu jest od razu wyłączane (narzut pamięci i CPU)
+        if started_here:
+            tracemalloc.stop()
+        _session_lock.release()
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Indeks podobnych pytań oparty o MinHash i LSH
+
+Każde pytanie użytkownika jest normalizowane, dzielone na n-gramy znakowe
+i zapisywane jako sygnatura MinHash. Podział sygnatury na pasma (LSH)
+pozwala znaleźć kandydatów na duplikaty bez porównywania z całym zbiorem,
+więc wstawienie kosztuje tyle co kilka odczytów ze słownika. Pytania
+o podobieństwie powyżej progu trafiają do wspólnego klastra.
+
+Zapis też nie zależy od rozmiaru indeksu: wątek w tle dopisuje do dziennika
+(plik .log obok migawki) tylko zmienione klastry, a co compact_every wpisów
+scala migawkę z dziennikiem z dysku - bez blokady indeksu. Przy pierwszym
+uruchomieniu indeks budowany jest z historii w tle.
+"""
+import os
+import re
+import json
+import time
+import zlib
+import atexit
+import random
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from utils.topic_tagger import fold_text
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_question(text: str) -> str:
+    """Normalizuje pytanie: małe litery, bez polskich znaków i interpunkcji"""
+    text = fold_text(text or '')
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def shingles(normalized: str, size: int = 3) -> set:
+    """Zwraca zbiór n-gramów znakowych znormalizowanego tekstu"""
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    padded = f' {normalized} '
+    return {padded[i:i + size] for i in range(len(padded) - size + 1)}
+
+
+class MinHasher:
+    """Generator sygnatur MinHash o stałej liczbie permutacji"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, features: set) -> List[int]:
+        if not features:
+            return [_MAX_HASH] * self.num_perm
+        hashes = [zlib.crc32(feature.encode('utf-8')) for feature in features]
+        return [
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        ]
+
+
+def estimate_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Szacuje podobieństwo Jaccarda na podstawie dwóch sygnatur"""
+    if not sig_a or not sig_b:
+        return 0.0
+    same = sum(1 for a, b in zip(sig_a, sig_b) if a == b)
+    return same / len(sig_a)
+
+
+class QuestionIndex:
+    """Przyrostowy indeks klastrów podobnych pytań (wszyscy użytkownicy i sesje)"""
+
+    MAX_VARIANTS = 5
+    MAX_SESSIONS = 50
+    # Ostatni użytkownicy klastra - tylko w pamięci, do rozpoznania powtórnego pytania;
+    # na dysk trafia wyłącznie licznik users_count (przybliżony: użytkownik spoza
+    # ostatnich MAX_USERS albo pytający ponownie po restarcie liczony jest jeszcze raz)
+    MAX_USERS = 50
+
+    FLUSH_BATCH = 200
+
+    def __init__(self, index_file: str = 'data/question_index.json', num_perm: int = 64,
+                 bands: int = 16, threshold: float = 0.6, flush_interval: float = 2.0,
+                 compact_every: int = 1000, history_dir: str = 'history'):
+        assert num_perm % bands == 0, "num_perm musi być wielokrotnością bands"
+        self.index_file = index_file
+        self.log_file = f'{index_file}.log'
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self.history_dir = history_dir
+        self.hasher = MinHasher(num_perm)
+
+        self._lock = threading.RLock()
+        # Zapis dziennika i scalanie migawki wykonuje jeden wątek naraz
+        self._io_lock = threading.Lock()
+        self._clusters = {}
+        self._buckets = {}
+        self._recent_users = {}
+        self._next_id = 1
+        self._dirty = set()
+        self._log_entries = 0
+        self._flush_event = threading.Event()
+        self._flush_thread = None
+        self.rebuilding = False
+
+        if os.path.exists(self.index_file) or os.path.exists(self.log_file):
+            self._load()
+        else:
+            self._rebuild_in_background()
+        atexit.register(self.flush)
+
+    # ------------------------------------------------------------------
+    # LSH
+    # ------------------------------------------------------------------
+
+    def _band_keys(self, signature: List[int]) -> List[str]:
+        return [
+            f'{band}:' + ','.join(str(v) for v in signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def _add_to_buckets(self, cluster_id: str, signature: List[int]):
+        for key in self._band_keys(signature):
+            bucket = self._buckets.setdefault(key, [])
+            if cluster_id not in bucket:
+                bucket.append(cluster_id)
+
+    def _best_match(self, signature: List[int]) -> Tuple[Optional[Dict], float]:
+        """Zwraca najbardziej podobny klaster spośród kandydatów LSH"""
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+
+        best, best_score = None, 0.0
+        for cluster_id in candidates:
+            cluster = self._clusters.get(cluster_id)
+            if not cluster:
+                continue
+            score = max(estimate_similarity(signature, variant) for variant in cluster['signatures'])
+            if score > best_score:
+                best, best_score = cluster, score
+        return best, best_score
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def signature_for(self, text: str) -> Tuple[str, List[int]]:
+        """Zwraca znormalizowany tekst i jego sygnaturę"""
+        normalized = normalize_question(text)
+        return normalized, self.hasher.signature(shingles(normalized))
+
+    def find_similar(self, text: str, threshold: float = None) -> Tuple[Optional[Dict], float]:
+        """Szuka klastra podobnego pytania bez modyfikowania indeksu"""
+        normalized, signature = self.signature_for(text)
+        if not normalized:
+            return None, 0.0
+        with self._lock:
+            cluster, score = self._best_match(signature)
+        if cluster and score >= (self.threshold if threshold is None else threshold):
+            return cluster, score
+        return None, score
+
+    def add_question(self, text: str, user_id=None, session_id: str = None,
+                     timestamp: str = None, autosave: bool = True) -> Optional[str]:
+        """Dodaje pytanie do indeksu i zwraca identyfikator jego klastra"""
+        normalized, signature = self.signature_for(text)
+        if not normalized:
+            return None
+        timestamp = timestamp or datetime.now().isoformat()
+
+        with self._lock:
+            cluster = self._assign(text, normalized, signature, timestamp)
+            self._count(cluster, user_id, session_id, timestamp)
+
+        if autosave:
+            self._schedule_flush()
+        return cluster['id']
+
+    def assign_question(self, text: str, timestamp: str = None) -> Optional[str]:
+        """Wyznacza klaster pytania bez liczenia wystąpienia (dolicza je count_question)
+
+        Nowy klaster ma count=0 i nie trafia na dysk, dopóki wystąpienie nie zostanie
+        policzone - pytanie odrzucone przed odpowiedzią nie zmienia statystyk.
+        """
+        normalized, signature = self.signature_for(text)
+        if not normalized:
+            return None
+        with self._lock:
+            return self._assign(text, normalized, signature, timestamp or datetime.now().isoformat())['id']
+
+    def count_question(self, cluster_id: Optional[str], text: str, user_id=None, session_id: str = None,
+                       timestamp: str = None, autosave: bool = True) -> Optional[str]:
+        """Dolicza wystąpienie pytania przypisanego wcześniej przez assign_question"""
+        timestamp = timestamp or datetime.now().isoformat()
+        with self._lock:
+            cluster = self._clusters.get(cluster_id) if cluster_id else None
+            if cluster is not None:
+                self._count(cluster, user_id, session_id, timestamp)
+        if cluster is None:
+            # Klaster zniknął (np. przebudowa indeksu) - zwykłe dodanie pytania
+            return self.add_question(text, user_id, session_id, timestamp, autosave)
+        if autosave:
+            self._schedule_flush()
+        return cluster_id
+
+    def _assign(self, text: str, normalized: str, signature: List[int], timestamp: str) -> Dict:
+        """Zwraca pasujący klaster albo tworzy nowy (wywoływane pod _lock)"""
+        cluster, score = self._best_match(signature)
+        if cluster is None or score < self.threshold:
+            cluster_id = f'q{self._next_id}'
+            self._next_id += 1
+            cluster = {
+                'id': cluster_id,
+                'question': text.strip()[:300],
+                'normalized': normalized,
+                'count': 0,
+                'users_count': 0,
+                'sessions': [],
+                'variants': [],
+                'signatures': [signature],
+                'first_asked': timestamp,
+                'last_asked': timestamp
+            }
+            self._clusters[cluster_id] = cluster
+            self._add_to_buckets(cluster_id, signature)
+        elif (score < 1.0 and len(cluster['signatures']) < self.MAX_VARIANTS
+              and normalized not in cluster['variants']):
+            # Zapamiętaj wariant pytania, żeby poprawić trafienia LSH
+            cluster['variants'].append(normalized)
+            cluster['signatures'].append(signature)
+            self._add_to_buckets(cluster['id'], signature)
+        return cluster
+
+    def _count(self, cluster: Dict, user_id, session_id: Optional[str], timestamp: str):
+        """Dolicza wystąpienie pytania w klastrze (wywoływane pod _lock)"""
+        cluster['count'] += 1
+        if user_id:
+            users = self._recent_users.setdefault(cluster['id'], [])
+            if user_id not in users:
+                cluster['users_count'] += 1
+                users.append(user_id)
+                del users[:-self.MAX_USERS]
+        if session_id and session_id not in cluster['sessions']:
+            cluster['sessions'] = (cluster['sessions'] + [session_id])[-self.MAX_SESSIONS:]
+        cluster['first_asked'] = min(cluster['first_asked'], timestamp)
+        cluster['last_asked'] = max(cluster['last_asked'], timestamp)
+        self._dirty.add(cluster['id'])
+
+    def get_cluster(self, cluster_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._clusters.get(cluster_id)
+
+    def most_asked(self, limit: int = 20, min_count: int = 2) -> List[Dict]:
+        """Zwraca najczęściej zadawane pytania (klastry podobnych pytań)"""
+        with self._lock:
+            clusters = [c for c in self._clusters.values() if c['count'] >= min_count]
+            clusters.sort(key=lambda c: (c['count'], c['users_count']), reverse=True)
+            return [{
+                'cluster_id': c['id'],
+                'question': c['question'],
+                'count': c['count'],
+                'users_count': c['users_count'],
+                'sessions_count': len(c['sessions']),
+                'variants': list(c['variants']),
+                'first_asked': c['first_asked'],
+                'last_asked': c['last_asked']
+            } for c in clusters[:limit]]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = sum(c['count'] for c in self._clusters.values())
+            repeated = sum(1 for c in self._clusters.values() if c['count'] > 1)
+            return {
+                'total_questions': total,
+                'clusters': sum(1 for c in self._clusters.values() if c['count'] > 0),
+                'repeated_clusters': repeated,
+                'buckets': len(self._buckets),
+                'log_entries': self._log_entries,
+                'rebuilding': self.rebuilding
+            }
+
+    # ------------------------------------------------------------------
+    # Trwałość
+    # ------------------------------------------------------------------
+
+    def rebuild_from_history(self, before: str = None, reset: bool = True):
+        """Buduje indeks ze wszystkich plików historii (tylko pytania zadane przed `before`)"""
+        if reset:
+            with self._lock:
+                self._clusters = {}
+                self._buckets = {}
+                self._recent_users = {}
+                self._next_id = 1
+        if os.path.exists(self.history_dir):
+            for filename in sorted(os.listdir(self.history_dir)):
+                if not filename.endswith('.json') or filename.endswith('_context.json'):
+                    continue
+                session_id = filename[:-len('.json')]
+                try:
+                    with open(os.path.join(self.history_dir, filename), 'r', encoding='utf-8') as f:
+                        history = json.load(f)
+                except Exception:
+                    continue
+                if not isinstance(history, list):
+                    continue
+                for message in history:
+                    if not isinstance(message, dict) or message.get('role') != 'user' or not message.get('content'):
+                        continue
+                    # Pytania zapisane po starcie przebudowy trafiły już do indeksu przez add_question
+                    if before and (message.get('timestamp') or '') >= before:
+                        continue
+                    self.add_question(message['content'], message.get('user_id'), session_id,
+                                      message.get('timestamp'), autosave=False)
+
+        # Pełna migawka zamiast dziennika z całym indeksem
+        with self._io_lock:
+            with self._lock:
+                payload = self._snapshot_payload(
+                    {cluster_id: c for cluster_id, c in self._clusters.items() if c['count'] > 0}, self._next_id)
+                self._dirty.clear()
+            self._write_snapshot(payload)
+        logger.info("Zbudowano indeks pytań: %s", self.stats())
+
+    def _rebuild_in_background(self):
+        """Pierwsze uruchomienie - budowa z historii nie blokuje zapisu wiadomości"""
+        before = datetime.now().isoformat()
+        self.rebuilding = True
+
+        def rebuild():
+            try:
+                self.rebuild_from_history(before, reset=False)
+            except Exception as e:
+                logger.error("Błąd budowania indeksu pytań z historii: %s", e)
+            finally:
+                self.rebuilding = False
+
+        threading.Thread(target=rebuild, daemon=True).start()
+
+    @staticmethod
+    def _upgrade_cluster(cluster: Dict) -> List:
+        """Zamienia dawną pełną listę użytkowników na licznik; zwraca ostatnich z listy"""
+        users = cluster.pop('users', None)
+        if users is None:
+            return []
+        cluster['users_count'] = len(users)
+        return users[-QuestionIndex.MAX_USERS:]
+
+    def _read_files(self, recent_users: Dict = None) -> Tuple[Dict, int, int]:
+        """Migawka z dysku z nałożonym dziennikiem: (klastry, next_id, liczba wpisów dziennika)"""
+        clusters, next_id = {}, 1
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            clusters = data.get('clusters', {})
+            for cluster in clusters.values():
+                users = self._upgrade_cluster(cluster)
+                if users and recent_users is not None:
+                    recent_users[cluster['id']] = users
+            next_id = data.get('next_id', len(clusters) + 1)
+
+        entries = 0
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # niedokończony ostatni wpis po przerwanym zapisie
+                    cluster = entry['cluster']
+                    users = self._upgrade_cluster(cluster)
+                    if users and recent_users is not None:
+                        recent_users[cluster['id']] = users
+                    clusters[cluster['id']] = cluster
+                    next_id = max(next_id, entry.get('next_id', 1))
+                    entries += 1
+        return clusters, next_id, entries
+
+    def _load(self):
+        try:
+            recent_users = {}
+            clusters, next_id, entries = self._read_files(recent_users)
+            with self._lock:
+                self._clusters = clusters
+                self._recent_users = recent_users
+                self._next_id = next_id
+                self._log_entries = entries
+                self._buckets = {}
+                for cluster_id, cluster in self._clusters.items():
+                    for signature in cluster['signatures']:
+                        self._add_to_buckets(cluster_id, signature)
+        except Exception as e:
+            logger.warning("Błąd wczytywania indeksu pytań, przebudowuję: %s", e)
+            self._rebuild_in_background()
+
+    def _schedule_flush(self):
+        """Uruchamia wątek zapisujący zmiany (jeśli jeszcze nie działa)"""
+        if self._flush_thread is None or not self._flush_thread.is_alive():
+            with self._lock:
+                if self._flush_thread is None or not self._flush_thread.is_alive():
+                    self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+                    self._flush_thread.start()
+        self._flush_event.set()
+
+    def _flush_loop(self):
+        while True:
+            self._flush_event.wait()
+            # Zbierz zmiany z krótkiego okna w jeden zapis
+            time.sleep(self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
+
+    def flush(self):
+        """Dopisuje zmienione klastry do dziennika; co compact_every wpisów scala migawkę"""
+        with self._io_lock:
+            while True:
+                # Serializacja partiami - blokada indeksu trzymana tylko na czas kilku klastrów
+                with self._lock:
+                    batch = [self._dirty.pop() for _ in range(min(self.FLUSH_BATCH, len(self._dirty)))]
+                    lines = [json.dumps({'next_id': self._next_id, 'cluster': self._clusters[cluster_id]},
+                                        ensure_ascii=False)
+                             for cluster_id in batch if cluster_id in self._clusters]
+                if not batch:
+                    break
+                try:
+                    os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+                    with open(self.log_file, 'a', encoding='utf-8') as f:
+                        f.write(''.join(line + '\n' for line in lines))
+                    self._log_entries += len(lines)
+                except Exception as e:
+                    logger.error("Błąd zapisywania dziennika indeksu pytań: %s", e)
+                    with self._lock:
+                        self._dirty.update(batch)
+                    return
+
+            if self._log_entries >= self.compact_every:
+                self._compact()
+
+    def save(self):
+        """Zapisuje zmiany na dysk (zgodność wsteczna - to samo co flush)"""
+        self.flush()
+
+    def _compact(self):
+        """Scala migawkę z dziennikiem na podstawie plików (wywoływane pod _io_lock)"""
+        try:
+            clusters, next_id, _ = self._read_files()
+            self._write_snapshot(self._snapshot_payload(clusters, next_id))
+        except Exception as e:
+            logger.error("Błąd scalania indeksu pytań: %s", e)
+
+    @staticmethod
+    def _snapshot_payload(clusters: Dict, next_id: int) -> str:
+        return json.dumps({'next_id': next_id, 'clusters': clusters, 'saved_at': datetime.now().isoformat()},
+                          ensure_ascii=False)
+
+    def _write_snapshot(self, payload: str):
+        """Zapisuje migawkę atomowo i czyści dziennik (wywoływane pod _io_lock)"""
+        os.makedirs(os.path.dirname(self.index_file) or '.', exist_ok=True)
+        tmp_path = f'{self.index_file}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.index_file)
+            # Wpisy dziennika są już w migawce; ponowne nałożenie po awarii w tym miejscu jest bezpieczne
+            with open(self.log_file, 'w', encoding='utf-8'):
+                pass
+            self._log_entries = 0
+        except Exception as e:
+            logger.error("Błąd zapisywania indeksu pytań: %s", e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+_question_index = None
+_question_index_lock = threading.Lock()
+
+
+def get_question_index() -> QuestionIndex:
+    """Zwraca globalny indeks podobnych pytań"""
+    global _question_index
+    if _question_index is None:
+        with _question_index_lock:
+            if _question_index is None:
+                _question_index = QuestionIndex()
+    return _question_index
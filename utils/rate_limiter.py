@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ogranicznik częstotliwości żądań (token bucket)
+
+Wiaderko napełnia się ze stałą szybkością do swojej pojemności, a każde
+żądanie zabiera z niego żeton. Pojemność pozwala na krótką serię żądań,
+a szybkość napełniania wyznacza średnią liczbę żądań na minutę.
+"""
+import time
+import threading
+from typing import Callable, Dict, Optional
+
+
+class TokenBucket:
+    """Wiaderko żetonów współdzielone przez wątki"""
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = max(float(rate_per_minute), 0.001) / 60.0
+        self.capacity = float(capacity) if capacity else max(1.0, float(rate_per_minute) / 6.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Zabiera żetony, jeśli są dostępne (bez czekania)"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self.acquired += 1
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None,
+                is_cancelled: Optional[Callable[[], bool]] = None) -> bool:
+        """Czeka na żetony; zwraca False po przekroczeniu czasu lub anulowaniu"""
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.acquired += 1
+                    self.waited += time.monotonic() - started
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+
+            if is_cancelled and is_cancelled():
+                return False
+            if timeout is not None and time.monotonic() - started + wait > timeout:
+                return False
+            time.sleep(min(wait, self.POLL_INTERVAL))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._refill()
+            return {
+                'rate_per_minute': self.rate * 60.0,
+                'capacity': self.capacity,
+                'available': round(self._tokens, 2),
+                'acquired': self.acquired,
+                'waited_seconds': round(self.waited, 2)
+            }
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Łączenie identycznych zapytań generowanych równocześnie (single-flight)
+
+Pierwsze zapytanie o danym kluczu uruchamia generator odpowiedzi w wątku
+w tle, a fragmenty trafiają do wspólnego bufora. Kolejne zapytania o ten
+sam klucz, które przyjdą przed końcem generowania, odczytują ten sam bufor
+od początku - zamiast tworzyć własny vector store, wątek i run asystenta.
+Gdy odłączy się ostatni odbiorca, generowanie jest anulowane.
+
+Klucz obejmuje odcisk spersonalizowanego promptu uczenia, więc odpowiedź
+zbudowana z profilu jednego użytkownika nie trafia do innego. Po końcu
+generowania każdy odbiorca dostaje wynik (zużycie tokenów, klucz cache,
+błąd): tokeny przypisywane są zapytaniu, które uruchomiło generowanie,
+pozostałe są oznaczane jako współdzielone (shared).
+"""
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from utils.question_index import normalize_question
+
+logger = logging.getLogger(__name__)
+
+
+def single_flight_key(query: str, context: List[Dict], file_paths: List[str],
+                      learning_prompt: Optional[str] = None) -> str:
+    """Zwraca klucz zapytania: pytanie, odcisk kontekstu, dokumenty i odcisk promptu uczenia"""
+    fingerprint = [
+        (msg.get('role'), normalize_question(msg.get('content', '')))
+        for msg in (context or []) if isinstance(msg, dict)
+    ]
+    payload = json.dumps({
+        'query': normalize_question(query),
+        'context': fingerprint,
+        'documents': sorted(file_paths or []),
+        'learning_prompt': hashlib.sha1(learning_prompt.encode('utf-8')).hexdigest() if learning_prompt else None
+    }, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    """Jedno generowanie w toku i jego bufor fragmentów"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks = []
+        self.result = {}
+        self.done = False
+        self.cancelled = False
+        self.subscribers = 0
+        self.started_at = time.time()
+        self.condition = threading.Condition()
+
+
+class SingleFlight:
+    """Rejestr generowań w toku, współdzielonych przez zapytania o tym samym kluczu"""
+
+    POLL_INTERVAL = 0.25
+    # Ile odbiorca anulujący generowanie czeka na wynik producenta (usage anulowanego runu)
+    CANCEL_RESULT_TIMEOUT = 15.0
+
+    def __init__(self, chunk_timeout: float = 300.0):
+        self.chunk_timeout = chunk_timeout
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def stream(self, key: str, producer: Callable[[Callable[[], bool]], Iterable[str]],
+               is_cancelled: Optional[Callable[[], bool]] = None,
+               result: Optional[Callable[[], Dict]] = None,
+               on_result: Optional[Callable[[Dict, bool], None]] = None) -> Iterator[str]:
+        """Zwraca strumień fragmentów odpowiedzi dla klucza (uruchamia producenta tylko raz)
+
+        Producent dostaje funkcję sprawdzającą, czy generowanie zostało anulowane.
+        result() zapytania uruchamiającego generowanie jest wołane po zakończeniu
+        producenta; on_result(wynik, shared) dostaje każdy odbiorca po ostatnim
+        fragmencie (shared=False tylko dla zapytania, które uruchomiło generowanie).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight(key)
+                self._flights[key] = flight
+                self.started += 1
+            else:
+                self.coalesced += 1
+            flight.subscribers += 1
+
+        if is_leader:
+            thread = threading.Thread(target=self._run, args=(flight, producer, result), daemon=True)
+            thread.start()
+        else:
+            logger.debug("Dołączono do generowania w toku (%d odbiorców)", flight.subscribers)
+        return self._follow(flight, is_cancelled, on_result, shared=not is_leader)
+
+    def _run(self, flight: _Flight, producer: Callable[[Callable[[], bool]], Iterable[str]],
+             result: Optional[Callable[[], Dict]] = None):
+        """Konsumuje producenta i publikuje fragmenty oraz wynik wszystkim odbiorcom"""
+        error = None
+        try:
+            for chunk in producer(lambda: flight.cancelled):
+                with flight.condition:
+                    flight.chunks.append(chunk)
+                    flight.condition.notify_all()
+        except Exception as e:
+            logger.error("Błąd generowania współdzielonego: %s", e)
+            error = str(e)
+        finally:
+            try:
+                flight.result = dict(result() or {}) if result else {}
+            except Exception as e:
+                logger.warning("Błąd odczytu wyniku generowania: %s", e)
+                flight.result = {}
+            if error:
+                flight.result['error'] = error
+            with self._lock:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+            with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+
+    def _follow(self, flight: _Flight, is_cancelled: Optional[Callable[[], bool]] = None,
+                on_result: Optional[Callable[[Dict, bool], None]] = None, shared: bool = False) -> Iterator[str]:
+        """Odczytuje bufor od początku i czeka na kolejne fragmenty"""
+        position = 0
+        delivered = False
+        try:
+            while True:
+                with flight.condition:
+                    waited = 0.0
+                    while position >= len(flight.chunks) and not flight.done:
+                        if is_cancelled and is_cancelled():
+                            return
+                        if waited >= self.chunk_timeout:
+                            logger.warning("Przekroczono czas oczekiwania na fragment odpowiedzi")
+                            if on_result:
+                                on_result({'error': 'Przekroczono czas oczekiwania na odpowiedź'}, shared)
+                            delivered = True
+                            return
+                        flight.condition.wait(timeout=self.POLL_INTERVAL)
+                        waited += self.POLL_INTERVAL
+                    pending = flight.chunks[position:]
+                    finished = flight.done
+                position += len(pending)
+                for chunk in pending:
+                    yield chunk
+                if finished and position >= len(flight.chunks):
+                    if on_result:
+                        on_result(dict(flight.result), shared)
+                    delivered = True
+                    return
+        finally:
+            cancelled_flight = self._unsubscribe(flight)
+            if cancelled_flight and on_result and not delivered and not shared:
+                # Zapytanie, które uruchomiło generowanie, dostaje wynik także po anulowaniu -
+                # producent domyka run i zwraca jego usage (tokeny zużyte do chwili anulowania)
+                with flight.condition:
+                    flight.condition.wait_for(lambda: flight.done, timeout=self.CANCEL_RESULT_TIMEOUT)
+                    finished = flight.done
+                if finished:
+                    on_result(dict(flight.result), shared)
+
+    def _unsubscribe(self, flight: _Flight) -> bool:
+        """Odłącza odbiorcę; po odejściu ostatniego anuluje generowanie (zwraca True)"""
+        with self._lock:
+            flight.subscribers -= 1
+            if flight.subscribers > 0 or flight.done:
+                return False
+            flight.cancelled = True
+            # Nowe zapytania o ten klucz nie mogą dołączyć do anulowanego generowania
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        logger.info("Ostatni odbiorca odłączony - anuluję generowanie")
+        return True
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'started': self.started,
+                'coalesced': self.coalesced
+            }
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Zwraca globalny rejestr generowań w toku"""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bufory strumieni odpowiedzi z możliwością wznowienia po ponownym połączeniu
+
+Każda generowana odpowiedź ma bufor (message_id) z całym dotychczas wysłanym
+tekstem i zdarzeniami końcowymi. Fragmenty niosą offset, więc klient, który
+utracił połączenie, wysyła ostatni otrzymany offset i dostaje brakującą
+część, a dalsze fragmenty trafiają już do nowego połączenia. Zakończone
+bufory są przechowywane przez krótki czas, po czym są usuwane.
+"""
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+
+
+class ResponseStream:
+    """Bufor jednej strumieniowanej odpowiedzi"""
+
+    def __init__(self, message_id: str, user_id: str, sid: str):
+        self.message_id = message_id
+        self.user_id = user_id
+        self.sid = sid
+        self.text = ''
+        self.done = False
+        self.final_events = []
+        self.detached_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+
+class StreamBufferRegistry:
+    """Rejestr buforów odpowiedzi kluczowany message_id"""
+
+    def __init__(self, emit: Callable[[str, Dict, str], None], retention_seconds: float = 120.0):
+        self.emit = emit
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._streams = {}
+
+    def open(self, message_id: str, user_id: str, sid: str) -> ResponseStream:
+        """Tworzy bufor dla nowej odpowiedzi"""
+        self.purge()
+        stream = ResponseStream(message_id, user_id, sid)
+        with self._lock:
+            self._streams[message_id] = stream
+        return stream
+
+    def get(self, message_id: str) -> Optional[ResponseStream]:
+        with self._lock:
+            return self._streams.get(message_id)
+
+    def send(self, stream: ResponseStream, event: str, payload: Dict, final: bool = False):
+        """Wysyła zdarzenie do bieżącego połączenia odbiorcy (końcowe zapamiętuje)"""
+        with stream.lock:
+            if final:
+                stream.final_events.append((event, payload))
+            self.emit(event, payload, stream.sid)
+
+    def send_chunk(self, stream: ResponseStream, chunk: str):
+        """Dopisuje fragment do bufora i wysyła go z offsetem"""
+        with stream.lock:
+            offset = len(stream.text)
+            stream.text += chunk
+            self.emit('response_chunk', {
+                'chunk': chunk,
+                'message_id': stream.message_id,
+                'offset': offset,
+                'next_offset': len(stream.text)
+            }, stream.sid)
+
+    def finish(self, stream: ResponseStream):
+        """Oznacza odpowiedź jako zakończoną (bufor czeka na ewentualne wznowienie)"""
+        with stream.lock:
+            stream.done = True
+            stream.finished_at = time.time()
+
+    def detach(self, sid: str) -> List[ResponseStream]:
+        """Oznacza bufory połączenia jako odłączone i zwraca te, które jeszcze trwają"""
+        now = time.time()
+        detached = []
+        with self._lock:
+            streams = [s for s in self._streams.values() if s.sid == sid]
+        for stream in streams:
+            with stream.lock:
+                stream.detached_at = now
+                if not stream.done:
+                    detached.append(stream)
+        return detached
+
+    def resume(self, message_id: str, user_id: str, sid: str, offset: int = 0) -> Optional[Dict]:
+        """Przełącza bufor na nowe połączenie i wysyła brakującą część odpowiedzi"""
+        stream = self.get(message_id)
+        if stream is None or stream.user_id != user_id:
+            return None
+
+        with stream.lock:
+            offset = max(0, min(int(offset or 0), len(stream.text)))
+            stream.sid = sid
+            stream.detached_at = None
+            missing = stream.text[offset:]
+            if missing:
+                self.emit('response_chunk', {
+                    'chunk': missing,
+                    'message_id': message_id,
+                    'offset': offset,
+                    'next_offset': len(stream.text),
+                    'resumed': True
+                }, sid)
+            for event, payload in stream.final_events:
+                self.emit(event, payload, sid)
+            return {'replayed': len(missing), 'done': stream.done}
+
+    def purge(self) -> int:
+        """Usuwa bufory zakończonych odpowiedzi starsze niż okres przechowywania"""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [mid for mid, s in self._streams.items() if s.done and s.finished_at < cutoff]
+            for message_id in expired:
+                del self._streams[message_id]
+        return len(expired)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            streams = list(self._streams.values())
+        return {
+            'buffers': len(streams),
+            'active': sum(1 for s in streams if not s.done),
+            'detached': sum(1 for s in streams if s.detached_at is not None),
+            'buffered_chars': sum(len(s.text) for s in streams)
+        }
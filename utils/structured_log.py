@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Strukturalne, asynchroniczne logowanie aplikacji
+
+Moduły pobierają własny logger (logging.getLogger(__name__)) i logują z poziomem
+zamiast print(). configure_logging() podpina do głównego loggera jeden
+QueueHandler - wątek obsługujący wiadomość tylko wkłada rekord do kolejki,
+a formatowanie i zapis na stdout/do pliku wykonuje wątek QueueListener.
+
+Przy domyślnym poziomie INFO wywołania logger.debug(...) kończą się na
+sprawdzeniu poziomu (argumenty w stylu %s nie są nawet formatowane), więc
+szczegółowe logi w pętli strumieniowania praktycznie nic nie kosztują.
+Gdy włączony jest poziom DEBUG, rekordy DEBUG są próbkowane per miejsce
+wywołania (LOG_DEBUG_SAMPLE_RATE lub extra={'sample_rate': ...}).
+
+Konfiguracja: LOG_LEVEL (INFO), LOG_FORMAT (text | json), LOG_FILE (opcjonalny
+plik), LOG_DEBUG_SAMPLE_RATE (1.0), LOG_QUEUE_SIZE (10000; przy pełnej
+kolejce rekordy są odrzucane zamiast blokować wątek).
+"""
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import itertools
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Standardowe atrybuty LogRecord - reszta to pola przekazane przez extra={...}
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'sample_rate'}
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Jeden obiekt JSON na linię: czas, poziom, logger, treść i pola z extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Czytelny format tekstowy z polami extra dopisanymi jako klucz=wartość"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = [f'{key}={value}' for key, value in vars(record).items()
+                  if key not in _RESERVED_ATTRS and not key.startswith('_')]
+        return f"{line} {' '.join(fields)}" if fields else line
+
+
+class SamplingFilter(logging.Filter):
+    """Przepuszcza co N-ty rekord DEBUG z danego miejsca wywołania (N = 1 / sample_rate)"""
+
+    def __init__(self, default_rate: float = 1.0):
+        super().__init__()
+        self.default_rate = default_rate
+        self._counters = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = getattr(record, 'sample_rate', self.default_rate)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        key = (record.pathname, record.lineno)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        return next(counter) % max(1, round(1.0 / rate)) == 0
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler, który przy pełnej kolejce odrzuca rekord zamiast czekać"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Treść formatujemy od razu (argumenty mogą się zmienić), wyjątek formatuje wątek zapisu
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def configure_logging(level: str = None, fmt: str = None) -> logging.Logger:
+    """Podpina asynchroniczny handler do głównego loggera (wywołanie wielokrotne jest bezpieczne)"""
+    global _listener
+    root = logging.getLogger()
+
+    with _listener_lock:
+        if _listener is not None:
+            return root
+
+        level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+        fmt = (fmt or os.getenv('LOG_FORMAT', 'text')).lower()
+        formatter = JsonFormatter() if fmt == 'json' else TextFormatter()
+
+        handlers = [logging.StreamHandler(sys.stdout)]
+        log_file = os.getenv('LOG_FILE')
+        if log_file:
+            os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+            handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+        queue_handler = NonBlockingQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 1.0))))
+
+        root.addHandler(queue_handler)
+        root.setLevel(getattr(logging, level, logging.INFO))
+
+        # Klienci HTTP logują każde żądanie do OpenAI na INFO
+        for noisy in ('httpx', 'httpcore', 'openai'):
+            logging.getLogger(noisy).setLevel(max(root.level, logging.WARNING))
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging():
+    """Opróżnia kolejkę i zatrzymuje wątek zapisu logów"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
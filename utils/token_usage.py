@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Zużycie tokenów i koszt zapytań do OpenAI
+
+usage_from_response zamienia pole usage z runu asystenta lub odpowiedzi
+chat.completions na słownik (model, tokeny promptu, odpowiedzi, tokeny
+promptu z cache dostawcy i szacowany koszt w USD). Słownik zapisywany jest
+przy wiadomości asystenta, a UsageLedger sumuje go w licznikach dzień /
+użytkownik / funkcja (chat, handbook, batch) / model, żeby w panelu admina
+było widać, które zmiany kontekstu i cache faktycznie obniżają koszt.
+
+Odpowiedzi z cache aplikacji liczone są jako cache_hits bez tokenów, a
+odpowiedzi współdzielone z generowania w toku (single-flight) jako shared -
+tokeny takiego runu są przypisane zapytaniu, które go uruchomiło. Zużycie
+anulowanego runu, dla którego dostawca nie podał usage, jest szacowane
+(estimate_usage) i liczone dodatkowo jako partial.
+Ceny (USD za 1M tokenów) można nadpisać zmienną TOKEN_PRICES, np.
+{"gpt-4o": {"input": 2.5, "cached_input": 1.25, "output": 10}}.
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# USD za 1M tokenów: wejście, wejście z cache dostawcy, wyjście
+MODEL_PRICES = {
+    'gpt-4o-mini': {'input': 0.15, 'cached_input': 0.075, 'output': 0.60},
+    'gpt-4o': {'input': 2.50, 'cached_input': 1.25, 'output': 10.00},
+    'gpt-4.1-nano': {'input': 0.10, 'cached_input': 0.025, 'output': 0.40},
+    'gpt-4.1-mini': {'input': 0.40, 'cached_input': 0.10, 'output': 1.60},
+    'gpt-4.1': {'input': 2.00, 'cached_input': 0.50, 'output': 8.00},
+    'gpt-4-turbo': {'input': 10.00, 'cached_input': 10.00, 'output': 30.00},
+    'o3-mini': {'input': 1.10, 'cached_input': 0.55, 'output': 4.40},
+}
+
+COUNTER_FIELDS = ('requests', 'cache_hits', 'shared', 'partial', 'prompt_tokens', 'completion_tokens',
+                  'cached_tokens', 'total_tokens', 'cost_usd')
+
+# Przybliżenie tokenizera przy szacowaniu zużycia bez usage od dostawcy
+CHARS_PER_TOKEN = 4
+
+
+def _load_prices() -> Dict:
+    prices = dict(MODEL_PRICES)
+    override = os.getenv('TOKEN_PRICES')
+    if override:
+        try:
+            prices.update(json.loads(override))
+        except ValueError as e:
+            logger.warning("Nieprawidłowe TOKEN_PRICES, używam cen domyślnych: %s", e)
+    return prices
+
+
+_prices = _load_prices()
+
+
+def price_for(model: str) -> Optional[Dict]:
+    """Cennik modelu; wersje z datą (gpt-4o-2024-08-06) dopasowywane po najdłuższym prefiksie"""
+    if not model:
+        return None
+    if model in _prices:
+        return _prices[model]
+    for name in sorted(_prices, key=len, reverse=True):
+        if model.startswith(name):
+            return _prices[name]
+    return None
+
+
+def _field(obj, name, default=None):
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def usage_from_response(usage, model: str = None) -> Optional[Dict]:
+    """Normalizuje usage z runu asystenta / chat.completions (obiekt SDK lub słownik)"""
+    if usage is None:
+        return None
+    prompt_tokens = int(_field(usage, 'prompt_tokens', 0) or 0)
+    completion_tokens = int(_field(usage, 'completion_tokens', 0) or 0)
+    cached_tokens = int(_field(_field(usage, 'prompt_tokens_details'), 'cached_tokens', 0) or 0)
+    result = {
+        'model': model,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'cached_tokens': cached_tokens,
+        'total_tokens': int(_field(usage, 'total_tokens', 0) or prompt_tokens + completion_tokens),
+        'cost_usd': None
+    }
+    price = price_for(model)
+    if price:
+        result['cost_usd'] = round((
+            (prompt_tokens - cached_tokens) * price['input']
+            + cached_tokens * price.get('cached_input', price['input'])
+            + completion_tokens * price['output']
+        ) / 1_000_000, 6)
+    return result
+
+
+def estimate_usage(prompt: str, completion: str, model: str = None) -> Dict:
+    """Szacuje zużycie z wysłanego promptu i odebranej odpowiedzi (partial=True)
+
+    Nie obejmuje fragmentów dokumentów dołączanych przez file_search - to dolne oszacowanie.
+    """
+    prompt_tokens = len(prompt or '') // CHARS_PER_TOKEN
+    completion_tokens = len(completion or '') // CHARS_PER_TOKEN
+    usage = usage_from_response({'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens}, model)
+    usage['partial'] = True
+    return usage
+
+
+def merge_usage(first: Optional[Dict], second: Optional[Dict]) -> Optional[Dict]:
+    """Sumuje zużycie kilku wywołań (np. ponowionych runów) jednej odpowiedzi"""
+    if not first or not second:
+        return first or second
+    merged = {'model': second.get('model') or first.get('model')}
+    for key in ('prompt_tokens', 'completion_tokens', 'cached_tokens', 'total_tokens'):
+        merged[key] = first.get(key, 0) + second.get(key, 0)
+    costs = [u['cost_usd'] for u in (first, second) if u.get('cost_usd') is not None]
+    merged['cost_usd'] = round(sum(costs), 6) if costs else None
+    if first.get('partial') or second.get('partial'):
+        merged['partial'] = True
+    return merged
+
+
+def _empty_counters() -> Dict:
+    return {field: 0 for field in COUNTER_FIELDS}
+
+
+def _add(counters: Dict, other: Dict):
+    for field in COUNTER_FIELDS:
+        counters[field] = counters.get(field, 0) + other.get(field, 0)
+    counters['cost_usd'] = round(counters['cost_usd'], 6)
+
+
+class UsageLedger:
+    """Trwałe liczniki zużycia tokenów: dzień -> użytkownik -> funkcja -> model"""
+
+    def __init__(self, ledger_file: str = 'data/token_usage.json', retention_days: int = None,
+                 save_every: int = 20, save_interval: float = 30.0):
+        self.ledger_file = ledger_file
+        self.retention_days = retention_days or int(os.getenv('TOKEN_USAGE_RETENTION_DAYS', 400))
+        self.save_every = save_every
+        self.save_interval = save_interval
+
+        self._lock = threading.RLock()
+        self._days = {}
+        self._pending = 0
+        self._last_save = time.time()
+
+        self._load()
+        atexit.register(self.save)
+
+    def _load(self):
+        if not os.path.exists(self.ledger_file):
+            return
+        try:
+            with open(self.ledger_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            with self._lock:
+                self._days = data.get('days', {})
+        except Exception as e:
+            logger.warning("Błąd wczytywania licznika tokenów %s: %s", self.ledger_file, e)
+
+    def record(self, usage: Optional[Dict], user_id=None, feature: str = 'chat', cached: bool = False,
+               when: datetime = None, shared: bool = False):
+        """Dolicza zużycie jednej odpowiedzi
+
+        cached=True - odpowiedź z cache aplikacji, shared=True - odpowiedź współdzielona
+        z generowania innego zapytania; obie bez własnych tokenów.
+        """
+        if not usage and not cached and not shared:
+            return
+        day = (when or datetime.now()).strftime('%Y-%m-%d')
+        model = (usage or {}).get('model') or '-'
+        entry = _empty_counters()
+        entry['requests'] = 1
+        entry['cache_hits'] = 1 if cached else 0
+        entry['shared'] = 1 if shared and not cached else 0
+        entry['partial'] = 1 if (usage or {}).get('partial') else 0
+        for key in ('prompt_tokens', 'completion_tokens', 'cached_tokens', 'total_tokens'):
+            entry[key] = (usage or {}).get(key) or 0
+        entry['cost_usd'] = (usage or {}).get('cost_usd') or 0.0
+
+        with self._lock:
+            users = self._days.setdefault(day, {})
+            features = users.setdefault(str(user_id or 'system'), {})
+            models = features.setdefault(feature, {})
+            _add(models.setdefault(model, _empty_counters()), entry)
+
+            self._pending += 1
+            should_save = self._pending >= self.save_every or time.time() - self._last_save > self.save_interval
+
+        if should_save:
+            self.save()
+
+    def summary(self, days: int = 30, user_id=None) -> Dict:
+        """Sumy za ostatnie `days` dni: łącznie, per dzień, użytkownik, funkcja i model"""
+        since = (datetime.now() - timedelta(days=max(1, days) - 1)).strftime('%Y-%m-%d')
+        totals = _empty_counters()
+        per_day, per_user, per_feature, per_model = {}, {}, {}, {}
+
+        with self._lock:
+            for day, users in self._days.items():
+                if day < since:
+                    continue
+                for uid, features in users.items():
+                    if user_id is not None and uid != str(user_id):
+                        continue
+                    for feature, models in features.items():
+                        for model, counters in models.items():
+                            _add(totals, counters)
+                            _add(per_day.setdefault(day, _empty_counters()), counters)
+                            _add(per_user.setdefault(uid, _empty_counters()), counters)
+                            _add(per_feature.setdefault(feature, _empty_counters()), counters)
+                            _add(per_model.setdefault(model, _empty_counters()), counters)
+
+        requests = totals['requests']
+        model_calls = requests - totals['cache_hits'] - totals['shared']
+        return {
+            'days': days,
+            'since': since,
+            'totals': totals,
+            'cache_hit_rate': totals['cache_hits'] / requests if requests else 0.0,
+            'shared_rate': totals['shared'] / requests if requests else 0.0,
+            'avg_prompt_tokens': totals['prompt_tokens'] / model_calls if model_calls > 0 else 0.0,
+            'per_day': [{'date': day, **per_day[day]} for day in sorted(per_day)],
+            'per_user': sorted(({'user_id': uid, **counters} for uid, counters in per_user.items()),
+                               key=lambda row: (row['cost_usd'], row['total_tokens']), reverse=True),
+            'per_feature': per_feature,
+            'per_model': per_model
+        }
+
+    def save(self):
+        """Zapisuje liczniki na dysk (starsze niż retention_days są usuwane)"""
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime('%Y-%m-%d')
+        with self._lock:
+            if not self._pending:
+                return
+            for day in [day for day in self._days if day < cutoff]:
+                del self._days[day]
+            payload = json.dumps({'days': self._days, 'saved_at': datetime.now().isoformat()},
+                                 ensure_ascii=False)
+            self._pending = 0
+            self._last_save = time.time()
+
+        os.makedirs(os.path.dirname(self.ledger_file) or '.', exist_ok=True)
+        tmp_path = f'{self.ledger_file}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.ledger_file)
+        except Exception as e:
+            logger.error("Błąd zapisywania licznika tokenów: %s", e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+_usage_ledger = None
+_usage_ledger_lock = threading.Lock()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """Zwraca globalny licznik zużycia tokenów"""
+    global _usage_ledger
+    if _usage_ledger is None:
+        with _usage_ledger_lock:
+            if _usage_ledger is None:
+                _usage_ledger = UsageLedger()
+    return _usage_ledger
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Wspólny klasyfikator tematów lotniczych
+
+Każdy temat ma własny skompilowany wzorzec (słowa kluczowe od początku
+słowa, \b), sprawdzany osobno na tekście bez polskich znaków - dzięki temu
+nakładające się słowa kluczowe różnych tematów (np. "procedury awaryjne"
+i "procedur") nie wykluczają się nawzajem. Tematy wyznaczane są
+raz przy zapisie wiadomości (pole 'topics') i odczytywane przez analitykę,
+raporty i system uczenia się.
+"""
+import re
+import unicodedata
+from typing import Dict, List
+
+DEFAULT_TOPIC = 'ogólne'
+
+# Słownik tematów: klucz -> słowa kluczowe (dopasowanie od początku słowa,
+# słowa z WHOLE_WORD_KEYWORDS tylko jako całe słowa)
+TOPIC_KEYWORDS = {
+    'aerodynamika': ['aerodynamik', 'siła nośna', 'siły nośnej', 'siła ciągu', 'opór', 'oporu',
+                     'profil', 'skrzydło', 'skrzydła', 'kąt natarcia', 'przeciągnięci',
+                     'lift', 'drag', 'stall'],
+    'nawigacja': ['nawigac', 'gps', 'vor', 'ndb', 'ils', 'dme', 'kompas', 'kurs', 'namierzanie',
+                  'pozycja', 'współrzędne', 'navigation'],
+    'meteorologia': ['meteorolog', 'pogod', 'wiatr', 'ciśnieni', 'temperatur', 'chmur', 'burz',
+                     'oblodzeni', 'turbulencj', 'widoczność', 'metar', 'taf', 'weather'],
+    'silniki': ['silnik', 'spalani', 'turbin', 'śmigło', 'moc silnika', 'paliw', 'napęd', 'engine'],
+    'procedury': ['procedur', 'start', 'lądowani', 'podejści', 'manewr', 'maneuwr', 'checklist',
+                  'approach', 'landing', 'takeoff'],
+    'systemy': ['hydrauli', 'elektryk', 'instalacja paliwowa', 'system', 'radar', 'transponder'],
+    'awionika': ['awionik', 'avionik', 'autopilot', 'instrumenty', 'altimetr', 'avionics'],
+    'przepisy': ['przepis', 'regulacj', 'prawo', 'icao', 'easa', 'faa', 'ulc', 'certyfikac'],
+    'bezpieczeństwo': ['bezpieczeństw', 'awari', 'procedury awaryjne', 'ryzyk', 'wypadek',
+                       'incydent', 'emergency'],
+    'struktury': ['konstrukcj', 'materiał', 'wytrzymałość', 'kadłub', 'podwozi'],
+    'pilotaż': ['pilotaż', 'pilot', 'sterowani', 'lot', 'lotu', 'samolot'],
+    'operacje': ['lotnisk', 'pas startowy', 'hangar', 'airport', 'runway'],
+    'komunikacja': ['komunikacj', 'radiotelefon', 'frazeologi', 'łączność'],
+    'kontrola ruchu': ['kontrola ruchu', 'atc', 'wieża', 'kontroler'],
+    'szkolenie': ['licencj', 'egzamin', 'szkoleni', 'atpl', 'ppl', 'cpl', 'instruktor']
+}
+
+# Nazwy wyświetlane w panelu administracyjnym
+TOPIC_LABELS = {
+    'aerodynamika': 'Aerodynamika',
+    'nawigacja': 'Nawigacja',
+    'meteorologia': 'Meteorologia',
+    'silniki': 'Napęd',
+    'procedury': 'Procedury',
+    'systemy': 'Systemy',
+    'awionika': 'Awionika',
+    'przepisy': 'Przepisy',
+    'bezpieczeństwo': 'Bezpieczeństwo',
+    'struktury': 'Konstrukcja',
+    'pilotaż': 'Pilotaż',
+    'operacje': 'Operacje',
+    'komunikacja': 'Komunikacja',
+    'kontrola ruchu': 'Kontrola ruchu',
+    'szkolenie': 'Szkolenie',
+    DEFAULT_TOPIC: 'Ogólne'
+}
+
+# Krótkie słowa, które jako przedrostek łapałyby inne tematy ("lot" -> "lotnisko")
+WHOLE_WORD_KEYWORDS = {'lot'}
+
+
+def fold_text(text: str) -> str:
+    """Zamienia tekst na małe litery bez polskich znaków"""
+    text = unicodedata.normalize('NFD', text.lower().replace('ł', 'l'))
+    return ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+
+
+def _keyword_pattern(keyword: str) -> str:
+    folded = re.escape(fold_text(keyword))
+    if keyword in WHOLE_WORD_KEYWORDS:
+        return rf'\b{folded}\b'
+    return rf'\b{folded}'
+
+
+def _build_patterns() -> Dict[str, re.Pattern]:
+    """Kompiluje osobny wzorzec dla każdego tematu"""
+    return {
+        topic: re.compile('|'.join(_keyword_pattern(k) for k in sorted(keywords, key=len, reverse=True)))
+        for topic, keywords in TOPIC_KEYWORDS.items()
+    }
+
+
+_TOPIC_PATTERNS = _build_patterns()
+
+
+def tag_topics(text: str) -> List[str]:
+    """Zwraca listę tematów tekstu (w kolejności słownika, bez powtórzeń)"""
+    if not text:
+        return []
+
+    folded = fold_text(text)
+    return [topic for topic, pattern in _TOPIC_PATTERNS.items() if pattern.search(folded)]
+
+
+def primary_topic(tags: List[str]) -> str:
+    """Zwraca główny temat z listy tagów"""
+    return tags[0] if tags else DEFAULT_TOPIC
+
+
+def message_topics(message: Dict) -> List[str]:
+    """Zwraca tematy zapisane w wiadomości (starsze wiadomości taguje na bieżąco)"""
+    if not isinstance(message, dict):
+        return []
+    if 'topics' in message:
+        return message['topics'] or []
+    return tag_topics(message.get('content', ''))
+
+
+def topic_label(topic: str) -> str:
+    """Zwraca nazwę tematu do wyświetlenia"""
+    return TOPIC_LABELS.get(topic, topic.capitalize())
@@ -7,8 +7,10 @@ import os
 import time
 import threading
 from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
 from watchdog.events import FileSystemEventHandler
 from app.models import UploadIndex
+from utils.async_support import get_async_mode
 
 class PDFUploadHandler(FileSystemEventHandler):
     """Handler do obsługi nowych plików PDF"""
@@ -81,7 +83,8 @@ def start_watcher():
         
         # Uruchom observer
         event_handler = PDFUploadHandler()
-        observer = Observer()
+        # Obserwator inotify blokuje pętlę eventlet/gevent - tam odpytujemy katalog
+        observer = Observer() if get_async_mode() == 'threading' else PollingObserver(timeout=2)
         observer.schedule(event_handler, upload_folder, recursive=False)
         observer.start()
         
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Punkt wejścia WSGI dla Gunicorna
+
+    SOCKETIO_ASYNC_MODE=eventlet gunicorn -k eventlet -w 1 -b 0.0.0.0:5000 wsgi:app
+    SOCKETIO_ASYNC_MODE=gevent gunicorn -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker -w 1 -b 0.0.0.0:5000 wsgi:app
+"""
+from utils.async_support import monkey_patch
+monkey_patch()
+
+from app import create_app, socketio
+from app.warmup import start_warmup
+
+app = create_app()
+start_warmup(socketio)